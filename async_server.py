@@ -0,0 +1,442 @@
+"""
+Asyncio HTTP server for running the scoring API in a container.
+
+Next to the order service there is no API Gateway or Lambda in front of
+the scorer, so this server turns each HTTP request into the API Gateway
+event lambda_handler expects. Scoring, explanations, idempotent replay,
+audit writes, the request deadline and the circuit breakers therefore
+behave exactly as in Lambda; only the transport differs:
+
+    - keep-alive: HTTP/1.1 connections serve one request after another
+      until the client sends "Connection: close" or idles for keep_alive_s
+    - bounded concurrency: at most max_in_flight requests run
+      lambda_handler at once, each on a thread of a pool of that size, so
+      blocking boto3 calls (SageMaker, Bedrock, DynamoDB) never stall the
+      event loop. Up to max_queued more wait up to queue_timeout_ms for a
+      slot; beyond that the server answers 429 with Retry-After at once,
+      so overload shows up at the caller instead of as unbounded latency
+    - deadline: time spent queued counts against REQUEST_BUDGET_MS (the
+      handler's context reports what is left, like Lambda's remaining time)
+    - health: GET /health answers while the event loop runs (liveness);
+      GET /ready answers 200 once the AWS clients are built and 503 while
+      starting or draining (readiness), with in-flight and circuit state
+    - graceful drain: on SIGTERM or SIGINT /ready turns 503, and after
+      drain_delay_s (time for the load balancer to notice) the listener
+      closes, idle connections are closed, and requests already accepted
+      finish (up to drain_timeout_s) with "Connection: close". The
+      micro-batcher and audit writer are drained last.
+
+Streamed explanations (explanation_mode "stream") come back as one NDJSON
+body, as through API Gateway; stream_server.py writes them as chunks.
+
+Usage:
+    python async_server.py [--port 8080] [--max-in-flight 64] [--max-queued 128]
+        [--queue-timeout-ms 100] [--keep-alive-s 5] [--drain-delay-s 0]
+        [--drain-timeout-s 10] [--stubs] [--micro-batch]
+
+--stubs swaps the AWS clients for the in-process stand-ins from
+benchmarks/aws_stubs.py (no AWS account needed); load test with e.g.
+    python benchmarks/load_replay.py run --url http://127.0.0.1:8080/risk-score
+or benchmarks/bench_async_server.py.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import lambda_function
+from stream_server import CORS_HEADERS
+
+# Longest request line + headers, and longest body (a full batch is ~100 KB)
+MAX_HEAD_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class RequestError(ValueError):
+    """Request the server cannot take; answered with status_code and the connection closed."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class HttpRequest(NamedTuple):
+    """One parsed HTTP/1.x request."""
+
+    method: str
+    path: str
+    query: str
+    version: str
+    headers: Dict[str, str]
+    body: bytes
+
+
+class RequestContext:
+    """Lambda context stand-in: request id and the time left of the request's budget."""
+
+    def __init__(self, aws_request_id: str, deadline_at: float):
+        self.aws_request_id = aws_request_id
+        self.deadline_at = deadline_at
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self.deadline_at - time.monotonic()) * 1000))
+
+
+class AdmissionControl:
+    """
+    In-flight limit with a bounded, time-limited wait for a slot.
+
+    acquire() returns False when the request should be rejected: the wait
+    queue is full, or no slot freed up within the queue timeout.
+    """
+
+    def __init__(self, max_in_flight: int, max_queued: int, queue_timeout_ms: float):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout_ms = queue_timeout_ms
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    async def acquire(self) -> bool:
+        if self._slots.locked():
+            if self.queued >= self.max_queued:
+                self.rejected += 1
+                return False
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout_ms / 1000)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+            finally:
+                self.queued -= 1
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.in_flight or self.queued)
+
+
+class ScoringServer:
+    """Keep-alive HTTP/1.1 front end for lambda_handler."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8080, max_in_flight: int = 64,
+                 max_queued: int = 128, queue_timeout_ms: float = 100.0,
+                 keep_alive_s: float = 5.0, drain_delay_s: float = 0.0,
+                 drain_timeout_s: float = 10.0, preload: bool = True):
+        """
+        Args:
+            host, port: Listen address
+            max_in_flight: Requests running lambda_handler at once (and
+                           handler threads)
+            max_queued: Requests waiting for a slot before new ones get 429
+            queue_timeout_ms: Longest wait for a slot before a 429
+            keep_alive_s: Idle time after which a keep-alive connection closes
+            drain_delay_s: Time between /ready turning 503 and the listener
+                           closing on shutdown
+            drain_timeout_s: Longest wait for accepted requests on shutdown
+            preload: Build the AWS clients before reporting ready
+        """
+        self.host = host
+        self.port = port
+        self.keep_alive_s = keep_alive_s
+        self.drain_delay_s = drain_delay_s
+        self.drain_timeout_s = drain_timeout_s
+        self.preload = preload
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout_ms = queue_timeout_ms
+        self.admission: Optional[AdmissionControl] = None
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight,
+                                           thread_name_prefix='scoring')
+        self.ready = False
+        self.draining = False
+        self._server: Optional[asyncio.AbstractServer] = None
+        # Open connections; busy ones are between reading a request and writing its response
+        self._connections: Dict[asyncio.StreamWriter, bool] = {}
+        self.connections_opened = 0
+        self.requests = 0
+
+    async def serve(self) -> bool:
+        """
+        Serve until SIGTERM/SIGINT, then drain.
+
+        Returns:
+            True if every accepted request finished within drain_timeout_s
+        """
+        loop = asyncio.get_running_loop()
+        # Created on the serving loop (asyncio primitives bind to it)
+        self.admission = AdmissionControl(self.max_in_flight, self.max_queued,
+                                          self.queue_timeout_ms)
+        self._server = await asyncio.start_server(self._handle_connection, self.host,
+                                                  self.port, limit=MAX_HEAD_BYTES)
+        stop = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+        if self.preload:
+            await loop.run_in_executor(self.executor, self._preload_clients)
+        self.ready = True
+        print(f"Serving on http://{self.host}:{self.port} "
+              f"(max in flight {self.admission.max_in_flight}, "
+              f"queue {self.admission.max_queued})", flush=True)
+        await stop.wait()
+        return await self.drain()
+
+    @staticmethod
+    def _preload_clients() -> None:
+        lambda_function.preload(lambda_function.AWS_CLIENTS, list(lambda_function.AWS_CLIENTS),
+                                budget_ms=lambda_function.REQUEST_BUDGET_MS)
+
+    async def drain(self) -> bool:
+        """Stop taking requests, finish accepted ones, flush background writers."""
+        loop = asyncio.get_running_loop()
+        self.draining = True
+        print(f"Draining: {self.admission.in_flight} in flight, "
+              f"{self.admission.queued} queued", flush=True)
+        await asyncio.sleep(self.drain_delay_s)
+        self._server.close()
+        for writer, busy in list(self._connections.items()):
+            if not busy:
+                writer.close()
+        give_up_at = loop.time() + self.drain_timeout_s
+        while (self.admission.busy or self._connections) and loop.time() < give_up_at:
+            await asyncio.sleep(0.01)
+        unfinished = self.admission.in_flight + self.admission.queued
+        for writer in list(self._connections):
+            writer.close()
+        self.executor.shutdown(wait=False)
+        if lambda_function.SAGEMAKER_BATCHER is not None:
+            lambda_function.SAGEMAKER_BATCHER.close(timeout=1.0)
+        lambda_function.AUDIT_WRITER.close(timeout=2.0)
+        print(f"Drained: {self.requests} requests, {self.admission.rejected} rejected, "
+              f"{unfinished} unfinished", flush=True)
+        return unfinished == 0
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        self._connections[writer] = False
+        self.connections_opened += 1
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader, writer),
+                                                     self.keep_alive_s)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._write(writer, 431, {'error': 'Request header too large'}, False)
+                    return
+                except ValueError as e:
+                    status_code = e.status_code if isinstance(e, RequestError) else 400
+                    await self._write(writer, status_code, {'error': str(e)}, False)
+                    return
+                if request is None:
+                    return
+                self._connections[writer] = True
+                status_code, headers, payload = await self._dispatch(request)
+                keep_alive = self._keep_alive(request) and not self.draining
+                await self._write_raw(writer, status_code, headers, payload, keep_alive)
+                self._connections[writer] = False
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            return
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> Optional[HttpRequest]:
+        """Next request on the connection, or None once the client closed it."""
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if not e.partial.strip():
+                return None
+            raise
+        lines = head.decode('latin-1').split('\r\n')
+        parts = lines[0].split(' ')
+        if len(parts) != 3 or not parts[2].startswith('HTTP/1.'):
+            raise RequestError(400, f"Malformed request line: {lines[0][:100]}")
+        method, target, version = parts
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise RequestError(411, 'Chunked request bodies are not supported; send Content-Length')
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise RequestError(413, f"Body over {MAX_BODY_BYTES} bytes")
+        if length and headers.get('expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        body = await reader.readexactly(length) if length else b''
+        path, _, query = target.partition('?')
+        return HttpRequest(method.upper(), path, query, version, headers, body)
+
+    @staticmethod
+    def _keep_alive(request: HttpRequest) -> bool:
+        connection = request.headers.get('connection', '').lower()
+        if request.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    async def _dispatch(self, request: HttpRequest) -> Tuple[int, Dict[str, str], bytes]:
+        """Status, headers and body for one request."""
+        self.requests += 1
+        route = request.path.rstrip('/')
+        if request.method == 'OPTIONS':
+            return 204, dict(CORS_HEADERS), b''
+        if request.method == 'GET' and route == '/health':
+            return self._json(200, {'status': 'ok'})
+        if request.method == 'GET' and route == '/ready':
+            return self._readiness()
+        arrived = time.monotonic()
+        if not await self.admission.acquire():
+            status_code, headers, payload = self._json(429, {
+                'error': 'TOO_MANY_REQUESTS',
+                'message': 'Server at capacity, retry shortly'
+            })
+            headers['Retry-After'] = '1'
+            return status_code, headers, payload
+        try:
+            context = RequestContext(
+                request.headers.get('x-request-id') or str(uuid.uuid4()),
+                arrived + lambda_function.REQUEST_BUDGET_MS / 1000
+            )
+            response = await asyncio.get_running_loop().run_in_executor(
+                self.executor, lambda_function.lambda_handler, self._event(request, context),
+                context
+            )
+        except Exception as e:
+            return self._json(500, {'error': str(e), 'message': 'Internal server error'})
+        finally:
+            self.admission.release()
+        return (response.get('statusCode', 200), dict(response.get('headers') or {}),
+                response.get('body', '').encode('utf-8'))
+
+    @staticmethod
+    def _event(request: HttpRequest, context: RequestContext) -> Dict[str, Any]:
+        """API Gateway (REST) proxy event for lambda_handler."""
+        event: Dict[str, Any] = {
+            'httpMethod': request.method,
+            'path': request.path,
+            'headers': request.headers,
+            'queryStringParameters': dict(parse_qsl(request.query)) or None,
+            'requestContext': {'requestId': context.aws_request_id}
+        }
+        if request.method != 'GET':
+            event['body'] = request.body.decode('utf-8', errors='replace')
+        return event
+
+    def _readiness(self) -> Tuple[int, Dict[str, str], bytes]:
+        status = 'draining' if self.draining else 'ready' if self.ready else 'starting'
+        return self._json(200 if status == 'ready' else 503, {
+            'status': status,
+            'in_flight': self.admission.in_flight,
+            'queued': self.admission.queued,
+            'rejected': self.admission.rejected,
+            'connections': len(self._connections),
+            'circuits': {breaker.name: breaker.state
+                         for breaker in lambda_function.CIRCUIT_BREAKERS}
+        })
+
+    @staticmethod
+    def _json(status_code: int, body: Dict[str, Any]) -> Tuple[int, Dict[str, str], bytes]:
+        headers = dict(CORS_HEADERS, **{'Content-Type': 'application/json'})
+        return status_code, headers, json.dumps(body).encode('utf-8')
+
+    async def _write(self, writer: asyncio.StreamWriter, status_code: int,
+                     body: Dict[str, Any], keep_alive: bool) -> None:
+        _, headers, payload = self._json(status_code, body)
+        try:
+            await self._write_raw(writer, status_code, headers, payload, keep_alive)
+        except ConnectionError:
+            pass
+
+    @staticmethod
+    async def _write_raw(writer: asyncio.StreamWriter, status_code: int,
+                         headers: Dict[str, str], payload: bytes, keep_alive: bool) -> None:
+        try:
+            reason = HTTPStatus(status_code).phrase
+        except ValueError:
+            reason = ''
+        lines = [f"HTTP/1.1 {status_code} {reason}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items()
+                     if name.lower() not in ('content-length', 'connection'))
+        lines.append(f"Content-Length: {len(payload)}")
+        lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+        # Waits while the client reads slowly, instead of buffering without bound
+        await writer.drain()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default=os.environ.get('SERVER_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('SERVER_PORT', '8080')))
+    parser.add_argument('--max-in-flight', type=int,
+                        default=int(os.environ.get('SERVER_MAX_IN_FLIGHT', '64')))
+    parser.add_argument('--max-queued', type=int,
+                        default=int(os.environ.get('SERVER_MAX_QUEUED', '128')))
+    parser.add_argument('--queue-timeout-ms', type=float,
+                        default=float(os.environ.get('SERVER_QUEUE_TIMEOUT_MS', '100')))
+    parser.add_argument('--keep-alive-s', type=float, default=5.0)
+    parser.add_argument('--drain-delay-s', type=float,
+                        default=float(os.environ.get('SERVER_DRAIN_DELAY_S', '0')))
+    parser.add_argument('--drain-timeout-s', type=float, default=10.0)
+    parser.add_argument('--stubs', action='store_true', help='use in-process AWS stand-ins')
+    parser.add_argument('--sagemaker-latency-ms', type=float, default=20.0)
+    parser.add_argument('--bedrock-latency-ms', type=float, default=300.0)
+    parser.add_argument('--dynamodb-latency-ms', type=float, default=5.0)
+    parser.add_argument('--micro-batch', action='store_true',
+                        help='batch concurrent SageMaker calls')
+    args = parser.parse_args()
+
+    if args.stubs:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+        from aws_stubs import install_stubs
+        install_stubs(lambda_function, args.sagemaker_latency_ms, args.bedrock_latency_ms,
+                      args.dynamodb_latency_ms)
+    if args.micro_batch:
+        lambda_function.SAGEMAKER_BATCHER = lambda_function.new_sagemaker_batcher()
+
+    server = ScoringServer(
+        host=args.host,
+        port=args.port,
+        max_in_flight=args.max_in_flight,
+        max_queued=args.max_queued,
+        queue_timeout_ms=args.queue_timeout_ms,
+        keep_alive_s=args.keep_alive_s,
+        drain_delay_s=args.drain_delay_s,
+        drain_timeout_s=args.drain_timeout_s,
+        # Stubbed clients need no building
+        preload=not args.stubs
+    )
+    drained = asyncio.run(server.serve())
+    sys.exit(0 if drained else 1)
+
+
+if __name__ == '__main__':
+    main()
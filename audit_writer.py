@@ -0,0 +1,368 @@
+"""
+Write-behind audit sink for the Return Abuse Detection System.
+
+Every prediction is written to the predictions table. A synchronous
+put_item puts one DynamoDB round trip on every request, and that round
+trip shows up in the p99 whenever DynamoDB has a slow moment. In
+"buffered" mode (AUDIT_WRITE_MODE) requests only append their audit item
+to an in-memory buffer. A background thread writes the buffer out with
+BatchWriteItem:
+
+    - as soon as a full batch (25 items, the BatchWriteItem limit) is waiting
+    - or when the oldest buffered item is AUDIT_FLUSH_AGE_MS old
+
+Unprocessed items and throttled calls are retried with exponential
+backoff. Items still unwritten after the last attempt are dropped and
+logged with their prediction IDs. New items are also dropped while the
+buffer is full (AUDIT_BUFFER_SIZE). close() drains the buffer; it runs on
+SIGTERM and at interpreter exit. Lambda only delivers SIGTERM to functions
+with an extension registered, and freezes background threads between
+invocations, so on Lambda the handler calls flush() before each invocation
+returns (AUDIT_INVOCATION_FLUSH), within what is left of the request
+deadline. Elsewhere a row can reach the table after its response; callers
+that read or update the row straight away must write it synchronously
+(write_now).
+
+put_if() writes one item straight away with a conditional PutItem; the
+rows of async explanation jobs use it so a late "pending" write never
+replaces the explanation the worker wrote back.
+
+"sync" mode writes every item on the request path, as before, for
+deployments where an acknowledged prediction must already be audited.
+Requests that are out of time (request_deadline.py) still defer their
+items to the buffer.
+
+Metrics (metrics() feeds the per-invocation EMF line):
+    - audit_queue_depth: items waiting in the buffer
+    - audit_flush_ms: BatchWriteItem flush latencies since the last line
+    - audit_dropped_items: items dropped since the last line
+"""
+
+import atexit
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from request_timing import RollingLatency
+
+AUDIT_WRITE_MODES = ('buffered', 'sync')
+
+# BatchWriteItem accepts at most 25 put requests
+MAX_BATCH_ITEMS = 25
+
+
+class AuditWriter:
+    """Audit items to DynamoDB, buffered with a flush thread or synchronously."""
+
+    def __init__(
+        self,
+        dynamodb: Any,
+        table_name: str,
+        mode: str = 'buffered',
+        key: str = 'prediction_id',
+        flush_size: int = MAX_BATCH_ITEMS,
+        flush_age_ms: float = 200.0,
+        max_buffer: int = 10000,
+        max_attempts: int = 5,
+        base_backoff_ms: float = 25.0,
+        latency_window: int = 1024
+    ):
+        """
+        Args:
+            dynamodb: boto3 DynamoDB service resource
+            table_name: Audit (predictions) table
+            mode: "buffered" (write-behind) or "sync" (write on the request path)
+            key: Partition key; repeats of a key within one flush keep the last item
+            flush_size: Buffered items that trigger a flush (at most 25 per call)
+            flush_age_ms: Longest time an item waits in the buffer
+            max_buffer: Buffered item limit; items beyond it are dropped
+            max_attempts: BatchWriteItem tries per chunk (unprocessed items / errors)
+            base_backoff_ms: First retry delay, doubled per attempt
+            latency_window: Flush latencies kept for stats()
+
+        Raises:
+            ValueError: Unknown mode
+        """
+        if mode not in AUDIT_WRITE_MODES:
+            raise ValueError(f"Invalid AUDIT_WRITE_MODE: {mode!r}")
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.mode = mode
+        self.key = key
+        self.flush_size = min(flush_size, MAX_BATCH_ITEMS)
+        self.flush_age_s = flush_age_ms / 1000
+        self.max_buffer = max_buffer
+        self.max_attempts = max_attempts
+        self.base_backoff_s = base_backoff_ms / 1000
+        # (enqueued_at, item), oldest first
+        self._buffer: Deque[Tuple[float, Dict[str, Any]]] = deque()
+        self._in_flight = 0
+        # Callers waiting in flush(): the worker writes without waiting for age
+        self._flush_requested = 0
+        self._condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+        self._latency = RollingLatency(window=latency_window)
+        self._recent_flush_ms: List[float] = []
+        self._reported_dropped = 0
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.retries = 0
+        self.flushes = 0
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._worker.start()
+
+    def write(self, items: List[Dict[str, Any]], defer: bool = False) -> bool:
+        """
+        Audit the items: buffer them (buffered mode) or write them now (sync mode).
+
+        Args:
+            items: Audit items
+            defer: Buffer them even in sync mode (the request has no time
+                   left to wait for DynamoDB)
+
+        Returns:
+            False if any item was dropped (buffer full, or sync write failed)
+        """
+        if self.mode == 'sync' and not defer:
+            return self.write_now(items)
+        with self._condition:
+            closed = self._closed
+            if not closed:
+                self._ensure_worker()
+                accepted = max(0, min(len(items), self.max_buffer - len(self._buffer)))
+                # The worker waits without a timeout while the buffer is empty:
+                # the first item wakes it to start that item's age timer
+                was_empty = not self._buffer
+                now = time.monotonic()
+                self._buffer.extend((now, item) for item in items[:accepted])
+                self.enqueued += accepted
+                if len(self._buffer) >= self.flush_size or (was_empty and accepted):
+                    self._condition.notify()
+        # After shutdown has drained the buffer, late items are written directly
+        if closed:
+            return self.write_now(items)
+        if accepted < len(items):
+            self._drop(items[accepted:], 'buffer full')
+            return False
+        return True
+
+    def write_now(self, items: List[Dict[str, Any]]) -> bool:
+        """Write the items on the calling thread, bypassing the buffer."""
+        failed = []
+        for start in range(0, len(items), MAX_BATCH_ITEMS):
+            failed.extend(self._write_chunk(items[start:start + MAX_BATCH_ITEMS]))
+        if failed:
+            self._drop(failed, 'write failed')
+        return not failed
+
+    def put_if(self, item: Dict[str, Any], condition: str, values: Dict[str, Any]) -> bool:
+        """
+        Write one item on the calling thread with a conditional PutItem.
+
+        Args:
+            item: Audit item
+            condition: ConditionExpression the stored item must meet
+            values: Its ExpressionAttributeValues
+
+        Returns:
+            False if the write still failed after max_attempts; an item
+            kept out by the condition counts as written
+        """
+        written = False
+        for attempt in range(self.max_attempts):
+            if attempt:
+                with self._condition:
+                    self.retries += 1
+                time.sleep(self.base_backoff_s * 2 ** (attempt - 1))
+            try:
+                self.dynamodb.Table(self.table_name).put_item(
+                    Item=item,
+                    ConditionExpression=condition,
+                    ExpressionAttributeValues=values
+                )
+            except Exception as e:
+                code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+                if code != 'ConditionalCheckFailedException':
+                    print(f"Audit put error: {str(e)}")
+                    continue
+                print(f"Audit put skipped, stored item kept: {item.get(self.key)}")
+            else:
+                with self._condition:
+                    self.written += 1
+            written = True
+            break
+        if not written:
+            self._drop([item], 'write failed')
+        return written
+
+    def _drop(self, items: List[Dict[str, Any]], reason: str) -> None:
+        with self._condition:
+            self.dropped += len(items)
+        print(f"Audit {reason}, dropping {len(items)} items: "
+              f"{[item.get(self.key) for item in items]}")
+
+    def _write_chunk(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        One BatchWriteItem chunk with retries.
+
+        Returns:
+            Items still unwritten after the last attempt
+        """
+        # Duplicate keys in one request are rejected; the latest item wins
+        pending = list({item[self.key]: item for item in items}.values())
+        requests = [{'PutRequest': {'Item': item}} for item in pending]
+        started = time.perf_counter()
+        for attempt in range(self.max_attempts):
+            if attempt:
+                with self._condition:
+                    self.retries += 1
+                time.sleep(self.base_backoff_s * 2 ** (attempt - 1))
+            try:
+                response = self.dynamodb.batch_write_item(
+                    RequestItems={self.table_name: requests}
+                )
+            except Exception as e:
+                print(f"Audit batch write error: {str(e)}")
+                continue
+            written = len(requests)
+            requests = response.get('UnprocessedItems', {}).get(self.table_name, [])
+            with self._condition:
+                self.written += written - len(requests)
+            if not requests:
+                break
+        flush_ms = (time.perf_counter() - started) * 1000
+        self._latency.record({'flush': flush_ms})
+        with self._condition:
+            self.flushes += 1
+            self._recent_flush_ms.append(flush_ms)
+        return [request['PutRequest']['Item'] for request in requests]
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    if self._buffer and (
+                        len(self._buffer) >= self.flush_size or self._closed
+                        or self._flush_requested
+                        or time.monotonic() - self._buffer[0][0] >= self.flush_age_s
+                    ):
+                        break
+                    if self._closed:
+                        return
+                    timeout = None
+                    if self._buffer:
+                        timeout = self._buffer[0][0] + self.flush_age_s - time.monotonic()
+                    self._condition.wait(timeout)
+                count = min(len(self._buffer), self.flush_size)
+                chunk = [self._buffer.popleft()[1] for _ in range(count)]
+                self._in_flight += count
+            try:
+                failed = self._write_chunk(chunk)
+                if failed:
+                    self._drop(failed, 'write failed')
+            finally:
+                with self._condition:
+                    self._in_flight -= count
+                    self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Write out everything buffered so far and wait for it.
+
+        Returns:
+            True if the buffer drained within the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._flush_requested += 1
+            try:
+                self._condition.notify_all()
+                while self._buffer or self._in_flight:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+                return True
+            finally:
+                self._flush_requested -= 1
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """Stop taking buffered items, drain the buffer and stop the flush thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            return not self._worker.is_alive()
+        return True
+
+    def depth(self) -> int:
+        return len(self._buffer)
+
+    def metrics(self) -> Dict[str, Tuple[Any, str]]:
+        """
+        EMF metrics since the previous call: {name: (value or values, unit)}.
+        """
+        with self._condition:
+            flush_ms, self._recent_flush_ms = self._recent_flush_ms, []
+            dropped = self.dropped - self._reported_dropped
+            self._reported_dropped = self.dropped
+            depth = len(self._buffer)
+        metrics: Dict[str, Tuple[Any, str]] = {
+            'audit_queue_depth': (depth, 'Count'),
+            'audit_dropped_items': (dropped, 'Count')
+        }
+        if flush_ms:
+            # EMF takes up to 100 values per metric in one record
+            metrics['audit_flush_ms'] = ([round(ms, 3) for ms in flush_ms[-100:]],
+                                         'Milliseconds')
+        return metrics
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters, buffer depth and flush latency p50/p95/p99 (ms)."""
+        latency = self._latency.percentiles().get('flush', {})
+        with self._condition:
+            stats: Dict[str, Any] = {
+                'mode': self.mode,
+                'queue_depth': len(self._buffer),
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'retries': self.retries,
+                'flushes': self.flushes
+            }
+        if latency:
+            stats['flush_ms'] = {key: latency[key] for key in ('p50', 'p95', 'p99')}
+        return stats
+
+
+def drain_on_shutdown(writer: AuditWriter, timeout: float = 1.0) -> None:
+    """
+    Drain the writer at interpreter exit and on SIGTERM.
+
+    The SIGTERM handler drains, then hands over to the previous handler
+    (or exits when there was none). It can only be installed from the main
+    thread; elsewhere only the exit hook is registered.
+    """
+    atexit.register(writer.close, timeout)
+    try:
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handle_sigterm(signum, frame):
+            writer.close(timeout)
+            if callable(previous):
+                previous(signum, frame)
+            elif previous != signal.SIG_IGN:
+                sys.exit(0)
+
+        signal.signal(signal.SIGTERM, handle_sigterm)
+    except ValueError:
+        pass
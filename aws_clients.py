@@ -0,0 +1,200 @@
+"""
+Lazily constructed AWS clients for the Return Abuse Detection System.
+
+Importing boto3 and building a client cost tens of milliseconds each, and
+lambda_function used to build three clients (two regions) during module
+import. Every cold start paid for all of them, including requests that
+never call Bedrock or SageMaker. LazyClient stands in for a boto3
+client, resource or DynamoDB Table and builds it on first attribute
+access:
+
+    - boto3 itself is imported on the first build, not at module import
+    - a client is built once per container and reused by warm invocations
+    - builds share one (re-entrant) lock, because boto3's default session
+      is not safe to use for concurrent client creation; a lazy Table
+      builds its lazy resource while holding it
+    - each build runs in a "client_init" span, so the invocation that paid
+      for it shows the cost in its EMF line
+
+Module globals keep their names (bedrock_runtime, sagemaker_runtime,
+dynamodb), so call sites and the benchmark stubs that replace them are
+unchanged. AWS_CLIENT_PRELOAD builds the named clients during init instead,
+e.g. with SnapStart or provisioned concurrency, where init time is not on a
+request's path.
+
+BudgetedClient adds one variant per request_deadline.ClientTimeouts: under a
+request deadline each call goes to a client whose connect/read timeouts and
+retry count fit the time that request has left. Outside a deadline (flush
+thread, workers) the default client is used.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from request_deadline import ClientTimeouts, Deadline, current_deadline
+from request_timing import timed
+
+# boto3's default session is shared by every factory; re-entrant because a
+# Table factory builds its resource first
+_BUILD_LOCK = threading.RLock()
+
+
+class LazyClient:
+    """Proxy that builds its boto3 object on first use and then delegates to it."""
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        """
+        Args:
+            name: Label for stats (e.g. "bedrock-runtime")
+            factory: Builds the client / resource / Table
+        """
+        self._name = name
+        self._factory = factory
+        self._target: Optional[Any] = None
+        self._build_ms: Optional[float] = None
+
+    def get(self) -> Any:
+        """The underlying boto3 object, built on the first call."""
+        target = self._target
+        if target is None:
+            with _BUILD_LOCK:
+                if self._target is None:
+                    started = time.perf_counter()
+                    with timed('client_init'):
+                        self._target = self._factory()
+                    self._build_ms = (time.perf_counter() - started) * 1000
+                target = self._target
+        return target
+
+    @property
+    def built(self) -> bool:
+        return self._target is not None
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self.get(), attribute)
+
+    def __repr__(self) -> str:
+        state = f"built in {self._build_ms:.1f} ms" if self._build_ms is not None else 'not built'
+        return f"<LazyClient {self._name} ({state})>"
+
+    def stats(self) -> Dict[str, Any]:
+        return {'built': self.built, 'build_ms': round(self._build_ms or 0.0, 3)}
+
+
+class BudgetedClient(LazyClient):
+    """LazyClient with a variant per timeout tier, picked from the request deadline."""
+
+    def __init__(self, name: str, factory: Callable[[Optional[ClientTimeouts]], Any],
+                 max_attempts: int = 1):
+        """
+        Args:
+            name: Label for stats
+            factory: Builds the object for ClientTimeouts, or the default
+                     (botocore default timeouts and retries) for None
+            max_attempts: Most attempts a variant may make
+        """
+        super().__init__(name, lambda: factory(None))
+        self._variant_factory = factory
+        self.max_attempts = max_attempts
+        self._variants: Dict[ClientTimeouts, Any] = {}
+
+    def get(self) -> Any:
+        """The variant for the current request's remaining budget, or the default client."""
+        deadline = current_deadline()
+        if deadline is None:
+            return super().get()
+        return self.variant(deadline.client_timeouts(self.max_attempts))
+
+    def variant(self, timeouts: Optional[ClientTimeouts]) -> Any:
+        """The object built for these timeouts (None: the default client)."""
+        if timeouts is None:
+            return super().get()
+        target = self._variants.get(timeouts)
+        if target is None:
+            with _BUILD_LOCK:
+                target = self._variants.get(timeouts)
+                if target is None:
+                    with timed('client_init'):
+                        target = self._variant_factory(timeouts)
+                    self._variants[timeouts] = target
+        return target
+
+    @property
+    def built(self) -> bool:
+        return self._target is not None or bool(self._variants)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(super().stats(), variants=[
+            f"{timeouts.timeout_ms}ms x{timeouts.attempts}" for timeouts in sorted(self._variants)
+        ])
+
+
+def _client_config(timeouts: Optional[ClientTimeouts]) -> Optional[Any]:
+    """botocore Config for a variant (None keeps botocore's defaults)."""
+    if timeouts is None:
+        return None
+    from botocore.config import Config
+    return Config(
+        connect_timeout=timeouts.timeout_ms / 1000,
+        read_timeout=timeouts.timeout_ms / 1000,
+        retries={'total_max_attempts': timeouts.attempts, 'mode': 'standard'}
+    )
+
+
+def aws_client(service: str, region: Optional[str] = None, max_attempts: int = 1,
+               **kwargs) -> BudgetedClient:
+    """Lazy boto3.client(service, region_name=region, **kwargs), with deadline variants."""
+    def build(timeouts: Optional[ClientTimeouts]) -> Any:
+        import boto3
+        return boto3.client(service, region_name=region, config=_client_config(timeouts),
+                            **kwargs)
+    return BudgetedClient(service, build, max_attempts)
+
+
+def aws_resource(service: str, region: Optional[str] = None, max_attempts: int = 1,
+                 **kwargs) -> BudgetedClient:
+    """Lazy boto3.resource(service, region_name=region, **kwargs), with deadline variants."""
+    def build(timeouts: Optional[ClientTimeouts]) -> Any:
+        import boto3
+        return boto3.resource(service, region_name=region, config=_client_config(timeouts),
+                              **kwargs)
+    return BudgetedClient(f"{service}-resource", build, max_attempts)
+
+
+def dynamodb_table(resource: Any, name: str) -> LazyClient:
+    """Lazy resource.Table(name); the resource itself may be a (budgeted) LazyClient."""
+    if isinstance(resource, BudgetedClient):
+        return BudgetedClient(
+            f"table:{name}",
+            lambda timeouts: resource.variant(timeouts).Table(name),
+            resource.max_attempts
+        )
+    return LazyClient(f"table:{name}", lambda: resource.Table(name))
+
+
+def without_deadline(client: Any) -> Any:
+    """
+    The default variant of a BudgetedClient (any other object as is), for
+    calls that have their own time limits, such as a streamed response.
+    """
+    if isinstance(client, BudgetedClient):
+        return client.variant(None)
+    return client
+
+
+def preload(clients: Dict[str, LazyClient], names: List[str],
+            budget_ms: Optional[float] = None) -> None:
+    """
+    Build the named clients now (AWS_CLIENT_PRELOAD); unknown names are ignored.
+
+    With budget_ms, budgeted clients also build the variant a request with
+    that much time left uses.
+    """
+    for name in names:
+        client = clients.get(name)
+        if client is None:
+            continue
+        client.get()
+        if budget_ms and isinstance(client, BudgetedClient):
+            client.variant(Deadline(budget_ms).client_timeouts(client.max_attempts))
@@ -0,0 +1,570 @@
+"""
+In-process stand-ins for the AWS clients used by lambda_function.
+
+They mimic just enough of boto3's sagemaker-runtime, bedrock-runtime and
+DynamoDB resource APIs for local benchmarks, with optional injected
+latency so remote calls can be compared against in-process work, and an
+optional error rate (seeded botocore ClientErrors such as throttling) so
+the fallback paths can be exercised. A tail_rate fraction of calls can take
+tail_latency_ms instead, and with deadline_timeouts the SageMaker and
+Bedrock stubs honour the read timeout of the request deadline's client
+variant (raising botocore's ReadTimeoutError), like a real client would.
+The SageMaker stub can also charge latency per CSV row and serve a limited
+number of invocations at once, for the micro-batching benchmark.
+
+Usage:
+    import lambda_function
+    stubs = install_stubs(lambda_function, sagemaker_latency_ms=20,
+                          bedrock_error_rate=0.1)
+"""
+
+import io
+import json
+import random
+import re
+import threading
+import time
+from bisect import bisect_right
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from botocore.exceptions import ClientError, ReadTimeoutError
+
+# Read timeout (ms) of the StubTimeoutView a call was made through, if any
+_READ_TIMEOUT_MS: ContextVar[Optional[float]] = ContextVar('stub_read_timeout_ms', default=None)
+
+
+class StubStreamingBody(io.BytesIO):
+    """botocore StreamingBody look-alike (read() returns bytes)."""
+
+
+class StubEventStream:
+    """
+    botocore EventStream look-alike: iterating yields the events, close()
+    ends the stream (also during a wait for the next event).
+    """
+
+    def __init__(self, events: Callable[[threading.Event], Iterator[Dict[str, Any]]]):
+        self.closed = threading.Event()
+        self._events = events
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self._events(self.closed)
+
+    def close(self) -> None:
+        self.closed.set()
+
+
+class FifoSlots:
+    """Limited concurrency served in arrival order (a Semaphore lets new callers barge in)."""
+
+    def __init__(self, slots: int):
+        self.free = slots
+        self._waiting: List[threading.Event] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> None:
+        with self._lock:
+            if self.free and not self._waiting:
+                self.free -= 1
+                return
+            turn = threading.Event()
+            self._waiting.append(turn)
+        turn.wait()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        with self._lock:
+            if self._waiting:
+                # Hand the slot straight to the oldest waiter
+                self._waiting.pop(0).set()
+            else:
+                self.free += 1
+
+
+class StubClient:
+    """Injected latency and errors shared by the stub clients."""
+
+    # Error code raised for failed calls (what the real service throttles with)
+    ERROR_CODE = 'ThrottlingException'
+
+    def __init__(self, latency_ms: float = 0.0, error_rate: float = 0.0, seed: int = 0,
+                 tail_rate: float = 0.0, tail_latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.tail_rate = tail_rate
+        self.tail_latency_ms = tail_latency_ms
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self._rng = random.Random(seed)
+        # Concurrent callers (threaded servers, micro-batch workers)
+        self._count_lock = threading.Lock()
+
+    def _call(self, operation: str) -> None:
+        """Count the call, sleep for the injected latency, maybe raise."""
+        with self._count_lock:
+            self.calls += 1
+        latency_ms = self.latency_ms
+        if self.tail_rate and self._rng.random() < self.tail_rate:
+            latency_ms = self.tail_latency_ms
+        timeout_ms = _READ_TIMEOUT_MS.get()
+        if timeout_ms is not None and latency_ms > timeout_ms:
+            time.sleep(timeout_ms / 1000)
+            self.timeouts += 1
+            raise ReadTimeoutError(endpoint_url=f"stub://{operation}")
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.errors += 1
+            raise ClientError(
+                {'Error': {'Code': self.ERROR_CODE, 'Message': 'Injected stub error'}},
+                operation
+            )
+
+
+class StubTimeoutView:
+    """
+    A stub client as seen through a deadline client variant: each call gets
+    the variant's read timeout and up to its number of attempts (timeouts
+    are retried at once; the real backoff is a few tens of milliseconds).
+    """
+
+    def __init__(self, stub: StubClient, timeouts: Any):
+        self.stub = stub
+        self.timeouts = timeouts
+
+    def __getattr__(self, attribute: str) -> Any:
+        method = getattr(self.stub, attribute)
+        if not callable(method):
+            return method
+
+        def call(*args, **kwargs):
+            for attempt in range(self.timeouts.attempts):
+                token = _READ_TIMEOUT_MS.set(self.timeouts.timeout_ms)
+                try:
+                    return method(*args, **kwargs)
+                except ReadTimeoutError:
+                    if attempt + 1 == self.timeouts.attempts:
+                        raise
+                finally:
+                    _READ_TIMEOUT_MS.reset(token)
+        return call
+
+
+class StubSageMakerRuntime(StubClient):
+    """
+    sagemaker-runtime client returning one score per CSV row.
+
+    latency_ms is the per-invocation overhead; row_latency_ms adds time per
+    CSV row. With max_concurrency set, the endpoint serves that many
+    invocations at once and later ones queue for a slot (like an endpoint
+    with a fixed number of instances x model workers).
+    """
+
+    ERROR_CODE = 'ModelError'
+
+    def __init__(self, latency_ms: float = 0.0,
+                 scorer: Optional[Callable[[List[List[float]]], List[float]]] = None,
+                 error_rate: float = 0.0, seed: int = 0, tail_rate: float = 0.0,
+                 tail_latency_ms: float = 0.0, row_latency_ms: float = 0.0,
+                 max_concurrency: Optional[int] = None):
+        super().__init__(latency_ms, error_rate, seed, tail_rate, tail_latency_ms)
+        self.scorer = scorer
+        self.row_latency_ms = row_latency_ms
+        self.rows = 0
+        self._slots = FifoSlots(max_concurrency) if max_concurrency else None
+
+    def invoke_endpoint(self, EndpointName: str, ContentType: str, Body: str, **kwargs):
+        if self._slots is None:
+            return self._invoke(Body)
+        with self._slots:
+            return self._invoke(Body)
+
+    def _invoke(self, Body: str):
+        self._call('InvokeEndpoint')
+        rows = [[float(value) for value in line.split(',')] for line in Body.splitlines()]
+        with self._count_lock:
+            self.rows += len(rows)
+        if self.row_latency_ms:
+            time.sleep(len(rows) * self.row_latency_ms / 1000)
+        scores = self.scorer(rows) if self.scorer else [0.5] * len(rows)
+        payload = '\n'.join(repr(float(score)) for score in scores)
+        return {'Body': StubStreamingBody(payload.encode())}
+
+
+class StubBedrockRuntime(StubClient):
+    """
+    bedrock-runtime client returning a canned Claude message.
+
+    invoke_model_with_response_stream sends the text a few words per chunk:
+    the first chunk after latency_ms, later ones every chunk_ms. With
+    stall_after set, the stream stops for stall_ms after that many chunks.
+    Closing the body ends generation; open_streams counts streams still
+    generating.
+
+    Usage is estimated like a tokenizer would count it (about 4 characters
+    per input token, 4 output tokens per 3 words); the text is cut to the
+    request's max_tokens, and token_ms adds generation time per output token.
+    """
+
+    def __init__(self, latency_ms: float = 0.0,
+                 text: str = 'Stub explanation for local benchmarking.',
+                 error_rate: float = 0.0, seed: int = 0, chunk_ms: float = 0.0,
+                 words_per_chunk: int = 3, stall_after: Optional[int] = None,
+                 stall_ms: float = 0.0, token_ms: float = 0.0, tail_rate: float = 0.0,
+                 tail_latency_ms: float = 0.0):
+        super().__init__(latency_ms, error_rate, seed, tail_rate, tail_latency_ms)
+        self.text = text
+        self.token_ms = token_ms
+        self.chunk_ms = chunk_ms
+        self.words_per_chunk = words_per_chunk
+        self.stall_after = stall_after
+        self.stall_ms = stall_ms
+        self.open_streams = 0
+
+    def _completion(self, body: str):
+        """(text cut to max_tokens, usage) for a request body."""
+        request = json.loads(body)
+        words = self.text.split(' ')
+        max_words = request['max_tokens'] * 3 // 4
+        if len(words) > max_words:
+            words = words[:max_words]
+        usage = {
+            'input_tokens': len(request['messages'][0]['content']) // 4,
+            'output_tokens': min(request['max_tokens'], -(-len(words) * 4 // 3))
+        }
+        return ' '.join(words), usage
+
+    def invoke_model(self, modelId: str, body: str, **kwargs):
+        self._call('InvokeModel')
+        text, usage = self._completion(body)
+        if self.token_ms:
+            time.sleep(usage['output_tokens'] * self.token_ms / 1000)
+        response = {'content': [{'type': 'text', 'text': text}], 'usage': usage}
+        return {'body': StubStreamingBody(json.dumps(response).encode())}
+
+    def invoke_model_with_response_stream(self, modelId: str, body: str, **kwargs):
+        self._call('InvokeModelWithResponseStream')
+        text, usage = self._completion(body)
+        words = text.split(' ')
+        chunks = [' '.join(words[i:i + self.words_per_chunk]) + ' '
+                  for i in range(0, len(words), self.words_per_chunk)]
+        chunks[-1] = chunks[-1].rstrip()
+
+        def events(closed: threading.Event) -> Iterator[Dict[str, Any]]:
+            with self._count_lock:
+                self.open_streams += 1
+            try:
+                yield self._event({'type': 'message_start', 'message': {
+                    'role': 'assistant', 'usage': {'input_tokens': usage['input_tokens']}}})
+                for index, text in enumerate(chunks):
+                    if index == self.stall_after:
+                        wait_ms = self.stall_ms
+                    else:
+                        wait_ms = self.chunk_ms if index else 0.0
+                    if closed.wait(wait_ms / 1000) if wait_ms else closed.is_set():
+                        return
+                    yield self._event({'type': 'content_block_delta', 'index': 0,
+                                       'delta': {'type': 'text_delta', 'text': text}})
+                yield self._event({'type': 'message_delta',
+                                   'usage': {'output_tokens': usage['output_tokens']}})
+                yield self._event({'type': 'message_stop'})
+            finally:
+                with self._count_lock:
+                    self.open_streams -= 1
+
+        return {'body': StubEventStream(events), 'contentType': 'application/json'}
+
+    @staticmethod
+    def _event(payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {'chunk': {'bytes': json.dumps(payload).encode()}}
+
+
+class StubBatchWriter:
+    def __init__(self, table: 'StubTable'):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def put_item(self, Item: Dict[str, Any]) -> None:
+        self.table.put_item(Item=Item)
+
+
+class StubTable(StubClient):
+    """DynamoDB Table keyed on its first item attribute name."""
+
+    ERROR_CODE = 'ProvisionedThroughputExceededException'
+
+    def __init__(self, name: str, key: str, latency_ms: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        super().__init__(latency_ms, error_rate, seed)
+        self.name = name
+        self.key = key
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    def put_item(self, Item: Dict[str, Any], ConditionExpression: str = '',
+                 ExpressionAttributeValues: Optional[Dict[str, Any]] = None,
+                 ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+                 **kwargs) -> Dict[str, Any]:
+        """Whole-item put, optionally under the same conditions as update_item."""
+        self._call('PutItem')
+        with self._lock:
+            current = self.items.get(Item[self.key], {})
+            if ConditionExpression and not any(
+                self._holds(alternative.strip(), ExpressionAttributeValues or {},
+                            ExpressionAttributeNames or {}, current)
+                for alternative in ConditionExpression.split(' OR ')
+            ):
+                raise ClientError(
+                    {'Error': {'Code': 'ConditionalCheckFailedException',
+                               'Message': 'The conditional request failed'}},
+                    'PutItem'
+                )
+            self.items[Item[self.key]] = dict(Item)
+            self.writes += 1
+        return {}
+
+    def get_item(self, Key: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        self._call('GetItem')
+        item = self.items.get(Key[self.key])
+        return {'Item': dict(item)} if item else {}
+
+    def update_item(self, Key: Dict[str, Any], UpdateExpression: str,
+                    ExpressionAttributeValues: Dict[str, Any],
+                    ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+                    ConditionExpression: str = '', **kwargs) -> Dict[str, Any]:
+        """
+        "SET a = :a, ..." and/or "ADD n :n, ..." sections, optionally under
+        an "attribute_not_exists(a) OR b < :x" style condition.
+        """
+        self._call('UpdateItem')
+        names = ExpressionAttributeNames or {}
+        sections = re.split(r'\b(SET|ADD)\s+', UpdateExpression)[1:]
+        with self._lock:
+            current = self.items.get(Key[self.key], {})
+            if ConditionExpression and not any(
+                self._holds(alternative.strip(), ExpressionAttributeValues, names, current)
+                for alternative in ConditionExpression.split(' OR ')
+            ):
+                raise ClientError(
+                    {'Error': {'Code': 'ConditionalCheckFailedException',
+                               'Message': 'The conditional request failed'}},
+                    'UpdateItem'
+                )
+            item = self.items.setdefault(Key[self.key], dict(Key))
+            for action, clauses in zip(sections[::2], sections[1::2]):
+                for clause in clauses.split(','):
+                    if action == 'ADD':
+                        attribute, placeholder = clause.split()
+                        value = ExpressionAttributeValues[placeholder]
+                        item[attribute] = item.get(attribute, 0) + value
+                    else:
+                        attribute, placeholder = (part.strip() for part in clause.split('='))
+                        item[names.get(attribute, attribute)] = \
+                            ExpressionAttributeValues[placeholder]
+            self.writes += 1
+        return {}
+
+    def _holds(self, condition: str, values: Dict[str, Any], names: Dict[str, str],
+               item: Dict[str, Any]) -> bool:
+        missing = re.fullmatch(r'attribute_not_exists\((\S+)\)', condition)
+        if missing:
+            return names.get(missing.group(1), missing.group(1)) not in item
+        return self._conditions([condition], values, names)(item)
+
+    @staticmethod
+    def _conditions(expressions: List[str], values: Dict[str, Any],
+                    names: Optional[Dict[str, str]]) -> Callable[[Dict[str, Any]], bool]:
+        """Predicate for "a = :x AND b >= :y" style conditions."""
+        names = names or {}
+        conditions = []
+        for expression in expressions:
+            for condition in filter(None, (c.strip() for c in expression.split(' AND '))):
+                attribute, operator, placeholder = condition.split()
+                conditions.append((names.get(attribute, attribute), operator, values[placeholder]))
+        checks = {'=': lambda a, b: a == b, '<>': lambda a, b: a != b,
+                  '>=': lambda a, b: a >= b, '<=': lambda a, b: a <= b,
+                  '>': lambda a, b: a > b, '<': lambda a, b: a < b}
+        return lambda item: all(attribute in item and checks[operator](item[attribute], value)
+                                for attribute, operator, value in conditions)
+
+    def query(self, KeyConditionExpression: str, ExpressionAttributeValues: Dict[str, Any],
+              ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+              FilterExpression: str = '', ScanIndexForward: bool = True,
+              **kwargs) -> Dict[str, Any]:
+        """Full scan evaluating "a = :x AND b >= :y" style conditions (any index)."""
+        self._call('Query')
+        matches = self._conditions([KeyConditionExpression, FilterExpression],
+                                   ExpressionAttributeValues, ExpressionAttributeNames)
+        with self._lock:
+            items = [dict(item) for item in self.items.values() if matches(item)]
+        items.sort(key=lambda item: item.get('timestamp', ''), reverse=not ScanIndexForward)
+        return {'Items': items, 'Count': len(items)}
+
+    def scan(self, FilterExpression: str = '',
+             ExpressionAttributeValues: Optional[Dict[str, Any]] = None,
+             ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+             Limit: Optional[int] = None, ExclusiveStartKey: Optional[Dict[str, Any]] = None,
+             **kwargs) -> Dict[str, Any]:
+        """
+        Paginated scan in key order. Like DynamoDB, Limit counts the items
+        read and the filter applies afterwards, so pages can come back short.
+        """
+        self._call('Scan')
+        matches = self._conditions([FilterExpression], ExpressionAttributeValues or {},
+                                   ExpressionAttributeNames)
+        with self._lock:
+            keys = sorted(self.items)
+            if ExclusiveStartKey is not None:
+                keys = keys[bisect_right(keys, ExclusiveStartKey[self.key]):]
+            read = keys[:Limit] if Limit else keys
+            items = [dict(self.items[key]) for key in read if matches(self.items[key])]
+        page = {'Items': items, 'Count': len(items), 'ScannedCount': len(read)}
+        if len(read) < len(keys):
+            page['LastEvaluatedKey'] = {self.key: read[-1]}
+        return page
+
+    def batch_writer(self) -> StubBatchWriter:
+        return StubBatchWriter(self)
+
+
+class StubDynamoDB:
+    """
+    boto3 DynamoDB resource returning StubTables.
+
+    batch_write_item hands back a fraction unprocessed_rate of the put
+    requests as UnprocessedItems, like a throttled table does.
+    """
+
+    KEYS = {'explanation-cache': 'signature', 'stream-aggregates': 'entity_key'}
+
+    def __init__(self, latency_ms: float = 0.0, error_rate: float = 0.0, seed: int = 0,
+                 unprocessed_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.seed = seed
+        self.unprocessed_rate = unprocessed_rate
+        self.tables: Dict[str, StubTable] = {}
+        self._rng = random.Random(seed)
+
+    def Table(self, name: str) -> StubTable:
+        if name not in self.tables:
+            key = next((k for marker, k in self.KEYS.items() if marker in name), 'prediction_id')
+            self.tables[name] = StubTable(name, key, self.latency_ms, self.error_rate,
+                                          self.seed + len(self.tables))
+        return self.tables[name]
+
+    def batch_write_item(self, RequestItems: Dict[str, List[Dict[str, Any]]],
+                         **kwargs) -> Dict[str, Any]:
+        """Put requests only; one call's latency/error draw per table."""
+        unprocessed: Dict[str, List[Dict[str, Any]]] = {}
+        for name, requests in RequestItems.items():
+            table = self.Table(name)
+            keys = [request['PutRequest']['Item'][table.key] for request in requests]
+            if len(requests) > 25 or len(set(keys)) < len(keys):
+                raise ClientError(
+                    {'Error': {'Code': 'ValidationException',
+                               'Message': 'Too many items or duplicate keys in the batch'}},
+                    'BatchWriteItem'
+                )
+            table._call('BatchWriteItem')
+            for request in requests:
+                if self.unprocessed_rate and self._rng.random() < self.unprocessed_rate:
+                    unprocessed.setdefault(name, []).append(request)
+                    continue
+                item = request['PutRequest']['Item']
+                with table._lock:
+                    table.items[item[table.key]] = dict(item)
+                    table.writes += 1
+        return {'UnprocessedItems': unprocessed}
+
+
+class Stubs:
+    """Handles to the installed stub clients."""
+
+    def __init__(self, sagemaker: StubSageMakerRuntime, bedrock: StubBedrockRuntime,
+                 dynamodb: StubDynamoDB):
+        self.sagemaker = sagemaker
+        self.bedrock = bedrock
+        self.dynamodb = dynamodb
+
+
+def install_stubs(
+    module: Any,
+    sagemaker_latency_ms: float = 0.0,
+    bedrock_latency_ms: float = 0.0,
+    dynamodb_latency_ms: float = 0.0,
+    sagemaker_scorer: Optional[Callable[[List[List[float]]], List[float]]] = None,
+    emit_metrics: bool = False,
+    sagemaker_error_rate: float = 0.0,
+    bedrock_error_rate: float = 0.0,
+    dynamodb_error_rate: float = 0.0,
+    seed: int = 0,
+    sagemaker_tail_rate: float = 0.0,
+    sagemaker_tail_latency_ms: float = 0.0,
+    bedrock_tail_rate: float = 0.0,
+    bedrock_tail_latency_ms: float = 0.0,
+    deadline_timeouts: bool = False,
+    sagemaker_row_latency_ms: float = 0.0,
+    sagemaker_max_concurrency: Optional[int] = None
+) -> Stubs:
+    """
+    Replace the AWS clients of lambda_function (or a compatible module) with stubs.
+
+    The per-invocation EMF metrics line is switched off unless emit_metrics
+    is set, so benchmark output is not flooded with log lines. Error rates
+    are the fraction of calls failing with a ClientError (seeded, so a run
+    is repeatable); tail rates the fraction taking the tail latency instead.
+    With deadline_timeouts the SageMaker and Bedrock stubs are wrapped in
+    BudgetedClients, so calls under a request deadline time out like the
+    real client variants do. sagemaker_row_latency_ms and
+    sagemaker_max_concurrency model an endpoint whose calls grow with the
+    rows they carry and that serves a limited number of calls at once.
+    """
+    stubs = Stubs(
+        StubSageMakerRuntime(sagemaker_latency_ms, sagemaker_scorer,
+                             error_rate=sagemaker_error_rate, seed=seed,
+                             tail_rate=sagemaker_tail_rate,
+                             tail_latency_ms=sagemaker_tail_latency_ms,
+                             row_latency_ms=sagemaker_row_latency_ms,
+                             max_concurrency=sagemaker_max_concurrency),
+        StubBedrockRuntime(bedrock_latency_ms, error_rate=bedrock_error_rate, seed=seed + 1,
+                           tail_rate=bedrock_tail_rate, tail_latency_ms=bedrock_tail_latency_ms),
+        StubDynamoDB(dynamodb_latency_ms, error_rate=dynamodb_error_rate, seed=seed + 2)
+    )
+    if deadline_timeouts:
+        from aws_clients import BudgetedClient
+
+        def budgeted(name: str, stub: StubClient, replaced: Any) -> BudgetedClient:
+            return BudgetedClient(
+                name,
+                lambda timeouts: stub if timeouts is None else StubTimeoutView(stub, timeouts),
+                getattr(replaced, 'max_attempts', 1)
+            )
+        module.sagemaker_runtime = budgeted('sagemaker-runtime', stubs.sagemaker,
+                                            module.sagemaker_runtime)
+        module.bedrock_runtime = budgeted('bedrock-runtime', stubs.bedrock,
+                                          module.bedrock_runtime)
+    else:
+        module.sagemaker_runtime = stubs.sagemaker
+        module.bedrock_runtime = stubs.bedrock
+    module.dynamodb = stubs.dynamodb
+    # Module-level caches bound to a table at import get the stub table too
+    idempotency_cache = getattr(module, 'IDEMPOTENCY_CACHE', None)
+    if idempotency_cache is not None and idempotency_cache.table is not None:
+        idempotency_cache.table = stubs.dynamodb.Table(module.PREDICTIONS_TABLE)
+    stream_aggregates = getattr(module, 'STREAM_AGGREGATES', None)
+    if stream_aggregates is not None and stream_aggregates.shared_table is not None:
+        stream_aggregates.shared_table = stubs.dynamodb.Table(module.STREAM_AGGREGATES_TABLE)
+    audit_writer = getattr(module, 'AUDIT_WRITER', None)
+    if audit_writer is not None:
+        audit_writer.dynamodb = stubs.dynamodb
+    if hasattr(module, 'METRICS_ENABLED'):
+        module.METRICS_ENABLED = emit_metrics
+    return stubs
@@ -0,0 +1,282 @@
+"""
+Load test of async_server.py: keep-alive throughput, backpressure and drain.
+
+Starts async_server.py --stubs in a subprocess with a small in-flight
+limit and runs closed-loop asyncio clients against it, one keep-alive
+connection each, at several client counts. Clients that get a 429 wait
+--retry-after-ms before their next request (clients honouring
+Retry-After would wait longer). Per client count it reports:
+
+    - admitted requests per second and their p50/p99
+    - 429s and their p99 (rejections should be fast)
+    - connections opened (1 per client with keep-alive working)
+
+Then, with the largest client count still running, it sends SIGTERM and
+checks the drain: /ready turns 503, requests already accepted complete,
+and the server exits 0. Exits 1 if any request fails with another status,
+if the client count within the server's capacity saw 429s, if the largest
+saw none, or if the drain check fails.
+
+Usage:
+    python benchmarks/bench_async_server.py [--clients 16,64,256] [--seconds 3]
+        [--max-in-flight 32] [--max-queued 64] [--queue-timeout-ms 100]
+        [--sagemaker-latency-ms 20] [--use-bedrock]
+
+Requires boto3 (client construction only).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_model_backends import percentile  # noqa: E402
+from sample_data import load_order_requests  # noqa: E402
+
+SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      'async_server.py')
+
+
+class ConnectionClosed(Exception):
+    """The server closed the connection before answering."""
+
+
+async def http_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                       method: str, path: str,
+                       body: bytes = b'') -> Tuple[int, Dict[str, str], bytes]:
+    """One request on a keep-alive connection: (status, headers, body)."""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+                 .encode('latin-1') + body)
+    try:
+        await writer.drain()
+        head = await reader.readuntil(b'\r\n\r\n')
+    except (asyncio.IncompleteReadError, ConnectionError) as e:
+        raise ConnectionClosed() from e
+    lines = head.decode('latin-1').split('\r\n')
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+    payload = await reader.readexactly(int(headers.get('content-length') or 0))
+    return int(lines[0].split(' ')[1]), headers, payload
+
+
+class LoadResult:
+    """Latencies and outcomes of one load phase."""
+
+    def __init__(self):
+        self.ok: List[float] = []
+        self.rejected: List[float] = []
+        self.statuses: Counter = Counter()
+        self.connections = 0
+        self.closed_before_read = 0
+        self.refused = 0
+
+
+async def client(port: int, bodies: List[bytes], offset: int, stop: asyncio.Event,
+                 result: LoadResult, retry_after_ms: float) -> None:
+    """Closed-loop client on one keep-alive connection, reconnecting when told to close."""
+    connection: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+    position = offset
+    while not stop.is_set():
+        if connection is None:
+            try:
+                connection = await asyncio.open_connection('127.0.0.1', port)
+            except ConnectionError:
+                # Listener closed (draining)
+                result.refused += 1
+                return
+            result.connections += 1
+        reader, writer = connection
+        started = time.perf_counter()
+        try:
+            status, headers, _ = await http_request(reader, writer, 'POST', '/risk-score',
+                                                    bodies[position % len(bodies)])
+        except ConnectionClosed:
+            # Idle connection closed by the drain as the request went out
+            result.closed_before_read += 1
+            writer.close()
+            connection = None
+            continue
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        position += 1
+        result.statuses[status] += 1
+        if status == 200:
+            result.ok.append(elapsed_ms)
+        elif status == 429:
+            result.rejected.append(elapsed_ms)
+            await asyncio.sleep(retry_after_ms / 1000)
+        if headers.get('connection', '').lower() == 'close':
+            writer.close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def get_json(port: int, path: str) -> Tuple[int, Dict[str, Any]]:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        status, _, payload = await http_request(reader, writer, 'GET', path)
+    finally:
+        writer.close()
+    return status, json.loads(payload)
+
+
+async def run_load(port: int, bodies: List[bytes], clients: int, seconds: float,
+                   retry_after_ms: float) -> LoadResult:
+    result = LoadResult()
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(client(port, bodies, index * 7, stop, result, retry_after_ms))
+             for index in range(clients)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return result
+
+
+async def run_drain(process: subprocess.Popen, port: int, bodies: List[bytes], clients: int,
+                    drain_delay_s: float, retry_after_ms: float) -> Dict[str, Any]:
+    """SIGTERM under load: readiness during the drain delay and the exit code."""
+    result = LoadResult()
+    stop = asyncio.Event()
+    probe = await asyncio.open_connection('127.0.0.1', port)
+    tasks = [asyncio.create_task(client(port, bodies, index * 7, stop, result, retry_after_ms))
+             for index in range(clients)]
+    await asyncio.sleep(0.5)
+    process.send_signal(signal.SIGTERM)
+    await asyncio.sleep(drain_delay_s / 3)
+    ready_status, _, _ = await http_request(*probe, 'GET', '/ready')
+    probe[1].close()
+    loop = asyncio.get_running_loop()
+    exit_code = await loop.run_in_executor(None, process.wait, 30)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return {'ready_status': ready_status, 'exit_code': exit_code, 'result': result}
+
+
+def start_server(args: argparse.Namespace, port: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, SERVER, '--stubs', '--port', str(port),
+         '--max-in-flight', str(args.max_in_flight), '--max-queued', str(args.max_queued),
+         '--queue-timeout-ms', str(args.queue_timeout_ms),
+         '--drain-delay-s', str(args.drain_delay_s),
+         '--sagemaker-latency-ms', str(args.sagemaker_latency_ms),
+         '--bedrock-latency-ms', str(args.bedrock_latency_ms)],
+        env=dict(os.environ, MODEL_BACKENDS='sagemaker,rules', IDEMPOTENCY_ENABLED='false'),
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    give_up_at = time.monotonic() + 30
+    while time.monotonic() < give_up_at:
+        try:
+            status, _ = asyncio.run(get_json(port, '/ready'))
+            if status == 200:
+                return process
+        except (ConnectionError, OSError):
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.1)
+    process.kill()
+    sys.exit(f"server did not become ready:\n{process.communicate()[0]}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', default='16,64,256',
+                        help='comma-separated concurrent client counts')
+    parser.add_argument('--seconds', type=float, default=3.0, help='run length per client count')
+    parser.add_argument('--max-in-flight', type=int, default=32)
+    parser.add_argument('--max-queued', type=int, default=64)
+    parser.add_argument('--queue-timeout-ms', type=float, default=100.0)
+    parser.add_argument('--drain-delay-s', type=float, default=0.6)
+    parser.add_argument('--retry-after-ms', type=float, default=50.0,
+                        help='client pause after a 429')
+    parser.add_argument('--sagemaker-latency-ms', type=float, default=20.0)
+    parser.add_argument('--bedrock-latency-ms', type=float, default=300.0)
+    parser.add_argument('--use-bedrock', action='store_true',
+                        help='request Bedrock explanations (longer requests)')
+    args = parser.parse_args()
+
+    bodies = [json.dumps(dict(order, use_bedrock=args.use_bedrock)).encode('utf-8')
+              for order in load_order_requests()]
+    client_counts = [int(value) for value in args.clients.split(',')]
+    port = free_port()
+    process = start_server(args, port)
+    failures = []
+
+    print(f"async_server: max in flight {args.max_in_flight}, queue {args.max_queued} "
+          f"({args.queue_timeout_ms:g} ms); SageMaker {args.sagemaker_latency_ms:g} ms, "
+          f"Bedrock {'on' if args.use_bedrock else 'off'}; {args.seconds:g} s per case")
+    print(f"{'clients':>7} {'ok/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'429s':>7} "
+          f"{'429 p99':>8} {'conns':>6}  other")
+    try:
+        for clients in client_counts:
+            result = asyncio.run(run_load(port, bodies, clients, args.seconds,
+                                          args.retry_after_ms))
+            result.ok.sort()
+            result.rejected.sort()
+            other = {status: count for status, count in result.statuses.items()
+                     if status not in (200, 429)}
+            print(f"{clients:>7} {len(result.ok) / args.seconds:8.0f} "
+                  f"{percentile(result.ok, 50) if result.ok else 0:8.1f} "
+                  f"{percentile(result.ok, 99) if result.ok else 0:8.1f} "
+                  f"{len(result.rejected):7d} "
+                  f"{percentile(result.rejected, 99) if result.rejected else 0:8.1f} "
+                  f"{result.connections:6d}  {other or ''}")
+            if other or result.closed_before_read or result.refused:
+                failures.append(f"{clients} clients: statuses {other}, "
+                                f"{result.closed_before_read + result.refused} connection errors")
+            if clients <= args.max_in_flight and result.rejected:
+                failures.append(f"{clients} clients within capacity got "
+                                f"{len(result.rejected)} 429s")
+        if len(client_counts) > 1 and clients > args.max_in_flight + args.max_queued \
+                and not result.rejected:
+            failures.append(f"{clients} clients over capacity got no 429s")
+
+        drain = asyncio.run(run_drain(process, port, bodies, client_counts[-1],
+                                      args.drain_delay_s, args.retry_after_ms))
+    finally:
+        if process.poll() is None:
+            process.kill()
+    output = process.communicate()[0]
+    drained = [line for line in output.splitlines() if line.startswith(('Draining', 'Drained'))]
+    result = drain['result']
+    print(f"\ndrain under {client_counts[-1]} clients: /ready {drain['ready_status']} "
+          f"during the drain delay, exit code {drain['exit_code']}, "
+          f"{sum(result.statuses.values())} responses {dict(result.statuses)}, "
+          f"{result.closed_before_read} idle connections closed as a request went out")
+    for line in drained:
+        print(f"  server: {line}")
+    if drain['ready_status'] != 503:
+        failures.append(f"/ready answered {drain['ready_status']} while draining")
+    if drain['exit_code'] != 0:
+        failures.append(f"server exited {drain['exit_code']} after SIGTERM")
+    if any(status not in (200, 429) for status in result.statuses):
+        failures.append(f"requests failed during the drain: {dict(result.statuses)}")
+
+    if failures:
+        print()
+        for failure in failures:
+            print(failure)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Request latency and DynamoDB calls with synchronous vs write-behind audit writes.
+
+1. Sample orders through lambda_handler (rule-based scores, rule-based
+   explanations) with the stub DynamoDB at --dynamodb-latency-ms per call.
+   The audit writer runs in "sync" mode first, then in "buffered" mode.
+   Reports:
+       - handler and store-span p50/p99
+       - BatchWriteItem calls
+       - rows in the table once the buffer has drained
+2. Unprocessed items: a fraction --unprocessed-rate of each batch comes
+   back unprocessed. Reports retries, dropped items and rows written.
+3. Shutdown: requests are in flight when close() drains the buffer. Every
+   row must reach the table, and writes after close() go straight through.
+4. Overflow: a small buffer in front of a slow table. The items that do not
+   fit are dropped and counted.
+
+Usage:
+    python benchmarks/bench_audit_writer.py [--requests 1000]
+        [--dynamodb-latency-ms 8] [--unprocessed-rate 0.1]
+
+Requires boto3 (client construction only).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_stubs import install_stubs  # noqa: E402
+from bench_model_backends import percentile  # noqa: E402
+from sample_data import load_order_requests  # noqa: E402
+
+
+def use_writer(lambda_function, stubs, mode: str, **kwargs):
+    """Fresh audit table and writer of the given mode."""
+    from audit_writer import AuditWriter
+
+    stubs.dynamodb.tables.pop(lambda_function.PREDICTIONS_TABLE, None)
+    lambda_function.AUDIT_WRITER = AuditWriter(
+        stubs.dynamodb, lambda_function.PREDICTIONS_TABLE, mode=mode, **kwargs
+    )
+    return lambda_function.AUDIT_WRITER, stubs.dynamodb.Table(lambda_function.PREDICTIONS_TABLE)
+
+
+def replay(lambda_function, requests: List[Dict[str, Any]]) -> Dict[str, List[float]]:
+    handler_ms, store_ms = [], []
+    for request in requests:
+        started = time.perf_counter()
+        response = lambda_function.lambda_handler(dict(request, debug_timings=True), None)
+        handler_ms.append((time.perf_counter() - started) * 1000)
+        spans = json.loads(response['body'])['debug_timings']['spans']
+        store_ms.append(sum(child['us'] / 1000 for child in spans.get('children', [])
+                            if child['name'] == 'store'))
+    return {'handler': sorted(handler_ms), 'store': sorted(store_ms)}
+
+
+def latency(lambda_function, stubs, requests: List[Dict[str, Any]]) -> None:
+    print(f"{len(requests)} requests:")
+    for mode in ('sync', 'buffered'):
+        writer, table = use_writer(lambda_function, stubs, mode)
+        calls = table.calls
+        started = time.perf_counter()
+        samples = replay(lambda_function, requests)
+        elapsed = time.perf_counter() - started
+        drained = writer.flush(timeout=10)
+        print(f"  {mode:<8} handler p50 {percentile(samples['handler'], 50):6.2f}  "
+              f"p99 {percentile(samples['handler'], 99):6.2f} ms   "
+              f"store p50 {percentile(samples['store'], 50):6.3f}  "
+              f"p99 {percentile(samples['store'], 99):6.3f} ms   "
+              f"BatchWriteItem calls {table.calls - calls:5d}   rows {len(table.items):5d}"
+              f"   ({len(requests) / elapsed:,.0f} req/s)")
+        if not drained or len(table.items) != len(requests):
+            sys.exit(f"{mode}: expected {len(requests)} rows")
+        writer.close()
+
+
+def unprocessed(lambda_function, stubs, requests: List[Dict[str, Any]], rate: float) -> None:
+    stubs.dynamodb.unprocessed_rate = rate
+    writer, table = use_writer(lambda_function, stubs, 'buffered', base_backoff_ms=2.0)
+    replay(lambda_function, requests)
+    writer.flush(timeout=30)
+    stats = writer.stats()
+    stubs.dynamodb.unprocessed_rate = 0.0
+    print(f"\n{rate:.0%} of each batch unprocessed: retries {stats['retries']}, "
+          f"dropped {stats['dropped']}, rows {len(table.items)} of {len(requests)}, "
+          f"flush p50 {stats['flush_ms']['p50']:.1f}  p99 {stats['flush_ms']['p99']:.1f} ms")
+    if len(table.items) + stats['dropped'] != len(requests):
+        sys.exit("unprocessed: rows and dropped items do not add up")
+    writer.close()
+
+
+def shutdown(lambda_function, stubs, requests: List[Dict[str, Any]]) -> None:
+    writer, table = use_writer(lambda_function, stubs, 'buffered', flush_age_ms=60000)
+    replay(lambda_function, requests)
+    depth = writer.depth()
+    started = time.perf_counter()
+    closed = writer.close(timeout=10)
+    close_ms = (time.perf_counter() - started) * 1000
+    lambda_function.lambda_handler(dict(requests[0], order_id='after-close'), None)
+    print(f"\nShutdown: {depth} buffered items drained in {close_ms:.1f} ms, "
+          f"rows {len(table.items)} of {len(requests) + 1} (one written after close)")
+    if not closed or len(table.items) != len(requests) + 1:
+        sys.exit("shutdown: buffered rows were lost")
+
+
+def overflow(lambda_function, stubs, requests: List[Dict[str, Any]]) -> None:
+    writer, table = use_writer(lambda_function, stubs, 'buffered', max_buffer=50)
+    latency_ms = table.latency_ms
+    table.latency_ms = 200.0
+    # One "dropping" log line per request that did not fit
+    with contextlib.redirect_stdout(io.StringIO()):
+        replay(lambda_function, requests)
+        writer.flush(timeout=60)
+    table.latency_ms = latency_ms
+    metrics = writer.metrics()
+    print(f"\nOverflow (buffer 50, 200 ms per BatchWriteItem): dropped "
+          f"{metrics['audit_dropped_items'][0]}, rows {len(table.items)} of {len(requests)}")
+    if len(table.items) + writer.dropped != len(requests):
+        sys.exit("overflow: rows and dropped items do not add up")
+    writer.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--dynamodb-latency-ms', type=float, default=8.0)
+    parser.add_argument('--unprocessed-rate', type=float, default=0.1)
+    args = parser.parse_args()
+
+    os.environ['MODEL_BACKENDS'] = 'rules'
+    os.environ['IDEMPOTENCY_ENABLED'] = 'false'
+    os.environ['EXPLANATION_CACHE_ENABLED'] = 'false'
+    import lambda_function
+    stubs = install_stubs(lambda_function, 0.0, 0.0, args.dynamodb_latency_ms)
+    requests = [dict(request, use_bedrock=False)
+                for request in load_order_requests()[:args.requests]]
+
+    latency(lambda_function, stubs, requests)
+    unprocessed(lambda_function, stubs, requests, args.unprocessed_rate)
+    shutdown(lambda_function, stubs, requests[:200])
+    overflow(lambda_function, stubs, requests[:200])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+SageMaker/Bedrock outage through lambda_handler, with and without circuit breakers.
+
+Replays sample orders in three phases against stubbed dependencies:
+
+    healthy   SageMaker and Bedrock answer normally
+    outage    every call fails, after --error-latency-ms (a connection
+              timeout or a 5xx from an overloaded endpoint)
+    recovered both answer normally again
+
+once with the breakers off (every request waits for each failing call
+before falling back) and once with them on (short --open-seconds so the
+half-open probes run within the benchmark). Reports per phase handler
+p50/p99, SageMaker and Bedrock calls, and scoring/explanation sources,
+plus the breakers' transitions. The request deadline is off, so every
+explanation is a sync Bedrock call and only the breakers differ between
+the runs. Exits 1 if a breaker is not closed again at the end of the
+recovered phase.
+
+Usage:
+    python benchmarks/bench_circuit_breaker.py [--healthy 30] [--outage 100]
+        [--recovered 50] [--error-latency-ms 150] [--open-seconds 0.5]
+        [--min-calls 10]
+
+Requires boto3 (client construction only).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_stubs import install_stubs  # noqa: E402
+from bench_model_backends import percentile  # noqa: E402
+from sample_data import load_order_requests  # noqa: E402
+
+PHASES = ('healthy', 'outage', 'recovered')
+
+
+def run_phase(lambda_function, stubs, requests: List[Dict[str, Any]], outage: bool,
+              args: argparse.Namespace) -> Dict[str, Any]:
+    for stub, latency_ms in ((stubs.sagemaker, args.sagemaker_latency_ms),
+                             (stubs.bedrock, args.bedrock_latency_ms)):
+        stub.latency_ms = args.error_latency_ms if outage else latency_ms
+        stub.error_rate = 1.0 if outage else 0.0
+    calls = (stubs.sagemaker.calls, stubs.bedrock.calls)
+    latencies = []
+    sources: Counter = Counter()
+    for request in requests:
+        started = time.perf_counter()
+        response = lambda_function.lambda_handler({'body': json.dumps(request)}, None)
+        latencies.append((time.perf_counter() - started) * 1000)
+        body = json.loads(response['body'])
+        sources[f"{body['model_type']}/{body['explanation']['generated_by']}"] += 1
+    latencies.sort()
+    return {
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'sagemaker_calls': stubs.sagemaker.calls - calls[0],
+        'bedrock_calls': stubs.bedrock.calls - calls[1],
+        'sources': sources
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--healthy', type=int, default=30)
+    parser.add_argument('--outage', type=int, default=100)
+    parser.add_argument('--recovered', type=int, default=50)
+    parser.add_argument('--sagemaker-latency-ms', type=float, default=20.0)
+    parser.add_argument('--bedrock-latency-ms', type=float, default=100.0)
+    parser.add_argument('--error-latency-ms', type=float, default=150.0,
+                        help='time each failing call takes to fail')
+    parser.add_argument('--open-seconds', type=float, default=0.5)
+    parser.add_argument('--min-calls', type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ['MODEL_BACKENDS'] = 'sagemaker,rules'
+    os.environ['EXPLANATION_CACHE_ENABLED'] = 'false'
+    os.environ['IDEMPOTENCY_ENABLED'] = 'false'
+    os.environ['REQUEST_BUDGET_MS'] = '0'
+    # Every explanation tier calls Bedrock (the stub scores every order 0.5)
+    os.environ['EXPLANATION_ROUTING'] = 'low=compact,medium=compact,high=full'
+    import lambda_function
+    stubs = install_stubs(lambda_function, args.sagemaker_latency_ms, args.bedrock_latency_ms)
+    orders = load_order_requests()
+    counts = (args.healthy, args.outage, args.recovered)
+
+    print(f"SageMaker {args.sagemaker_latency_ms:g} ms, Bedrock {args.bedrock_latency_ms:g} ms; "
+          f"outage: every call fails after {args.error_latency_ms:g} ms")
+    failures = []
+    for enabled in (False, True):
+        breakers = []
+        if enabled:
+            lambda_function.CIRCUIT_MIN_CALLS = args.min_calls
+            lambda_function.CIRCUIT_OPEN_SECONDS = args.open_seconds
+            breakers = [
+                lambda_function._circuit_breaker(name, slow_call_ms) for name, slow_call_ms in (
+                    ('sagemaker', lambda_function.SAGEMAKER_SLOW_CALL_MS),
+                    ('bedrock', lambda_function.BEDROCK_SLOW_CALL_MS)
+                )
+            ]
+        lambda_function.SAGEMAKER_BREAKER, lambda_function.BEDROCK_BREAKER = (
+            breakers if enabled else (None, None)
+        )
+        lambda_function.CIRCUIT_BREAKERS = breakers
+        print(f"\ncircuit breakers {'on' if enabled else 'off'}:")
+        offset = 0
+        for phase, count in zip(PHASES, counts):
+            requests = orders[offset:offset + count]
+            offset += count
+            result = run_phase(lambda_function, stubs, requests, phase == 'outage', args)
+            print(f"  {phase:<9} {count:4d} requests  p50 {result['p50']:7.1f} ms  "
+                  f"p99 {result['p99']:7.1f} ms  SageMaker calls {result['sagemaker_calls']:4d}  "
+                  f"Bedrock calls {result['bedrock_calls']:4d}  {dict(result['sources'])}")
+            if phase == 'outage' and enabled:
+                # Let the last open period run out so the recovery probes start
+                time.sleep(args.open_seconds)
+        for breaker in breakers:
+            stats = breaker.stats()
+            print(f"  {breaker.name:<9} state {stats['state']}, opened {stats['opened']}x, "
+                  f"rejected {stats['rejected']} calls")
+            if stats['state'] != 'closed':
+                failures.append(f"{breaker.name} breaker still {stats['state']} after recovery")
+
+    if failures:
+        print()
+        for failure in failures:
+            print(failure)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
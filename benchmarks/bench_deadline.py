@@ -0,0 +1,136 @@
+"""
+Handler latency with and without the per-request deadline, under tail latency.
+
+Replays sample orders through lambda_handler with stubbed SageMaker and
+Bedrock whose calls occasionally take far longer than usual (tail_rate /
+tail latency), once with the deadline off (REQUEST_BUDGET_MS=0, botocore's
+default timeouts: every slow call is waited out) and once with it on. Under
+the deadline the stubs honour the read timeout of the client variant the
+request gets, so a tail call times out and the request degrades (rules
+instead of SageMaker, rule-based instead of Bedrock explanation, deferred
+audit row) instead of blowing the budget.
+
+Reports handler p50/p99/max, how the orders were scored and explained, and
+the degradations the deadline run reported in "degraded". Exits 1 if the
+deadline run's p99 exceeds the budget plus --margin-ms.
+
+Usage:
+    python benchmarks/bench_deadline.py [--orders 100] [--budget-ms 500]
+        [--sagemaker-latency-ms 20] [--sagemaker-tail-rate 0.1]
+        [--sagemaker-tail-ms 600] [--bedrock-latency-ms 150]
+        [--bedrock-tail-rate 0.1] [--bedrock-tail-ms 1000]
+        [--audit-mode buffered|sync] [--margin-ms 25]
+
+Requires boto3 (client construction only).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_stubs import install_stubs  # noqa: E402
+from bench_model_backends import percentile  # noqa: E402
+from sample_data import load_order_requests  # noqa: E402
+
+
+def replay(lambda_function, requests: List[Dict[str, Any]], budget_ms: int,
+           args: argparse.Namespace) -> Dict[str, Any]:
+    """Handler latencies and response breakdown of one pass over the orders."""
+    install_stubs(
+        lambda_function,
+        sagemaker_latency_ms=args.sagemaker_latency_ms,
+        bedrock_latency_ms=args.bedrock_latency_ms,
+        dynamodb_latency_ms=args.dynamodb_latency_ms,
+        sagemaker_tail_rate=args.sagemaker_tail_rate,
+        sagemaker_tail_latency_ms=args.sagemaker_tail_ms,
+        bedrock_tail_rate=args.bedrock_tail_rate,
+        bedrock_tail_latency_ms=args.bedrock_tail_ms,
+        deadline_timeouts=True
+    )
+    lambda_function.REQUEST_BUDGET_MS = budget_ms
+    latencies = []
+    model_types: Counter = Counter()
+    explanations: Counter = Counter()
+    degraded: Counter = Counter()
+    degraded_requests = 0
+    for request in requests:
+        started = time.perf_counter()
+        response = lambda_function.lambda_handler({'body': json.dumps(request)}, None)
+        latencies.append((time.perf_counter() - started) * 1000)
+        body = json.loads(response['body'])
+        if response['statusCode'] != 200:
+            sys.exit(f"request failed: {body}")
+        model_types[body['model_type']] += 1
+        explanations[body['explanation']['generated_by']] += 1
+        if body.get('degraded'):
+            degraded_requests += 1
+            for entry in body['degraded']:
+                degraded[f"{entry['stage']}:{entry['reason']}"] += entry['count']
+    latencies.sort()
+    return {
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'max': latencies[-1],
+        'model_types': model_types,
+        'explanations': explanations,
+        'degraded': degraded,
+        'degraded_requests': degraded_requests
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=100)
+    parser.add_argument('--budget-ms', type=int, default=500)
+    parser.add_argument('--sagemaker-latency-ms', type=float, default=20.0)
+    parser.add_argument('--sagemaker-tail-rate', type=float, default=0.1)
+    parser.add_argument('--sagemaker-tail-ms', type=float, default=600.0)
+    parser.add_argument('--bedrock-latency-ms', type=float, default=150.0)
+    parser.add_argument('--bedrock-tail-rate', type=float, default=0.1)
+    parser.add_argument('--bedrock-tail-ms', type=float, default=1000.0)
+    parser.add_argument('--dynamodb-latency-ms', type=float, default=5.0)
+    parser.add_argument('--audit-mode', choices=('buffered', 'sync'), default='buffered')
+    parser.add_argument('--margin-ms', type=float, default=25.0,
+                        help='allowed p99 overshoot of the budget')
+    args = parser.parse_args()
+
+    os.environ['MODEL_BACKENDS'] = 'sagemaker,rules'
+    os.environ['EXPLANATION_CACHE_ENABLED'] = 'false'
+    os.environ['IDEMPOTENCY_ENABLED'] = 'false'
+    os.environ['AUDIT_WRITE_MODE'] = args.audit_mode
+    import lambda_function
+    requests = load_order_requests()[:args.orders]
+
+    print(f"{len(requests)} orders; SageMaker {args.sagemaker_latency_ms:g} ms "
+          f"({args.sagemaker_tail_rate:.0%} at {args.sagemaker_tail_ms:g} ms), "
+          f"Bedrock {args.bedrock_latency_ms:g} ms "
+          f"({args.bedrock_tail_rate:.0%} at {args.bedrock_tail_ms:g} ms), "
+          f"audit {args.audit_mode}")
+    runs = {'no deadline': 0, f"{args.budget_ms} ms deadline": args.budget_ms}
+    results = {}
+    for label, budget_ms in runs.items():
+        result = results[label] = replay(lambda_function, requests, budget_ms, args)
+        print(f"\n{label}: handler p50 {result['p50']:.1f} ms  p99 {result['p99']:.1f} ms  "
+              f"max {result['max']:.1f} ms")
+        print(f"  model_type   {dict(result['model_types'])}")
+        print(f"  explanation  {dict(result['explanations'])}")
+        print(f"  degraded     {result['degraded_requests']} requests "
+              f"{dict(result['degraded']) or ''}")
+    lambda_function.AUDIT_WRITER.flush()
+
+    p99 = results[f"{args.budget_ms} ms deadline"]['p99']
+    limit = args.budget_ms + args.margin_ms
+    if p99 > limit:
+        print(f"\nDeadline p99 {p99:.1f} ms > {limit:g} ms")
+        sys.exit(1)
+    print(f"\nDeadline p99 {p99:.1f} ms within {limit:g} ms")
+
+
+if __name__ == '__main__':
+    main()
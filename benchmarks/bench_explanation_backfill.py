@@ -0,0 +1,166 @@
+"""
+Throughput and dedup of the offline explanation backfill (explanation_backfill.py).
+
+Seeds a stub predictions table through lambda_handler batches with
+rule-based scores and rule-based explanations. The first batch is sent with
+"use_bedrock" so some rows already have Bedrock text, and every 50th row
+has its features removed like a row written before they were stored. Then:
+
+1. invoke_model backfill against stubbed Bedrock. Each call costs
+   --bedrock-latency-ms and a fraction --throttle-rate of calls fail with
+   ThrottlingException. The backfill runs with bounded concurrency and a
+   calls-per-second limit.
+   Reports:
+       - candidates and distinct signatures (dedup ratio)
+       - Bedrock calls and retries
+       - rows/s
+       - the time one Bedrock call per row, made sequentially, would have taken
+2. Batch inference round trip on a freshly seeded table. It writes the
+   JSONL input file and answers each record with the stub, as a Bedrock
+   batch job would. It then reads the output file back.
+
+Both runs check that no medium/high row with features is left without a
+Bedrock explanation.
+
+Usage:
+    python benchmarks/bench_explanation_backfill.py [--orders 10000]
+        [--bedrock-latency-ms 200] [--concurrency 8] [--rate 40]
+        [--throttle-rate 0.05] [--prompt auto]
+
+Requires boto3 (client construction only).
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_stubs import install_stubs  # noqa: E402
+from sample_data import load_order_requests  # noqa: E402
+
+
+def seed_table(lambda_function, stubs, requests: List[Dict[str, Any]]):
+    """Fresh predictions table filled through the batch endpoint."""
+    stubs.dynamodb.tables.pop(lambda_function.PREDICTIONS_TABLE, None)
+    latency_ms = stubs.bedrock.latency_ms
+    stubs.bedrock.latency_ms = 0.0
+    batch_size = lambda_function.MAX_BATCH_SIZE
+    for start in range(0, len(requests), batch_size):
+        lambda_function.lambda_handler({'body': json.dumps({
+            'orders': requests[start:start + batch_size],
+            'use_bedrock': start == 0
+        })}, None)
+    lambda_function.AUDIT_WRITER.flush()
+    stubs.bedrock.latency_ms = latency_ms
+    table = stubs.dynamodb.Table(lambda_function.PREDICTIONS_TABLE)
+    for position, item in enumerate(sorted(table.items.values(),
+                                           key=lambda item: item['prediction_id'])):
+        if position % 50 == 0:
+            del item['features']
+    return table
+
+
+def unexplained(table) -> int:
+    """Medium/high rows with features that still lack a Bedrock explanation."""
+    from explanation_backfill import BEDROCK_SOURCE
+
+    return sum(
+        1 for item in table.items.values()
+        if item['risk_level'] != 'low' and 'features' in item
+        and json.loads(item['explanation'])['generated_by'] != BEDROCK_SOURCE
+    )
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"  scanned {report['scanned']}, candidates {report['candidates']} "
+          f"(skipped: {report['has_bedrock']} with Bedrock text, "
+          f"{report['missing_features']} without features)")
+    print(f"  {report['signatures']} distinct signatures, dedup ratio {report['dedup_ratio']:.1%}")
+    print(f"  Bedrock calls {report['bedrock_calls']} (retries {report['retries']}), "
+          f"tokens in {report['input_tokens']:,} out {report['output_tokens']:,}, "
+          f"failed rows {report['failed_rows']}")
+    print(f"  written {report['written']} rows in {report['elapsed_s']:.2f} s: "
+          f"{report['rows_per_s']:.0f} rows/s, {report['bedrock_calls_per_s']:.1f} calls/s "
+          f"(rate limit wait {report['rate_limit_wait_s']:.2f} s)")
+
+
+def answer_batch_input(stubs, input_path: str, output_path: str) -> None:
+    """What the Bedrock batch job does: one modelOutput per input record."""
+    with open(input_path) as source, open(output_path, 'w') as target:
+        for line in source:
+            record = json.loads(line)
+            body = json.dumps(record['modelInput'])
+            response = stubs.bedrock.invoke_model(modelId='batch', body=body)
+            output = json.loads(response['body'].read())
+            target.write(json.dumps(dict(record, modelOutput=output)) + '\n')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--bedrock-latency-ms', type=float, default=200.0)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=40.0, help='Bedrock calls per second')
+    parser.add_argument('--throttle-rate', type=float, default=0.05)
+    parser.add_argument('--prompt', choices=('auto', 'compact', 'full'), default='auto')
+    parser.add_argument('--window', type=int, default=5000)
+    args = parser.parse_args()
+
+    os.environ['EXPLANATION_CACHE_ENABLED'] = 'false'
+    os.environ['IDEMPOTENCY_ENABLED'] = 'false'
+    # Rule-based scores give the sample orders their real low/medium/high mix
+    os.environ['MODEL_BACKENDS'] = 'rules'
+    os.environ['EXPLANATION_ROUTING'] = 'low=full,medium=full,high=full'
+    import lambda_function
+    from explanation_backfill import ExplanationBackfill
+    stubs = install_stubs(lambda_function, 0.0, args.bedrock_latency_ms, 0.0)
+    requests = load_order_requests()[:args.orders]
+
+    table = seed_table(lambda_function, stubs, requests)
+    print(f"Seeded {len(table.items)} predictions, {unexplained(table)} medium/high rows "
+          f"without a Bedrock explanation")
+
+    stubs.bedrock.error_rate = args.throttle_rate
+    backfill = ExplanationBackfill(
+        table, stubs.bedrock, prompt=args.prompt, concurrency=args.concurrency,
+        rate=args.rate, base_backoff_s=0.05, window=args.window
+    )
+    report = backfill.run()
+    stubs.bedrock.error_rate = 0.0
+    print(f"\ninvoke_model backfill (concurrency {args.concurrency}, {args.rate:g} calls/s, "
+          f"{args.throttle_rate:.0%} throttled):")
+    print_report(report)
+    sequential_s = report['candidates'] * args.bedrock_latency_ms / 1000
+    print(f"  one call per row, sequentially: ~{sequential_s:.1f} s")
+    left = unexplained(table)
+    print(f"  medium/high rows still without a Bedrock explanation: {left}")
+    if left:
+        sys.exit("backfill left rows unexplained")
+
+    print("\nBatch inference files:")
+    table = seed_table(lambda_function, stubs, requests)
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, 'records.jsonl')
+        report = ExplanationBackfill(table, prompt=args.prompt).write_batch_input(input_path)
+        print(f"  wrote {report['batch_records']} records for {report['candidates']} rows")
+        started = time.perf_counter()
+        stubs.bedrock.latency_ms = 0.0
+        answer_batch_input(stubs, input_path, input_path + '.out')
+        print(f"  (stub batch job answered in {time.perf_counter() - started:.2f} s)")
+        report = ExplanationBackfill(table, prompt=args.prompt).read_batch_output(
+            input_path + '.out'
+        )
+    print_report(report)
+    left = unexplained(table)
+    print(f"  medium/high rows still without a Bedrock explanation: {left}")
+    if left:
+        sys.exit("batch output left rows unexplained")
+
+
+if __name__ == '__main__':
+    main()
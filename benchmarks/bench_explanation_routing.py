@@ -0,0 +1,168 @@
+"""
+Bedrock calls, tokens and latency with risk-tiered explanation routing.
+
+1. Prompt build: the legacy prompt (risk factors as json.dumps(indent=2),
+   request body serialized per call) vs the precompiled full and compact
+   templates - size in characters / estimated input tokens, and build time.
+2. Replay: sample orders through lambda_handler (rule-based scores) with
+   stubbed Bedrock (generation time proportional to output tokens) and DynamoDB,
+   once with every tier on the full prompt (the old behaviour) and once
+   per routing policy. Reports per-tier requests, Bedrock calls, input and
+   output tokens, Bedrock p50 and handler p50, plus totals.
+
+The explanation cache and the request deadline are off so every routed
+request reaches Bedrock synchronously.
+
+Usage:
+    python benchmarks/bench_explanation_routing.py [--orders 200]
+        [--bedrock-latency-ms 50] [--token-ms 0.5] [--words 300]
+        [--policy low=fallback,medium=compact,high=full]
+
+Requires boto3 (client construction only).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_stubs import install_stubs  # noqa: E402
+from bench_model_backends import percentile  # noqa: E402
+from sample_data import load_order_requests  # noqa: E402
+
+ALL_FULL = 'low=full,medium=full,high=full'
+
+
+def legacy_request_body(risk_score: float, risk_factors: List[Dict], features: Dict) -> str:
+    """Prompt and body as generate_bedrock_explanation built them before routing."""
+    prompt = f"""You are an AI assistant for an e-commerce return abuse detection system.
+Generate a clear, professional explanation for the following return risk assessment.
+
+Risk Score: {risk_score:.2f} (0 = No Risk, 1 = High Risk)
+
+Risk Factors Detected:
+{json.dumps(risk_factors, indent=2)}
+
+Order Details:
+- Customer Return Rate: {features['customer_return_rate']*100:.1f}%
+- Total Orders: {features['total_orders']}
+- Payment Method: {'COD' if features['is_cod'] else 'Prepaid'}
+- Order Amount: ₹{features['amount']:,.0f}
+- Product Return Rate: {features['product_return_rate']*100:.1f}%
+- Festival Season: {'Yes' if features['is_festival_season'] else 'No'}
+
+Generate:
+1. A brief summary (1-2 sentences) explaining the risk level
+2. Top 3-5 key factors contributing to this risk score
+3. A recommended action for the operations team
+
+Keep the language professional, clear, and actionable. Focus on business impact."""
+    return json.dumps({
+        'anthropic_version': 'bedrock-2023-05-31',
+        'max_tokens': 500,
+        'messages': [{'role': 'user', 'content': prompt}],
+        'temperature': 0.3
+    })
+
+
+def prompt_cost(lambda_function, requests: List[Dict[str, Any]]) -> None:
+    from explanation_routing import build_templates
+
+    rows = []
+    for request in requests:
+        features = lambda_function.extract_features(request)
+        score, factors = lambda_function.calculate_risk_score(features)
+        rows.append((score, factors, features))
+    templates = build_templates()
+    builders = {
+        'legacy': legacy_request_body,
+        'full': templates['full'].request_body,
+        'compact': templates['compact'].request_body
+    }
+    print("Prompt build (request body incl. prompt):")
+    for name, build in builders.items():
+        sizes = [len(json.loads(build(*row))['messages'][0]['content']) for row in rows]
+        repeats = max(1, 20000 // len(rows))
+        started = time.perf_counter()
+        for _ in range(repeats):
+            for row in rows:
+                build(*row)
+        per_call_us = (time.perf_counter() - started) / (repeats * len(rows)) * 1e6
+        mean_chars = sum(sizes) / len(sizes)
+        print(f"  {name:<8} {mean_chars:7.0f} chars  ~{mean_chars / 4:5.0f} input tokens  "
+              f"{per_call_us:6.1f} us per body")
+
+
+def replay(lambda_function, stubs, requests: List[Dict[str, Any]], policy: str,
+           args: argparse.Namespace) -> None:
+    from explanation_routing import ExplanationRouter, build_templates, parse_routing
+
+    lambda_function.EXPLANATION_ROUTER = ExplanationRouter(
+        parse_routing(policy),
+        build_templates(args.compact_max_tokens, args.full_max_tokens)
+    )
+    bedrock_calls = stubs.bedrock.calls
+    handler_ms: Dict[str, List[float]] = {}
+    started = time.perf_counter()
+    for request in requests:
+        call_started = time.perf_counter()
+        response = lambda_function.lambda_handler({'body': json.dumps(request)}, None)
+        body = json.loads(response['body'])
+        handler_ms.setdefault(body['risk_level'], []).append(
+            (time.perf_counter() - call_started) * 1000
+        )
+    elapsed = time.perf_counter() - started
+
+    stats = lambda_function.EXPLANATION_ROUTER.stats()
+    print(f"\n{policy}: {stubs.bedrock.calls - bedrock_calls} Bedrock calls, "
+          f"{sum(s['input_tokens'] for s in stats.values()):,} input / "
+          f"{sum(s['output_tokens'] for s in stats.values()):,} output tokens, "
+          f"{elapsed:.1f} s for {len(requests)} orders")
+    for tier, tier_stats in stats.items():
+        latencies = sorted(handler_ms.get(tier, []))
+        bedrock = tier_stats.get('bedrock_latency_ms', {})
+        print(f"  {tier:<7} {tier_stats['prompt']:<9} requests {tier_stats['requests']:4d}  "
+              f"Bedrock {tier_stats['bedrock_calls']:4d}  "
+              f"tokens in {tier_stats['input_tokens']:7,} out {tier_stats['output_tokens']:7,}  "
+              f"Bedrock p50 {bedrock.get('p50', 0):6.1f} ms  "
+              f"handler p50 {percentile(latencies, 50) if latencies else 0:6.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--bedrock-latency-ms', type=float, default=50.0,
+                        help='Bedrock time before generation starts')
+    parser.add_argument('--token-ms', type=float, default=0.5, help='per output token')
+    parser.add_argument('--words', type=int, default=300, help='length of a full explanation')
+    parser.add_argument('--dynamodb-latency-ms', type=float, default=5.0)
+    parser.add_argument('--compact-max-tokens', type=int, default=150)
+    parser.add_argument('--full-max-tokens', type=int, default=500)
+    parser.add_argument('--policy', action='append',
+                        help='routing policy to compare (repeatable); default: the built-in one')
+    args = parser.parse_args()
+
+    os.environ['EXPLANATION_CACHE_ENABLED'] = 'false'
+    os.environ['IDEMPOTENCY_ENABLED'] = 'false'
+    # Rule-based scores give the sample orders their real low/medium/high mix
+    # (the stub endpoint scores every order 0.5)
+    os.environ['MODEL_BACKENDS'] = 'rules'
+    os.environ['REQUEST_BUDGET_MS'] = '0'
+    import lambda_function
+    from explanation_routing import DEFAULT_ROUTING
+    stubs = install_stubs(lambda_function, 0.0, args.bedrock_latency_ms, args.dynamodb_latency_ms)
+    stubs.bedrock.text = ' '.join(f"word{i}" for i in range(args.words))
+    stubs.bedrock.token_ms = args.token_ms
+    requests = load_order_requests()[:args.orders]
+
+    prompt_cost(lambda_function, requests)
+    for policy in [ALL_FULL] + (args.policy or [DEFAULT_ROUTING]):
+        replay(lambda_function, stubs, requests, policy, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Time to first byte with buffered vs streaming Bedrock explanations.
+
+Runs sample orders through lambda_handler (buffered "sync" mode) and
+through lambda_function.stream_prediction ("stream" mode, what
+stream_server.py sends) with stubbed SageMaker/Bedrock/DynamoDB. The stub
+Bedrock stream sends its first chunk after --bedrock-latency-ms and a few
+words every --chunk-ms; the buffered call waits for the whole completion.
+The explanation cache is off so every request reaches Bedrock, and so is
+the request deadline (which would defer sync calls this long to the async
+worker).
+
+Reports p50/p99 of:
+    - time to first byte (sync: whole response; stream: score event)
+    - time to first explanation text (stream)
+    - time to the final explanation
+and then stalls the stream after a few chunks to check that the
+rule-based explanation arrives at the stall deadline rather than when
+Bedrock resumes, and that the stalled streams are closed (no stub stream
+left generating, no reader thread left running).
+
+Usage:
+    python benchmarks/bench_explanation_stream.py [--requests 10]
+        [--bedrock-latency-ms 800] [--chunk-ms 20] [--words 150]
+        [--stall-ms 500]
+
+Requires boto3 (client construction only).
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_stubs import install_stubs  # noqa: E402
+from bench_model_backends import percentile  # noqa: E402
+from sample_data import load_order_requests  # noqa: E402
+
+
+def summary(name: str, values: List[float]) -> str:
+    values = sorted(values)
+    return f"{name} p50 {percentile(values, 50):7.1f}  p99 {percentile(values, 99):7.1f} ms"
+
+
+def run_sync(lambda_function, requests: List[Dict[str, Any]]) -> None:
+    totals = []
+    for request in requests:
+        started = time.perf_counter()
+        response = lambda_function.lambda_handler({'body': json.dumps(request)}, None)
+        totals.append((time.perf_counter() - started) * 1000)
+        generated_by = json.loads(response['body'])['explanation']['generated_by']
+        if generated_by != 'bedrock_claude_3_sonnet':
+            sys.exit(f"sync: unexpected explanation source {generated_by}")
+    print(f"  sync    {summary('first byte', totals)}   {summary('explanation', totals)}")
+
+
+def run_stream(lambda_function, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    first_byte, first_text, final, finals = [], [], [], []
+    for request in requests:
+        started = time.perf_counter()
+        for line in lambda_function.stream_prediction(dict(request, explanation_mode='stream')):
+            elapsed = (time.perf_counter() - started) * 1000
+            event = json.loads(line)
+            if event['type'] == 'score':
+                first_byte.append(elapsed)
+            elif event['type'] == 'explanation_delta' and len(first_text) < len(first_byte):
+                first_text.append(elapsed)
+            elif event['type'] == 'explanation':
+                final.append(elapsed)
+                finals.append(event)
+    print(f"  stream  {summary('first byte', first_byte)}   {summary('explanation', final)}")
+    if first_text:
+        print(f"          {summary('first text', first_text)}")
+    return finals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=10)
+    parser.add_argument('--sagemaker-latency-ms', type=float, default=20.0)
+    parser.add_argument('--bedrock-latency-ms', type=float, default=800.0,
+                        help='time to the first streamed chunk')
+    parser.add_argument('--chunk-ms', type=float, default=20.0)
+    parser.add_argument('--words', type=int, default=150)
+    parser.add_argument('--dynamodb-latency-ms', type=float, default=5.0)
+    parser.add_argument('--stall-ms', type=float, default=500.0,
+                        help='EXPLANATION_STREAM_STALL_MS for the stall scenario')
+    args = parser.parse_args()
+
+    os.environ['EXPLANATION_CACHE_ENABLED'] = 'false'
+    os.environ['IDEMPOTENCY_ENABLED'] = 'false'
+    os.environ['EXPLANATION_ROUTING'] = 'low=full,medium=full,high=full'
+    os.environ['REQUEST_BUDGET_MS'] = '0'
+    import lambda_function
+    stubs = install_stubs(lambda_function, args.sagemaker_latency_ms, args.bedrock_latency_ms,
+                          args.dynamodb_latency_ms)
+    stubs.bedrock.text = ' '.join(f"word{i}" for i in range(args.words))
+    stubs.bedrock.chunk_ms = args.chunk_ms
+    requests = load_order_requests()[:args.requests]
+    chunks = -(-args.words // stubs.bedrock.words_per_chunk)
+
+    # The buffered call returns once the whole completion has been generated
+    stubs.bedrock.latency_ms = args.bedrock_latency_ms + (chunks - 1) * args.chunk_ms
+    print(f"{args.requests} requests, Bedrock first chunk {args.bedrock_latency_ms:.0f} ms, "
+          f"{chunks} chunks every {args.chunk_ms:.0f} ms:")
+    run_sync(lambda_function, requests)
+    stubs.bedrock.latency_ms = args.bedrock_latency_ms
+    finals = run_stream(lambda_function, requests)
+    if any(event['status'] != 'complete' for event in finals):
+        sys.exit("stream: expected every explanation to complete")
+    if finals[0]['explanation']['explanation_text'] != stubs.bedrock.text:
+        sys.exit("stream: reassembled text differs from the Bedrock completion")
+
+    print(f"\nStream stalls for 10 s after 5 chunks (stall deadline {args.stall_ms:.0f} ms):")
+    lambda_function.EXPLANATION_STREAM_STALL_MS = args.stall_ms
+    stubs.bedrock.stall_after = 5
+    stubs.bedrock.stall_ms = 10000
+    finals = run_stream(lambda_function, requests[:3])
+    expected = (args.sagemaker_latency_ms + args.bedrock_latency_ms + 4 * args.chunk_ms
+                + args.stall_ms)
+    print(f"          expected final at about {expected:.0f} ms; statuses "
+          f"{sorted({event['status'] + '/' + event.get('reason', '') for event in finals})}")
+    if any(event['explanation']['generated_by'] != 'rule_based_fallback' for event in finals):
+        sys.exit("stall: expected the rule-based explanation")
+    time.sleep(0.1)
+    readers = sum(thread.name == 'explanation-stream' for thread in threading.enumerate())
+    print(f"          after the fallback: {stubs.bedrock.open_streams} streams still generating, "
+          f"{readers} reader threads running")
+    if stubs.bedrock.open_streams or readers:
+        sys.exit("stall: stalled streams were left open")
+
+
+if __name__ == '__main__':
+    main()
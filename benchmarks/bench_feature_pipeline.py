@@ -0,0 +1,172 @@
+"""
+Parity check and latency benchmark for feature_pipeline.
+
+Parity (exact, NaN-aware):
+    - transform_row vs transform_columns on every sample order joined with
+      feature-store history, plus randomized rows with missing keys, None,
+      NaN and int/bool inputs
+    - transform_frame vs the engineer_features formulas train.py used
+      before the shared pipeline (legacy_engineer_features)
+
+Latency: per-row p50/p99 of the generated single-row path against a
+one-row DataFrame through transform_frame (what reusing the training
+code per request would cost).
+
+Usage:
+    python benchmarks/bench_feature_pipeline.py [--rows 20000]
+
+Requires numpy and pandas.
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from feature_pipeline import (  # noqa: E402
+    FEATURE_NAMES, INPUT_FEATURES, transform_columns, transform_frame, transform_row
+)
+from feature_store import FeatureStore, build_snapshot  # noqa: E402
+from sample_data import SAMPLE_DATA_DIR  # noqa: E402
+
+
+def legacy_engineer_features(X):
+    """train.py's engineer_features before the shared pipeline (reference)."""
+    X = X.copy()
+    X['return_rate_x_cod'] = X['customer_return_rate'] * X['is_cod']
+    X['amount_x_return_rate'] = X['amount'] * X['customer_return_rate']
+    X['festival_x_cod'] = X['is_festival_season'] * X['is_cod']
+    X['customer_risk_score'] = (
+        X['customer_return_rate'] * 0.4 +
+        X['new_customer_flag'] * 0.1
+    )
+    X['order_risk_score'] = (
+        X['is_cod'] * 0.15 +
+        X['high_value_order_flag'] * 0.2 +
+        X['product_return_rate'] * 0.1
+    )
+    return X
+
+
+def sample_rows() -> List[Dict[str, Any]]:
+    """Sample orders resolved through the feature store (raw pipeline inputs)."""
+    store = FeatureStore.from_snapshot(build_snapshot(SAMPLE_DATA_DIR))
+    rows = []
+    for order_id in store._tables['orders'].rows:
+        body, _ = store.resolve({'order_id': order_id})
+        body['is_cod'] = 1 if body['payment_method'] == 'COD' else 0
+        rows.append({name: body.get(name) for name in INPUT_FEATURES})
+    return rows
+
+
+def random_rows(count: int, seed: int = 3) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    special = [None, math.nan, 0, 1, True, False]
+    rows = []
+    for _ in range(count):
+        row: Dict[str, Any] = {}
+        for name in INPUT_FEATURES:
+            roll = rng.random()
+            if roll < 0.1:
+                continue
+            if roll < 0.25:
+                row[name] = rng.choice(special)
+            elif name in ('amount', 'avg_order_value'):
+                row[name] = rng.choice([20000, 20000.5, rng.uniform(0, 100000)])
+            elif name in ('total_orders', 'customer_age_days', 'return_frequency_30d'):
+                row[name] = rng.randint(0, 50)
+            else:
+                row[name] = rng.random()
+        rows.append(row)
+    return rows
+
+
+def same(a: float, b: float) -> bool:
+    return a == b or (a != a and b != b)
+
+
+def check_row_vs_columns(rows: List[Dict[str, Any]]) -> int:
+    columns = {name: [row.get(name) for row in rows] for name in INPUT_FEATURES}
+    matrix = transform_columns(columns)
+    mismatches = 0
+    for row, expected in zip(rows, matrix):
+        if not all(same(a, float(b)) for a, b in zip(transform_row(row), expected)):
+            mismatches += 1
+    return mismatches
+
+
+def check_frame_vs_legacy(rows: List[Dict[str, Any]]) -> int:
+    import pandas as pd
+
+    frame = pd.DataFrame(rows)[INPUT_FEATURES].astype(float).fillna(
+        {'customer_return_rate': 0.0, 'total_orders': 0.0, 'is_cod': 0.0, 'amount': 0.0,
+         'product_return_rate': 0.0, 'is_festival_season': 0.0}
+    )
+    legacy = frame.copy()
+    legacy['high_value_order_flag'] = (legacy['amount'] > 20000).astype(float)
+    legacy['new_customer_flag'] = (legacy['total_orders'] < 3).astype(float)
+    legacy = legacy_engineer_features(legacy)[FEATURE_NAMES].to_numpy()
+    current = transform_frame(frame).to_numpy()
+    return int(sum(
+        not all(same(float(a), float(b)) for a, b in zip(x, y)) for x, y in zip(current, legacy)
+    ))
+
+
+def latency_us(fn, rows: List[Dict[str, Any]]) -> List[float]:
+    samples = []
+    for row in rows:
+        started = time.perf_counter()
+        fn(row)
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    rows = sample_rows()
+    randomized = random_rows(args.rows)
+    checks = [
+        ('transform_row vs transform_columns, sample orders', check_row_vs_columns(rows),
+         len(rows)),
+        ('transform_row vs transform_columns, randomized', check_row_vs_columns(randomized),
+         len(randomized)),
+        ('transform_frame vs legacy engineer_features', check_frame_vs_legacy(rows), len(rows))
+    ]
+    print(f"Parity ({len(FEATURE_NAMES)} features):")
+    for label, mismatches, total in checks:
+        print(f"  {label:<50} {mismatches} / {total} rows differ")
+    if any(mismatches for _, mismatches, _ in checks):
+        sys.exit("Feature pipeline parity check failed")
+
+    timed = (rows * (args.rows // len(rows) + 1))[:args.rows]
+    print(f"\nPer-row latency ({len(timed)} rows):")
+    samples = latency_us(transform_row, timed)
+    print(f"  transform_row              p50 {samples[len(samples) // 2]:8.2f} us   "
+          f"p99 {samples[int(len(samples) * 0.99)]:8.2f} us")
+    frame_rows = timed[:min(len(timed), 1000)]
+    samples = latency_us(lambda row: transform_frame(pd.DataFrame([row])), frame_rows)
+    print(f"  one-row transform_frame    p50 {samples[len(samples) // 2]:8.2f} us   "
+          f"p99 {samples[int(len(samples) * 0.99)]:8.2f} us")
+
+    columns = {name: [row.get(name) for row in timed] for name in INPUT_FEATURES}
+    started = time.perf_counter()
+    transform_columns(columns)
+    elapsed = time.perf_counter() - started
+    print(f"  transform_columns batch    {elapsed * 1e6 / len(timed):8.2f} us/row "
+          f"({len(timed)} rows in {elapsed * 1000:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
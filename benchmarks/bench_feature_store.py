@@ -0,0 +1,169 @@
+"""
+Feature snapshot benchmark: JSON vs memory-mapped binary format.
+
+1. Sample data: builds both formats from sample-data/, checks every
+   order/customer/product record decodes identically and compares load
+   time and lookup latency.
+2. Scale: writes synthetic snapshots with --customers customers (and a
+   tenth as many products) and reports file size, open time, Python heap
+   allocated while loading (tracemalloc), lookup latency and the cold
+   start of a fresh worker process opening the binary file.
+
+Usage:
+    python benchmarks/bench_feature_store.py [--customers 1000000] [--lookups 20000]
+
+NumPy is optional (binary lookups fall back to bisect without it).
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import feature_store  # noqa: E402
+from feature_store import (  # noqa: E402
+    SNAPSHOT_FORMAT, FeatureStore, build_snapshot, write_binary_snapshot
+)
+from sample_data import SAMPLE_DATA_DIR  # noqa: E402
+
+LOCATIONS = ['Mumbai', 'Delhi', 'Bangalore', 'Hyderabad', 'Chennai', 'Kolkata', 'Pune', 'Jaipur']
+PAYMENTS = ['COD', 'Card', 'UPI', 'Prepaid']
+CATEGORIES = ['Electronics - Mobile', 'Fashion - Clothing', 'Books', 'Home & Kitchen']
+
+
+def synthetic_snapshot(customers: int, seed: int = 7) -> Dict[str, Any]:
+    """Snapshot in the JSON layout with random customers/products and no orders."""
+    rng = random.Random(seed)
+    return {
+        'format': SNAPSHOT_FORMAT,
+        'as_of': '2026-03-14',
+        'built_at': int(time.time()),
+        'orders': {'fields': [name for name, _ in feature_store.ORDER_SCHEMA], 'rows': {}},
+        'customers': {
+            'fields': [name for name, _ in feature_store.CUSTOMER_SCHEMA],
+            'rows': {
+                f"CUST{i:09d}": [
+                    round(rng.random() * 0.6, 2), rng.randint(1, 200), rng.randint(0, 40),
+                    rng.randint(0, 2000), round(rng.uniform(300, 60000), 2), rng.randint(0, 5),
+                    rng.choice(LOCATIONS), rng.choice(PAYMENTS)
+                ]
+                for i in range(customers)
+            }
+        },
+        'products': {
+            'fields': [name for name, _ in feature_store.PRODUCT_SCHEMA],
+            'rows': {
+                f"PROD{i:08d}": [
+                    round(rng.random() * 0.4, 2), float(rng.randint(99, 150000)),
+                    rng.choice(CATEGORIES), 'Generic Brand'
+                ]
+                for i in range(max(1, customers // 10))
+            }
+        }
+    }
+
+
+def measure_load(path: str) -> Tuple[FeatureStore, float, float]:
+    """Load a snapshot; returns (store, wall ms, MB allocated by Python while loading)."""
+    started = time.perf_counter()
+    store = FeatureStore.load(path)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    # Allocation is measured on a second load since tracing slows loading down
+    tracemalloc.start()
+    retained = FeatureStore.load(path)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del retained
+    return store, elapsed_ms, allocated / 1e6
+
+
+def lookup_latency_us(lookup: Callable[[str], Any], keys: List[str]) -> Tuple[float, float]:
+    samples = []
+    for key in keys:
+        started = time.perf_counter()
+        lookup(key)
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+
+def worker_open_ms(path: str) -> float:
+    """Fresh interpreter: import feature_store, open the snapshot, one lookup."""
+    code = (
+        "import time; started = time.perf_counter(); "
+        "from feature_store import FeatureStore; "
+        f"store = FeatureStore.load({path!r}); store.get_customer('CUST000000001'); "
+        "print((time.perf_counter() - started) * 1000)"
+    )
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def report(label: str, path: str, keys: List[str]) -> FeatureStore:
+    store, load_ms, allocated_mb = measure_load(path)
+    p50, p99 = lookup_latency_us(store.get_customer, keys)
+    print(f"  {label:<7} {os.path.getsize(path) / 1e6:8.1f} MB file   load {load_ms:9.2f} ms   "
+          f"heap {allocated_mb:8.1f} MB   lookup p50 {p50:5.1f} us  p99 {p99:5.1f} us")
+    return store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--customers', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=20000)
+    args = parser.parse_args()
+    rng = random.Random(11)
+    print(f"NumPy index search: {'yes' if feature_store.np else 'no (bisect)'}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        snapshot = build_snapshot(SAMPLE_DATA_DIR)
+        json_path = os.path.join(workdir, 'sample.json')
+        bin_path = os.path.join(workdir, 'sample.bin')
+        with open(json_path, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        write_binary_snapshot(snapshot, bin_path)
+
+        print("\nSample data:")
+        keys = [rng.choice(list(snapshot['customers']['rows'])) for _ in range(args.lookups)]
+        json_store = report('json', json_path, keys)
+        bin_store = report('binary', bin_path, keys)
+        mismatches = sum(
+            json_store._lookup(table, key) != bin_store._lookup(table, key)
+            for table in ('orders', 'customers', 'products')
+            for key in snapshot[table]['rows']
+        )
+        print(f"  records decoded differently: {mismatches}")
+        if mismatches:
+            sys.exit("Binary snapshot does not match the JSON snapshot")
+
+        print(f"\nSynthetic: {args.customers:,} customers, {args.customers // 10:,} products")
+        started = time.perf_counter()
+        synthetic = synthetic_snapshot(args.customers)
+        json_path = os.path.join(workdir, 'scale.json')
+        bin_path = os.path.join(workdir, 'scale.bin')
+        with open(json_path, 'w') as f:
+            json.dump(synthetic, f, separators=(',', ':'))
+        write_binary_snapshot(synthetic, bin_path)
+        print(f"  built in {time.perf_counter() - started:.1f} s")
+        ids = list(synthetic['customers']['rows'])
+        del synthetic
+        keys = [rng.choice(ids) for _ in range(args.lookups)]
+        del ids
+        report('json', json_path, keys)
+        report('binary', bin_path, keys)
+        print(f"  fresh worker process (import + open + first lookup): "
+              f"{worker_open_ms(bin_path):.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
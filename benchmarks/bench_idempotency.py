@@ -0,0 +1,117 @@
+"""
+Cost of repeated order submissions with and without idempotent scoring.
+
+Replays sample orders through lambda_handler (stubbed SageMaker, Bedrock
+and DynamoDB with injected latency), submitting each order 1-4 times as
+upstream retries and the demo frontend do, in three modes:
+    - off: every repeat is scored again (pre-idempotency behaviour)
+    - local: repeats hit the in-process LRU (same warm container)
+    - table: the LRU is cleared before every repeat, so repeats are found
+      through the predictions table's order-id-index (another container)
+
+Reports SageMaker/Bedrock calls, audit rows written, and p50/p99 latency
+of first submissions vs repeats, and checks that every replay returns the
+original response.
+
+Usage:
+    python benchmarks/bench_idempotency.py [--orders 100]
+        [--sagemaker-latency-ms 20] [--bedrock-latency-ms 300]
+        [--dynamodb-latency-ms 5]
+
+Requires boto3 (client construction only).
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_stubs import install_stubs  # noqa: E402
+from bench_model_backends import percentile  # noqa: E402
+from sample_data import load_order_requests  # noqa: E402
+
+
+def submissions(orders: List[Dict[str, Any]], seed: int = 13) -> List[Dict[str, Any]]:
+    """Each order 1-4 times, repeats shortly after the first submission."""
+    rng = random.Random(seed)
+    sequence: List[Dict[str, Any]] = []
+    for order in orders:
+        sequence.extend(dict(order) for _ in range(rng.randint(1, 4)))
+    return sequence
+
+
+def run_mode(lambda_function, stubs, mode: str, sequence: List[Dict[str, Any]]) -> None:
+    from idempotency import IdempotencyCache
+
+    table = stubs.dynamodb.Table(lambda_function.PREDICTIONS_TABLE)
+    table.items.clear()
+    table.writes = 0
+    lambda_function.EXPLANATION_CACHE = None
+    lambda_function.IDEMPOTENCY_CACHE = None if mode == 'off' else IdempotencyCache(
+        window_seconds=300, table=table if mode == 'table' else None
+    )
+    sagemaker_calls, bedrock_calls = stubs.sagemaker.calls, stubs.bedrock.calls
+
+    seen: Dict[str, Dict[str, Any]] = {}
+    first_ms: List[float] = []
+    repeat_ms: List[float] = []
+    mismatches = 0
+    for request in sequence:
+        order_id = request['order_id']
+        if mode == 'table' and order_id in seen:
+            lambda_function.IDEMPOTENCY_CACHE._entries.clear()
+        started = time.perf_counter()
+        body = json.loads(lambda_function.lambda_handler(dict(request), None)['body'])
+        elapsed = (time.perf_counter() - started) * 1000
+        if order_id in seen:
+            repeat_ms.append(elapsed)
+            if mode != 'off':
+                replayed = dict(body)
+                replayed.pop('idempotency', None)
+                mismatches += replayed != seen[order_id] or 'idempotency' not in body
+        else:
+            first_ms.append(elapsed)
+            # Container-level routing counters are not part of the stored response
+            body.pop('explanation_routing', None)
+            seen[order_id] = body
+
+    first_ms.sort()
+    repeat_ms.sort()
+    print(f"  {mode:<6} SageMaker {stubs.sagemaker.calls - sagemaker_calls:5d}   "
+          f"Bedrock {stubs.bedrock.calls - bedrock_calls:5d}   audit rows {table.writes:5d}   "
+          f"first p50 {percentile(first_ms, 50):7.1f} ms   "
+          f"repeat p50 {percentile(repeat_ms, 50):7.1f} ms  p99 {percentile(repeat_ms, 99):7.1f} ms"
+          + (f"   replay mismatches {mismatches}" if mode != 'off' else ''))
+    if mismatches:
+        sys.exit(f"{mode}: replayed responses differ from the originals")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=100)
+    parser.add_argument('--sagemaker-latency-ms', type=float, default=20.0)
+    parser.add_argument('--bedrock-latency-ms', type=float, default=300.0)
+    parser.add_argument('--dynamodb-latency-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    os.environ.setdefault('MODEL_BACKENDS', 'sagemaker,rules')
+    # Table mode reads each audit row back on the next request, so rows are
+    # written before the response rather than within AUDIT_FLUSH_AGE_MS
+    os.environ['AUDIT_WRITE_MODE'] = 'sync'
+    import lambda_function
+    stubs = install_stubs(lambda_function, args.sagemaker_latency_ms, args.bedrock_latency_ms,
+                          args.dynamodb_latency_ms)
+    sequence = submissions(load_order_requests()[:args.orders])
+    print(f"{len(sequence)} submissions of {args.orders} orders "
+          f"({len(sequence) - args.orders} repeats):")
+    for mode in ('off', 'local', 'table'):
+        run_mode(lambda_function, stubs, mode, sequence)
+
+
+if __name__ == '__main__':
+    main()
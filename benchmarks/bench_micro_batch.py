@@ -0,0 +1,152 @@
+"""
+SageMaker micro-batching under concurrent load: endpoint calls vs requests.
+
+Closed loop: --clients threads each send single-order requests through
+lambda_handler (scoring only, no Bedrock) back to back, like concurrent
+connections to stream_server.py. SageMaker is stubbed as an endpoint with
+a fixed per-call cost, a small per-row cost and a limited number of calls
+it serves at once (--endpoint-concurrency); calls beyond that queue.
+
+Each client count runs with batching off (one invoke_endpoint per
+request), with a fixed window (always wait --max-wait-ms or --max-rows
+rows) and adaptive (window and batch size from the observed arrival rate
+and call latency). Reports request throughput, endpoint calls per second,
+rows per call, handler p50/p99 and how many requests fell back to the
+rules. The circuit breakers are off: the overloaded endpoint of the
+unbatched runs would otherwise trip the SageMaker breaker and turn later
+runs into rule-based ones. Exits 1 if adaptive batching at the highest
+client count serves fewer requests per second than batching off.
+
+Usage:
+    python benchmarks/bench_micro_batch.py [--clients 1,8,32,128] [--seconds 3]
+        [--sagemaker-latency-ms 20] [--row-latency-ms 0.2]
+        [--endpoint-concurrency 8] [--max-rows 64] [--max-wait-ms 5]
+
+Requires boto3 (client construction only).
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_stubs import install_stubs  # noqa: E402
+from bench_model_backends import percentile  # noqa: E402
+from sample_data import load_order_requests  # noqa: E402
+
+MODES = ('off', 'fixed', 'adaptive')
+
+
+def run_load(lambda_function, requests: List[Dict[str, Any]], clients: int,
+             args: argparse.Namespace) -> Dict[str, Any]:
+    """Closed-loop load from `clients` threads for args.seconds."""
+    bodies = [json.dumps(dict(request, use_bedrock=False)) for request in requests]
+    latencies: List[List[float]] = [[] for _ in range(clients)]
+    fallbacks = [0] * clients
+    stop_at = time.perf_counter() + args.seconds
+
+    def client(index: int) -> None:
+        position = index
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            response = lambda_function.lambda_handler(
+                {'body': bodies[position % len(bodies)]}, None
+            )
+            latencies[index].append((time.perf_counter() - started) * 1000)
+            if json.loads(response['body']).get('model_type') != 'sagemaker_ml':
+                fallbacks[index] += 1
+            position += clients
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    merged = sorted(latency for client_latencies in latencies for latency in client_latencies)
+    return {
+        'requests': len(merged),
+        'elapsed': elapsed,
+        'p50': percentile(merged, 50),
+        'p99': percentile(merged, 99),
+        'fallbacks': sum(fallbacks)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', default='1,8,32,128',
+                        help='comma-separated concurrent client counts')
+    parser.add_argument('--seconds', type=float, default=3.0, help='run length per case')
+    parser.add_argument('--sagemaker-latency-ms', type=float, default=20.0,
+                        help='stub cost of one endpoint call')
+    parser.add_argument('--row-latency-ms', type=float, default=0.2,
+                        help='stub cost of each row in a call')
+    parser.add_argument('--endpoint-concurrency', type=int, default=8,
+                        help='endpoint calls served at once')
+    parser.add_argument('--max-rows', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    os.environ['MODEL_BACKENDS'] = 'sagemaker,rules'
+    os.environ['EXPLANATION_CACHE_ENABLED'] = 'false'
+    os.environ['IDEMPOTENCY_ENABLED'] = 'false'
+    os.environ['MICRO_BATCH_ENABLED'] = 'false'
+    import lambda_function
+    lambda_function.SAGEMAKER_BREAKER = None
+    lambda_function.CIRCUIT_BREAKERS = []
+    requests = load_order_requests()
+    client_counts = [int(value) for value in args.clients.split(',')]
+
+    print(f"SageMaker stub: {args.sagemaker_latency_ms:g} ms + {args.row_latency_ms:g} ms/row, "
+          f"{args.endpoint_concurrency} calls at once; {args.seconds:g} s per case")
+    print(f"{'clients':>7} {'batching':<9} {'req/s':>8} {'calls/s':>8} {'rows/call':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'fallback':>8}  batcher")
+    throughput: Dict[str, float] = {}
+    for clients in client_counts:
+        for mode in MODES:
+            stubs = install_stubs(
+                lambda_function,
+                sagemaker_latency_ms=args.sagemaker_latency_ms,
+                sagemaker_row_latency_ms=args.row_latency_ms,
+                sagemaker_max_concurrency=args.endpoint_concurrency
+            )
+            batcher = None
+            if mode != 'off':
+                batcher = lambda_function.new_sagemaker_batcher(
+                    max_rows=args.max_rows,
+                    max_wait_ms=args.max_wait_ms,
+                    workers=args.endpoint_concurrency,
+                    adaptive=mode == 'adaptive'
+                )
+            lambda_function.SAGEMAKER_BATCHER = batcher
+            result = run_load(lambda_function, requests, clients, args)
+            if batcher is not None:
+                batcher.close(timeout=1.0)
+            calls = stubs.sagemaker.calls
+            rate = result['requests'] / result['elapsed']
+            throughput[mode] = rate
+            detail = ''
+            if batcher is not None:
+                stats = batcher.stats()
+                detail = f"row_limit {stats['row_limit']}  window {stats['window_ms']:g} ms"
+            print(f"{clients:>7} {mode:<9} {rate:8.0f} {calls / result['elapsed']:8.0f} "
+                  f"{stubs.sagemaker.rows / calls if calls else 0:9.1f} "
+                  f"{result['p50']:8.1f} {result['p99']:8.1f} {result['fallbacks']:8d}  {detail}")
+    lambda_function.SAGEMAKER_BATCHER = None
+    lambda_function.AUDIT_WRITER.flush()
+
+    if throughput['adaptive'] < throughput['off']:
+        print(f"\nAdaptive batching {throughput['adaptive']:.0f} req/s < "
+              f"{throughput['off']:.0f} req/s without batching at {client_counts[-1]} clients")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
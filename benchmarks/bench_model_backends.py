@@ -0,0 +1,147 @@
+"""
+Latency benchmark: local XGBoost vs SageMaker vs rules through lambda_handler.
+
+Drives the real lambda_handler entry point over sample-data/orders.csv with
+stubbed AWS clients and reports p50/p99 latency per scoring backend:
+    - local: in-process booster (LOCAL_MODEL_PATH)
+    - sagemaker: stub endpoint with injected network + inference latency
+    - rules: rule-based fallback only
+
+Without --model a throwaway booster is trained on the sample data with
+synthetic labels (latency depends on tree count/depth, not model quality).
+
+Usage:
+    python benchmarks/bench_model_backends.py [--model model.json]
+        [--requests 2000] [--sagemaker-latency-ms 20]
+
+Requires boto3 (client construction only), xgboost and numpy.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_stubs import install_stubs  # noqa: E402
+from sample_data import load_order_features, load_order_requests  # noqa: E402
+
+def train_sample_model(output_dir: str, n_estimators: int = 100,
+                       max_depth: int = 6) -> Tuple[str, Any, Any]:
+    """
+    Train a train.py-shaped classifier on sample orders.
+
+    Raw inputs come from the sample data (plus random history features) and
+    go through feature_pipeline.transform_columns, as in train.py.
+
+    Returns:
+        Tuple of (model.json path, fitted XGBClassifier, held-out 15% feature matrix)
+    """
+    import numpy as np
+    import xgboost as xgb
+    from feature_pipeline import FEATURE_NAMES, transform_columns
+    from risk_scoring import calculate_risk_score
+
+    rng = np.random.default_rng(42)
+    rows = load_order_features()
+    columns: Dict[str, List[float]] = {
+        name: [row[name] for row in rows] for name in rows[0]
+    }
+    columns['customer_age_days'] = rng.integers(30, 1500, len(rows)).astype(float)
+    columns['avg_order_value'] = np.asarray(columns['amount']) * rng.uniform(0.5, 1.5, len(rows))
+    columns['return_frequency_30d'] = rng.poisson(
+        np.asarray(columns['customer_return_rate']) * 4
+    ).astype(float)
+    labels = [
+        int(calculate_risk_score(features)[0] + rng.normal(0, 0.1) >= 0.45)
+        for features in rows
+    ]
+
+    matrix = transform_columns(columns)
+    model = xgb.XGBClassifier(n_estimators=n_estimators, max_depth=max_depth,
+                              learning_rate=0.1, subsample=0.8, colsample_bytree=0.8,
+                              random_state=42)
+    order = rng.permutation(len(labels))
+    test_size = len(order) * 15 // 100
+    train_rows, test_rows = order[test_size:], order[:test_size]
+    model.fit(matrix[train_rows], np.asarray(labels)[train_rows])
+    booster = model.get_booster()
+    booster.feature_names = FEATURE_NAMES
+    path = os.path.join(output_dir, 'model.json')
+    booster.save_model(path)
+    return path, model, matrix[test_rows]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(lambda_function, label: str, backends: List[str],
+                 requests: List[dict], count: int, report: bool = True) -> None:
+    lambda_function.MODEL_BACKENDS = backends
+    latencies = []
+    model_types = set()
+    for i in range(count):
+        body = dict(requests[i % len(requests)], use_bedrock=False)
+        started = time.perf_counter()
+        response = lambda_function.lambda_handler(body, None)
+        latencies.append((time.perf_counter() - started) * 1000)
+        model_types.add(json.loads(response['body']).get('model_type'))
+    if not report:
+        return
+    latencies.sort()
+    total_s = sum(latencies) / 1000
+    print(f"{label:<10} p50 {percentile(latencies, 50):8.3f} ms   "
+          f"p99 {percentile(latencies, 99):8.3f} ms   "
+          f"mean {sum(latencies) / len(latencies):8.3f} ms   "
+          f"{count / total_s:10,.0f} req/s   model_type={','.join(sorted(model_types))}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', help='model.json / model.joblib (default: train one)')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--sagemaker-latency-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        model_path = args.model or train_sample_model(workdir)[0]
+        os.environ['MODEL_BACKENDS'] = 'local,sagemaker,rules'
+        os.environ['LOCAL_MODEL_PATH'] = model_path
+        os.environ['EXPLANATION_CACHE_ENABLED'] = 'false'
+        # Every order is scored once per backend; replays would hide the model cost
+        os.environ['IDEMPOTENCY_ENABLED'] = 'false'
+
+        started = time.perf_counter()
+        import lambda_function
+        import_ms = (time.perf_counter() - started) * 1000
+        install_stubs(lambda_function, sagemaker_latency_ms=args.sagemaker_latency_ms)
+
+        model = lambda_function.LOCAL_MODEL
+        if model is None or not model.load():
+            sys.exit(f"Local model unavailable: {model.load_error if model else 'not configured'}")
+        print(f"lambda_function import {import_ms:.1f} ms (model load {model.load_ms:.1f} ms, "
+              f"{len(model.feature_names)} features)")
+
+        requests = load_order_requests()
+        # Warm up every path once
+        for backends in (['local'], ['sagemaker'], ['rules']):
+            run_scenario(lambda_function, 'warmup', backends, requests, 20, report=False)
+        print(f"\n{args.requests} requests per backend "
+              f"(stub SageMaker latency {args.sagemaker_latency_ms:g} ms)")
+        run_scenario(lambda_function, 'local', ['local', 'rules'], requests, args.requests)
+        # Cap the stubbed-network scenario at ~20 s of injected sleep
+        sagemaker_count = max(50, min(args.requests,
+                                      int(20000 / max(args.sagemaker_latency_ms, 1))))
+        run_scenario(lambda_function, 'sagemaker', ['sagemaker', 'rules'], requests,
+                     sagemaker_count)
+        run_scenario(lambda_function, 'rules', ['rules'], requests, args.requests)
+
+
+if __name__ == '__main__':
+    main()
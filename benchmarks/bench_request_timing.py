@@ -0,0 +1,200 @@
+"""
+Cost and accuracy of the per-stage request timings.
+
+1. Overhead: cost of one timed() span with and without an active request
+   timer, and of the end-of-invocation work (stage totals, rolling window
+   update, EMF line), compared with a rules-only lambda_handler call.
+2. Accuracy: with injected SageMaker/Bedrock/DynamoDB latency, the
+   sagemaker/bedrock/store spans should match the injected latency and the
+   stage spans should account for the invocation total.
+3. EMF: every metric declared in the EMF header has a numeric value and
+   every dimension is present; size of the line for a single order and for
+   a MAX_BATCH_SIZE batch (CloudWatch rejects log events over 256 KB).
+4. Rolling percentiles returned through "debug_timings" vs percentiles of
+   the handler latencies measured outside the handler.
+
+Usage:
+    python benchmarks/bench_request_timing.py [--requests 300]
+        [--sagemaker-latency-ms 20] [--bedrock-latency-ms 50]
+        [--dynamodb-latency-ms 5]
+
+Requires boto3 (client construction only).
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_stubs import install_stubs  # noqa: E402
+from bench_model_backends import percentile  # noqa: E402
+from sample_data import load_order_requests  # noqa: E402
+
+EMF_MAX_BYTES = 256 * 1024
+
+
+def _per_call_us(fn, repeats: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - started) / repeats * 1e6
+
+
+def overhead(lambda_function, requests: List[Dict[str, Any]]) -> None:
+    from request_timing import RollingLatency, emf_line, start_timer, stop_timer, timed
+
+    def span():
+        with timed('stage'):
+            pass
+
+    idle_us = _per_call_us(span, 200000)
+    timer, token = start_timer()
+    active_us = _per_call_us(span, 200000)
+    stop_timer(timer, token)
+
+    # End-of-invocation work for a typical tree
+    rolling = RollingLatency()
+
+    def finish():
+        timer, token = start_timer()
+        for name in ('parse', 'features', 'predict', 'explanation', 'store', 'serialize'):
+            with timed(name):
+                with timed('child'):
+                    pass
+        stop_timer(timer, token)
+        totals = timer.stage_totals()
+        rolling.record(totals)
+        emf_line(timer, 'Bench', totals)
+
+    finish_us = _per_call_us(finish, 5000)
+
+    events = [{'body': json.dumps(request)} for request in requests]
+    handler_us = {}
+    for emit in (False, True, False, True):
+        lambda_function.METRICS_ENABLED = emit
+        samples = []
+        for event in events:
+            started = time.perf_counter()
+            lambda_function.lambda_handler(event, None)
+            samples.append((time.perf_counter() - started) * 1e6)
+        samples.sort()
+        handler_us[emit] = percentile(samples, 50)
+    print(f"  timed() span: {idle_us:.2f} us without a request timer, "
+          f"{active_us:.2f} us with one")
+    print(f"  12-span tree + rolling update + EMF line: {finish_us:.1f} us")
+    print(f"  rules-only lambda_handler p50: {handler_us[False]:.1f} us without the EMF line, "
+          f"{handler_us[True]:.1f} us with it")
+
+
+def check_emf(line: str) -> Dict[str, Any]:
+    record = json.loads(line)
+    directive = record['_aws']['CloudWatchMetrics'][0]
+    for dimension_set in directive['Dimensions']:
+        for dimension in dimension_set:
+            if not isinstance(record.get(dimension), str):
+                sys.exit(f"EMF dimension {dimension} missing")
+    for metric in directive['Metrics']:
+        if not isinstance(record.get(metric['Name']), (int, float)):
+            sys.exit(f"EMF metric {metric['Name']} has no numeric value")
+    if len(directive['Metrics']) > 100:
+        sys.exit("EMF allows at most 100 metrics per directive")
+    return record
+
+
+def accuracy(lambda_function, requests: List[Dict[str, Any]], injected: Dict[str, float],
+             batch_size: int) -> None:
+    from request_timing import RollingLatency
+
+    lambda_function.EXPLANATION_CACHE = None
+    lambda_function.STAGE_LATENCY = RollingLatency()
+    lambda_function.METRICS_ENABLED = True
+    out = io.StringIO()
+    latencies = []
+    with redirect_stdout(out):
+        for request in requests:
+            started = time.perf_counter()
+            response = lambda_function.lambda_handler(
+                {'body': json.dumps(dict(request, debug_timings=True))}, None
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+    lines = [line for line in out.getvalue().splitlines() if line.startswith('{"_aws"')]
+    records = [check_emf(line) for line in lines]
+    print(f"  {len(records)} invocations, {len(records)} EMF lines, all well-formed "
+          f"(single order: {len(lines[-1]):,} bytes)")
+
+    for stage, expected in injected.items():
+        values = sorted(record[f"{stage}_ms"] for record in records)
+        print(f"  {stage:<10} injected {expected:6.1f} ms   span p50 {percentile(values, 50):7.2f} ms")
+    unaccounted = sorted(
+        record['total_ms'] - sum(child['us'] for child in record['spans']['children']) / 1000
+        for record in records
+    )
+    print(f"  time outside stage spans: p50 {percentile(unaccounted, 50):.3f} ms, "
+          f"max {unaccounted[-1]:.3f} ms")
+
+    latencies.sort()
+    rolling = json.loads(response['body'])['debug_timings']['rolling']['total']
+    print(f"  debug_timings rolling total ({rolling['count']} samples): p50 {rolling['p50']:.2f}  "
+          f"p95 {rolling['p95']:.2f}  p99 {rolling['p99']:.2f} ms")
+    print(f"  measured around the handler:                 p50 "
+          f"{percentile(latencies, 50):.2f}  p95 {percentile(latencies, 95):.2f}  "
+          f"p99 {percentile(latencies, 99):.2f} ms")
+
+    orders = [requests[i % len(requests)] for i in range(batch_size)]
+    out = io.StringIO()
+    with redirect_stdout(out):
+        lambda_function.lambda_handler({'body': json.dumps({'orders': orders})}, None)
+    line = [line for line in out.getvalue().splitlines() if line.startswith('{"_aws"')][-1]
+    record = check_emf(line)
+    print(f"  {batch_size}-order batch: EMF line {len(line):,} bytes "
+          f"(limit {EMF_MAX_BYTES:,}), features span count "
+          f"{record['spans']['children'][1].get('count', 1)}")
+    if len(line) > EMF_MAX_BYTES:
+        sys.exit("EMF line exceeds the CloudWatch log event size limit")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--sagemaker-latency-ms', type=float, default=20.0)
+    parser.add_argument('--bedrock-latency-ms', type=float, default=50.0)
+    parser.add_argument('--dynamodb-latency-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    os.environ['MODEL_BACKENDS'] = 'rules'
+    os.environ['IDEMPOTENCY_ENABLED'] = 'false'
+    # The store span should measure the DynamoDB write, not a buffer append
+    os.environ['AUDIT_WRITE_MODE'] = 'sync'
+    # Every tier calls Bedrock, so every invocation has a bedrock span
+    os.environ['EXPLANATION_ROUTING'] = 'low=full,medium=full,high=full'
+    # Under the default deadline sync Bedrock calls are routed to the async worker
+    os.environ['REQUEST_BUDGET_MS'] = '0'
+    import lambda_function
+    requests = load_order_requests()[:args.requests]
+
+    print("Instrumentation overhead (no injected latency, rules backend, no Bedrock):")
+    install_stubs(lambda_function, emit_metrics=True)
+    with redirect_stdout(io.StringIO()) as out:
+        overhead(lambda_function, [dict(request, use_bedrock=False) for request in requests])
+    print(''.join(line + '\n' for line in out.getvalue().splitlines()
+                  if not line.startswith('{"_aws"')), end='')
+
+    print("\nSpan accuracy and EMF output (SageMaker + Bedrock + DynamoDB stubs):")
+    lambda_function.MODEL_BACKENDS = ['sagemaker', 'rules']
+    install_stubs(lambda_function, args.sagemaker_latency_ms, args.bedrock_latency_ms,
+                  args.dynamodb_latency_ms)
+    accuracy(lambda_function, requests, {
+        'sagemaker': args.sagemaker_latency_ms,
+        'bedrock': args.bedrock_latency_ms,
+        'store': args.dynamodb_latency_ms
+    }, lambda_function.MAX_BATCH_SIZE)
+
+
+if __name__ == '__main__':
+    main()
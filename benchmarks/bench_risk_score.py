@@ -0,0 +1,181 @@
+"""
+Parity check and benchmark for rule-based risk scoring.
+
+Scores every order in sample-data/orders.csv with:
+    - the legacy if/elif implementation (reference copy kept below)
+    - the compiled rule table via the scalar wrapper (calculate_risk_score)
+    - the compiled rule table via the columnar path (pure Python and NumPy)
+verifies that scores, factor lists and fallback explanation lines are
+identical, and reports throughput for each.
+
+Usage:
+    python benchmarks/bench_risk_score.py [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from risk_scoring import (  # noqa: E402
+    RISK_FEATURES,
+    calculate_risk_score,
+    calculate_risk_scores,
+    decode_risk_factors,
+    explain_risk_factors,
+    np
+)
+from sample_data import load_order_features  # noqa: E402
+
+
+def legacy_calculate_risk_score(features):
+    """Pre-rule-table implementation, kept as the parity reference."""
+    customer_return_rate = features['customer_return_rate']
+    total_orders = features['total_orders']
+    amount = features['amount']
+    product_return_rate = features['product_return_rate']
+
+    risk_score = 0.0
+    risk_factors = []
+
+    def add(name, value, weight):
+        risk_factors.append({'factor': name, 'value': value, 'weight': weight})
+
+    if customer_return_rate > 0.5:
+        risk_score += 0.30
+        add('very_high_customer_return_rate', customer_return_rate, 0.30)
+    elif customer_return_rate > 0.3:
+        risk_score += 0.15
+        add('high_customer_return_rate', customer_return_rate, 0.15)
+    elif customer_return_rate > 0.15:
+        risk_score += 0.05
+        add('moderate_customer_return_rate', customer_return_rate, 0.05)
+
+    if total_orders < 3:
+        risk_score += 0.10
+        add('new_customer', total_orders, 0.10)
+    elif total_orders < 10:
+        risk_score += 0.05
+        add('relatively_new_customer', total_orders, 0.05)
+
+    if features['is_cod']:
+        risk_score += 0.15
+        add('cod_payment', 'COD', 0.15)
+
+    if amount > 50000:
+        risk_score += 0.20
+        add('very_high_value_order', amount, 0.20)
+    elif amount > 20000:
+        risk_score += 0.10
+        add('high_value_order', amount, 0.10)
+    elif amount > 10000:
+        risk_score += 0.05
+        add('moderate_value_order', amount, 0.05)
+
+    if product_return_rate > 0.4:
+        risk_score += 0.10
+        add('high_product_return_rate', product_return_rate, 0.10)
+    elif product_return_rate > 0.2:
+        risk_score += 0.05
+        add('moderate_product_return_rate', product_return_rate, 0.05)
+
+    if features['is_festival_season']:
+        risk_score -= 0.05
+        add('festival_season', 'Yes', -0.05)
+
+    return max(0.0, min(1.0, risk_score)), risk_factors
+
+
+def legacy_explain(risk_factors):
+    """Pre-rule-table explanation ladder, kept as the parity reference."""
+    reasons = []
+    for factor in risk_factors:
+        if factor['factor'] == 'very_high_customer_return_rate':
+            reasons.append(f"Very high return rate: {factor['value']*100:.0f}% of orders returned")
+        elif factor['factor'] == 'high_customer_return_rate':
+            reasons.append(f"High return rate: {factor['value']*100:.0f}% of orders returned")
+        elif factor['factor'] == 'new_customer':
+            reasons.append(f"New customer with only {factor['value']} previous orders")
+        elif factor['factor'] == 'cod_payment':
+            reasons.append("Cash on Delivery payment method (higher risk)")
+        elif factor['factor'] == 'very_high_value_order':
+            reasons.append(f"Very high value order: ₹{factor['value']:,.0f}")
+        elif factor['factor'] == 'high_value_order':
+            reasons.append(f"High value order: ₹{factor['value']:,.0f}")
+        elif factor['factor'] == 'high_product_return_rate':
+            reasons.append(f"Product has high return rate: {factor['value']*100:.0f}%")
+        elif factor['factor'] == 'festival_season':
+            reasons.append("Festival season - normal shopping behavior expected")
+    return reasons
+
+
+def check_parity(rows, columns) -> None:
+    """Fail loudly if any path disagrees with the legacy implementation."""
+    expected = [legacy_calculate_risk_score(features) for features in rows]
+
+    for i, (features, (score, factors)) in enumerate(zip(rows, expected)):
+        if calculate_risk_score(features) != (score, factors):
+            raise AssertionError(f"scalar: mismatch on row {i}")
+        if explain_risk_factors(factors) != legacy_explain(factors):
+            raise AssertionError(f"explanation: mismatch on row {i}")
+    print(f"parity[scalar+explain]: {len(rows)} rows identical to legacy implementation")
+
+    paths = {'python': False}
+    if np:
+        paths['numpy'] = True
+    for label, use_numpy in paths.items():
+        risk_scores, masks = calculate_risk_scores(columns, use_numpy=use_numpy)
+        for i, (features, (score, factors)) in enumerate(zip(rows, expected)):
+            if float(risk_scores[i]) != score:
+                raise AssertionError(f"{label}: score mismatch on row {i}: "
+                                     f"{risk_scores[i]!r} != {score!r}")
+            if decode_risk_factors(int(masks[i]), features) != factors:
+                raise AssertionError(f"{label}: factor mismatch on row {i}")
+        print(f"parity[{label}]: {len(rows)} rows identical to legacy implementation")
+
+
+def bench(label: str, fn, row_count: int, repeat: int) -> None:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<30} {best * 1000:9.2f} ms  {row_count / best:14,.0f} rows/sec")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = load_order_features()
+    columns = {name: [features[name] for features in rows] for name in RISK_FEATURES}
+    factor_lists = [legacy_calculate_risk_score(features)[1] for features in rows]
+
+    check_parity(rows, columns)
+
+    print(f"\nScoring {len(rows)} orders (best of {args.repeat})")
+    bench('legacy if/elif', lambda: [legacy_calculate_risk_score(f) for f in rows],
+          len(rows), args.repeat)
+    bench('compiled calculate_risk_score', lambda: [calculate_risk_score(f) for f in rows],
+          len(rows), args.repeat)
+    bench('compiled columnar (python)', lambda: calculate_risk_scores(columns, use_numpy=False),
+          len(rows), args.repeat)
+    if np:
+        arrays = {name: np.asarray(values) for name, values in columns.items()}
+        bench('compiled columnar (numpy)', lambda: calculate_risk_scores(arrays, use_numpy=True),
+              len(rows), args.repeat)
+    else:
+        print('compiled columnar (numpy)      skipped - NumPy not installed')
+
+    print(f"\nExplaining {len(rows)} factor lists (best of {args.repeat})")
+    bench('legacy explanation ladder', lambda: [legacy_explain(f) for f in factor_lists],
+          len(rows), args.repeat)
+    bench('compiled templates', lambda: [explain_risk_factors(f) for f in factor_lists],
+          len(rows), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Cold start: module import plus the first invocation, in fresh interpreters.
+
+Each sample runs in a new Python process. It times `import lambda_function`,
+then the first lambda_handler call (the one that pays for lazily built
+clients and imports), then a second, warm call. Scenarios:
+
+    no_aws     rules backend, no idempotency table lookup: no AWS client on the
+               request path (audit rows are flushed by the writer thread)
+    rules      MODEL_BACKENDS=rules, use_bedrock false (DynamoDB for the
+               idempotency lookup)
+    sagemaker  default backend chain, use_bedrock false (SageMaker client)
+    bedrock    default backend chain, use_bedrock true (SageMaker + Bedrock clients)
+
+Every scenario also runs "eager": AWS_CLIENT_PRELOAD builds all three
+clients during import and NumPy is imported up front, which is what every
+cold start paid before clients and NumPy were deferred.
+
+The clients are real boto3 clients, so their build cost is measured, but
+their calls are answered by the aws_stubs stand-ins (no network). The first
+client a process builds also pays for importing boto3 and loading botocore's
+endpoint data, so it costs several times more than each later one. Reports
+medians of --repeat processes, the clients built by the end of the first
+request, and the "client_init" time in the first request's span tree.
+
+Exits 1 if a lazy scenario's median import exceeds --import-budget-ms or its
+median import + first invocation exceeds its cold-start budget
+(--cold-start-budget-ms).
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat 7] [--scenarios rules,sagemaker,bedrock]
+        [--import-budget-ms 100]
+        [--cold-start-budget-ms no_aws=100,rules=500,sagemaker=550,bedrock=600]
+        [--no-eager]
+
+Requires boto3.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+SCENARIOS = {
+    'no_aws': ({'MODEL_BACKENDS': 'rules', 'IDEMPOTENCY_TABLE_LOOKUP': 'false'}, False),
+    'rules': ({'MODEL_BACKENDS': 'rules'}, False),
+    'sagemaker': ({'MODEL_BACKENDS': 'sagemaker,rules'}, False),
+    'bedrock': ({'MODEL_BACKENDS': 'sagemaker,rules'}, True)
+}
+DEFAULT_COLD_START_BUDGET_MS = 'no_aws=100,rules=500,sagemaker=550,bedrock=600'
+
+
+def client_init_ms(span: Dict[str, Any]) -> float:
+    """Total "client_init" time in a debug_timings span tree (outermost spans only)."""
+    if span['name'] == 'client_init':
+        # A lazy Table's span contains its resource's
+        return span['us'] / 1000
+    return sum(client_init_ms(child) for child in span.get('children', []))
+
+
+def route_to_stubs(lambda_function) -> None:
+    """Build each lazy client for real, then hand out a stub in its place."""
+    def make_stub(name: str) -> Any:
+        from aws_stubs import StubBedrockRuntime, StubDynamoDB, StubSageMakerRuntime
+        return {'bedrock': StubBedrockRuntime, 'sagemaker': StubSageMakerRuntime,
+                'dynamodb': StubDynamoDB}[name]()
+
+    for name, client in lambda_function.AWS_CLIENTS.items():
+        if client.built:
+            client._target = make_stub(name)
+            client._variants = {timeouts: make_stub(name) for timeouts in client._variants}
+
+        def build(factory=client._factory, name=name) -> Any:
+            factory()
+            return make_stub(name)
+        client._factory = build
+
+        # Requests run under a deadline, so they use the timeout variants
+        def build_variant(timeouts, factory=client._variant_factory, name=name) -> Any:
+            factory(timeouts)
+            return make_stub(name)
+        client._variant_factory = build_variant
+
+
+def child(request: Dict[str, Any], eager: bool) -> None:
+    """One cold start in this (fresh) process; prints a JSON result line."""
+    started = time.perf_counter()
+    if eager:
+        import numpy  # noqa: F401
+    import lambda_function
+    import_ms = (time.perf_counter() - started) * 1000
+    sys.path.insert(0, BENCH_DIR)
+    route_to_stubs(lambda_function)
+
+    invocations = []
+    for order_id in (request['order_id'], request['order_id'] + '-warm'):
+        started = time.perf_counter()
+        response = lambda_function.lambda_handler(
+            dict(request, order_id=order_id, debug_timings=True), None
+        )
+        invocations.append(((time.perf_counter() - started) * 1000, response))
+    (first_ms, first), (warm_ms, _) = invocations
+    body = json.loads(first['body'])
+    if first['statusCode'] != 200:
+        sys.exit(f"first invocation failed: {body}")
+    print(json.dumps({
+        'import_ms': import_ms,
+        'first_ms': first_ms,
+        'warm_ms': warm_ms,
+        'client_init_ms': client_init_ms(body['debug_timings']['spans']),
+        'built': sorted(name for name, stats in body['debug_timings']['clients'].items()
+                        if stats['built']),
+        'model_type': body['model_type']
+    }))
+
+
+def cold_starts(scenario: str, eager: bool, request: Dict[str, Any],
+                repeat: int) -> List[Dict[str, Any]]:
+    overrides, use_bedrock = SCENARIOS[scenario]
+    env = dict(
+        os.environ, **overrides,
+        AWS_CLIENT_PRELOAD='bedrock,sagemaker,dynamodb' if eager else '',
+        AWS_DEFAULT_REGION=os.environ.get('AWS_DEFAULT_REGION', 'ap-south-1'),
+        METRICS_ENABLED='false',
+        PYTHONDONTWRITEBYTECODE='1'
+    )
+    command = [sys.executable, os.path.abspath(__file__), '--child',
+               json.dumps(dict(request, use_bedrock=use_bedrock))]
+    if eager:
+        command.append('--eager')
+    results = []
+    for _ in range(repeat):
+        output = subprocess.run(command, cwd=ROOT, env=env, check=True,
+                                capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+def parse_budgets(spec: str) -> Dict[str, float]:
+    budgets = {}
+    for entry in spec.split(','):
+        scenario, _, value = entry.partition('=')
+        budgets[scenario.strip()] = float(value)
+    return budgets
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--import-budget-ms', type=float, default=100.0)
+    parser.add_argument('--cold-start-budget-ms', default=DEFAULT_COLD_START_BUDGET_MS,
+                        help='import + first invocation, per scenario')
+    parser.add_argument('--no-eager', action='store_true', help='skip the eager comparison')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--eager', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(json.loads(args.child), args.eager)
+        return
+
+    from sample_data import load_order_requests
+
+    request = load_order_requests()[0]
+    budgets = parse_budgets(args.cold_start_budget_ms)
+    failures = []
+    print(f"Cold starts, median of {args.repeat} fresh interpreters (ms):")
+    print(f"  {'scenario':<10} {'clients':<7} {'import':>8} {'first call':>11} "
+          f"{'cold start':>11} {'warm call':>10} {'client_init':>12}  clients built")
+    for scenario in [name.strip() for name in args.scenarios.split(',') if name.strip()]:
+        for eager in (False,) if args.no_eager else (False, True):
+            results = cold_starts(scenario, eager, request, args.repeat)
+            medians = {
+                key: statistics.median(result[key] for result in results)
+                for key in ('import_ms', 'first_ms', 'warm_ms', 'client_init_ms')
+            }
+            cold_start_ms = statistics.median(
+                result['import_ms'] + result['first_ms'] for result in results
+            )
+            print(f"  {scenario:<10} {'eager' if eager else 'lazy':<7} "
+                  f"{medians['import_ms']:8.1f} {medians['first_ms']:11.1f} "
+                  f"{cold_start_ms:11.1f} {medians['warm_ms']:10.2f} "
+                  f"{medians['client_init_ms']:12.1f}  "
+                  f"{','.join(results[0]['built']) or '-'} ({results[0]['model_type']})")
+            if eager:
+                continue
+            if medians['import_ms'] > args.import_budget_ms:
+                failures.append(f"{scenario}: import {medians['import_ms']:.1f} ms "
+                                f"> {args.import_budget_ms:g} ms")
+            budget = budgets.get(scenario)
+            if budget is not None and cold_start_ms > budget:
+                failures.append(f"{scenario}: cold start {cold_start_ms:.1f} ms > {budget:g} ms")
+
+    if failures:
+        print("\nOver budget:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nAll lazy scenarios within budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+Throughput and correctness check for the order/return stream consumer.
+
+Replays sample-data/orders.csv and returns.csv through a FileEventStream
+(the file-backed Kinesis stand-in) and the same batch handler the Lambda
+runs, then:
+    - compares every customer's and product's counters with a full recount
+      of the CSVs
+    - reports events/sec and per-batch latency for the in-process tier and
+      for the shared DynamoDB tier (stub table with injected latency),
+      plus how many counter updates each batch coalesced into
+    - re-delivers a batch (skipped as duplicates) and a batch with a bad
+      record (partial failure at exactly that record)
+    - retries half the stream on a second shared-tier consumer with no
+      checkpoints (a batch retried on another container), in larger
+      batches that overlap what the first one applied, and checks the
+      table's counters and velocity windows against a single pass
+    - scores one order through lambda_handler before and after a burst of
+      returns for its customer arrives on the stream
+
+Usage:
+    python benchmarks/bench_stream_consumer.py [--batch-size 100]
+        [--dynamodb-latency-ms 2]
+
+Requires boto3 (client construction only).
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aws_stubs import StubTable, install_stubs  # noqa: E402
+from sample_data import SAMPLE_DATA_DIR  # noqa: E402
+from stream_consumer import (  # noqa: E402
+    FileEventStream, StreamAggregates, event_type, events_from_csv, handle_stream_batch
+)
+
+
+def recount(events: List[Dict[str, Any]]) -> Tuple[Dict[str, List[float]], Dict[str, List[int]]]:
+    """Reference counters computed directly from the events."""
+    order_products = {e['order_id']: e['product_id'] for e in events if event_type(e) == 'order'}
+    customers: Dict[str, List[float]] = {}
+    products: Dict[str, List[int]] = {}
+    for item in events:
+        customer = customers.setdefault(item['customer_id'], [0, 0, 0.0])
+        product = products.setdefault(order_products[item['order_id']], [0, 0])
+        if event_type(item) == 'order':
+            customer[0] += 1
+            customer[2] += item['amount']
+            product[0] += 1
+        else:
+            customer[1] += 1
+            product[1] += 1
+    return customers, products
+
+
+def consume(stream: FileEventStream, aggregates: StreamAggregates,
+            batch_size: int) -> Tuple[int, float, List[float]]:
+    """Drain the stream; returns (records, seconds, per-batch ms sorted)."""
+    records = 0
+    batch_ms = []
+    started = time.perf_counter()
+    for batch in stream.read_batches(batch_size):
+        batch_started = time.perf_counter()
+        response = handle_stream_batch(batch, aggregates)
+        batch_ms.append((time.perf_counter() - batch_started) * 1000)
+        if response['batchItemFailures']:
+            sys.exit(f"Unexpected batch failure: {response}")
+        records += len(batch['Records'])
+    batch_ms.sort()
+    return records, time.perf_counter() - started, batch_ms
+
+
+def report(label: str, records: int, seconds: float, batch_ms: List[float]) -> None:
+    print(f"  {label:<22} {records / seconds:10,.0f} events/s   "
+          f"{seconds * 1e6 / records:6.1f} us/event   "
+          f"batch p50 {batch_ms[len(batch_ms) // 2]:7.2f} ms  p99 {batch_ms[int(len(batch_ms) * 0.99)]:7.2f} ms")
+
+
+def check_counters(aggregates: StreamAggregates, events: List[Dict[str, Any]]) -> int:
+    customers, products = recount(events)
+    mismatches = 0
+    for customer_id, expected in customers.items():
+        actual = aggregates.customer_counters(customer_id)
+        if actual is None or actual[:2] != expected[:2] or abs(actual[2] - expected[2]) > 0.01:
+            mismatches += 1
+    for product_id, expected in products.items():
+        if aggregates.product_counters(product_id) != expected:
+            mismatches += 1
+    return mismatches
+
+
+def redelivery_checks(stream: FileEventStream, aggregates: StreamAggregates) -> None:
+    first = next(stream.read_batches(50))
+    before = aggregates.stats()['applied']
+    handle_stream_batch(first, aggregates)
+    stats = aggregates.stats()
+    print(f"  re-delivered batch of 50: applied {stats['applied'] - before}, "
+          f"skipped as duplicates {stats['skipped_duplicate']}")
+
+    fresh = StreamAggregates()
+    broken = next(stream.read_batches(50))
+    bad = broken['Records'][20]['kinesis']
+    bad['data'] = base64.b64encode(b'{"event_type": "order"}').decode()
+    response = handle_stream_batch(broken, fresh)
+    print(f"  batch with bad record #20: applied {fresh.stats()['applied']}, "
+          f"batchItemFailures {response['batchItemFailures']} (record seq {bad['sequenceNumber']})")
+
+
+def cross_container_retry(stream: FileEventStream, reference: StreamAggregates,
+                          events: List[Dict[str, Any]], batch_size: int) -> int:
+    """Replay over a shared table from a fresh consumer; returns mismatches."""
+    table = StubTable('stream-aggregates', 'entity_key')
+    first = StreamAggregates(shared_table=table, read_ttl_seconds=0)
+    batches = list(stream.read_batches(batch_size))
+    for batch in batches[:len(batches) // 2]:
+        handle_stream_batch(batch, first)
+    # The retry starts over from the first record in larger batches
+    retry = StreamAggregates(shared_table=table, read_ttl_seconds=0)
+    for batch in stream.read_batches(batch_size * 3):
+        handle_stream_batch(batch, retry)
+    counters = check_counters(retry, events)
+    windows = 0
+    for customer_id in {item['customer_id'] for item in events}:
+        expected = reference.velocity_window(customer_id)
+        actual = retry.velocity_window(customer_id)
+        if (expected is None) != (actual is None):
+            windows += 1
+        elif expected is not None:
+            # The EWMA is stored as float32, so a window read back from the
+            # table can differ from one kept in process in the last cent
+            wanted, got = expected.features(expected.last_day), actual.features(expected.last_day)
+            ewma_diff = abs(wanted.pop('order_value_ewma') - got.pop('order_value_ewma'))
+            if wanted != got or ewma_diff > 0.011:
+                windows += 1
+    print(f"  first consumer applied {first.stats()['applied']} records; the retry dropped "
+          f"{retry.stats()['skipped_shared']} already-stored deltas; "
+          f"counter mismatches {counters}, velocity window mismatches {windows}")
+    return counters + windows
+
+
+def scoring_visibility(workdir: str) -> None:
+    """Score an order before and after new returns for its customer hit the stream."""
+    from feature_store import build_snapshot
+
+    snapshot_path = os.path.join(workdir, 'snapshot.json')
+    with open(snapshot_path, 'w') as f:
+        json.dump(build_snapshot(SAMPLE_DATA_DIR), f)
+    os.environ['FEATURE_SNAPSHOT_PATH'] = snapshot_path
+    os.environ['MODEL_BACKENDS'] = 'rules'
+    import lambda_function
+    install_stubs(lambda_function)
+
+    # The burst lands the day after the snapshot (older events are already in it)
+    day = (date.fromisoformat(lambda_function.FEATURE_STORE.as_of) + timedelta(days=1)).isoformat()
+    request = {'order_id': 'ORD100000', 'order_date': day, 'use_bedrock': False}
+    order = lambda_function.FEATURE_STORE.get_order('ORD100000')
+
+    def score() -> Dict[str, Any]:
+        body = json.loads(lambda_function.lambda_handler(dict(request), None)['body'])
+        merged, _ = lambda_function.resolve_request_features(dict(request))
+        return {'risk_score': body['risk_score'],
+                'customer_return_rate': merged['customer_return_rate'],
+                'total_orders': merged['total_orders'],
+                'return_frequency_30d': merged['return_frequency_30d'],
+                'live': body.get('feature_lookup', {}).get('live')}
+
+    before = score()
+    burst = FileEventStream(os.path.join(workdir, 'burst.jsonl'))
+    new_events = []
+    for i in range(6):
+        order_id = f"ORDLIVE{i}"
+        new_events.append({'event_type': 'order', 'order_id': order_id,
+                           'customer_id': order['customer_id'], 'product_id': order['product_id'],
+                           'order_date': f"{day}T12:00:0{i}", 'amount': 45000.0,
+                           'payment_method': 'COD', 'is_festival_season': 0})
+        new_events.append({'event_type': 'return', 'return_id': f"RETLIVE{i}",
+                           'order_id': order_id, 'customer_id': order['customer_id'],
+                           'return_date': f"{day}T18:00:0{i}", 'days_to_return': 0})
+    burst.put_records(new_events)
+    for batch in burst.read_batches(100):
+        lambda_function.lambda_handler(batch, None)
+    after = score()
+    print(f"  ORD100000 before: {before['risk_score']:.3f} risk, return rate "
+          f"{before['customer_return_rate']}, {before['total_orders']} orders, "
+          f"{before['return_frequency_30d']} returns in 30 days")
+    print(f"  ORD100000 after:  {after['risk_score']:.3f} risk, return rate "
+          f"{after['customer_return_rate']}, {after['total_orders']} orders, "
+          f"{after['return_frequency_30d']} returns in 30 days")
+    print(f"  live: {after['live']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--dynamodb-latency-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    events = events_from_csv(SAMPLE_DATA_DIR)
+    with tempfile.TemporaryDirectory() as workdir:
+        stream = FileEventStream(os.path.join(workdir, 'events.jsonl'))
+        stream.put_records(events)
+        print(f"{len(events)} events ({sum(event_type(e) == 'order' for e in events)} orders), "
+              f"batches of {args.batch_size}:")
+
+        local = StreamAggregates()
+        report('in-process', *consume(stream, local, args.batch_size))
+
+        table = StubTable('stream-aggregates', 'entity_key', args.dynamodb_latency_ms)
+        shared = StreamAggregates(shared_table=table, read_ttl_seconds=0)
+        report(f"shared (+{args.dynamodb_latency_ms:g} ms/write)",
+               *consume(stream, shared, args.batch_size))
+        batches = -(-len(events) // args.batch_size)
+        print(f"  shared tier: {table.writes} updates for {len(events)} events "
+              f"({table.writes / batches:.1f} per batch, one ADD per touched key)")
+
+        table.latency_ms = 0
+
+        print("\nCounters vs full recount:")
+        local_diff = check_counters(local, events)
+        shared_diff = check_counters(shared, events)
+        print(f"  in-process mismatches {local_diff}, shared mismatches {shared_diff}")
+        if local_diff or shared_diff:
+            sys.exit("Stream aggregates do not match the recount")
+
+        print("\nAt-least-once delivery:")
+        redelivery_checks(stream, local)
+        if cross_container_retry(stream, shared, events, args.batch_size):
+            sys.exit("A batch retried on another container was counted twice")
+
+        print("\nScoring sees stream updates (lambda_handler, rules backend):")
+        scoring_visibility(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+"""
+Repeatable benchmark suite for the scoring path, with a saved baseline.
+
+test-complete-system.sh only exercises a deployed endpoint. This suite
+runs locally over sample-data/orders.csv with stubbed AWS clients
+(aws_stubs) and reports ops/sec and p50/p95/p99 per case:
+
+    risk_score            calculate_risk_score on one order
+    fallback_explanation  generate_fallback_explanation for its factors
+    response_json         build_prediction + _api_response (JSON body)
+    handler_rules         lambda_handler, rules backend, no Bedrock, no injected latency
+    handler_full          lambda_handler, SageMaker + sync Bedrock + audit write,
+                          with the injected latencies
+    handler_degraded      handler_full with injected error rates; also reports
+                          the share of requests served by each fallback
+
+Explanation and idempotency caches are off in the handler cases so every
+request does the full work, and the EMF metrics line is written (to a
+null sink) as in production. CPU-bound cases keep the fastest of
+--repeat runs.
+
+Baseline:
+    --save-baseline writes the results to benchmarks/baseline.json;
+    --check compares with it and exits 1 if any case lost more than
+    --tolerance of its ops/sec or gained more than --tolerance on p50.
+    Every run also times a fixed pure-Python calibration workload, and
+    baseline numbers are scaled by the calibration ratio before comparing,
+    so a slower machine (or a noisy neighbour on a shared runner) is not
+    reported as a regression. Calibration cannot remove all variance;
+    the default tolerance leaves room for it. update-lambda.sh runs the
+    CPU-bound cases against the baseline before deploying.
+
+Usage:
+    python benchmarks/bench_suite.py [--cases risk_score,handler_rules]
+        [--check | --save-baseline] [--baseline benchmarks/baseline.json]
+        [--tolerance 0.25] [--scale 1.0] [--repeat 5]
+        [--sagemaker-latency-ms 20] [--bedrock-latency-ms 80] [--dynamodb-latency-ms 5]
+        [--sagemaker-error-rate 0.2] [--bedrock-error-rate 0.3] [--dynamodb-error-rate 0.05]
+
+Requires boto3 (client construction only).
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from aws_stubs import install_stubs  # noqa: E402
+from bench_model_backends import percentile  # noqa: E402
+from sample_data import load_order_features, load_order_requests  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+BASELINE_VERSION = 1
+
+# Iterations per run at --scale 1
+ITERATIONS = {
+    'risk_score': 20000,
+    'fallback_explanation': 20000,
+    'response_json': 10000,
+    'handler_rules': 5000,
+    'handler_full': 150,
+    'handler_degraded': 150
+}
+CPU_CASES = ['risk_score', 'fallback_explanation', 'response_json', 'handler_rules']
+
+
+def measure(operation: Callable[[int], Any], iterations: int) -> Dict[str, Any]:
+    """Run operation(i) for i in range(iterations); ops/sec and latency percentiles."""
+    samples = []
+    clock = time.perf_counter_ns
+    started = clock()
+    for i in range(iterations):
+        begin = clock()
+        operation(i)
+        samples.append(clock() - begin)
+    elapsed_s = (clock() - started) / 1e9
+    samples.sort()
+    return {
+        'iterations': iterations,
+        'ops_per_sec': round(iterations / elapsed_s, 1),
+        'p50_us': round(percentile(samples, 50) / 1000, 2),
+        'p95_us': round(percentile(samples, 95) / 1000, 2),
+        'p99_us': round(percentile(samples, 99) / 1000, 2)
+    }
+
+
+def calibration_workload() -> Callable[[int], Any]:
+    """Fixed dict/str/float workload; its speed relates runs on different machines."""
+    rows = [{'id': f"ORD{i}", 'amount': i * 1.5, 'rate': i / 997} for i in range(200)]
+
+    def workload(i: int) -> int:
+        total = 0.0
+        for row in rows:
+            total += row['amount'] * row['rate'] if row['rate'] < 0.1 else row['amount']
+        return len(json.dumps(rows[i % 200])) + int(total)
+
+    return workload
+
+
+def cpu_operations(lambda_function, names: List[str]) -> Dict[str, Callable[[int], Any]]:
+    """operation(i) per CPU-bound case (handler_rules installs zero-latency stubs)."""
+    requests = load_order_requests()
+    features = load_order_features()
+    scored = [lambda_function.calculate_risk_score(row) for row in features]
+    explanations = [
+        lambda_function.generate_fallback_explanation(score, factors, row)
+        for (score, factors), row in zip(scored, features)
+    ]
+    count = len(requests)
+
+    def respond(i: int) -> Dict[str, Any]:
+        prediction = lambda_function.build_prediction(
+            requests[i % count]['order_id'], scored[i % count][0],
+            explanations[i % count], 'rule_based'
+        )
+        return lambda_function._api_response(200, prediction)
+
+    operations = {
+        'risk_score': lambda i: lambda_function.calculate_risk_score(features[i % count]),
+        'fallback_explanation': lambda i: lambda_function.generate_fallback_explanation(
+            scored[i % count][0], scored[i % count][1], features[i % count]
+        ),
+        'response_json': respond
+    }
+    if 'handler_rules' in names:
+        install_stubs(lambda_function, emit_metrics=True)
+        events = [{'body': json.dumps(dict(request, use_bedrock=False))} for request in requests]
+        operations['handler_rules'] = lambda i: lambda_function.lambda_handler(
+            events[i % count], None
+        )
+    return {name: operations[name] for name in names if name in operations}
+
+
+def run_cpu_cases(lambda_function, names: List[str], args: argparse.Namespace,
+                  sink) -> Tuple[Dict[str, Any], float]:
+    """
+    Best of --repeat runs per CPU-bound case, plus the calibration p50 (us).
+
+    Repeats are interleaved (one run of every case per round) so that a
+    slow period on the machine hits all cases and the calibration alike.
+    """
+    operations = cpu_operations(lambda_function, names)
+    lambda_function.MODEL_BACKENDS = ['rules']
+    calibration = calibration_workload()
+    counts = {name: max(10, int(ITERATIONS[name] * args.scale)) for name in operations}
+    counts['calibration'] = 2000
+    best: Dict[str, Dict[str, Any]] = {}
+    with redirect_stdout(sink):
+        for _ in range(args.repeat):
+            for name, operation in [('calibration', calibration)] + list(operations.items()):
+                run = measure(operation, counts[name])
+                if name not in best:
+                    best[name] = run
+                else:
+                    # Fastest run, but the median from the least disturbed round
+                    best[name] = dict(
+                        run if run['p50_us'] < best[name]['p50_us'] else best[name],
+                        ops_per_sec=max(run['ops_per_sec'], best[name]['ops_per_sec'])
+                    )
+    calibration_us = best.pop('calibration')['p50_us']
+    return best, calibration_us
+
+
+def run_stubbed_cases(lambda_function, names: List[str], args: argparse.Namespace,
+                      sink) -> Dict[str, Any]:
+    """handler_full / handler_degraded: one run each with injected latency (and errors)."""
+    requests = load_order_requests()
+    events = [{'body': json.dumps(dict(request, use_bedrock=True))} for request in requests]
+    results: Dict[str, Any] = {}
+    for name in names:
+        degraded = name == 'handler_degraded'
+        stubs = install_stubs(
+            lambda_function, args.sagemaker_latency_ms, args.bedrock_latency_ms,
+            args.dynamodb_latency_ms, emit_metrics=True,
+            sagemaker_error_rate=args.sagemaker_error_rate if degraded else 0.0,
+            bedrock_error_rate=args.bedrock_error_rate if degraded else 0.0,
+            dynamodb_error_rate=args.dynamodb_error_rate if degraded else 0.0,
+            seed=args.seed
+        )
+        lambda_function.MODEL_BACKENDS = ['sagemaker', 'rules']
+        responses: List[Dict[str, Any]] = []
+
+        def handle(i: int) -> None:
+            responses.append(json.loads(
+                lambda_function.lambda_handler(events[i % len(events)], None)['body']
+            ))
+
+        with redirect_stdout(sink):
+            results[name] = measure(handle, max(10, int(ITERATIONS[name] * args.scale)))
+        total = len(responses)
+        results[name].update({
+            'rule_based_ratio': round(
+                sum(r.get('model_type') == 'rule_based' for r in responses) / total, 3),
+            # Bedrock failures only, not tiers routed to the rule-based explanation
+            'fallback_explanation_ratio': round(sum(
+                r.get('explanation', {}).get('generated_by') == 'rule_based_fallback'
+                and 'routing' not in r['explanation']
+                for r in responses
+            ) / total, 3),
+            'error_ratio': round(sum('error' in r for r in responses) / total, 3),
+            'audit_write_errors': stubs.dynamodb.Table(lambda_function.PREDICTIONS_TABLE).errors
+        })
+    return results
+
+
+def suite_config(args: argparse.Namespace) -> Dict[str, Any]:
+    """Settings that must match for two runs to be comparable."""
+    return {
+        'sagemaker_latency_ms': args.sagemaker_latency_ms,
+        'bedrock_latency_ms': args.bedrock_latency_ms,
+        'dynamodb_latency_ms': args.dynamodb_latency_ms,
+        'sagemaker_error_rate': args.sagemaker_error_rate,
+        'bedrock_error_rate': args.bedrock_error_rate,
+        'dynamodb_error_rate': args.dynamodb_error_rate,
+        'seed': args.seed
+    }
+
+
+def scaled_baseline(saved: Dict[str, Any], calibration_us: float) -> Dict[str, Any]:
+    """Baseline cases adjusted to this run's calibration speed (CPU-bound cases only)."""
+    ratio = saved['calibration_p50_us'] / calibration_us
+    cases = {}
+    for name, result in saved['cases'].items():
+        if name in CPU_CASES:
+            result = dict(result, ops_per_sec=result['ops_per_sec'] * ratio,
+                          p50_us=result['p50_us'] / ratio)
+        cases[name] = result
+    return cases
+
+
+def print_results(results: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    header = f"  {'case':<22}{'ops/sec':>12}{'p50 us':>12}{'p95 us':>12}{'p99 us':>12}"
+    print(header + ('   vs baseline (ops/sec, p50)' if baseline else ''))
+    for name, result in results.items():
+        line = (f"  {name:<22}{result['ops_per_sec']:>12,.1f}{result['p50_us']:>12,.2f}"
+                f"{result['p95_us']:>12,.2f}{result['p99_us']:>12,.2f}")
+        reference = (baseline or {}).get(name)
+        if reference:
+            line += (f"   {_change(result['ops_per_sec'], reference['ops_per_sec']):>8} "
+                     f"{_change(result['p50_us'], reference['p50_us']):>8}")
+        print(line)
+        if 'rule_based_ratio' in result:
+            print(f"  {'':<22}rule_based {result['rule_based_ratio']:.1%}   "
+                  f"fallback explanations {result['fallback_explanation_ratio']:.1%}   "
+                  f"errors {result['error_ratio']:.1%}   "
+                  f"failed audit writes {result['audit_write_errors']}")
+
+
+def _change(value: float, reference: float) -> str:
+    return f"{(value / reference - 1) * 100:+.1f}%" if reference else 'n/a'
+
+
+def regressions(results: Dict[str, Any], baseline: Dict[str, Any],
+                tolerance: float) -> List[Tuple[str, str]]:
+    """(case, message) for every case slower than the baseline beyond tolerance."""
+    found = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        if result['ops_per_sec'] < reference['ops_per_sec'] * (1 - tolerance):
+            found.append((name, f"{name}: {result['ops_per_sec']:,.1f} ops/sec vs "
+                                f"{reference['ops_per_sec']:,.1f} in the baseline"))
+        if result['p50_us'] > reference['p50_us'] * (1 + tolerance):
+            found.append((name, f"{name}: p50 {result['p50_us']:,.2f} us vs "
+                                f"{reference['p50_us']:,.2f} us in the baseline"))
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cases', default=','.join(ITERATIONS),
+                        help="comma-separated case names, or 'cpu' for the CPU-bound cases")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=15)
+    parser.add_argument('--sagemaker-latency-ms', type=float, default=20.0)
+    parser.add_argument('--bedrock-latency-ms', type=float, default=80.0)
+    parser.add_argument('--dynamodb-latency-ms', type=float, default=5.0)
+    parser.add_argument('--sagemaker-error-rate', type=float, default=0.2)
+    parser.add_argument('--bedrock-error-rate', type=float, default=0.3)
+    parser.add_argument('--dynamodb-error-rate', type=float, default=0.05)
+    args = parser.parse_args()
+    names = CPU_CASES if args.cases == 'cpu' else [n.strip() for n in args.cases.split(',')]
+    unknown = [name for name in names if name not in ITERATIONS]
+    if unknown:
+        sys.exit(f"Unknown case(s): {', '.join(unknown)} (choose from {', '.join(ITERATIONS)})")
+
+    os.environ['MODEL_BACKENDS'] = 'sagemaker,rules'
+    os.environ['EXPLANATION_CACHE_ENABLED'] = 'false'
+    os.environ['IDEMPOTENCY_ENABLED'] = 'false'
+    import lambda_function
+
+    saved = None
+    if args.check:
+        if not os.path.exists(args.baseline):
+            sys.exit(f"No baseline at {args.baseline} (run with --save-baseline first)")
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        if saved.get('config') != suite_config(args):
+            sys.exit(f"Baseline was recorded with different settings: {saved.get('config')}")
+
+    # Every request does the full work: no explanation or idempotency replays
+    lambda_function.EXPLANATION_CACHE = None
+    lambda_function.IDEMPOTENCY_CACHE = None
+    print(f"Benchmark suite: {', '.join(names)} (Python {platform.python_version()})")
+    with open(os.devnull, 'w') as sink:
+        results, calibration_us = run_cpu_cases(
+            lambda_function, [name for name in names if name in CPU_CASES], args, sink
+        )
+        results.update(run_stubbed_cases(
+            lambda_function, [name for name in names if name not in CPU_CASES], args, sink
+        ))
+    print(f"  calibration p50 {calibration_us:.2f} us")
+    baseline = None
+    if saved is not None:
+        baseline = scaled_baseline(saved, calibration_us)
+        print(f"  baseline from {saved['created']} ({saved['machine']}, Python {saved['python']}) "
+              f"scaled by {saved['calibration_p50_us'] / calibration_us:.2f}")
+    print_results({name: results[name] for name in names}, baseline)
+
+    if args.save_baseline:
+        saved = {'cases': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                saved = json.load(f)
+            if saved.get('config') != suite_config(args):
+                saved['cases'] = {}
+        # Cases kept from an earlier save are rescaled to this run's calibration
+        if saved.get('calibration_p50_us'):
+            saved['cases'] = scaled_baseline(saved, calibration_us)
+        saved['cases'].update(results)
+        saved.update({
+            'version': BASELINE_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': f"{platform.system()} {platform.machine()}",
+            'config': suite_config(args),
+            'calibration_p50_us': calibration_us
+        })
+        with open(args.baseline, 'w') as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if baseline is not None:
+        found = regressions(results, baseline, args.tolerance)
+        # A slow spell on a shared machine can hit one run; CPU-bound cases
+        # only count as regressed if a second, fresh measurement agrees
+        retry = sorted({name for name, _ in found if name in CPU_CASES})
+        if retry:
+            print(f"\nRe-measuring {', '.join(retry)} to confirm")
+            with open(os.devnull, 'w') as sink:
+                rerun, calibration_us = run_cpu_cases(lambda_function, retry, args, sink)
+            confirmed = regressions(rerun, scaled_baseline(saved, calibration_us), args.tolerance)
+            found = [item for item in found if item[0] not in CPU_CASES] + confirmed
+        if found:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for _, line in found:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Parity and latency check: flat-array tree scorer vs XGBoost predict_proba.
+
+Trains a train.py-shaped classifier on the sample orders (synthetic
+labels), exports it with sagemaker-training/export_trees.py and compares
+tree_model.TreeModel against XGBClassifier.predict_proba on the held-out
+split - row path and NumPy batch path. Then reports:
+    - cold import time of tree_model (with and without NumPy installed)
+      vs xgboost + numpy, each in fresh interpreters
+    - model load time of model_trees.json vs model.json
+    - per-row latency of both scorers and batch throughput
+
+Usage:
+    python benchmarks/bench_tree_model.py [--rows 2000] [--tolerance 1e-6]
+
+Requires xgboost, scikit-learn and numpy (for the reference model only).
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'sagemaker-training'))
+
+from bench_model_backends import percentile, train_sample_model  # noqa: E402
+from export_trees import export_trees  # noqa: E402
+from feature_pipeline import FEATURE_NAMES  # noqa: E402
+from tree_model import TreeModel  # noqa: E402
+
+
+def cold_import_ms(statement: str, repeats: int = 5) -> float:
+    """Median wall time of `statement` in a fresh interpreter."""
+    code = (
+        "import time; started = time.perf_counter(); "
+        f"{statement}; print((time.perf_counter() - started) * 1000)"
+    )
+    samples = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return sorted(samples)[len(samples) // 2]
+
+
+def time_per_call_us(fn: Callable[[], object], count: int) -> List[float]:
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000, help='rows timed per scorer')
+    parser.add_argument('--tolerance', type=float, default=1e-6)
+    args = parser.parse_args()
+
+    import numpy as np
+    import xgboost as xgb
+
+    with tempfile.TemporaryDirectory() as workdir:
+        model_path, classifier, x_test = train_sample_model(workdir)
+        trees_path = os.path.join(workdir, 'model_trees.json')
+        export_trees(model_path, trees_path)
+
+        # Some rows with missing features exercise the default branches
+        x_test = x_test.astype(np.float32)
+        x_test[::7, 6:] = np.nan
+
+        started = time.perf_counter()
+        tree_model = TreeModel.load(trees_path)
+        trees_load_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        booster = xgb.Booster()
+        booster.load_model(model_path)
+        booster_load_ms = (time.perf_counter() - started) * 1000
+
+        expected = classifier.predict_proba(x_test)[:, 1]
+        rows = [
+            {name: float(value) for name, value in zip(FEATURE_NAMES, row)
+             if not np.isnan(value)}
+            for row in x_test
+        ]
+        row_scores = np.asarray(tree_model.predict(rows, use_numpy=False))
+        batch_scores = tree_model.predict_matrix_numpy(x_test)
+        row_diff = float(np.max(np.abs(row_scores - expected)))
+        batch_diff = float(np.max(np.abs(batch_scores - expected)))
+        print(f"\nParity vs predict_proba on {len(rows)} held-out rows "
+              f"({tree_model.n_trees} trees, depth {tree_model.max_depth}):")
+        print(f"  row path   max |diff| {row_diff:.2e}")
+        print(f"  numpy path max |diff| {batch_diff:.2e}")
+        if max(row_diff, batch_diff) > args.tolerance:
+            sys.exit(f"Parity check failed (tolerance {args.tolerance:g})")
+
+        print("\nCold import (median of 5 fresh interpreters):")
+        # sys.modules['numpy'] = None makes the import fail, as in a Lambda without a layer
+        stdlib_ms = cold_import_ms("import sys; sys.modules['numpy'] = None; import tree_model")
+        print(f"  tree_model (stdlib)  {stdlib_ms:8.1f} ms")
+        print(f"  tree_model + numpy   {cold_import_ms('import tree_model'):8.1f} ms")
+        print(f"  numpy + xgboost      {cold_import_ms('import numpy, xgboost'):8.1f} ms")
+        print("Model load:")
+        print(f"  model_trees.json     {trees_load_ms:8.1f} ms")
+        print(f"  model.json (Booster) {booster_load_ms:8.1f} ms")
+
+        count = min(args.rows, len(rows))
+        print(f"\nPer-row latency over {count} single-row calls:")
+        for label, fn_for in (
+            ('tree_model row', lambda i: lambda: tree_model.predict_row(rows[i])),
+            ('xgboost Booster', lambda i: lambda: booster.predict(
+                xgb.DMatrix(x_test[i:i + 1], feature_names=FEATURE_NAMES)))
+        ):
+            samples = []
+            for i in range(count):
+                samples.extend(time_per_call_us(fn_for(i % len(rows)), 1))
+            samples.sort()
+            print(f"  {label:<16} p50 {percentile(samples, 50):8.1f} us   "
+                  f"p99 {percentile(samples, 99):8.1f} us")
+
+        print(f"\nBatch of {len(rows)} rows:")
+        for label, fn in (
+            ('tree_model row', lambda: tree_model.predict(rows, use_numpy=False)),
+            ('tree_model numpy', lambda: tree_model.predict_matrix_numpy(x_test)),
+            ('xgboost Booster', lambda: booster.predict(
+                xgb.DMatrix(x_test, feature_names=FEATURE_NAMES)))
+        ):
+            elapsed_us = time_per_call_us(fn, 5)[2]
+            print(f"  {label:<16} {elapsed_us / 1000:8.2f} ms   "
+                  f"{elapsed_us / len(rows):8.2f} us/row")
+
+
+if __name__ == '__main__':
+    main()
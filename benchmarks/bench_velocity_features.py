@@ -0,0 +1,191 @@
+"""
+Correctness and cost of the sliding-window velocity features.
+
+1. Parity: replays sample-data orders/returns into a VelocityStore and,
+   for every customer at several scoring dates, compares returns in
+   1/7/30 days, the order value EWMA and the median days_to_return with a
+   full recount over the customer's history (the naive implementation).
+2. Scaling: per-query cost of the recount vs the window as one customer's
+   history grows; window cost stays flat.
+3. Memory: Python heap per window (tracemalloc over --keys synthetic
+   customers), serialized record size, to_bytes/from_bytes round trip
+   time, and idle-key expiry.
+
+Usage:
+    python benchmarks/bench_velocity_features.py [--keys 100000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sample_data import SAMPLE_DATA_DIR  # noqa: E402
+from stream_consumer import event_date, event_type, events_from_csv  # noqa: E402
+from velocity_features import (  # noqa: E402
+    DAYS_TO_RETURN_BINS, EWMA_ALPHA, VELOCITY_RECORD_SIZE, VelocityStore, VelocityWindow,
+    day_number
+)
+
+
+def recount(history: List[Dict[str, Any]], today: int) -> Dict[str, Any]:
+    """Velocity features by scanning the customer's whole history."""
+    returns = [day_number(event_date(e)) for e in history if event_type(e) == 'return']
+    ewma: Optional[float] = None
+    for item in history:
+        if event_type(item) == 'order':
+            amount = float(item['amount'])
+            ewma = amount if ewma is None else ewma + EWMA_ALPHA * (amount - ewma)
+    days = sorted(min(max(int(e['days_to_return']), 0), DAYS_TO_RETURN_BINS - 1)
+                  for e in history if event_type(e) == 'return')
+    return {
+        'returns_1d': sum(today - 1 < day <= today for day in returns),
+        'returns_7d': sum(today - 7 < day <= today for day in returns),
+        'returns_30d': sum(today - 30 < day <= today for day in returns),
+        'order_value_ewma': round(ewma, 2) if ewma is not None else None,
+        'median_days_to_return': float(days[(len(days) - 1) // 2]) if days else None
+    }
+
+
+def replay(store: VelocityStore, events: List[Dict[str, Any]]) -> None:
+    for item in events:
+        day = day_number(event_date(item))
+        if event_type(item) == 'order':
+            store.record_order(item['customer_id'], day, float(item['amount']))
+        else:
+            store.record_return(item['customer_id'], day, item['days_to_return'])
+
+
+def check_parity(events: List[Dict[str, Any]]) -> int:
+    """Replay day by day and compare every active customer at each day's end."""
+    by_customer: Dict[str, List[Dict[str, Any]]] = {}
+    store = VelocityStore(idle_days=10 ** 6)
+    mismatches = checks = 0
+    days = sorted({event_date(e) for e in events})
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    for item in events:
+        by_day.setdefault(event_date(item), []).append(item)
+    for index, day in enumerate(days):
+        replay(store, by_day[day])
+        for item in by_day[day]:
+            by_customer.setdefault(item['customer_id'], []).append(item)
+        if index % 7:
+            continue
+        today = day_number(day)
+        for customer_id, history in by_customer.items():
+            expected = recount(history, today)
+            actual = store.get(customer_id).features(today)
+            actual['order_value_ewma'] = (round(actual['order_value_ewma'], 0)
+                                          if actual['order_value_ewma'] is not None else None)
+            if expected['order_value_ewma'] is not None:
+                expected['order_value_ewma'] = round(expected['order_value_ewma'], 0)
+            checks += 1
+            if any(actual[name] != value for name, value in expected.items()):
+                mismatches += 1
+    print(f"  {checks} (customer, day) checks, {mismatches} differ")
+    return mismatches
+
+
+def scaling(sizes: List[int]) -> None:
+    rng = random.Random(5)
+    start = day_number('2026-01-01')
+    for size in sizes:
+        history = []
+        window = VelocityWindow(start)
+        for i in range(size):
+            day = start + i * 365 // max(size, 1) // 4
+            if rng.random() < 0.3:
+                item = {'event_type': 'return', 'return_date': _iso(day),
+                        'days_to_return': rng.randint(1, 14), 'customer_id': 'C'}
+                window.add_return(day, item['days_to_return'])
+            else:
+                item = {'event_type': 'order', 'order_date': _iso(day),
+                        'amount': rng.uniform(300, 50000), 'customer_id': 'C'}
+                window.add_order(day, item['amount'])
+            history.append(item)
+        today = start + 100
+        naive_us = _time_us(lambda: recount(history, today), 3 if size > 10000 else 20)
+        window_us = _time_us(lambda: window.features(today), 200)
+        print(f"  history {size:>7,} events   recount {naive_us:12,.1f} us   "
+              f"window {window_us:6.1f} us")
+
+
+def _iso(day: int) -> str:
+    return date.fromordinal(day).isoformat()
+
+
+def _time_us(fn, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def memory(keys: int) -> None:
+    rng = random.Random(9)
+    start = day_number('2026-01-01')
+    tracemalloc.start()
+    store = VelocityStore(idle_days=365)
+    for i in range(keys):
+        customer_id = f"CUST{i:09d}"
+        day = start + rng.randint(0, 90)
+        store.record_order(customer_id, day, rng.uniform(300, 50000))
+        if rng.random() < 0.3:
+            store.record_return(customer_id, day, rng.randint(1, 14))
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"  {keys:,} windows: {allocated / keys:6.0f} bytes of heap per key, "
+          f"{VELOCITY_RECORD_SIZE} bytes serialized")
+
+    window = store.get('CUST000000001')
+    blob = window.to_bytes()
+    encode_us = _time_us(window.to_bytes, 2000)
+    decode_us = _time_us(lambda: VelocityWindow.from_bytes(blob), 2000)
+    decoded = VelocityWindow.from_bytes(blob).features(start + 60)
+    original = window.features(start + 60)
+    # The EWMA is stored as float32
+    same = all(
+        abs(decoded[name] - value) < 0.01 if name == 'order_value_ewma' else decoded[name] == value
+        for name, value in original.items()
+    )
+    print(f"  to_bytes {encode_us:.2f} us   from_bytes {decode_us:.2f} us   "
+          f"round trip equal: {same}")
+    if not same:
+        sys.exit("Velocity window serialization round trip failed")
+
+    before = len(store)
+    store.idle_days = 30
+    store.record_order('CUST-late', start + 200, 1000.0)
+    print(f"  event 200 days later expires idle keys: {before:,} -> {len(store):,} windows "
+          f"({store.expired:,} expired)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--keys', type=int, default=100000)
+    args = parser.parse_args()
+
+    events = events_from_csv(SAMPLE_DATA_DIR)
+    print(f"Parity vs full-history recount ({len(events)} sample events, weekly checkpoints):")
+    if check_parity(events):
+        sys.exit("Velocity window parity check failed")
+
+    print("\nPer-query cost as one customer's history grows:")
+    scaling([100, 1000, 10000, 100000])
+
+    print("\nMemory and serialization:")
+    memory(args.keys)
+
+
+if __name__ == '__main__':
+    main()
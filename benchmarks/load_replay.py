@@ -0,0 +1,532 @@
+"""
+Open-loop load replay against lambda_handler (or any HTTP endpoint).
+
+Replays sample-data/orders.csv (joined with customer/product return
+rates) at a fixed target rate to see how the scoring path behaves at
+festival-season load, optionally with SageMaker/Bedrock/DynamoDB degraded
+part-way through the run.
+
+Open loop: request i is due at start + i / rate whether or not earlier
+requests have finished. Worker threads pick requests up from a queue, so
+when the system falls behind, requests wait and that wait is part of
+their latency. Latency is measured from the time a request was due, not
+from when a worker got to it (coordinated-omission correction); the
+uncorrected service time is reported next to it to show the difference.
+
+Targets:
+    - in process (default): lambda_handler with aws_stubs clients
+      (injected latency / error rates, changeable mid-run with --phase)
+    - --url: POST each order to an HTTP endpoint (keep-alive connection
+      per worker), e.g. a local server wrapping lambda_handler or the
+      deployed API Gateway stage
+
+Per run: achieved rate, corrected and uncorrected p50/p90/p99/p99.9/max,
+error rate, model fallback ratio (rule_based although an ML backend is
+configured), explanation fallback ratio (rule_based_fallback although
+Bedrock was requested) and a per-second timeline. Results go to
+<output>.json and <output>.html; `report` renders several JSON runs into
+one HTML page for comparison.
+
+One Python process serialises lambda_handler's CPU work on the GIL;
+--processes splits the rate over several processes (each with its own
+lambda_function and stubs) on multi-core machines.
+
+Usage:
+    python benchmarks/load_replay.py run [--rate 1000] [--duration 15] [--warmup 2]
+        [--workers 200] [--processes 1] [--output load_replay]
+        [--sagemaker-latency-ms 20] [--bedrock-latency-ms 300] [--dynamodb-latency-ms 5]
+        [--sagemaker-error-rate 0] [--bedrock-error-rate 0] [--dynamodb-error-rate 0]
+        [--no-explanation-cache] [--phase 5:sagemaker.error_rate=0.5] [--url URL]
+    python benchmarks/load_replay.py report run1.json run2.json [-o compare.html]
+
+Requires boto3 (client construction only) for the in-process target.
+"""
+
+import argparse
+import html
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import platform
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_stubs import install_stubs  # noqa: E402
+from bench_model_backends import percentile  # noqa: E402
+from sample_data import load_order_requests  # noqa: E402
+
+REPORT_VERSION = 1
+PERCENTILES = [50, 90, 99, 99.9]
+# Log-spaced histogram buckets: 10 per decade from 10 us to 100 s
+BUCKETS_PER_DECADE = 10
+BUCKET_MIN_US = 10.0
+
+# Result flags
+ERROR = 1
+MODEL_FALLBACK = 2
+EXPLANATION_FALLBACK = 4
+
+# (due_ns, start_ns, end_ns, flags) relative to the run start
+Record = Tuple[int, int, int, int]
+
+
+def parse_phase(text: str) -> Tuple[float, List[Tuple[str, str, float]]]:
+    """'10:sagemaker.error_rate=0.5,bedrock.latency_ms=800' -> (10.0, [(client, attr, value)])."""
+    at, _, settings = text.partition(':')
+    changes = []
+    for setting in settings.split(','):
+        target, _, value = setting.partition('=')
+        client, _, attribute = target.strip().partition('.')
+        if client not in ('sagemaker', 'bedrock', 'dynamodb') or \
+                attribute not in ('latency_ms', 'error_rate'):
+            raise argparse.ArgumentTypeError(f"Unsupported phase setting: {setting}")
+        changes.append((client, attribute, float(value)))
+    return float(at), changes
+
+
+def apply_phase(stubs, changes: List[Tuple[str, str, float]]) -> None:
+    for client, attribute, value in changes:
+        if client == 'dynamodb':
+            setattr(stubs.dynamodb, attribute, value)
+            for table in stubs.dynamodb.tables.values():
+                setattr(table, attribute, value)
+        else:
+            setattr(getattr(stubs, client), attribute, value)
+
+
+def classify(status: int, body: Any, ml_backend: bool) -> int:
+    """Result flags for one response."""
+    if status != 200 or not isinstance(body, dict) or 'error' in body:
+        return ERROR
+    flags = 0
+    if ml_backend and body.get('model_type') == 'rule_based':
+        flags |= MODEL_FALLBACK
+    explanation = body.get('explanation') or {}
+    # Bedrock failures only: tiers routed to the rule-based text carry "routing"
+    if explanation.get('generated_by') == 'rule_based_fallback' and \
+            'routing' not in explanation and body.get('explanation_status') is None:
+        flags |= EXPLANATION_FALLBACK
+    return flags
+
+
+class InProcessTarget:
+    """lambda_handler with stubbed AWS clients."""
+
+    def __init__(self, args: argparse.Namespace):
+        os.environ.setdefault('IDEMPOTENCY_ENABLED', 'false')
+        if args.no_explanation_cache:
+            os.environ['EXPLANATION_CACHE_ENABLED'] = 'false'
+        import lambda_function
+        self.lambda_function = lambda_function
+        self.stubs = install_stubs(
+            lambda_function, args.sagemaker_latency_ms, args.bedrock_latency_ms,
+            args.dynamodb_latency_ms, sagemaker_error_rate=args.sagemaker_error_rate,
+            bedrock_error_rate=args.bedrock_error_rate,
+            dynamodb_error_rate=args.dynamodb_error_rate, seed=args.seed
+        )
+        self.ml_backend = any(b in ('local', 'sagemaker') for b in lambda_function.MODEL_BACKENDS)
+
+    def connect(self) -> None:
+        return None
+
+    def call(self, connection: None, body: str) -> int:
+        response = self.lambda_function.lambda_handler({'body': body}, None)
+        return classify(response['statusCode'], json.loads(response['body']), self.ml_backend)
+
+
+class HttpTarget:
+    """POST to an HTTP endpoint; one keep-alive connection per worker."""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.netloc
+        self.path = parts.path or '/'
+        self.stubs = None
+        self.ml_backend = True
+
+    def connect(self) -> http.client.HTTPConnection:
+        factory = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return factory(self.host, timeout=30)
+
+    def call(self, connection: http.client.HTTPConnection, body: str) -> int:
+        try:
+            connection.request('POST', self.path, body=body,
+                               headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            payload = response.read()
+            return classify(response.status, json.loads(payload or b'null'), self.ml_backend)
+        except Exception:
+            connection.close()
+            return ERROR
+
+
+def run_shard(args: argparse.Namespace, shard: int, start_wall: float) -> Dict[str, Any]:
+    """
+    Run this process's share of the schedule.
+
+    Requests shard, shard + processes, ... are due at start + i / rate
+    (warmup included); the shared wall-clock start lines shards up.
+    """
+    target = HttpTarget(args.url) if args.url else InProcessTarget(args)
+    orders = load_order_requests()
+    total = int(args.rate * (args.warmup + args.duration))
+    interval_ns = 1e9 / args.rate
+    jobs: 'queue.Queue[Optional[Tuple[int, int]]]' = queue.Queue()
+    records: List[List[Record]] = [[] for _ in range(args.workers)]
+
+    # Line up on the shared wall-clock start, then use the monotonic clock
+    time.sleep(max(0.0, start_wall - time.time()))
+    origin = time.perf_counter_ns()
+
+    def worker(index: int) -> None:
+        connection = target.connect()
+        own = records[index]
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            number, due = job
+            order = orders[number % len(orders)]
+            body = json.dumps(dict(order, order_id=f"{order['order_id']}-{number}"))
+            started = time.perf_counter_ns() - origin
+            try:
+                flags = target.call(connection, body)
+            except Exception:
+                flags = ERROR
+            own.append((due, started, time.perf_counter_ns() - origin, flags))
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True)
+               for i in range(args.workers)]
+    for thread in threads:
+        thread.start()
+
+    timers = []
+    if target.stubs is not None:
+        for at, changes in args.phase:
+            timer = threading.Timer(max(0.0, args.warmup + at - 0.001),
+                                    apply_phase, (target.stubs, changes))
+            timer.daemon = True
+            timer.start()
+            timers.append(timer)
+
+    # Dispatcher: hand out each request when it is due; lag is how late that was
+    max_lag_ns = 0
+    for number in range(shard, total, args.processes):
+        due = int(number * interval_ns)
+        now = time.perf_counter_ns() - origin
+        if due > now:
+            time.sleep((due - now) / 1e9)
+            now = time.perf_counter_ns() - origin
+        max_lag_ns = max(max_lag_ns, now - due)
+        jobs.put((number, due))
+    for _ in threads:
+        jobs.put(None)
+    for thread in threads:
+        thread.join()
+
+    warmup_ns = int(args.warmup * 1e9)
+    merged = [record for own in records for record in own if record[0] >= warmup_ns]
+    return {'records': merged, 'dispatch_max_lag_ms': max_lag_ns / 1e6}
+
+
+def _run_shard_entry(payload: Tuple[argparse.Namespace, int, float]) -> Dict[str, Any]:
+    return run_shard(*payload)
+
+
+def histogram(sorted_us: List[float]) -> List[List[float]]:
+    """[[bucket upper bound us, count], ...] on log-spaced buckets (non-empty only)."""
+    counts: Dict[int, int] = {}
+    for value in sorted_us:
+        index = max(0, math.ceil(BUCKETS_PER_DECADE * math.log10(max(value, 1e-3) / BUCKET_MIN_US)))
+        counts[index] = counts.get(index, 0) + 1
+    return [[round(BUCKET_MIN_US * 10 ** (index / BUCKETS_PER_DECADE), 1), count]
+            for index, count in sorted(counts.items())]
+
+
+def latency_summary(sorted_us: List[float]) -> Dict[str, Any]:
+    summary = {f"p{pct:g}_ms": round(percentile(sorted_us, pct) / 1000, 3) for pct in PERCENTILES}
+    summary['max_ms'] = round(sorted_us[-1] / 1000, 3) if sorted_us else 0.0
+    summary['mean_ms'] = round(sum(sorted_us) / len(sorted_us) / 1000, 3) if sorted_us else 0.0
+    return summary
+
+
+def summarize(records: List[Record], args: argparse.Namespace,
+              dispatch_lag_ms: float) -> Dict[str, Any]:
+    """JSON report for one run (warmup already excluded)."""
+    warmup_ns = int(args.warmup * 1e9)
+    corrected = sorted((end - due) / 1000 for due, _, end, _ in records)
+    service = sorted((end - start) / 1000 for _, start, end, _ in records)
+    count = len(records)
+    first_due = min((r[0] for r in records), default=warmup_ns)
+    last_end = max((r[2] for r in records), default=warmup_ns)
+
+    timeline = []
+    by_second: Dict[int, List[Record]] = {}
+    for record in records:
+        by_second.setdefault((record[0] - warmup_ns) // 1_000_000_000, []).append(record)
+    for second in sorted(by_second):
+        bucket = by_second[second]
+        latencies = sorted((end - due) / 1000 for due, _, end, _ in bucket)
+        timeline.append({
+            'second': second,
+            'requests': len(bucket),
+            'p50_ms': round(percentile(latencies, 50) / 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) / 1000, 3),
+            'errors': sum(1 for r in bucket if r[3] & ERROR),
+            'model_fallbacks': sum(1 for r in bucket if r[3] & MODEL_FALLBACK),
+            'explanation_fallbacks': sum(1 for r in bucket if r[3] & EXPLANATION_FALLBACK)
+        })
+
+    def ratio(flag: int) -> float:
+        return round(sum(1 for r in records if r[3] & flag) / count, 4) if count else 0.0
+
+    return {
+        'version': REPORT_VERSION,
+        'label': args.label or f"{args.rate:g} rps",
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'machine': f"{platform.system()} {platform.machine()}, Python {platform.python_version()}",
+        'config': {
+            'target': args.url or 'lambda_handler (in process)',
+            'rate': args.rate, 'duration_s': args.duration, 'warmup_s': args.warmup,
+            'workers': args.workers, 'processes': args.processes,
+            'sagemaker_latency_ms': args.sagemaker_latency_ms,
+            'bedrock_latency_ms': args.bedrock_latency_ms,
+            'dynamodb_latency_ms': args.dynamodb_latency_ms,
+            'sagemaker_error_rate': args.sagemaker_error_rate,
+            'bedrock_error_rate': args.bedrock_error_rate,
+            'dynamodb_error_rate': args.dynamodb_error_rate,
+            'explanation_cache': not args.no_explanation_cache,
+            'phases': [{'at_s': at, 'set': {f"{c}.{a}": v for c, a, v in changes}}
+                       for at, changes in args.phase]
+        },
+        'requests': count,
+        'achieved_rps': round(count / ((last_end - first_due) / 1e9), 1) if count else 0.0,
+        'dispatch_max_lag_ms': round(dispatch_lag_ms, 3),
+        'error_ratio': ratio(ERROR),
+        'model_fallback_ratio': ratio(MODEL_FALLBACK),
+        'explanation_fallback_ratio': ratio(EXPLANATION_FALLBACK),
+        'latency': latency_summary(corrected),
+        'service_time': latency_summary(service),
+        'histogram_us': histogram(corrected),
+        'timeline': timeline
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    start_wall = time.time() + 1.0 + 0.5 * args.processes
+    if args.processes == 1:
+        shards = [run_shard(args, 0, start_wall)]
+    else:
+        # Fork so every shard gets its own lambda_function and stub clients
+        context = multiprocessing.get_context('fork')
+        with context.Pool(args.processes) as pool:
+            shards = pool.map(_run_shard_entry,
+                              [(args, shard, start_wall) for shard in range(args.processes)])
+    records = [record for shard in shards for record in shard['records']]
+    return summarize(records, args, max(shard['dispatch_max_lag_ms'] for shard in shards))
+
+
+def print_summary(report: Dict[str, Any]) -> None:
+    latency, service = report['latency'], report['service_time']
+    print(f"{report['label']}: {report['requests']:,} requests, achieved "
+          f"{report['achieved_rps']:,.1f} rps (dispatcher max lag "
+          f"{report['dispatch_max_lag_ms']:.1f} ms)")
+    for name, summary in (('corrected', latency), ('service', service)):
+        print(f"  {name:<10}" + '  '.join(
+            f"{key[:-3]} {value:,.1f}" for key, value in summary.items()
+        ) + '  (ms)')
+    print(f"  errors {report['error_ratio']:.2%}   model fallback "
+          f"{report['model_fallback_ratio']:.2%}   explanation fallback "
+          f"{report['explanation_fallback_ratio']:.2%}")
+
+
+# --- HTML report -------------------------------------------------------------
+
+COLORS = ['#1f77b4', '#d62728', '#2ca02c', '#ff7f0e', '#9467bd', '#8c564b']
+
+
+def _svg_lines(series: List[Tuple[str, List[Tuple[float, float]]]], x_label: str,
+               y_label: str, log_x: bool = False, x_ticks: Optional[List[Tuple[float, str]]] = None
+               ) -> str:
+    """Small dependency-free SVG line chart."""
+    width, height, left, bottom = 720, 280, 60, 40
+    points = [point for _, values in series for point in values]
+    if not points:
+        return '<p>No data</p>'
+    xs = [point[0] for point in points]
+    y_max = max(point[1] for point in points) * 1.05 or 1.0
+    x_min, x_max = min(xs), max(xs)
+    if x_max == x_min:
+        x_max = x_min + 1
+
+    def sx(x: float) -> float:
+        return left + (width - left - 10) * (x - x_min) / (x_max - x_min)
+
+    def sy(y: float) -> float:
+        return height - bottom - (height - bottom - 10) * y / y_max
+
+    parts = [f'<svg width="{width}" height="{height}" xmlns="http://www.w3.org/2000/svg" '
+             f'font-family="sans-serif" font-size="11">',
+             f'<line x1="{left}" y1="{height - bottom}" x2="{width - 10}" '
+             f'y2="{height - bottom}" stroke="#999"/>',
+             f'<line x1="{left}" y1="10" x2="{left}" y2="{height - bottom}" stroke="#999"/>']
+    for step in range(5):
+        y = y_max * step / 4
+        parts.append(f'<text x="{left - 5}" y="{sy(y) + 4:.1f}" text-anchor="end">{y:,.1f}</text>')
+        parts.append(f'<line x1="{left}" y1="{sy(y):.1f}" x2="{width - 10}" y2="{sy(y):.1f}" '
+                     f'stroke="#eee"/>')
+    for x, label in x_ticks or [(x_min + (x_max - x_min) * i / 5, None) for i in range(6)]:
+        parts.append(f'<text x="{sx(x):.1f}" y="{height - bottom + 15}" text-anchor="middle">'
+                     f'{label if label is not None else f"{x:,.0f}"}</text>')
+    parts.append(f'<text x="{(width + left) / 2}" y="{height - 5}" text-anchor="middle">'
+                 f'{html.escape(x_label)}</text>')
+    middle = (height - bottom) / 2
+    parts.append(f'<text x="12" y="{middle}" text-anchor="middle" '
+                 f'transform="rotate(-90 12 {middle})">{html.escape(y_label)}</text>')
+    for index, (name, values) in enumerate(series):
+        color = COLORS[index % len(COLORS)]
+        path = ' '.join(f"{sx(x):.1f},{sy(y):.1f}" for x, y in values)
+        parts.append(f'<polyline fill="none" stroke="{color}" stroke-width="1.5" points="{path}"/>')
+        parts.append(f'<text x="{width - 15}" y="{20 + 14 * index}" text-anchor="end" '
+                     f'fill="{color}">{html.escape(name)}</text>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def _percentile_spectrum(report: Dict[str, Any]) -> List[Tuple[float, float]]:
+    """(log10(1 / (1 - q)), latency ms) from the histogram, HdrHistogram style."""
+    total = sum(count for _, count in report['histogram_us'])
+    seen = 0
+    points = []
+    for upper_us, count in report['histogram_us']:
+        seen += count
+        quantile = min(seen / total, 0.99999)
+        points.append((math.log10(1 / (1 - quantile)), upper_us / 1000))
+    return points
+
+
+def render_html(reports: List[Dict[str, Any]]) -> str:
+    rows = []
+    for report in reports:
+        latency = report['latency']
+        rows.append(
+            '<tr>' + ''.join(f'<td>{cell}</td>' for cell in [
+                html.escape(report['label']), f"{report['config']['rate']:,.0f}",
+                f"{report['achieved_rps']:,.1f}", f"{report['requests']:,}",
+                *(f"{latency[key]:,.1f}" for key in
+                  ('p50_ms', 'p90_ms', 'p99_ms', 'p99.9_ms', 'max_ms')),
+                f"{report['service_time']['p99_ms']:,.1f}",
+                f"{report['error_ratio']:.2%}", f"{report['model_fallback_ratio']:.2%}",
+                f"{report['explanation_fallback_ratio']:.2%}"
+            ]) + '</tr>'
+        )
+    spectrum = _svg_lines(
+        [(report['label'], _percentile_spectrum(report)) for report in reports],
+        'percentile', 'latency (ms, corrected)',
+        x_ticks=[(0, '0%'), (1, '90%'), (2, '99%'), (3, '99.9%'), (4, '99.99%')]
+    )
+    timeline_p99 = _svg_lines(
+        [(report['label'], [(t['second'], t['p99_ms']) for t in report['timeline']])
+         for report in reports], 'second', 'p99 latency (ms, corrected)'
+    )
+    timeline_fallback = _svg_lines(
+        [(f"{report['label']} {kind}", [
+            (t['second'], 100 * t[field] / max(t['requests'], 1)) for t in report['timeline']
+        ]) for report in reports for kind, field in (
+            ('errors', 'errors'), ('model fallback', 'model_fallbacks'),
+            ('explanation fallback', 'explanation_fallbacks'))],
+        'second', '% of requests'
+    )
+    configs = ''.join(
+        f"<h3>{html.escape(report['label'])}</h3><p>{html.escape(report['created'])} - "
+        f"{html.escape(report['machine'])}</p><pre>"
+        f"{html.escape(json.dumps(report['config'], indent=2))}</pre>"
+        for report in reports
+    )
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Load replay report</title>
+<style>
+body {{ font-family: sans-serif; margin: 24px; color: #222; }}
+table {{ border-collapse: collapse; }}
+td, th {{ border: 1px solid #ccc; padding: 4px 8px; text-align: right; }}
+td:first-child, th:first-child {{ text-align: left; }}
+pre {{ background: #f6f6f6; padding: 8px; display: inline-block; }}
+</style></head><body>
+<h1>Load replay report</h1>
+<p>Latency is measured from the time each request was due (coordinated-omission
+corrected); "service p99" is measured from when a worker picked the request up.</p>
+<table><tr><th>run</th><th>target rps</th><th>achieved rps</th><th>requests</th>
+<th>p50 ms</th><th>p90 ms</th><th>p99 ms</th><th>p99.9 ms</th><th>max ms</th>
+<th>service p99 ms</th><th>errors</th><th>model fallback</th><th>explanation fallback</th></tr>
+{''.join(rows)}</table>
+<h2>Latency by percentile</h2>{spectrum}
+<h2>p99 over time</h2>{timeline_p99}
+<h2>Errors and fallbacks over time</h2>{timeline_fallback}
+<h2>Configurations</h2>{configs}
+</body></html>
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='replay orders at a target rate')
+    run_parser.add_argument('--rate', type=float, default=1000.0, help='requests per second')
+    run_parser.add_argument('--duration', type=float, default=15.0, help='measured seconds')
+    run_parser.add_argument('--warmup', type=float, default=2.0, help='unmeasured seconds first')
+    run_parser.add_argument('--workers', type=int, default=200, help='threads per process')
+    run_parser.add_argument('--processes', type=int, default=1)
+    run_parser.add_argument('--url', help='POST to this endpoint instead of lambda_handler')
+    run_parser.add_argument('--label')
+    run_parser.add_argument('--output', default='load_replay')
+    run_parser.add_argument('--seed', type=int, default=16)
+    run_parser.add_argument('--sagemaker-latency-ms', type=float, default=20.0)
+    run_parser.add_argument('--bedrock-latency-ms', type=float, default=300.0)
+    run_parser.add_argument('--dynamodb-latency-ms', type=float, default=5.0)
+    run_parser.add_argument('--sagemaker-error-rate', type=float, default=0.0)
+    run_parser.add_argument('--bedrock-error-rate', type=float, default=0.0)
+    run_parser.add_argument('--dynamodb-error-rate', type=float, default=0.0)
+    run_parser.add_argument('--no-explanation-cache', action='store_true')
+    run_parser.add_argument('--phase', type=parse_phase, action='append', default=[],
+                            help="SECONDS:client.attr=value[,...] applied that far into "
+                                 "the measured run, e.g. 5:sagemaker.error_rate=0.5")
+
+    report_parser = commands.add_parser('report', help='render JSON runs into one HTML page')
+    report_parser.add_argument('runs', nargs='+')
+    report_parser.add_argument('-o', '--output', default='load_replay_compare.html')
+    args = parser.parse_args()
+
+    if args.command == 'report':
+        reports = []
+        for path in args.runs:
+            with open(path) as f:
+                reports.append(json.load(f))
+        with open(args.output, 'w') as f:
+            f.write(render_html(reports))
+        for report in reports:
+            print_summary(report)
+        print(f"Wrote {args.output}")
+        return
+
+    report = run(args)
+    print_summary(report)
+    with open(f"{args.output}.json", 'w') as f:
+        json.dump(report, f, indent=2)
+    with open(f"{args.output}.html", 'w') as f:
+        f.write(render_html([report]))
+    print(f"Wrote {args.output}.json and {args.output}.html")
+
+
+if __name__ == '__main__':
+    main()
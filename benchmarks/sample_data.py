@@ -0,0 +1,61 @@
+"""
+Sample-data loaders shared by the benchmark scripts.
+
+Joins sample-data/orders.csv with customers.csv and products.csv to build
+request-shaped feature rows (the same fields lambda_handler receives).
+"""
+
+import csv
+import os
+from typing import Any, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_DATA_DIR = os.path.join(REPO_ROOT, 'sample-data')
+
+
+def _read_csv(name: str) -> List[Dict[str, str]]:
+    with open(os.path.join(SAMPLE_DATA_DIR, name), newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def load_order_requests() -> List[Dict[str, Any]]:
+    """
+    Build one API request body per row of orders.csv.
+
+    Returns:
+        List of request dicts with order_id, customer_return_rate,
+        total_orders, payment_method, amount, product_return_rate
+        and is_festival_season
+    """
+    customers = {row['customer_id']: row for row in _read_csv('customers.csv')}
+    products = {row['product_id']: row for row in _read_csv('products.csv')}
+
+    requests = []
+    for order in _read_csv('orders.csv'):
+        customer = customers[order['customer_id']]
+        product = products[order['product_id']]
+        requests.append({
+            'order_id': order['order_id'],
+            'customer_return_rate': float(customer['return_rate']),
+            'total_orders': int(customer['total_orders']),
+            'payment_method': order['payment_method'],
+            'amount': float(order['amount']),
+            'product_return_rate': float(product['return_rate']),
+            'is_festival_season': int(order['is_festival_season'])
+        })
+    return requests
+
+
+def load_order_features() -> List[Dict[str, Any]]:
+    """Model feature dicts (is_cod instead of payment_method) for every order."""
+    return [
+        {
+            'customer_return_rate': request['customer_return_rate'],
+            'total_orders': request['total_orders'],
+            'is_cod': 1 if request['payment_method'] == 'COD' else 0,
+            'amount': request['amount'],
+            'product_return_rate': request['product_return_rate'],
+            'is_festival_season': request['is_festival_season']
+        }
+        for request in load_order_requests()
+    ]
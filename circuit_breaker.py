@@ -0,0 +1,259 @@
+"""
+Circuit breakers for the remote dependencies of the scoring path
+(SageMaker, Bedrock, the shared stream aggregates table).
+
+Without a breaker, an endpoint outage costs every request the full wait
+for the exception (or the deadline's timeout) before it falls back to the
+rules or the rule-based explanation: the outage turns into a latency storm
+and keeps hammering a dependency that is already failing.
+
+Each dependency gets one CircuitBreaker per container, kept in a module
+global, so its state carries over warm invocations:
+
+    - closed: calls go through; each outcome (error, latency) is kept for
+      window_s seconds. Once at least min_calls are in the window and the
+      error rate reaches error_rate, or the share of calls slower than
+      slow_call_ms reaches slow_rate, the breaker opens.
+    - open: calls are rejected at once, so callers take their fallback
+      without waiting, for open_s seconds.
+    - half_open: after that, up to half_open_calls probe calls go through.
+      If all succeed in time the breaker closes with an empty window; one
+      failed or slow probe opens it again.
+
+Callers ask allow() before the call and report it with record(), or with
+discard() when the outcome says nothing about the dependency (e.g. a call
+cut short by the caller's own deadline); a call that allow() let through
+must always be reported, or half-open probes are only given back after
+open_s. record() can take a per-call slow threshold for dependencies whose
+normal latency differs between kinds of call.
+
+circuit_allows() and circuit_record() wrap both for the request path:
+an open circuit becomes a "circuit_open" degradation of the current
+request, and a call cut short by the request deadline is discarded
+unless it had already run past the slow threshold.
+
+metrics() feeds the per-invocation EMF line (state as 1 half-open or
+2 open, and calls rejected since the previous line; nothing while closed,
+to keep the line short); stats() is shown in debug_timings.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from request_deadline import current_deadline
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# EMF value of each state
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a rolling window of call outcomes."""
+
+    def __init__(self, name: str, window_s: float = 30.0, min_calls: int = 20,
+                 error_rate: float = 0.5, slow_call_ms: Optional[float] = None,
+                 slow_rate: float = 0.8, open_s: float = 15.0, half_open_calls: int = 3):
+        """
+        Args:
+            name: Dependency name (metric names, "degraded" stage)
+            window_s: How long call outcomes count towards the rates
+            min_calls: Calls needed in the window before the breaker can open
+            error_rate: Failed share of the window that opens the breaker
+            slow_call_ms: Calls slower than this count as slow (None: no
+                          latency trigger)
+            slow_rate: Slow share of the window that opens the breaker
+            open_s: How long an open breaker rejects calls before probing
+            half_open_calls: Probes that must succeed to close again
+        """
+        self.name = name
+        self.window_s = window_s
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_ms = slow_call_ms
+        self.slow_rate = slow_rate
+        self.open_s = open_s
+        self.half_open_calls = half_open_calls
+        # (recorded_at, error, slow), oldest first
+        self._window: Deque[Tuple[float, bool, bool]] = deque()
+        self._errors = 0
+        self._slow = 0
+        self._state = CLOSED
+        self._state_since = time.monotonic()
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self._reported_rejected = 0
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._expire_open(time.monotonic())
+            return self._state
+
+    def allow(self) -> bool:
+        """True if a call may go out now (a probe, when half-open)."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire_open(now)
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN:
+                # Probes never recorded are given back after open_s
+                stale = now - self._state_since >= self.open_s
+                if self._probes >= self.half_open_calls and stale:
+                    self._probes = self._probe_successes
+                    self._state_since = now
+                if self._probes < self.half_open_calls:
+                    self._probes += 1
+                    return True
+            self.rejected += 1
+            return False
+
+    def record(self, latency_ms: float, error: bool = False,
+               slow_call_ms: Optional[float] = None) -> None:
+        """
+        Outcome of a call allow() let through.
+
+        Args:
+            latency_ms: Duration of the call
+            error: The call failed
+            slow_call_ms: Slow threshold of this call (default: the breaker's)
+        """
+        now = time.monotonic()
+        if slow_call_ms is None:
+            slow_call_ms = self.slow_call_ms
+        slow = slow_call_ms is not None and latency_ms > slow_call_ms
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if error or slow:
+                    self._transition(OPEN, now)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self._transition(CLOSED, now)
+                return
+            if self._state == OPEN:
+                # Call let through before the breaker opened
+                return
+            self._window.append((now, error, slow))
+            self._errors += error
+            self._slow += slow
+            self._expire_window(now)
+            calls = len(self._window)
+            if calls >= self.min_calls and (
+                self._errors >= self.error_rate * calls
+                or (self._slow and self._slow >= self.slow_rate * calls)
+            ):
+                self._transition(OPEN, now)
+
+    def discard(self) -> None:
+        """A call allow() let through ended without telling anything; free its probe."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > self._probe_successes:
+                self._probes -= 1
+
+    def _expire_window(self, now: float) -> None:
+        while self._window and now - self._window[0][0] > self.window_s:
+            _, error, slow = self._window.popleft()
+            self._errors -= error
+            self._slow -= slow
+
+    def _expire_open(self, now: float) -> None:
+        if self._state == OPEN and now - self._state_since >= self.open_s:
+            self._transition(HALF_OPEN, now)
+
+    def _transition(self, state: str, now: float) -> None:
+        if state == OPEN:
+            self.opened += 1
+            if self._state == HALF_OPEN:
+                reason = 'half-open probe failed'
+            else:
+                reason = f"{self._errors} errors, {self._slow} slow of {len(self._window)} calls"
+            print(f"Circuit {self.name} open: {reason}")
+        elif state == CLOSED:
+            print(f"Circuit {self.name} closed: {self._probe_successes} probes succeeded")
+        self._state = state
+        self._state_since = now
+        self._probes = 0
+        self._probe_successes = 0
+        self._window.clear()
+        self._errors = 0
+        self._slow = 0
+
+    def metrics(self) -> Dict[str, Tuple[Any, str]]:
+        """
+        EMF metrics: {name: (value, unit)}, empty while the breaker is closed
+        and has rejected nothing since the previous call (no datapoint reads
+        as closed, e.g. FILL(m, 0) in metric math).
+        """
+        if self._state == CLOSED and self.rejected == self._reported_rejected:
+            return {}
+        with self._lock:
+            self._expire_open(time.monotonic())
+            rejected = self.rejected - self._reported_rejected
+            self._reported_rejected = self.rejected
+            state = self._state
+        metrics: Dict[str, Tuple[Any, str]] = {
+            f"circuit_{self.name}_state": (STATE_CODES[state], 'None')
+        }
+        if rejected:
+            metrics[f"circuit_{self.name}_rejected"] = (rejected, 'Count')
+        return metrics
+
+    def stats(self) -> Dict[str, Any]:
+        """State, window counts and lifetime counters."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire_open(now)
+            self._expire_window(now)
+            calls = len(self._window)
+            return {
+                'state': self._state,
+                'state_for_s': round(now - self._state_since, 3),
+                'window_calls': calls,
+                'error_rate': round(self._errors / calls, 4) if calls else 0.0,
+                'slow_rate': round(self._slow / calls, 4) if calls else 0.0,
+                'opened': self.opened,
+                'rejected': self.rejected
+            }
+
+
+def circuit_allows(breaker: Optional[CircuitBreaker]) -> bool:
+    """
+    True if the dependency may be called; an open circuit is recorded as a
+    "circuit_open" degradation of the current request.
+    """
+    if breaker is None or breaker.allow():
+        return True
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.degrade(breaker.name, 'circuit_open')
+    return False
+
+
+def circuit_record(breaker: Optional[CircuitBreaker], started: float, error: bool = False,
+                   slow_call_ms: Optional[float] = None, timed_out: bool = False) -> None:
+    """
+    Report a call circuit_allows let through (started: its perf_counter).
+
+    A call our own request deadline cut short (timed_out, from note_timeout)
+    is no dependency error: it only counts as slow if it already ran past
+    the slow threshold, and is discarded otherwise.
+    """
+    if breaker is None:
+        return
+    latency_ms = (time.perf_counter() - started) * 1000
+    if timed_out:
+        threshold = slow_call_ms if slow_call_ms is not None else breaker.slow_call_ms
+        if threshold is None or latency_ms <= threshold:
+            breaker.discard()
+            return
+        error = False
+    breaker.record(latency_ms, error, slow_call_ms)
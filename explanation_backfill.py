@@ -0,0 +1,506 @@
+"""
+Offline explanation backfill for the Return Abuse Detection System.
+
+Compliance wants a Bedrock explanation on every medium and high risk
+decision. Many audit rows only hold the rule-based text, for example when:
+    - the tier was routed to the fallback explanation
+    - Bedrock failed or throttled
+    - the async worker gave up
+    - a batch ran without "use_bedrock"
+
+This job repairs those rows after the fact:
+
+    1. Scan the predictions table (paginated, risk_level <> low) for rows
+       whose explanation was not generated by Bedrock
+    2. Group them by explanation signature (explanation_cache), so each
+       distinct factor set / quantized feature combination is generated once
+    3. Generate one explanation per group with bounded concurrency, a shared
+       calls-per-second limit and exponential backoff on throttling - or
+       write the groups as a Bedrock batch inference input file and read the
+       job's output file back later
+    4. Write the rows back with batch writes (25-item BatchWriteItem calls)
+
+Rows are processed a window at a time. Explanations generated for earlier
+windows are reused by later ones, so memory stays bounded and the dedup is
+table-wide.
+
+A row needs the "features" attribute that predictions store; rows written
+before it existed are counted as missing_features and left alone. Risk
+factors are recomputed from the features with the rule table, so rows scored
+by an ML backend get the factors the rules report. Rows with a pending async
+explanation belong to the explanation worker and are skipped. Batch writes
+replace whole items, so run the backfill against rows that are no longer
+being updated (the default leaves out the last hour).
+
+Usage:
+    python explanation_backfill.py [--concurrency 8] [--rate 5]
+        [--prompt auto|compact|full] [--dry-run]
+    python explanation_backfill.py --write-batch-input records.jsonl
+    python explanation_backfill.py --read-batch-output records.jsonl.out
+    python benchmarks/bench_explanation_backfill.py   # local table and model stand-ins
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from explanation_cache import ExplanationCache, explanation_signature
+from explanation_routing import DEFAULT_ROUTING, PromptTemplate, build_templates, parse_routing
+from risk_scoring import calculate_risk_score
+
+BEDROCK_SOURCE = 'bedrock_claude_3_sonnet'
+DEFAULT_MODEL_ID = 'us.anthropic.claude-sonnet-4-20250514-v1:0'
+
+# Bedrock error codes worth retrying after a pause
+RETRYABLE_CODES = ('ThrottlingException', 'ServiceUnavailableException',
+                   'ModelNotReadyException', 'InternalServerException')
+
+# Bedrock batch inference record IDs are 11 alphanumeric characters
+RECORD_ID_LENGTH = 11
+
+
+class RateLimiter:
+    """Token bucket shared by the generation threads (calls per second)."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """
+        Args:
+            rate: Calls per second; 0 disables the limit
+            burst: Calls allowed back to back (default: one second's worth)
+        """
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns seconds waited."""
+        waited = 0.0
+        while self.rate > 0:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+        return waited
+
+
+class BackfillGroup:
+    """Candidate rows sharing one explanation signature."""
+
+    def __init__(self, signature: str, template: PromptTemplate, risk_score: float,
+                 risk_factors: List[Dict[str, Any]], features: Dict[str, Any]):
+        self.signature = signature
+        self.template = template
+        # The first row stands in for the group in the prompt
+        self.risk_score = risk_score
+        self.risk_factors = risk_factors
+        self.features = features
+        self.rows: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]] = []
+
+    def request_body(self) -> str:
+        return self.template.request_body(self.risk_score, self.risk_factors, self.features)
+
+
+class ExplanationBackfill:
+    """
+    Scan, group, generate and write back missing Bedrock explanations.
+
+    run() generates through invoke_model. write_batch_input() and
+    read_batch_output() go through a Bedrock batch inference job instead.
+    All three return a report dict (see report()).
+    """
+
+    def __init__(
+        self,
+        table: Any,
+        bedrock_runtime: Any = None,
+        model_id: str = DEFAULT_MODEL_ID,
+        templates: Optional[Dict[str, PromptTemplate]] = None,
+        routing: Optional[Dict[str, str]] = None,
+        prompt: str = 'auto',
+        tiers: Tuple[str, ...] = ('medium', 'high'),
+        concurrency: int = 8,
+        rate: float = 5.0,
+        max_attempts: int = 5,
+        base_backoff_s: float = 0.5,
+        window: int = 5000,
+        page_size: int = 500,
+        older_than: Optional[datetime] = None,
+        cache: Optional[ExplanationCache] = None,
+        dry_run: bool = False
+    ):
+        """
+        Args:
+            table: boto3 DynamoDB Table holding the predictions
+            bedrock_runtime: bedrock-runtime client (not needed for batch files)
+            model_id: Bedrock model or inference profile
+            templates: Prompt templates (explanation_routing.build_templates)
+            routing: Tier -> prompt (explanation_routing.parse_routing)
+            prompt: "auto" uses the tier's routed prompt (full where the tier
+                is routed to the fallback explanation), or "compact" / "full"
+            tiers: Risk levels to backfill
+            concurrency: Bedrock calls in flight
+            rate: Bedrock calls per second across all threads (0: no limit)
+            max_attempts: Tries per group on throttling / transient errors
+            base_backoff_s: First retry delay, doubled per attempt (with jitter)
+            window: Candidate rows grouped, generated and written together
+            page_size: Scan page size
+            older_than: Only rows with an earlier timestamp
+            cache: Explanation cache checked before Bedrock and filled after
+            dry_run: Scan and group only - no Bedrock calls, no writes
+        """
+        self.table = table
+        self.bedrock_runtime = bedrock_runtime
+        self.model_id = model_id
+        self.templates = templates or build_templates()
+        self.routing = routing or parse_routing(DEFAULT_ROUTING)
+        self.prompt = prompt
+        self.tiers = tiers
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate)
+        self.max_attempts = max_attempts
+        self.base_backoff_s = base_backoff_s
+        self.window = window
+        self.page_size = page_size
+        self.older_than = older_than
+        self.cache = cache
+        self.dry_run = dry_run
+        # signature -> explanation (or None when generation failed), table-wide
+        self._explanations: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            'scanned': 0, 'candidates': 0, 'has_bedrock': 0, 'pending': 0,
+            'missing_features': 0, 'too_recent': 0, 'signatures': 0, 'bedrock_calls': 0,
+            'retries': 0, 'cache_hits': 0, 'failed_signatures': 0, 'failed_rows': 0,
+            'written': 0, 'input_tokens': 0, 'output_tokens': 0
+        }
+        self._rate_wait_s = 0.0
+        self._started = time.perf_counter()
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[key] += amount
+
+    def _template_for(self, tier: str) -> PromptTemplate:
+        name = self.prompt
+        if name == 'auto':
+            name = self.routing.get(tier, 'full')
+        return self.templates.get(name) or self.templates['full']
+
+    def scan_predictions(self) -> Iterator[Dict[str, Any]]:
+        """Rows of the requested tiers, one scan page at a time."""
+        kwargs: Dict[str, Any] = {
+            'FilterExpression': 'risk_level <> :low',
+            'ExpressionAttributeValues': {':low': 'low'},
+            'Limit': self.page_size
+        }
+        while True:
+            page = self.table.scan(**kwargs)
+            self._count('scanned', page.get('ScannedCount', len(page.get('Items', []))))
+            for item in page.get('Items', []):
+                if item.get('risk_level') in self.tiers:
+                    yield item
+            if not page.get('LastEvaluatedKey'):
+                return
+            kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+    def _skip_reason(self, item: Dict[str, Any]) -> Optional[str]:
+        """Counter to charge a row that is not backfilled, or None for candidates."""
+        try:
+            generated_by = json.loads(item.get('explanation') or '{}').get('generated_by')
+        except ValueError:
+            generated_by = None
+        if generated_by == BEDROCK_SOURCE:
+            return 'has_bedrock'
+        if item.get('explanation_status') == 'pending':
+            return 'pending'
+        if self.older_than is not None and item.get('timestamp', '') >= self.older_than.isoformat():
+            return 'too_recent'
+        if not item.get('features'):
+            return 'missing_features'
+        return None
+
+    def candidate_windows(self) -> Iterator[List[Dict[str, Any]]]:
+        """Candidate rows in lists of up to `window`."""
+        window: List[Dict[str, Any]] = []
+        for item in self.scan_predictions():
+            reason = self._skip_reason(item)
+            if reason is not None:
+                self._count(reason)
+                continue
+            self._count('candidates')
+            window.append(item)
+            if len(window) >= self.window:
+                yield window
+                window = []
+        if window:
+            yield window
+
+    def group(self, items: List[Dict[str, Any]]) -> Dict[str, BackfillGroup]:
+        """Group rows by explanation signature (prompt included)."""
+        groups: Dict[str, BackfillGroup] = {}
+        for item in items:
+            features = json.loads(item['features'])
+            risk_score = float(item['risk_score'])
+            _, risk_factors = calculate_risk_score(features)
+            template = self._template_for(item['risk_level'])
+            signature = explanation_signature(risk_score, risk_factors, features, template.name)
+            group = groups.get(signature)
+            if group is None:
+                group = groups[signature] = BackfillGroup(
+                    signature, template, risk_score, risk_factors, features
+                )
+            group.rows.append((item, risk_factors))
+        with self._lock:
+            self._counters['signatures'] += sum(1 for signature in groups
+                                                if signature not in self._explanations)
+        return groups
+
+    def _invoke(self, body: str) -> Dict[str, Any]:
+        """invoke_model under the rate limit, retrying throttling with backoff."""
+        attempt = 0
+        while True:
+            waited = self.limiter.acquire()
+            with self._lock:
+                self._rate_wait_s += waited
+                self._counters['bedrock_calls'] += 1
+            try:
+                response = self.bedrock_runtime.invoke_model(modelId=self.model_id, body=body)
+                return json.loads(response['body'].read())
+            except ClientError as e:
+                attempt += 1
+                code = e.response.get('Error', {}).get('Code')
+                if code not in RETRYABLE_CODES or attempt >= self.max_attempts:
+                    raise
+                self._count('retries')
+                time.sleep(self.base_backoff_s * 2 ** (attempt - 1) * random.uniform(0.5, 1.0))
+
+    def _record_output(self, group: BackfillGroup, response_body: Dict[str, Any],
+                       generation_ms: float) -> Dict[str, Any]:
+        usage = response_body.get('usage') or {}
+        self._count('input_tokens', int(usage.get('input_tokens') or 0))
+        self._count('output_tokens', int(usage.get('output_tokens') or 0))
+        explanation = {
+            'generated_by': BEDROCK_SOURCE,
+            'explanation_text': response_body['content'][0]['text']
+        }
+        if self.cache is not None:
+            self.cache.put(group.signature, explanation, generation_ms)
+        return explanation
+
+    def generate(self, group: BackfillGroup) -> Optional[Dict[str, Any]]:
+        """One explanation for the group (cache first), or None if Bedrock failed."""
+        if self.cache is not None:
+            cached, _ = self.cache.get(group.signature)
+            if cached is not None:
+                self._count('cache_hits')
+                return cached
+        started = time.perf_counter()
+        try:
+            response_body = self._invoke(group.request_body())
+        except Exception as e:
+            print(f"Backfill Bedrock error: {str(e)}")
+            return None
+        return self._record_output(group, response_body,
+                                   (time.perf_counter() - started) * 1000)
+
+    def write_back(self, groups: Dict[str, BackfillGroup]) -> None:
+        """Put the explained rows back (the stored response too, for idempotent replays)."""
+        backfilled_at = datetime.now().isoformat()
+        with self.table.batch_writer() as batch:
+            for signature, group in groups.items():
+                explanation = self._explanations.get(signature)
+                if explanation is None:
+                    self._count('failed_rows', len(group.rows))
+                    continue
+                for item, risk_factors in group.rows:
+                    row_explanation = dict(
+                        explanation, risk_factors=risk_factors,
+                        routing={'tier': item['risk_level'], 'prompt': group.template.name}
+                    )
+                    updated = dict(item, explanation=json.dumps(row_explanation),
+                                   explanation_source='backfill',
+                                   explanation_backfilled_at=backfilled_at)
+                    if 'explanation_status' in item:
+                        updated['explanation_status'] = 'ready'
+                    if 'response' in item:
+                        response = json.loads(item['response'])
+                        response['explanation'] = row_explanation
+                        updated['response'] = json.dumps(response)
+                    batch.put_item(Item=updated)
+                    self._count('written')
+
+    def run(self) -> Dict[str, Any]:
+        """Backfill through invoke_model."""
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix='backfill') as pool:
+            for window in self.candidate_windows():
+                groups = self.group(window)
+                if self.dry_run:
+                    self._explanations.update(dict.fromkeys(groups))
+                    continue
+                new = [group for signature, group in groups.items()
+                       if signature not in self._explanations]
+                for group, explanation in zip(new, pool.map(self.generate, new)):
+                    self._explanations[group.signature] = explanation
+                    if explanation is None:
+                        self._count('failed_signatures')
+                self.write_back(groups)
+        return self.report()
+
+    @staticmethod
+    def record_id(signature: str) -> str:
+        return signature[:RECORD_ID_LENGTH]
+
+    def write_batch_input(self, path: str) -> Dict[str, Any]:
+        """
+        Write one Bedrock batch inference record per distinct signature.
+
+        Lines are {"recordId", "modelInput"}. Upload the file to S3 and start
+        the job with create_model_invocation_job, then pass the job's
+        output file to read_batch_output().
+        """
+        written = set()
+        with open(path, 'w') as handle:
+            for window in self.candidate_windows():
+                for signature, group in self.group(window).items():
+                    record_id = self.record_id(signature)
+                    if record_id in written:
+                        continue
+                    written.add(record_id)
+                    self._explanations[signature] = None
+                    handle.write(json.dumps({
+                        'recordId': record_id,
+                        'modelInput': json.loads(group.request_body())
+                    }) + '\n')
+        self._count('bedrock_calls', len(written))
+        return dict(self.report(), batch_records=len(written), batch_input=path)
+
+    def read_batch_output(self, path: str) -> Dict[str, Any]:
+        """
+        Back-fill from a Bedrock batch inference output file.
+
+        The table is scanned and grouped again; groups are matched to
+        output records by record ID. Groups with no record, or whose record
+        holds an error, are counted as failed and left unchanged.
+        """
+        outputs: Dict[str, Dict[str, Any]] = {}
+        with open(path) as handle:
+            for line in filter(None, (line.strip() for line in handle)):
+                record = json.loads(line)
+                if 'modelOutput' in record:
+                    outputs[record['recordId']] = record['modelOutput']
+        for window in self.candidate_windows():
+            groups = self.group(window)
+            for signature, group in groups.items():
+                if signature in self._explanations:
+                    continue
+                output = outputs.get(self.record_id(signature))
+                explanation = None
+                if output is not None:
+                    try:
+                        explanation = self._record_output(group, output, 0.0)
+                    except (KeyError, IndexError, TypeError) as e:
+                        print(f"Backfill batch output error: {str(e)}")
+                if explanation is None:
+                    self._count('failed_signatures')
+                self._explanations[signature] = explanation
+            if not self.dry_run:
+                self.write_back(groups)
+        return self.report()
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Counters plus throughput.
+
+        dedup_ratio is the share of candidate rows that did not need a
+        Bedrock generation of their own (1 - signatures / candidates).
+        """
+        elapsed = time.perf_counter() - self._started
+        with self._lock:
+            report: Dict[str, Any] = dict(self._counters)
+        candidates = report['candidates']
+        report['dedup_ratio'] = (round(1 - report['signatures'] / candidates, 4)
+                                 if candidates else 0.0)
+        report['elapsed_s'] = round(elapsed, 3)
+        report['rows_per_s'] = round(report['written'] / elapsed, 1) if elapsed else 0.0
+        report['bedrock_calls_per_s'] = (round(report['bedrock_calls'] / elapsed, 2)
+                                         if elapsed else 0.0)
+        report['rate_limit_wait_s'] = round(self._rate_wait_s, 3)
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Back-fill Bedrock explanations on audit rows')
+    parser.add_argument('--table', default=os.environ.get('PREDICTIONS_TABLE',
+                                                          'return-abuse-predictions'))
+    parser.add_argument('--region', default='ap-south-1')
+    parser.add_argument('--dynamodb-endpoint-url', help='e.g. DynamoDB Local')
+    parser.add_argument('--bedrock-region', default='us-east-1')
+    parser.add_argument('--model-id', default=os.environ.get('BEDROCK_MODEL_ID', DEFAULT_MODEL_ID))
+    parser.add_argument('--prompt', choices=('auto', 'compact', 'full'), default='auto')
+    parser.add_argument('--routing', default=os.environ.get('EXPLANATION_ROUTING',
+                                                            DEFAULT_ROUTING))
+    parser.add_argument('--tiers', default='medium,high')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=5.0, help='Bedrock calls per second')
+    parser.add_argument('--window', type=int, default=5000)
+    parser.add_argument('--min-age-minutes', type=float, default=60.0,
+                        help='leave rows younger than this alone')
+    parser.add_argument('--cache-table', default=os.environ.get('EXPLANATION_CACHE_TABLE', ''))
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--write-batch-input', metavar='JSONL')
+    parser.add_argument('--read-batch-output', metavar='JSONL')
+    args = parser.parse_args()
+
+    import boto3
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region,
+                              endpoint_url=args.dynamodb_endpoint_url)
+    templates = build_templates(
+        int(os.environ.get('EXPLANATION_COMPACT_MAX_TOKENS', '150')),
+        int(os.environ.get('EXPLANATION_FULL_MAX_TOKENS', '500'))
+    )
+    backfill = ExplanationBackfill(
+        dynamodb.Table(args.table),
+        bedrock_runtime=boto3.client('bedrock-runtime', region_name=args.bedrock_region),
+        model_id=args.model_id,
+        templates=templates,
+        routing=parse_routing(args.routing),
+        prompt=args.prompt,
+        tiers=tuple(tier.strip() for tier in args.tiers.split(',')),
+        concurrency=args.concurrency,
+        rate=args.rate,
+        window=args.window,
+        older_than=datetime.now() - timedelta(minutes=args.min_age_minutes),
+        cache=ExplanationCache(shared_table=dynamodb.Table(args.cache_table))
+        if args.cache_table else None,
+        dry_run=args.dry_run
+    )
+    if args.write_batch_input:
+        report = backfill.write_batch_input(args.write_batch_input)
+    elif args.read_batch_output:
+        report = backfill.read_batch_output(args.read_batch_output)
+    else:
+        report = backfill.run()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
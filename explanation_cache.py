@@ -0,0 +1,206 @@
+"""
+Bedrock explanation cache for the Return Abuse Detection System.
+
+Bedrock explanations depend on the set of triggered risk factors and on
+roughly where the order sits (amount band, return-rate band, history),
+and those combinations repeat constantly. Explanations are cached under a
+canonical signature of the factor names plus quantized features, so a
+repeat signature skips Bedrock entirely.
+
+Tiers:
+    - In-process LRU with TTL (survives across warm Lambda invocations)
+    - Optional DynamoDB table shared by all containers (EXPLANATION_CACHE_TABLE)
+
+Quantization means a cached explanation may quote a nearby value (e.g. an
+amount from the same band) - the exact risk factors of the current order
+are always attached to the returned explanation.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+SIGNATURE_VERSION = 'sig-v1'
+
+# Quantization grid for the signature
+AMOUNT_BUCKETS = [1000, 2500, 5000, 10000, 20000, 35000, 50000, 100000]
+ORDER_COUNT_BUCKETS = [3, 5, 10, 20, 50]
+RATE_STEP = 0.05
+SCORE_STEP = 0.05
+
+
+def _quantize(value: float, step: float) -> int:
+    return int(round(float(value) / step))
+
+
+def explanation_signature(
+    risk_score: float,
+    risk_factors: List[Dict[str, Any]],
+    features: Dict[str, Any],
+    variant: str = ''
+) -> str:
+    """
+    Canonical cache key for an explanation request.
+
+    Args:
+        risk_score: Risk score being explained
+        risk_factors: Detected risk factors (only factor names are used)
+        features: Order and customer features (quantized)
+        variant: Prompt the explanation was generated with (e.g. "compact"),
+            so explanations of different lengths never stand in for each other
+
+    Returns:
+        Hex digest identifying the (factor set, quantized features) signature
+    """
+    canonical = [
+        SIGNATURE_VERSION,
+        ','.join(sorted(factor['factor'] for factor in risk_factors)),
+        _quantize(risk_score, SCORE_STEP),
+        _quantize(features['customer_return_rate'], RATE_STEP),
+        _quantize(features['product_return_rate'], RATE_STEP),
+        bisect_right(ORDER_COUNT_BUCKETS, features['total_orders']),
+        bisect_right(AMOUNT_BUCKETS, features['amount']),
+        int(bool(features['is_cod'])),
+        int(bool(features['is_festival_season']))
+    ]
+    if variant:
+        canonical.append(variant)
+    return hashlib.sha256('|'.join(map(str, canonical)).encode()).hexdigest()[:32]
+
+
+class ExplanationCache:
+    """
+    Two-tier (in-process LRU + optional DynamoDB) explanation cache.
+
+    Entries hold the generated explanation and how long Bedrock took to
+    produce it, so each hit can report the latency it saved.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: float = 3600,
+                 shared_table: Any = None):
+        """
+        Args:
+            maxsize: Maximum entries kept in process (LRU eviction)
+            ttl_seconds: Entry lifetime in both tiers
+            shared_table: boto3 DynamoDB Table for the shared tier, or None
+        """
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.shared_table = shared_table
+        self._entries: 'OrderedDict[str, Tuple[float, Dict[str, Any], float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_local = 0
+        self.hits_shared = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_latency_ms = 0.0
+
+    def _get_local(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, explanation, generation_ms = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return explanation, generation_ms
+
+    def _put_local(self, key: str, explanation: Dict[str, Any], generation_ms: float,
+                   ttl_seconds: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (ttl_seconds if ttl_seconds is not None
+                                         else self.ttl_seconds)
+        with self._lock:
+            self._entries[key] = (expires_at, explanation, generation_ms)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _get_shared(self, key: str) -> Optional[Tuple[Dict[str, Any], float, float]]:
+        if self.shared_table is None:
+            return None
+        try:
+            item = self.shared_table.get_item(Key={'signature': key}).get('Item')
+            # DynamoDB deletes expired items lazily, so check the TTL ourselves
+            remaining = int(item['ttl']) - time.time() if item else 0
+            if remaining <= 0:
+                return None
+            return json.loads(item['explanation']), float(item['generation_ms']), remaining
+        except Exception as e:
+            print(f"Explanation cache read error: {str(e)}")
+            return None
+
+    def _put_shared(self, key: str, explanation: Dict[str, Any], generation_ms: float) -> None:
+        if self.shared_table is None:
+            return
+        try:
+            self.shared_table.put_item(Item={
+                'signature': key,
+                'explanation': json.dumps(explanation),
+                'generation_ms': str(round(generation_ms, 1)),
+                'ttl': int(time.time() + self.ttl_seconds)
+            })
+        except Exception as e:
+            print(f"Explanation cache write error: {str(e)}")
+
+    def get(self, key: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Look up an explanation in the local tier, then the shared tier.
+
+        Returns:
+            Tuple of (explanation or None, per-request cache info with
+            status 'hit' | 'miss', tier and saved_latency_ms)
+        """
+        started = time.perf_counter()
+        tier = 'local'
+        found = self._get_local(key)
+        if found is None:
+            shared = self._get_shared(key)
+            if shared is not None:
+                tier = 'shared'
+                explanation, generation_ms, remaining = shared
+                self._put_local(key, explanation, generation_ms, min(remaining, self.ttl_seconds))
+                found = explanation, generation_ms
+
+        if found is None:
+            with self._lock:
+                self.misses += 1
+            return None, {'status': 'miss'}
+
+        explanation, generation_ms = found
+        lookup_ms = (time.perf_counter() - started) * 1000
+        saved_ms = max(0.0, generation_ms - lookup_ms)
+        with self._lock:
+            if tier == 'local':
+                self.hits_local += 1
+            else:
+                self.hits_shared += 1
+            self.saved_latency_ms += saved_ms
+        return explanation, {'status': 'hit', 'tier': tier, 'saved_latency_ms': round(saved_ms, 1)}
+
+    def put(self, key: str, explanation: Dict[str, Any], generation_ms: float) -> None:
+        """Store a freshly generated explanation in both tiers."""
+        self._put_local(key, explanation, generation_ms)
+        self._put_shared(key, explanation, generation_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        """Container-level counters for response metadata."""
+        with self._lock:
+            hits = self.hits_local + self.hits_shared
+            lookups = hits + self.misses
+            return {
+                'hits': hits,
+                'hits_local': self.hits_local,
+                'hits_shared': self.hits_shared,
+                'misses': self.misses,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+                'evictions': self.evictions,
+                'saved_latency_ms': round(self.saved_latency_ms, 1)
+            }
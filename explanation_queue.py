@@ -0,0 +1,100 @@
+"""
+Explanation job queue for asynchronous explanation mode.
+
+Requests with "explanation_mode": "async" return the score immediately and
+hand the Bedrock explanation off to a worker through one of these queues:
+
+    - SqsExplanationQueue: production path; the same Lambda (or a dedicated
+      one) consumes the SQS event source and writes the explanation back
+      to the predictions table
+    - LocalExplanationQueue: in-process stand-in backed by queue.Queue and
+      a daemon worker thread, for local runs, tests and long-lived server
+      processes (Lambda freezes background threads between invocations,
+      so deployed Lambdas should use SQS)
+"""
+
+import json
+import queue
+import threading
+from typing import Any, Callable, Dict, Optional
+
+ExplanationJob = Dict[str, Any]
+
+
+class LocalExplanationQueue:
+    """In-process explanation queue drained by a background worker thread."""
+
+    def __init__(self, handler: Callable[[ExplanationJob], None], maxsize: int = 10000):
+        """
+        Args:
+            handler: Called with each job on the worker thread
+            maxsize: Pending job limit; enqueue fails when the queue is full
+        """
+        self.handler = handler
+        self._jobs: 'queue.Queue[Optional[ExplanationJob]]' = queue.Queue(maxsize=maxsize)
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name='explanation-worker', daemon=True
+                )
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            try:
+                if job is None:
+                    return
+                self.handler(job)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Explanation worker error: {str(e)}")
+            finally:
+                self._jobs.task_done()
+
+    def enqueue(self, job: ExplanationJob) -> bool:
+        """Queue a job; returns False if the queue is full."""
+        self._ensure_worker()
+        try:
+            self._jobs.put_nowait(job)
+            return True
+        except queue.Full:
+            print("Explanation queue full, dropping job")
+            return False
+
+    def join(self) -> None:
+        """Block until every queued job has been processed."""
+        self._jobs.join()
+
+    def depth(self) -> int:
+        return self._jobs.qsize()
+
+
+class SqsExplanationQueue:
+    """Explanation queue backed by Amazon SQS."""
+
+    def __init__(self, sqs_client: Any, queue_url: str):
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+
+    def enqueue(self, job: ExplanationJob) -> bool:
+        """Send a job to SQS; returns False if the send failed."""
+        try:
+            self.sqs_client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(job))
+            return True
+        except Exception as e:
+            print(f"SQS enqueue error: {str(e)}")
+            return False
+
+
+def is_sqs_event(event: Dict[str, Any]) -> bool:
+    """True if the Lambda event was delivered by an SQS event source mapping."""
+    records = event.get('Records')
+    return bool(records) and records[0].get('eventSource') == 'aws:sqs'
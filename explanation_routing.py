@@ -0,0 +1,227 @@
+"""
+Risk-tiered explanation routing for the Return Abuse Detection System.
+
+Most orders are low risk and get an instant refund; nobody reads a
+500-token Claude explanation for them. EXPLANATION_ROUTING maps each risk
+level (classify_risk: low / medium / high) to how its explanation is
+produced:
+
+    - fallback: rule-based explanation only, no Bedrock call
+    - compact:  short prompt, small token budget (summary + action)
+    - full:     the full analyst prompt
+
+so Bedrock spend and latency follow the risk mix rather than traffic.
+Default: "low=fallback,medium=compact,high=full".
+
+Prompt templates are built once at import: the static instructions are
+plain format strings, risk factors are rendered as one short line each
+(not pretty-printed JSON), and the invoke_model body around the prompt is
+pre-serialized, so each request only formats the order's values and
+JSON-escapes the prompt.
+
+ExplanationRouter counts per tier: requests, Bedrock calls, cache hits,
+errors, input/output tokens (from Bedrock's usage) and rolling latency
+percentiles of the Bedrock calls. typical_ms() is the median Bedrock call
+of a tier, which lambda_function compares with the request deadline before
+starting a sync call it could not finish; such requests are routed to the
+async worker and counted as "deferred".
+"""
+
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+from request_timing import RollingLatency
+
+ANTHROPIC_VERSION = 'bedrock-2023-05-31'
+TIERS = ('low', 'medium', 'high')
+PROMPTS = ('fallback', 'compact', 'full')
+DEFAULT_ROUTING = 'low=fallback,medium=compact,high=full'
+
+# Bedrock calls of a tier needed before typical_ms() reports a median, and
+# how often (in calls) the median is recomputed
+TYPICAL_MIN_CALLS = 8
+TYPICAL_REFRESH_CALLS = 16
+
+_FULL_PROMPT = (
+    "You are an AI assistant for an e-commerce return abuse detection system.\n"
+    "Generate a clear, professional explanation for the following return risk assessment.\n"
+    "\n"
+    "Risk Score: {risk_score:.2f} (0 = No Risk, 1 = High Risk)\n"
+    "\n"
+    "Risk Factors Detected:\n"
+    "{factors}\n"
+    "\n"
+    "Order Details:\n"
+    "- Customer Return Rate: {customer_return_rate:.1f}%\n"
+    "- Total Orders: {total_orders}\n"
+    "- Payment Method: {payment}\n"
+    "- Order Amount: ₹{amount:,.0f}\n"
+    "- Product Return Rate: {product_return_rate:.1f}%\n"
+    "- Festival Season: {festival}\n"
+    "\n"
+    "Generate:\n"
+    "1. A brief summary (1-2 sentences) explaining the risk level\n"
+    "2. Top 3-5 key factors contributing to this risk score\n"
+    "3. A recommended action for the operations team\n"
+    "\n"
+    "Keep the language professional, clear, and actionable. Focus on business impact."
+)
+
+_COMPACT_PROMPT = (
+    "Return-abuse risk {risk_score:.2f} (0-1) for an e-commerce order.\n"
+    "Factors:\n"
+    "{factors}\n"
+    "Customer return rate {customer_return_rate:.1f}%, {total_orders} orders, {payment}, "
+    "₹{amount:,.0f}, product return rate {product_return_rate:.1f}%, "
+    "festival season {festival}.\n"
+    "In at most 3 short sentences: why this risk level, and the action for the operations team."
+)
+
+
+def format_risk_factors(risk_factors: List[Dict[str, Any]]) -> str:
+    """One "- factor: value (weight w)" line per factor."""
+    if not risk_factors:
+        return '- none'
+    return '\n'.join(
+        f"- {factor['factor']}: {factor.get('value')} (weight {factor.get('weight', 0):g})"
+        for factor in risk_factors
+    )
+
+
+class PromptTemplate:
+    """Precompiled prompt plus the invoke_model body around it."""
+
+    def __init__(self, name: str, template: str, max_tokens: int, temperature: float = 0.3):
+        self.name = name
+        self.template = template
+        self.max_tokens = max_tokens
+        # Everything but the prompt is serialized once; the prompt goes in between
+        marker = '\x00'
+        body = json.dumps({
+            'anthropic_version': ANTHROPIC_VERSION,
+            'max_tokens': max_tokens,
+            'messages': [{'role': 'user', 'content': marker}],
+            'temperature': temperature
+        })
+        self._body_prefix, self._body_suffix = body.split(json.dumps(marker))
+
+    def render(self, risk_score: float, risk_factors: List[Dict[str, Any]],
+               features: Dict[str, Any]) -> str:
+        return self.template.format(
+            risk_score=risk_score,
+            factors=format_risk_factors(risk_factors),
+            customer_return_rate=features['customer_return_rate'] * 100,
+            total_orders=features['total_orders'],
+            payment='COD' if features['is_cod'] else 'Prepaid',
+            amount=features['amount'],
+            product_return_rate=features['product_return_rate'] * 100,
+            festival='Yes' if features['is_festival_season'] else 'No'
+        )
+
+    def request_body(self, risk_score: float, risk_factors: List[Dict[str, Any]],
+                     features: Dict[str, Any]) -> str:
+        """invoke_model / invoke_model_with_response_stream body."""
+        prompt = self.render(risk_score, risk_factors, features)
+        return self._body_prefix + json.dumps(prompt) + self._body_suffix
+
+
+def build_templates(compact_max_tokens: int = 150,
+                    full_max_tokens: int = 500) -> Dict[str, PromptTemplate]:
+    return {
+        'compact': PromptTemplate('compact', _COMPACT_PROMPT, compact_max_tokens),
+        'full': PromptTemplate('full', _FULL_PROMPT, full_max_tokens)
+    }
+
+
+def parse_routing(spec: str) -> Dict[str, str]:
+    """
+    "low=fallback,medium=compact,high=full" -> {tier: prompt}.
+
+    Tiers left out keep the default routing.
+
+    Raises:
+        ValueError: Unknown tier or prompt name
+    """
+    routing = dict(item.split('=') for item in DEFAULT_ROUTING.split(','))
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        tier, _, prompt = (part.strip() for part in item.partition('='))
+        if tier not in TIERS or prompt not in PROMPTS:
+            raise ValueError(f"Invalid EXPLANATION_ROUTING entry: {item!r}")
+        routing[tier] = prompt
+    return routing
+
+
+class ExplanationRouter:
+    """Chooses the prompt per risk tier and keeps per-tier usage counters."""
+
+    def __init__(self, routing: Dict[str, str], templates: Dict[str, PromptTemplate],
+                 latency_window: int = 1024):
+        self.routing = routing
+        self.templates = templates
+        self._lock = threading.Lock()
+        self._counters = {
+            tier: {'requests': 0, 'bedrock_calls': 0, 'cache_hits': 0, 'errors': 0,
+                   'input_tokens': 0, 'output_tokens': 0, 'deferred': 0}
+            for tier in TIERS
+        }
+        self._latency = RollingLatency(window=latency_window)
+        # Cached median Bedrock call per tier (typical_ms)
+        self._typical_ms: Dict[str, float] = {}
+
+    def template_for(self, tier: str) -> Optional[PromptTemplate]:
+        """Prompt for the tier, or None when it gets the rule-based explanation."""
+        return self.templates.get(self.routing.get(tier, 'full'))
+
+    def record(self, tier: str, bedrock_ms: Optional[float] = None,
+               usage: Optional[Dict[str, Any]] = None, cache_hit: bool = False,
+               error: bool = False) -> None:
+        """
+        Count one explanation request of a tier.
+
+        Args:
+            tier: Risk level the request was routed by
+            bedrock_ms: Duration of the Bedrock call, if one was made
+            usage: Bedrock usage ({"input_tokens", "output_tokens"})
+            cache_hit: Served from the explanation cache
+            error: Bedrock failed and the rule-based explanation was used
+        """
+        with self._lock:
+            counters = self._counters[tier]
+            counters['requests'] += 1
+            counters['cache_hits'] += cache_hit
+            counters['errors'] += error
+            if bedrock_ms is not None:
+                counters['bedrock_calls'] += 1
+            if usage:
+                counters['input_tokens'] += int(usage.get('input_tokens') or 0)
+                counters['output_tokens'] += int(usage.get('output_tokens') or 0)
+            calls = counters['bedrock_calls']
+        if bedrock_ms is not None:
+            self._latency.record({tier: bedrock_ms})
+            if calls <= TYPICAL_MIN_CALLS or calls % TYPICAL_REFRESH_CALLS == 0:
+                count, median = self._latency.stage_percentile(tier, 50)
+                if count >= TYPICAL_MIN_CALLS:
+                    self._typical_ms[tier] = median
+
+    def defer(self, tier: str) -> None:
+        """Count a sync request of a tier routed to the async worker (deadline too short)."""
+        with self._lock:
+            self._counters[tier]['deferred'] += 1
+
+    def typical_ms(self, tier: str) -> Optional[float]:
+        """Median Bedrock call of the tier (recent calls), None until TYPICAL_MIN_CALLS."""
+        return self._typical_ms.get(tier)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-tier counters, routing and Bedrock latency p50/p95/p99 (ms)."""
+        latency = self._latency.percentiles()
+        with self._lock:
+            counters = {tier: dict(values) for tier, values in self._counters.items()}
+        for tier, values in counters.items():
+            values['prompt'] = self.routing.get(tier, 'full')
+            if tier in latency:
+                values['bedrock_latency_ms'] = {
+                    key: latency[tier][key] for key in ('p50', 'p95', 'p99')
+                }
+        return counters
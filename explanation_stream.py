@@ -0,0 +1,164 @@
+"""
+Streaming explanations for the Return Abuse Detection System.
+
+Streaming explanation mode ("explanation_mode": "stream") answers with
+newline-delimited JSON events instead of one response body:
+
+    {"type": "score", ...}                  prediction without the explanation
+    {"type": "explanation_delta", "text"}   Bedrock text as it is generated
+    {"type": "explanation", "status", "explanation", ...}
+                                            final explanation: "complete",
+                                            "cached" or "fallback"
+
+The score goes out as soon as the model has answered, so time to first
+byte no longer depends on the length of Bedrock's completion. Text comes
+from invoke_model_with_response_stream; the call and the chunk reads run
+on a reader thread so the request side can give up on a stalled stream:
+if the first chunk takes longer than the first-chunk deadline, or the gap
+between chunks exceeds the stall deadline, the rule-based explanation is
+sent as the final event instead (clients replace any partial text). A
+stream given up on (stalled, or its consumer gone) has its response body
+closed, which ends the generation Bedrock would otherwise keep billing
+for and lets the reader thread exit.
+
+Lambda behind API Gateway (REST) buffers the whole body, so there the
+events arrive together; stream_server.py is the local stand-in (and the
+process to run behind Lambda Web Adapter with a RESPONSE_STREAM function
+URL) that writes each event as a chunk when it is produced.
+"""
+
+import json
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+_DONE = object()
+
+
+class StreamStalled(Exception):
+    """No chunk arrived before the deadline."""
+
+
+def bedrock_text_deltas(response: Dict[str, Any],
+                        usage: Optional[Dict[str, int]] = None) -> Iterator[str]:
+    """
+    Text deltas from an invoke_model_with_response_stream response (Anthropic messages).
+
+    Args:
+        response: invoke_model_with_response_stream response
+        usage: Filled with "input_tokens" / "output_tokens" as the
+            message_start / message_delta events report them
+
+    Raises:
+        RuntimeError: For error events delivered inside the stream
+            (throttling, modelStreamErrorException, ...)
+    """
+    for event in response['body']:
+        chunk = event.get('chunk')
+        if chunk is None:
+            # Error events are the only other members of the event stream
+            name, detail = next(iter(event.items()))
+            raise RuntimeError(f"{name}: {(detail or {}).get('message', '')}")
+        payload = json.loads(chunk['bytes'])
+        kind = payload.get('type')
+        if kind == 'content_block_delta':
+            text = payload.get('delta', {}).get('text')
+            if text:
+                yield text
+        elif usage is not None and kind in ('message_start', 'message_delta'):
+            reported = payload.get('usage') or payload.get('message', {}).get('usage') or {}
+            usage.update((key, value) for key, value in reported.items()
+                         if key in ('input_tokens', 'output_tokens'))
+
+
+def close_stream(response: Dict[str, Any]) -> None:
+    """Close a streamed response's body (botocore EventStream), ending reads from it."""
+    close = getattr(response.get('body'), 'close', None)
+    if close is None:
+        return
+    try:
+        close()
+    except Exception as e:
+        print(f"Explanation stream close error: {str(e)}")
+
+
+def iter_with_deadline(
+    open_stream: Callable[[], Dict[str, Any]],
+    read: Callable[[Dict[str, Any]], Iterable[str]],
+    first_timeout_s: float,
+    stall_timeout_s: float
+) -> Iterator[str]:
+    """
+    Open and read a stream on a reader thread and yield its chunks as they arrive.
+
+    Args:
+        open_stream: Makes the streaming call and returns its response
+            (called on the reader thread, so the call itself is covered by
+            the first-chunk deadline)
+        read: Text chunks from the response (e.g. bedrock_text_deltas)
+        first_timeout_s: Longest wait for the first chunk
+        stall_timeout_s: Longest wait between later chunks
+
+    If the stream is given up on before it ends (a deadline passes, or the
+    caller stops iterating), the response body is closed - as soon as the
+    call returns, if it is still in flight - and the reader thread exits.
+
+    Raises:
+        StreamStalled: When a deadline passes
+        Exception: Whatever open_stream or read raised
+    """
+    chunks: 'queue.Queue[Any]' = queue.Queue()
+    abandoned = threading.Event()
+    opened: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+
+    def reader() -> None:
+        try:
+            response = open_stream()
+            with lock:
+                if abandoned.is_set():
+                    close_stream(response)
+                    return
+                opened.append(response)
+            for chunk in read(response):
+                if abandoned.is_set():
+                    return
+                chunks.put(chunk)
+            chunks.put(_DONE)
+        except Exception as e:
+            chunks.put(e)
+
+    def abandon() -> None:
+        with lock:
+            abandoned.set()
+            response = opened[0] if opened else None
+        if response is not None:
+            close_stream(response)
+
+    threading.Thread(target=reader, name='explanation-stream', daemon=True).start()
+    timeout = first_timeout_s
+    finished = False
+    try:
+        while True:
+            try:
+                item = chunks.get(timeout=timeout)
+            except queue.Empty:
+                raise StreamStalled(f"no explanation chunk within {timeout * 1000:.0f} ms")
+            if item is _DONE:
+                finished = True
+                return
+            if isinstance(item, Exception):
+                finished = True
+                raise item
+            yield item
+            timeout = stall_timeout_s
+    finally:
+        if not finished:
+            abandon()
+
+
+def ndjson_line(event: Dict[str, Any]) -> str:
+    """One streamed event as a JSON line."""
+    return json.dumps(event) + '\n'
@@ -0,0 +1,205 @@
+"""
+Shared feature pipeline for training and online scoring.
+
+FEATURE_SPEC is the single definition of the model's 16 input columns:
+the raw order/customer inputs read by train.py's load_data plus the
+flags, interactions and risk components that engineer_features used to
+add. Two implementations are generated from it:
+
+    - transform_row: single-request path. The spec is compiled at import
+      into one straight-line Python function (one local per feature, no
+      intermediate dicts), returning the feature vector as a list.
+    - transform_columns / transform_frame: vectorized path for training
+      and batch jobs, evaluating each spec entry over whole NumPy columns
+      (or a pandas DataFrame).
+
+Spec entry kinds:
+    input        - raw value; None/NaN becomes `default` (None keeps it
+                   missing, which XGBoost routes down each split's
+                   default branch)
+    above/below  - 1.0 if the source feature is > / < threshold else 0.0
+    product      - product of the listed features
+    weighted_sum - sum of weight * feature (weights applied in spec order)
+
+NumPy (and pandas for transform_frame) are only needed by the
+vectorized path; the Lambda scores single rows without them.
+"""
+
+import math
+from typing import Any, Callable, Dict, List, Mapping, Sequence, Tuple
+
+from lazy_import import lazy_import
+
+# Imported on first use; falsy on a Lambda runtime without a NumPy layer
+np = lazy_import('numpy')
+
+# (name, kind, parameters) in model column order
+FEATURE_SPEC: List[Tuple[str, str, Dict[str, Any]]] = [
+    ('customer_return_rate', 'input', {'default': 0.0}),
+    ('total_orders', 'input', {'default': 0.0}),
+    ('is_cod', 'input', {'default': 0.0}),
+    ('amount', 'input', {'default': 0.0}),
+    ('product_return_rate', 'input', {'default': 0.0}),
+    ('is_festival_season', 'input', {'default': 0.0}),
+    ('customer_age_days', 'input', {'default': None}),
+    ('avg_order_value', 'input', {'default': None}),
+    ('return_frequency_30d', 'input', {'default': None}),
+    ('high_value_order_flag', 'above', {'feature': 'amount', 'threshold': 20000}),
+    ('new_customer_flag', 'below', {'feature': 'total_orders', 'threshold': 3}),
+    # Interaction features
+    ('return_rate_x_cod', 'product', {'features': ['customer_return_rate', 'is_cod']}),
+    ('amount_x_return_rate', 'product', {'features': ['amount', 'customer_return_rate']}),
+    ('festival_x_cod', 'product', {'features': ['is_festival_season', 'is_cod']}),
+    # Risk score components
+    ('customer_risk_score', 'weighted_sum', {
+        'weights': [('customer_return_rate', 0.4), ('new_customer_flag', 0.1)]
+    }),
+    ('order_risk_score', 'weighted_sum', {
+        'weights': [('is_cod', 0.15), ('high_value_order_flag', 0.2),
+                    ('product_return_rate', 0.1)]
+    })
+]
+
+FEATURE_NAMES = [name for name, _, _ in FEATURE_SPEC]
+INPUT_FEATURES = [name for name, kind, _ in FEATURE_SPEC if kind == 'input']
+
+_KINDS = ('input', 'above', 'below', 'product', 'weighted_sum')
+
+
+def _validate_spec(spec: Sequence[Tuple[str, str, Dict[str, Any]]]) -> None:
+    seen = set()
+    for name, kind, params in spec:
+        if kind not in _KINDS:
+            raise ValueError(f"Unknown feature kind for '{name}': {kind}")
+        if name in seen:
+            raise ValueError(f"Duplicate feature: {name}")
+        if kind in ('above', 'below'):
+            sources = [params['feature']]
+        elif kind == 'product':
+            sources = params['features']
+        elif kind == 'weighted_sum':
+            sources = [source for source, _ in params['weights']]
+        else:
+            sources = []
+        for source in sources:
+            if source not in seen:
+                raise ValueError(f"Feature '{name}' uses '{source}' before it is defined")
+        seen.add(name)
+
+
+def _compile_row_transform(
+    spec: Sequence[Tuple[str, str, Dict[str, Any]]]
+) -> Tuple[Callable[[Mapping[str, Any]], List[float]], str]:
+    """Generate the straight-line single-row function for a spec."""
+    local = {name: f"v{index}" for index, (name, _, _) in enumerate(spec)}
+    lines = ['def transform_row(row):', '    get = row.get']
+    for name, kind, params in spec:
+        target = local[name]
+        if kind == 'input':
+            default = params['default']
+            fallback = 'NAN' if default is None else repr(float(default))
+            lines.append(f"    {target} = get({name!r})")
+            lines.append(f"    {target} = {fallback} if {target} is None "
+                         f"or {target} != {target} else float({target})")
+        elif kind in ('above', 'below'):
+            operator = '>' if kind == 'above' else '<'
+            lines.append(f"    {target} = 1.0 if {local[params['feature']]} {operator} "
+                         f"{float(params['threshold'])!r} else 0.0")
+        elif kind == 'product':
+            lines.append(f"    {target} = " + ' * '.join(local[f] for f in params['features']))
+        else:
+            lines.append(f"    {target} = " + ' + '.join(
+                f"{local[source]} * {float(weight)!r}" for source, weight in params['weights']
+            ))
+    lines.append('    return [' + ', '.join(local[name] for name, _, _ in spec) + ']')
+    source = '\n'.join(lines) + '\n'
+    namespace: Dict[str, Any] = {'NAN': math.nan}
+    exec(compile(source, '<feature_pipeline.transform_row>', 'exec'), namespace)
+    return namespace['transform_row'], source
+
+
+_validate_spec(FEATURE_SPEC)
+transform_row, TRANSFORM_ROW_SOURCE = _compile_row_transform(FEATURE_SPEC)
+transform_row.__doc__ = """
+Build the model feature vector (FEATURE_NAMES order) for one request.
+
+Args:
+    row: Mapping with the raw inputs (missing keys use the spec defaults)
+
+Returns:
+    List of floats; inputs without a default stay NaN when absent
+"""
+
+
+def transform_rows(rows: Sequence[Mapping[str, Any]]) -> List[List[float]]:
+    """Single-row path over several rows (small batches without NumPy)."""
+    return [transform_row(row) for row in rows]
+
+
+def transform_columns(columns: Mapping[str, Any]) -> Any:
+    """
+    Vectorized feature matrix for column-oriented input.
+
+    Args:
+        columns: Feature name -> sequence/array of raw values (all the same
+            length); None or NaN entries and absent inputs use the defaults
+
+    Returns:
+        float64 NumPy array of shape (rows, len(FEATURE_NAMES))
+    """
+    if not np:
+        raise RuntimeError("NumPy is not installed")
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError("All feature columns must have the same length")
+    n_rows = lengths.pop() if lengths else 0
+
+    values: Dict[str, Any] = {}
+    for name, kind, params in FEATURE_SPEC:
+        if kind == 'input':
+            if name in columns:
+                column = np.array(columns[name], dtype=np.float64)
+            else:
+                column = np.full(n_rows, np.nan)
+            if params['default'] is not None:
+                column[np.isnan(column)] = float(params['default'])
+        elif kind == 'above':
+            column = (values[params['feature']] > float(params['threshold'])).astype(np.float64)
+        elif kind == 'below':
+            column = (values[params['feature']] < float(params['threshold'])).astype(np.float64)
+        elif kind == 'product':
+            sources = params['features']
+            column = values[sources[0]]
+            for source in sources[1:]:
+                column = column * values[source]
+        else:
+            column = None
+            for source, weight in params['weights']:
+                term = values[source] * float(weight)
+                column = term if column is None else column + term
+        values[name] = column
+
+    if not n_rows:
+        return np.empty((0, len(FEATURE_NAMES)))
+    return np.column_stack([values[name] for name in FEATURE_NAMES])
+
+
+def transform_frame(frame: Any) -> Any:
+    """
+    Vectorized path for a pandas DataFrame (train.py and batch jobs).
+
+    Args:
+        frame: DataFrame with (a subset of) the INPUT_FEATURES columns
+
+    Returns:
+        New DataFrame with exactly the FEATURE_NAMES columns, same index
+    """
+    import pandas as pd
+
+    columns = {
+        name: pd.to_numeric(frame[name], errors='coerce').to_numpy(dtype=np.float64)
+        for name in INPUT_FEATURES if name in frame.columns
+    }
+    if not columns:
+        columns = {INPUT_FEATURES[0]: np.full(len(frame), np.nan)}
+    return pd.DataFrame(transform_columns(columns), columns=FEATURE_NAMES, index=frame.index)
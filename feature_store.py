@@ -0,0 +1,519 @@
+"""
+Online feature store for the Return Abuse Detection System.
+
+Callers used to send customer_return_rate, total_orders and
+product_return_rate with every request, recomputing them upstream with
+their own queries. The feature store resolves them by ID instead, from a
+snapshot precomputed offline out of the sample-data tables:
+
+    - customers.csv: return rate, order/return counts, location and
+      preferred payment per customer
+    - products.csv: return rate, price, category and brand per product
+    - orders.csv: order amount, payment method and festival flag per
+      order, plus each customer's average order value
+    - returns.csv: each customer's returns in the 30 days before the snapshot
+
+Two snapshot formats hold the same tables:
+
+    - JSON: one table per entity holding a field list and
+      {id: [values in field order]}; loading is a single json.load and
+      every lookup is one dict access. Fine for the sample data.
+    - Binary (.bin): per table, fixed-width records sorted by ID plus a
+      sorted fixed-width ID index, behind a small header. The reader
+      mmaps the file, so opening it costs microseconds regardless of
+      size and every process on a host shares one page-cached copy;
+      lookups binary-search the index (numpy.searchsorted over
+      numpy.frombuffer when NumPy is installed, bisect otherwise) and
+      decode one record in place with struct.unpack_from.
+
+Values sent by the caller always override the snapshot.
+
+Build a snapshot (format from the extension):
+    python feature_store.py sample-data feature_snapshot.json
+    python feature_store.py sample-data feature_snapshot.bin
+"""
+
+import argparse
+import csv
+import json
+import math
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from lazy_import import lazy_import
+
+# Imported on first use; falsy on a Lambda runtime without a NumPy layer
+np = lazy_import('numpy')
+
+SNAPSHOT_FORMAT = 'feature-snapshot-v1'
+
+# Binary layout: header (magic, layout version, reserved, metadata length),
+# JSON metadata describing each table, then per table the sorted ID index
+# and the records, each block starting on an 8-byte boundary
+BINARY_MAGIC = b'RAFS'
+BINARY_LAYOUT_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sHHI')
+BINARY_ALIGNMENT = 8
+
+# Fields stored per entity, in record order, with their binary struct codes
+# ('d' float64 - NaN encodes missing, 'i' int32, 'B' uint8, 'Ns' UTF-8 string
+# null-padded to N bytes)
+ORDER_SCHEMA = [
+    ('customer_id', '16s'),
+    ('product_id', '16s'),
+    ('amount', 'd'),
+    ('payment_method', '8s'),
+    ('is_festival_season', 'B')
+]
+CUSTOMER_SCHEMA = [
+    ('customer_return_rate', 'd'),
+    ('total_orders', 'i'),
+    ('customer_return_count', 'i'),
+    ('customer_age_days', 'i'),
+    ('avg_order_value', 'd'),
+    ('return_frequency_30d', 'i'),
+    ('customer_location', '24s'),
+    ('customer_preferred_payment', '8s')
+]
+PRODUCT_SCHEMA = [
+    ('product_return_rate', 'd'),
+    ('product_price', 'd'),
+    ('product_category', '32s'),
+    ('product_brand', '24s')
+]
+TABLE_SCHEMAS = {
+    'orders': ORDER_SCHEMA,
+    'customers': CUSTOMER_SCHEMA,
+    'products': PRODUCT_SCHEMA
+}
+
+RETURN_WINDOW_DAYS = 30
+
+
+def _read_csv(data_dir: str, name: str) -> List[Dict[str, str]]:
+    with open(os.path.join(data_dir, name), newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def build_snapshot(data_dir: str, as_of: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Precompute per-order, per-customer and per-product features.
+
+    Args:
+        data_dir: Directory with customers.csv, products.csv, orders.csv
+            and returns.csv
+        as_of: Snapshot date for age and 30-day windows (default: the
+            latest order or return date in the data)
+
+    Returns:
+        Snapshot dictionary in the JSON layout (see module docstring)
+    """
+    customers = _read_csv(data_dir, 'customers.csv')
+    products = _read_csv(data_dir, 'products.csv')
+    orders = _read_csv(data_dir, 'orders.csv')
+    returns = _read_csv(data_dir, 'returns.csv')
+
+    if as_of is None:
+        as_of = max(
+            date.fromisoformat(row[column])
+            for rows, column in ((orders, 'order_date'), (returns, 'return_date'))
+            for row in rows
+        )
+    window_start = as_of - timedelta(days=RETURN_WINDOW_DAYS)
+
+    order_totals: Dict[str, Tuple[float, int]] = {}
+    for order in orders:
+        total, count = order_totals.get(order['customer_id'], (0.0, 0))
+        order_totals[order['customer_id']] = (total + float(order['amount']), count + 1)
+
+    recent_returns: Dict[str, int] = {}
+    for row in returns:
+        if window_start < date.fromisoformat(row['return_date']) <= as_of:
+            recent_returns[row['customer_id']] = recent_returns.get(row['customer_id'], 0) + 1
+
+    customer_rows = {}
+    for customer in customers:
+        customer_id = customer['customer_id']
+        total, count = order_totals.get(customer_id, (0.0, 0))
+        registered = date.fromisoformat(customer['registration_date'])
+        customer_rows[customer_id] = [
+            float(customer['return_rate']),
+            int(customer['total_orders']),
+            int(customer['return_count']),
+            max(0, (as_of - registered).days),
+            round(total / count, 2) if count else None,
+            recent_returns.get(customer_id, 0),
+            customer['location'],
+            customer['preferred_payment']
+        ]
+
+    return {
+        'format': SNAPSHOT_FORMAT,
+        'as_of': as_of.isoformat(),
+        'built_at': int(time.time()),
+        'orders': {
+            'fields': [name for name, _ in ORDER_SCHEMA],
+            'rows': {
+                order['order_id']: [
+                    order['customer_id'],
+                    order['product_id'],
+                    float(order['amount']),
+                    order['payment_method'],
+                    int(order['is_festival_season'])
+                ]
+                for order in orders
+            }
+        },
+        'customers': {'fields': [name for name, _ in CUSTOMER_SCHEMA], 'rows': customer_rows},
+        'products': {
+            'fields': [name for name, _ in PRODUCT_SCHEMA],
+            'rows': {
+                product['product_id']: [
+                    float(product['return_rate']),
+                    float(product['price']),
+                    product['category'],
+                    product['brand']
+                ]
+                for product in products
+            }
+        }
+    }
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // BINARY_ALIGNMENT) * BINARY_ALIGNMENT
+
+
+def _encode_value(name: str, code: str, value: Any) -> Any:
+    if code.endswith('s'):
+        encoded = str(value or '').encode('utf-8')
+        if len(encoded) > int(code[:-1]):
+            raise ValueError(f"Value for '{name}' exceeds {code[:-1]} bytes: {value!r}")
+        return encoded
+    if code == 'd':
+        return float('nan') if value is None else float(value)
+    return int(value)
+
+
+def write_binary_snapshot(snapshot: Dict[str, Any], path: str) -> None:
+    """
+    Write a JSON-layout snapshot as a memory-mappable binary file.
+
+    Args:
+        snapshot: Output of build_snapshot (any table with a schema in
+            TABLE_SCHEMAS is written)
+        path: Destination file
+
+    Raises:
+        ValueError: If a string value does not fit its fixed width
+    """
+    tables = []
+    for name, schema in TABLE_SCHEMAS.items():
+        table = snapshot[name]
+        if table['fields'] != [field for field, _ in schema]:
+            raise ValueError(f"Table '{name}' fields do not match TABLE_SCHEMAS")
+        keys = sorted(table['rows'])
+        encoded_keys = [key.encode('utf-8') for key in keys]
+        key_size = max((len(key) for key in encoded_keys), default=1)
+        record = struct.Struct('<' + ''.join(code for _, code in schema))
+        tables.append((name, schema, table['rows'], keys, encoded_keys, key_size, record))
+
+    # Lay out the blocks first so the metadata can record absolute offsets
+    meta: Dict[str, Any] = {
+        'format': SNAPSHOT_FORMAT,
+        'as_of': snapshot['as_of'],
+        'built_at': snapshot.get('built_at', int(time.time())),
+        'tables': {}
+    }
+    for name, schema, _, keys, _, key_size, record in tables:
+        meta['tables'][name] = {
+            'fields': [[field, code] for field, code in schema],
+            'record_format': record.format,
+            'record_size': record.size,
+            'key_size': key_size,
+            'count': len(keys)
+        }
+    # Offsets are fixed-width decimal strings so the metadata length does
+    # not depend on them
+    for name in meta['tables']:
+        meta['tables'][name]['keys_offset'] = '0' * 16
+        meta['tables'][name]['records_offset'] = '0' * 16
+    offset = _aligned(BINARY_HEADER.size + len(json.dumps(meta).encode('utf-8')))
+    for name, _, _, keys, _, key_size, record in tables:
+        table_meta = meta['tables'][name]
+        table_meta['keys_offset'] = f"{offset:016d}"
+        offset = _aligned(offset + key_size * len(keys))
+        table_meta['records_offset'] = f"{offset:016d}"
+        offset = _aligned(offset + record.size * len(keys))
+    meta_bytes = json.dumps(meta).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_LAYOUT_VERSION, 0, len(meta_bytes)))
+        f.write(meta_bytes)
+        for name, schema, rows, keys, encoded_keys, key_size, record in tables:
+            table_meta = meta['tables'][name]
+            f.write(b'\0' * (int(table_meta['keys_offset']) - f.tell()))
+            key_format = struct.Struct(f'{key_size}s')
+            f.write(b''.join(key_format.pack(key) for key in encoded_keys))
+            f.write(b'\0' * (int(table_meta['records_offset']) - f.tell()))
+            f.write(b''.join(
+                record.pack(*(
+                    _encode_value(field, code, value)
+                    for (field, code), value in zip(schema, rows[key])
+                ))
+                for key in keys
+            ))
+        f.write(b'\0' * (offset - f.tell()))
+
+
+class _JsonTable:
+    """Snapshot table held as {id: [values]} in memory."""
+
+    def __init__(self, fields: List[str], rows: Dict[str, List[Any]]):
+        self.fields = fields
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self.rows.get(key)
+        return dict(zip(self.fields, row)) if row is not None else None
+
+
+class _KeyIndex:
+    """Sequence view over a fixed-width ID block (for bisect without NumPy)."""
+
+    def __init__(self, buffer: Any, offset: int, key_size: int, count: int):
+        self.buffer = buffer
+        self.offset = offset
+        self.key_size = key_size
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> bytes:
+        start = self.offset + index * self.key_size
+        return self.buffer[start:start + self.key_size]
+
+
+class _MappedTable:
+    """Fixed-width snapshot table read in place from a memory map."""
+
+    def __init__(self, buffer: Any, meta: Dict[str, Any]):
+        self.buffer = buffer
+        self.fields = [field for field, _ in meta['fields']]
+        self.record = struct.Struct(meta['record_format'])
+        self.key_size = int(meta['key_size'])
+        self.count = int(meta['count'])
+        self.records_offset = int(meta['records_offset'])
+        keys_offset = int(meta['keys_offset'])
+        self._strings = [i for i, (_, code) in enumerate(meta['fields']) if code.endswith('s')]
+        self._floats = [i for i, (_, code) in enumerate(meta['fields']) if code == 'd']
+        self._codes = [code for _, code in meta['fields']]
+        # Checked once here, not per lookup
+        self._use_numpy = bool(np)
+        if self._use_numpy:
+            self._keys = np.frombuffer(buffer, dtype=f'S{self.key_size}', count=self.count,
+                                       offset=keys_offset)
+        else:
+            self._keys = _KeyIndex(buffer, keys_offset, self.key_size, self.count)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def find(self, key: str) -> int:
+        """Record index of an ID, or -1 if it is not in the table."""
+        encoded = key.encode('utf-8')
+        if len(encoded) > self.key_size:
+            return -1
+        padded = encoded.ljust(self.key_size, b'\0')
+        if self._use_numpy:
+            index = int(self._keys.searchsorted(padded))
+        else:
+            index = bisect_left(self._keys, padded)
+        if index < self.count and self._keys[index].rstrip(b'\0') == encoded:
+            return index
+        return -1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        index = self.find(key)
+        if index < 0:
+            return None
+        values = list(self.record.unpack_from(
+            self.buffer, self.records_offset + index * self.record.size
+        ))
+        for i in self._strings:
+            values[i] = values[i].rstrip(b'\0').decode('utf-8')
+        for i in self._floats:
+            if math.isnan(values[i]):
+                values[i] = None
+        return dict(zip(self.fields, values))
+
+    def records(self) -> Any:
+        """Zero-copy NumPy structured view of every record (columnar access)."""
+        if not np:
+            raise RuntimeError("NumPy is not installed")
+        dtype = np.dtype([
+            (field, f'S{code[:-1]}' if code.endswith('s') else '<' + code)
+            for field, code in zip(self.fields, self._codes)
+        ])
+        return np.frombuffer(self.buffer, dtype=dtype, count=self.count,
+                             offset=self.records_offset)
+
+
+class FeatureStore:
+    """Loaded snapshot with lookups by order, customer and product ID."""
+
+    def __init__(self, tables: Dict[str, Any], as_of: str):
+        """
+        Args:
+            tables: Table name -> table with get(id) and len()
+            as_of: Snapshot date (ISO format)
+        """
+        self._tables = tables
+        self.as_of = as_of
+        self.version = f"{SNAPSHOT_FORMAT}@{as_of}"
+        self.load_ms: Optional[float] = None
+        self._mmap: Optional[mmap.mmap] = None
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict[str, Any]) -> 'FeatureStore':
+        """Wrap an in-memory JSON-layout snapshot."""
+        if snapshot.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported feature snapshot format: {snapshot.get('format')}")
+        tables = {
+            name: _JsonTable(snapshot[name]['fields'], snapshot[name]['rows'])
+            for name in TABLE_SCHEMAS
+        }
+        return cls(tables, snapshot['as_of'])
+
+    @classmethod
+    def open_binary(cls, path: str) -> 'FeatureStore':
+        """Memory-map a binary snapshot (records are decoded on lookup)."""
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, layout_version, _, meta_size = BINARY_HEADER.unpack_from(buffer, 0)
+        if magic != BINARY_MAGIC or layout_version != BINARY_LAYOUT_VERSION:
+            buffer.close()
+            raise ValueError(f"Not a v{BINARY_LAYOUT_VERSION} binary feature snapshot: {path}")
+        start = BINARY_HEADER.size
+        meta = json.loads(buffer[start:start + meta_size])
+        if meta.get('format') != SNAPSHOT_FORMAT:
+            buffer.close()
+            raise ValueError(f"Unsupported feature snapshot format: {meta.get('format')}")
+        tables = {
+            name: _MappedTable(buffer, meta['tables'][name]) for name in TABLE_SCHEMAS
+        }
+        store = cls(tables, meta['as_of'])
+        store._mmap = buffer
+        return store
+
+    @classmethod
+    def load(cls, path: str) -> 'FeatureStore':
+        """Open a snapshot file, detecting JSON or binary from its first bytes."""
+        started = time.perf_counter()
+        with open(path, 'rb') as f:
+            is_binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+        if is_binary:
+            store = cls.open_binary(path)
+        else:
+            with open(path) as f:
+                store = cls.from_snapshot(json.load(f))
+        store.load_ms = (time.perf_counter() - started) * 1000
+        return store
+
+    def size(self) -> Dict[str, int]:
+        return {name: len(table) for name, table in self._tables.items()}
+
+    def _lookup(self, table: str, key: Any) -> Optional[Dict[str, Any]]:
+        if not isinstance(key, str):
+            return None
+        return self._tables[table].get(key)
+
+    def get_order(self, order_id: str) -> Optional[Dict[str, Any]]:
+        return self._lookup('orders', order_id)
+
+    def get_customer(self, customer_id: str) -> Optional[Dict[str, Any]]:
+        return self._lookup('customers', customer_id)
+
+    def get_product(self, product_id: str) -> Optional[Dict[str, Any]]:
+        return self._lookup('products', product_id)
+
+    def resolve(self, body: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Fill in request fields from the snapshot.
+
+        The order row (by order_id) supplies customer_id/product_id when the
+        caller omits them; customer and product rows are then looked up by
+        those IDs. Fields present in the body (not None) are never replaced.
+
+        Args:
+            body: Request payload for one order
+
+        Returns:
+            Tuple of (merged payload, lookup info: snapshot version, which
+            entities were found and which fields were filled in)
+        """
+        resolved: Dict[str, Any] = {}
+        found = {}
+
+        order = self.get_order(body.get('order_id'))
+        found['order'] = order is not None
+        if order:
+            resolved.update(order)
+
+        customer_id = body.get('customer_id') or resolved.get('customer_id')
+        customer = self.get_customer(customer_id)
+        found['customer'] = customer is not None
+        if customer:
+            resolved.update(customer)
+
+        product_id = body.get('product_id') or resolved.get('product_id')
+        product = self.get_product(product_id)
+        found['product'] = product is not None
+        if product:
+            resolved.update(product)
+
+        # A caller-supplied is_cod overrides the snapshot's payment method
+        if body.get('is_cod') is not None:
+            resolved.pop('payment_method', None)
+
+        filled = sorted(
+            name for name, value in resolved.items()
+            if value is not None and body.get(name) is None
+        )
+        merged = dict(body)
+        for name in filled:
+            merged[name] = resolved[name]
+        return merged, {'snapshot': self.version, 'found': found, 'filled': filled}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the online feature snapshot')
+    parser.add_argument('data_dir', help='Directory with the sample-data CSV files')
+    parser.add_argument('output_path', help='Snapshot to write (.bin for the binary format)')
+    parser.add_argument('--as-of', type=date.fromisoformat, default=None,
+                        help='Snapshot date (YYYY-MM-DD, default: latest date in the data)')
+    args = parser.parse_args()
+
+    snapshot = build_snapshot(args.data_dir, args.as_of)
+    if args.output_path.endswith('.bin'):
+        write_binary_snapshot(snapshot, args.output_path)
+    else:
+        with open(args.output_path, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+
+    store = FeatureStore.load(args.output_path)
+    print(f"Wrote {args.output_path} ({os.path.getsize(args.output_path)} bytes, "
+          f"as of {store.as_of}): {store.size()}; loads in {store.load_ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
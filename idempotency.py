@@ -0,0 +1,177 @@
+"""
+Idempotent scoring for repeated submissions of the same order.
+
+Upstream retries and the demo frontend often send the same order_id
+several times in a row. Each repeat used to run the model backends and
+Bedrock again and write another audit row. A request is now identified by
+its order_id plus a hash of the resolved model features and the options
+that shape the response (use_bedrock, explanation_mode, model version);
+a repeat within the idempotency window gets the stored response back.
+
+Tiers:
+    - In-process LRU with the window as TTL (retries landing on the same
+      warm container)
+    - The audit row itself: each stored prediction carries request_hash and
+      the response JSON, and other containers find it through the
+      predictions table's order-id-index GSI (order_id, timestamp >= window
+      start). GSI reads are eventually consistent, so a retry arriving
+      within a few hundred milliseconds on another container may still be
+      scored again.
+
+Replays skip the model, Bedrock and the audit write, and carry
+"idempotency": {"status": "replay", "tier", "original_timestamp"}.
+"""
+
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+FINGERPRINT_VERSION = 'idem-v1'
+
+
+def request_fingerprint(features: Dict[str, Any], options: Dict[str, Any]) -> str:
+    """
+    Hash of everything that determines a prediction response.
+
+    Args:
+        features: Model features after feature-store lookup and extraction
+        options: Response-shaping request options (e.g. use_bedrock)
+
+    Returns:
+        Hex digest (32 characters)
+    """
+    canonical = json.dumps([FINGERPRINT_VERSION, features, options], sort_keys=True,
+                           separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:32]
+
+
+class IdempotencyCache:
+    """Recent prediction responses by (order_id, request hash)."""
+
+    def __init__(self, window_seconds: float = 300, maxsize: int = 2048,
+                 table: Any = None, index_name: str = 'order-id-index'):
+        """
+        Args:
+            window_seconds: How long a response is replayed for repeats
+            maxsize: Maximum responses kept in process (LRU eviction)
+            table: boto3 DynamoDB predictions Table for cross-container
+                lookups, or None for the in-process tier only
+            index_name: GSI on (order_id, timestamp) of the predictions table
+        """
+        self.window_seconds = window_seconds
+        self.maxsize = maxsize
+        self.table = table
+        self.index_name = index_name
+        self._entries: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_local = 0
+        self.hits_table = 0
+        self.misses = 0
+
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def _get_table(self, order_id: str, request_hash: str) -> Optional[Dict[str, Any]]:
+        if self.table is None:
+            return None
+        since = (datetime.now() - timedelta(seconds=self.window_seconds)).isoformat()
+        try:
+            result = self.table.query(
+                IndexName=self.index_name,
+                KeyConditionExpression='order_id = :order_id AND #ts >= :since',
+                FilterExpression='request_hash = :request_hash',
+                ExpressionAttributeNames={'#ts': 'timestamp'},
+                ExpressionAttributeValues={
+                    ':order_id': order_id,
+                    ':since': since,
+                    ':request_hash': request_hash
+                },
+                ScanIndexForward=False
+            )
+        except Exception as e:
+            print(f"Idempotency lookup error: {str(e)}")
+            return None
+        for item in result.get('Items', []):
+            if item.get('response'):
+                response = json.loads(item['response'])
+                # The async worker may have attached the explanation since
+                status = item.get('explanation_status')
+                if status:
+                    response['explanation_status'] = status
+                    if item.get('explanation'):
+                        response['explanation'] = json.loads(item['explanation'])
+                    # The audit row is written before the job is queued
+                    if status != 'failed' and response.get('prediction_id'):
+                        response['explanation_url'] = f"/explanations/{response['prediction_id']}"
+                return response
+        return None
+
+    def get(self, order_id: str, request_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Stored response for a repeat request, or None if it must be scored.
+
+        Returns:
+            Copy of the original response plus replay metadata under
+            "idempotency"
+        """
+        key = f"{order_id}#{request_hash}"
+        tier = 'local'
+        response = self._get_local(key)
+        if response is None:
+            response = self._get_table(order_id, request_hash)
+            if response is not None:
+                tier = 'table'
+                self.put(order_id, request_hash, response)
+
+        with self._lock:
+            if response is None:
+                self.misses += 1
+                return None
+            if tier == 'local':
+                self.hits_local += 1
+            else:
+                self.hits_table += 1
+        replay = copy.deepcopy(response)
+        replay['idempotency'] = {
+            'status': 'replay',
+            'tier': tier,
+            'original_timestamp': response.get('timestamp')
+        }
+        return replay
+
+    def put(self, order_id: str, request_hash: str, response: Dict[str, Any]) -> None:
+        """Remember a freshly computed response for the idempotency window."""
+        key = f"{order_id}#{request_hash}"
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.window_seconds, copy.deepcopy(response))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Container-level counters."""
+        with self._lock:
+            hits = self.hits_local + self.hits_table
+            lookups = hits + self.misses
+            return {
+                'replays': hits,
+                'replays_local': self.hits_local,
+                'replays_table': self.hits_table,
+                'misses': self.misses,
+                'replay_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries)
+            }
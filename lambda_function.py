@@ -19,23 +19,462 @@ Version: 1.2-hybrid
 """
 
 import json
-import boto3
 import os
+import time
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextvars import Token
 from datetime import datetime
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, Iterator, List, Tuple, Optional, Any
 
-# Initialize AWS clients
-bedrock_runtime = boto3.client('bedrock-runtime', region_name='us-east-1')
-sagemaker_runtime = boto3.client('sagemaker-runtime', region_name='ap-south-1')
-dynamodb = boto3.resource('dynamodb', region_name='ap-south-1')
+from audit_writer import AuditWriter, drain_on_shutdown
+from aws_clients import aws_client, aws_resource, dynamodb_table, preload, without_deadline
+from circuit_breaker import CircuitBreaker, circuit_allows, circuit_record
+from explanation_cache import ExplanationCache, explanation_signature
+from explanation_queue import LocalExplanationQueue, SqsExplanationQueue, is_sqs_event
+from explanation_routing import DEFAULT_ROUTING, ExplanationRouter, build_templates, parse_routing
+from explanation_stream import (
+    NDJSON_CONTENT_TYPE,
+    StreamStalled,
+    bedrock_text_deltas,
+    iter_with_deadline,
+    ndjson_line
+)
+from feature_pipeline import FEATURE_NAMES, INPUT_FEATURES, transform_row
+from feature_store import FeatureStore
+from idempotency import IdempotencyCache, request_fingerprint
+from local_model import LocalModel
+from micro_batcher import MicroBatcher
+from request_deadline import (
+    Deadline,
+    current_deadline,
+    note_timeout,
+    start_deadline,
+    stop_deadline,
+    within_budget
+)
+from request_timing import (
+    RequestTimer,
+    RollingLatency,
+    current_timer,
+    emf_line,
+    start_timer,
+    stop_timer,
+    timed
+)
+from stream_consumer import StreamAggregates, handle_stream_batch, is_kinesis_event
+from risk_scoring import (
+    RISK_FEATURES,
+    active_rules,
+    calculate_risk_score,
+    calculate_risk_scores,
+    decode_risk_factors,
+    explain_risk_factors,
+    reload_rules_if_changed
+)
+
+# AWS clients are built on first use (see aws_clients) and cached for the container;
+# under a request deadline each call uses a variant with timeouts that fit it
+bedrock_runtime = aws_client('bedrock-runtime', region='us-east-1')
+sagemaker_runtime = aws_client('sagemaker-runtime', region='ap-south-1', max_attempts=2)
+dynamodb = aws_resource('dynamodb', region='ap-south-1', max_attempts=2)
 
 # Configuration from environment variables
 PREDICTIONS_TABLE = os.environ.get('PREDICTIONS_TABLE', 'return-abuse-predictions')
 SAGEMAKER_ENDPOINT = os.environ.get('SAGEMAKER_ENDPOINT', 'return-abuse-prod-endpoint')
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '500'))
+EXPLANATION_CACHE_ENABLED = os.environ.get('EXPLANATION_CACHE_ENABLED', 'true').lower() == 'true'
+EXPLANATION_CACHE_SIZE = int(os.environ.get('EXPLANATION_CACHE_SIZE', '1024'))
+EXPLANATION_CACHE_TTL = int(os.environ.get('EXPLANATION_CACHE_TTL', '3600'))
+EXPLANATION_CACHE_TABLE = os.environ.get('EXPLANATION_CACHE_TABLE', '')
+EXPLANATION_QUEUE_URL = os.environ.get('EXPLANATION_QUEUE_URL', '')
+
+# Scoring backends tried in order; the rule-based model always ends the chain
+MODEL_BACKENDS = [
+    backend.strip()
+    for backend in os.environ.get('MODEL_BACKENDS', 'sagemaker,rules').split(',')
+    if backend.strip()
+]
+LOCAL_MODEL_PATH = os.environ.get('LOCAL_MODEL_PATH', '')
+LOCAL_MODEL_PRELOAD = os.environ.get('LOCAL_MODEL_PRELOAD', 'true').lower() == 'true'
+# Feature snapshot (local path or s3://bucket/key); empty disables ID lookups
+FEATURE_SNAPSHOT_PATH = os.environ.get('FEATURE_SNAPSHOT_PATH', '')
+# Live order/return counters from the Kinesis event stream
+STREAM_AGGREGATES_ENABLED = os.environ.get('STREAM_AGGREGATES_ENABLED', 'true').lower() == 'true'
+STREAM_AGGREGATES_TABLE = os.environ.get('STREAM_AGGREGATES_TABLE', '')
+VELOCITY_IDLE_DAYS = int(os.environ.get('VELOCITY_IDLE_DAYS', '90'))
+STREAM_AGGREGATES_CACHE_SIZE = int(os.environ.get('STREAM_AGGREGATES_CACHE_SIZE', '10000'))
+# Repeats of the same order + features within the window replay the stored result
+IDEMPOTENCY_ENABLED = os.environ.get('IDEMPOTENCY_ENABLED', 'true').lower() == 'true'
+IDEMPOTENCY_WINDOW_SECONDS = int(os.environ.get('IDEMPOTENCY_WINDOW_SECONDS', '300'))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '2048'))
+IDEMPOTENCY_TABLE_LOOKUP = os.environ.get('IDEMPOTENCY_TABLE_LOOKUP', 'true').lower() == 'true'
+# Per-stage timings: one EMF metrics log line per invocation, rolling percentiles
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'ReturnAbuseDetection')
+DEBUG_TIMINGS_ENABLED = os.environ.get('DEBUG_TIMINGS_ENABLED', 'true').lower() == 'true'
+TIMINGS_WINDOW = int(os.environ.get('TIMINGS_WINDOW', '1024'))
+# Streaming explanations: the rule-based text replaces a Bedrock stream that stalls
+EXPLANATION_STREAM_FIRST_CHUNK_MS = int(os.environ.get('EXPLANATION_STREAM_FIRST_CHUNK_MS', '3000'))
+EXPLANATION_STREAM_STALL_MS = int(os.environ.get('EXPLANATION_STREAM_STALL_MS', '1500'))
+# Audit rows: buffered (write-behind BatchWriteItem) or sync (written on the request path)
+AUDIT_WRITE_MODE = os.environ.get('AUDIT_WRITE_MODE', 'buffered').lower()
+AUDIT_FLUSH_SIZE = int(os.environ.get('AUDIT_FLUSH_SIZE', '25'))
+AUDIT_FLUSH_AGE_MS = int(os.environ.get('AUDIT_FLUSH_AGE_MS', '200'))
+AUDIT_BUFFER_SIZE = int(os.environ.get('AUDIT_BUFFER_SIZE', '10000'))
+# Lambda sends SIGTERM only to functions with an extension, and freezes the
+# flush thread between invocations: there the buffer is flushed before each
+# invocation returns (set false when an extension drains it on SIGTERM)
+AUDIT_INVOCATION_FLUSH = os.environ.get(
+    'AUDIT_INVOCATION_FLUSH', 'true' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else 'false'
+).lower() == 'true'
+AUDIT_INVOCATION_FLUSH_MS = int(os.environ.get('AUDIT_INVOCATION_FLUSH_MS', '1000'))
+# Per-request latency budget for scoring routes (request_deadline.py); 0 disables it
+REQUEST_BUDGET_MS = int(os.environ.get('REQUEST_BUDGET_MS', '500'))
+# Kept back for the work after the last remote call (rules, response, serialization)
+BUDGET_RESERVE_MS = int(os.environ.get('BUDGET_RESERVE_MS', '20'))
+# Least time a stage needs; with less left it is skipped or degraded
+SAGEMAKER_MIN_BUDGET_MS = int(os.environ.get('SAGEMAKER_MIN_BUDGET_MS', '50'))
+# Bedrock needs its tier's median call (explanation_routing typical_ms);
+# this is assumed until enough calls of the tier were seen
+BEDROCK_MIN_BUDGET_MS = int(os.environ.get('BEDROCK_MIN_BUDGET_MS', '2000'))
+AUDIT_SYNC_MIN_BUDGET_MS = int(os.environ.get('AUDIT_SYNC_MIN_BUDGET_MS', '50'))
+STREAM_AGGREGATES_MIN_BUDGET_MS = int(os.environ.get('STREAM_AGGREGATES_MIN_BUDGET_MS', '10'))
+# Circuit breakers for SageMaker and Bedrock (circuit_breaker.py): open after
+# CIRCUIT_ERROR_RATE errors or CIRCUIT_SLOW_CALL_RATE slow calls over the window
+CIRCUIT_BREAKERS_ENABLED = os.environ.get('CIRCUIT_BREAKERS_ENABLED', 'true').lower() == 'true'
+CIRCUIT_WINDOW_SECONDS = float(os.environ.get('CIRCUIT_WINDOW_SECONDS', '30'))
+CIRCUIT_MIN_CALLS = int(os.environ.get('CIRCUIT_MIN_CALLS', '20'))
+CIRCUIT_ERROR_RATE = float(os.environ.get('CIRCUIT_ERROR_RATE', '0.5'))
+CIRCUIT_SLOW_CALL_RATE = float(os.environ.get('CIRCUIT_SLOW_CALL_RATE', '0.8'))
+CIRCUIT_OPEN_SECONDS = float(os.environ.get('CIRCUIT_OPEN_SECONDS', '15'))
+CIRCUIT_HALF_OPEN_CALLS = int(os.environ.get('CIRCUIT_HALF_OPEN_CALLS', '3'))
+SAGEMAKER_SLOW_CALL_MS = float(os.environ.get('SAGEMAKER_SLOW_CALL_MS', '300'))
+# A Bedrock call is slow past BEDROCK_SLOW_CALL_FACTOR x its tier's median
+# call; BEDROCK_SLOW_CALL_MS until the median is known
+BEDROCK_SLOW_CALL_FACTOR = float(os.environ.get('BEDROCK_SLOW_CALL_FACTOR', '3'))
+BEDROCK_SLOW_CALL_MS = float(os.environ.get('BEDROCK_SLOW_CALL_MS', '10000'))
+STREAM_AGGREGATES_SLOW_CALL_MS = float(os.environ.get('STREAM_AGGREGATES_SLOW_CALL_MS', '50'))
+# Micro-batching of concurrent single-order SageMaker calls (micro_batcher.py);
+# only useful where one process serves many requests at once (stream_server.py)
+MICRO_BATCH_ENABLED = os.environ.get('MICRO_BATCH_ENABLED', 'false').lower() == 'true'
+MICRO_BATCH_MAX_ROWS = int(os.environ.get('MICRO_BATCH_MAX_ROWS', '64'))
+MICRO_BATCH_MIN_WAIT_MS = float(os.environ.get('MICRO_BATCH_MIN_WAIT_MS', '2'))
+MICRO_BATCH_MAX_WAIT_MS = float(os.environ.get('MICRO_BATCH_MAX_WAIT_MS', '5'))
+MICRO_BATCH_TARGET_CALL_MS = float(os.environ.get('MICRO_BATCH_TARGET_CALL_MS', '50'))
+MICRO_BATCH_WORKERS = int(os.environ.get('MICRO_BATCH_WORKERS', '4'))
+MICRO_BATCH_ADAPTIVE = os.environ.get('MICRO_BATCH_ADAPTIVE', 'true').lower() == 'true'
+# AWS clients to build during init instead of on first use (comma-separated:
+# bedrock, sagemaker, dynamodb), for SnapStart or provisioned concurrency
+AWS_CLIENT_PRELOAD = [
+    name.strip()
+    for name in os.environ.get('AWS_CLIENT_PRELOAD', '').split(',')
+    if name.strip()
+]
+
+# Explanation prompt per risk level: fallback (no Bedrock) | compact | full
+EXPLANATION_ROUTING = os.environ.get('EXPLANATION_ROUTING', DEFAULT_ROUTING)
+EXPLANATION_COMPACT_MAX_TOKENS = int(os.environ.get('EXPLANATION_COMPACT_MAX_TOKENS', '150'))
+EXPLANATION_FULL_MAX_TOKENS = int(os.environ.get('EXPLANATION_FULL_MAX_TOKENS', '500'))
+
+# Claude Sonnet 4 cross-region inference profile
+BEDROCK_MODEL_ID = 'us.anthropic.claude-sonnet-4-20250514-v1:0'
 
 # Model version tracking
 MODEL_VERSION = 'v1.2-hybrid'
 
+# Column order expected by the XGBoost endpoint (CSV, no header): the 16
+# columns train.py builds with the shared feature pipeline
+SAGEMAKER_FEATURES = FEATURE_NAMES
+
+# Optional model inputs (usually from the feature store); absent ones are
+# sent to the model as missing values
+OPTIONAL_FEATURES = [name for name in INPUT_FEATURES if name not in RISK_FEATURES]
+
+# Local model is loaded once per container: during init when preloading,
+# otherwise on the first request that reaches the "local" backend
+LOCAL_MODEL = None
+if 'local' in MODEL_BACKENDS and LOCAL_MODEL_PATH:
+    LOCAL_MODEL = LocalModel(LOCAL_MODEL_PATH)
+    if LOCAL_MODEL_PRELOAD:
+        LOCAL_MODEL.load()
+
+
+
+def load_feature_store(path: str) -> Optional[FeatureStore]:
+    """
+    Load the feature snapshot once per container.
+    
+    Args:
+        path: Local snapshot file, or s3://bucket/key (downloaded to /tmp)
+        
+    Returns:
+        FeatureStore, or None if the snapshot could not be loaded
+        (requests then rely on caller-supplied features only)
+    """
+    try:
+        if path.startswith('s3://'):
+            bucket, _, key = path[len('s3://'):].partition('/')
+            local_path = os.path.join('/tmp', os.path.basename(key))
+            if not os.path.exists(local_path):
+                import boto3
+                boto3.client('s3').download_file(bucket, key, local_path)
+            path = local_path
+        store = FeatureStore.load(path)
+        print(f"Loaded feature snapshot {store.version} in {store.load_ms:.1f} ms: {store.size()}")
+        return store
+    except Exception as e:
+        print(f"Feature snapshot load error: {str(e)}")
+        return None
+
+
+FEATURE_STORE = load_feature_store(FEATURE_SNAPSHOT_PATH) if FEATURE_SNAPSHOT_PATH else None
+
+# Explanation routing and its per-tier counters live for the container
+EXPLANATION_ROUTER = ExplanationRouter(
+    parse_routing(EXPLANATION_ROUTING),
+    build_templates(EXPLANATION_COMPACT_MAX_TOKENS, EXPLANATION_FULL_MAX_TOKENS),
+    latency_window=TIMINGS_WINDOW
+)
+
+# Explanation cache lives at module scope so warm containers reuse it
+EXPLANATION_CACHE = ExplanationCache(
+    maxsize=EXPLANATION_CACHE_SIZE,
+    ttl_seconds=EXPLANATION_CACHE_TTL,
+    shared_table=(
+        dynamodb_table(dynamodb, EXPLANATION_CACHE_TABLE) if EXPLANATION_CACHE_TABLE else None
+    )
+) if EXPLANATION_CACHE_ENABLED else None
+
+
+# Idempotency cache: in-process LRU, then the audit rows via order-id-index
+IDEMPOTENCY_CACHE = IdempotencyCache(
+    window_seconds=IDEMPOTENCY_WINDOW_SECONDS,
+    maxsize=IDEMPOTENCY_CACHE_SIZE,
+    table=dynamodb_table(dynamodb, PREDICTIONS_TABLE) if IDEMPOTENCY_TABLE_LOOKUP else None
+) if IDEMPOTENCY_ENABLED else None
+
+# Rolling per-stage latency samples of this container (debug_timings)
+STAGE_LATENCY = RollingLatency(window=TIMINGS_WINDOW)
+
+
+def _circuit_breaker(name: str, slow_call_ms: float) -> Optional[CircuitBreaker]:
+    if not CIRCUIT_BREAKERS_ENABLED:
+        return None
+    return CircuitBreaker(
+        name,
+        window_s=CIRCUIT_WINDOW_SECONDS,
+        min_calls=CIRCUIT_MIN_CALLS,
+        error_rate=CIRCUIT_ERROR_RATE,
+        slow_call_ms=slow_call_ms,
+        slow_rate=CIRCUIT_SLOW_CALL_RATE,
+        open_s=CIRCUIT_OPEN_SECONDS,
+        half_open_calls=CIRCUIT_HALF_OPEN_CALLS
+    )
+
+
+# Breaker state is per container and carries over warm invocations
+SAGEMAKER_BREAKER = _circuit_breaker('sagemaker', SAGEMAKER_SLOW_CALL_MS)
+BEDROCK_BREAKER = _circuit_breaker('bedrock', BEDROCK_SLOW_CALL_MS)
+STREAM_AGGREGATES_BREAKER = _circuit_breaker(
+    'stream_aggregates', STREAM_AGGREGATES_SLOW_CALL_MS
+) if STREAM_AGGREGATES_TABLE else None
+CIRCUIT_BREAKERS = [
+    breaker for breaker in (SAGEMAKER_BREAKER, BEDROCK_BREAKER, STREAM_AGGREGATES_BREAKER)
+    if breaker
+]
+
+# Stream counters start where the snapshot ends; returns of orders that
+# predate the stream are attributed to products through the snapshot
+STREAM_AGGREGATES = StreamAggregates(
+    shared_table=(
+        dynamodb_table(dynamodb, STREAM_AGGREGATES_TABLE) if STREAM_AGGREGATES_TABLE else None
+    ),
+    as_of=FEATURE_STORE.as_of if FEATURE_STORE is not None else None,
+    order_lookup=(
+        lambda order_id: (FEATURE_STORE.get_order(order_id) or {}).get('product_id')
+    ) if FEATURE_STORE is not None else None,
+    velocity_idle_days=VELOCITY_IDLE_DAYS,
+    read_cache_size=STREAM_AGGREGATES_CACHE_SIZE,
+    read_min_budget_ms=STREAM_AGGREGATES_MIN_BUDGET_MS,
+    breaker=STREAM_AGGREGATES_BREAKER
+) if STREAM_AGGREGATES_ENABLED else None
+
+# Audit writer and its flush thread live for the container; drained on shutdown
+AUDIT_WRITER = AuditWriter(
+    dynamodb,
+    PREDICTIONS_TABLE,
+    mode=AUDIT_WRITE_MODE,
+    flush_size=AUDIT_FLUSH_SIZE,
+    flush_age_ms=AUDIT_FLUSH_AGE_MS,
+    max_buffer=AUDIT_BUFFER_SIZE,
+    latency_window=TIMINGS_WINDOW
+)
+# Sync mode drains too: requests out of time defer their rows to the buffer
+drain_on_shutdown(AUDIT_WRITER)
+
+
+def _score_sagemaker_rows(rows: List[Tuple[str, Optional[Deadline]]]
+                          ) -> List[Tuple[Optional[float], List[Dict[str, Any]]]]:
+    """
+    SAGEMAKER_BATCHER handler: one multi-row call for (CSV row, deadline)
+    pairs submitted by concurrent requests.
+    
+    Budgets are read at dispatch, after the rows waited in the queue. Rows
+    whose request has less than SAGEMAKER_MIN_BUDGET_MS left stay out of the
+    call; the others share it under the tightest budget among them. Each row
+    was admitted by SAGEMAKER_BREAKER already, so the call records its outcome
+    once without asking the breaker again.
+    
+    Returns:
+        (score, degradations) per row: the score is None if the row was left
+        out or the call failed; the degradations of the call go back to the
+        request, which records them on its own deadline
+    """
+    budgets = [deadline.remaining_ms() if deadline is not None else None for _, deadline in rows]
+    results: List[Tuple[Optional[float], List[Dict[str, Any]]]] = [
+        (None, [{'stage': 'sagemaker', 'reason': 'budget', 'count': 1}])
+    ] * len(rows)
+    called = [index for index, budget_ms in enumerate(budgets)
+              if budget_ms is None or budget_ms >= SAGEMAKER_MIN_BUDGET_MS]
+    if not called:
+        return results
+    call_budgets = [budgets[index] for index in called if budgets[index] is not None]
+    deadline, deadline_token = start_deadline(min(call_budgets)) if call_budgets else (None, None)
+    try:
+        risk_scores = _invoke_sagemaker_rows([rows[index][0] for index in called],
+                                             admitted=True)
+    finally:
+        if deadline_token is not None:
+            stop_deadline(deadline_token)
+    degradations = deadline.degradations if deadline is not None else []
+    for position, index in enumerate(called):
+        results[index] = (risk_scores[position] if risk_scores is not None else None,
+                          degradations)
+    return results
+
+
+def new_sagemaker_batcher(**overrides) -> MicroBatcher:
+    """MicroBatcher for single-order SageMaker calls, MICRO_BATCH_* settings unless overridden."""
+    settings = dict(
+        max_rows=MICRO_BATCH_MAX_ROWS,
+        min_wait_ms=MICRO_BATCH_MIN_WAIT_MS,
+        max_wait_ms=MICRO_BATCH_MAX_WAIT_MS,
+        target_call_ms=MICRO_BATCH_TARGET_CALL_MS,
+        workers=MICRO_BATCH_WORKERS,
+        adaptive=MICRO_BATCH_ADAPTIVE
+    )
+    settings.update(overrides)
+    return MicroBatcher(_score_sagemaker_rows, name='sagemaker-batch', **settings)
+
+
+# Concurrent single-order SageMaker calls of this process share micro-batches
+SAGEMAKER_BATCHER = new_sagemaker_batcher() if MICRO_BATCH_ENABLED else None
+
+# Lazy clients by AWS_CLIENT_PRELOAD name (build times in debug_timings)
+AWS_CLIENTS = {
+    'bedrock': bedrock_runtime,
+    'sagemaker': sagemaker_runtime,
+    'dynamodb': dynamodb
+}
+preload(AWS_CLIENTS, AWS_CLIENT_PRELOAD,
+        REQUEST_BUDGET_MS - BUDGET_RESERVE_MS if REQUEST_BUDGET_MS > 0 else None)
+
+
+def _bedrock_slow_call_ms(tier: str) -> float:
+    """Slow threshold of a Bedrock call of the tier (BEDROCK_SLOW_CALL_FACTOR x its median)."""
+    typical_ms = EXPLANATION_ROUTER.typical_ms(tier)
+    if typical_ms is None:
+        return BEDROCK_SLOW_CALL_MS
+    return BEDROCK_SLOW_CALL_FACTOR * typical_ms
+
+
+def _bedrock_budget_ms(tier: str) -> float:
+    """Time a sync Bedrock call of the tier needs: its median call, or BEDROCK_MIN_BUDGET_MS."""
+    typical_ms = EXPLANATION_ROUTER.typical_ms(tier)
+    return typical_ms if typical_ms is not None else BEDROCK_MIN_BUDGET_MS
+
+
+def _to_csv_row(features: Dict[str, Any]) -> str:
+    """Serialize one request's engineered feature vector as a CSV row (SAGEMAKER_FEATURES)."""
+    return ','.join(repr(value) for value in transform_row(features))
+
+
+def predict_with_local_model(feature_rows: List[Dict[str, Any]]) -> Optional[List[float]]:
+    """
+    Score orders with the in-process XGBoost model (LOCAL_MODEL_PATH).
+    
+    Returns:
+        List of risk scores, or None if the local backend is not configured
+        or the model could not be loaded
+    """
+    if LOCAL_MODEL is None:
+        return None
+    with timed('local_model'):
+        return LOCAL_MODEL.predict(feature_rows)
+
+
+def predict_risk(features: Dict[str, Any]) -> Tuple[float, List[Dict[str, Any]], str]:
+    """
+    Score one order with the configured backend chain (MODEL_BACKENDS).
+    
+    Returns:
+        Tuple of (risk_score, risk_factors, model_type) where model_type is
+        "local_ml" | "sagemaker_ml" | "rule_based"
+        
+    SageMaker is skipped when the request deadline has less than
+    SAGEMAKER_MIN_BUDGET_MS left.
+    """
+    for backend in MODEL_BACKENDS:
+        if backend == 'local':
+            risk_scores = predict_with_local_model([features])
+            if risk_scores is not None:
+                return risk_scores[0], [], 'local_ml'
+        elif backend == 'sagemaker':
+            if not within_budget('sagemaker', SAGEMAKER_MIN_BUDGET_MS):
+                continue
+            risk_score, feature_importance = predict_with_sagemaker(features)
+            if risk_score is not None:
+                return risk_score, feature_importance or [], 'sagemaker_ml'
+        elif backend == 'rules':
+            break
+    
+    with timed('rules'):
+        risk_score, risk_factors = calculate_risk_score(features)
+    return risk_score, risk_factors, 'rule_based'
+
+
+def predict_risk_batch(
+    feature_rows: List[Dict[str, Any]]
+) -> Tuple[List[float], Optional[List[int]], str]:
+    """
+    Score many orders with the configured backend chain in one pass per backend.
+    
+    Returns:
+        Tuple of (risk_scores, factor_masks, model_type); factor_masks is only
+        set for the rule-based model (decode with decode_risk_factors)
+    """
+    for backend in MODEL_BACKENDS:
+        if backend == 'local':
+            risk_scores = predict_with_local_model(feature_rows)
+            if risk_scores is not None:
+                return risk_scores, None, 'local_ml'
+        elif backend == 'sagemaker':
+            if not within_budget('sagemaker', SAGEMAKER_MIN_BUDGET_MS):
+                continue
+            risk_scores = predict_with_sagemaker_batch(feature_rows)
+            if risk_scores is not None:
+                return risk_scores, None, 'sagemaker_ml'
+        elif backend == 'rules':
+            break
+    
+    with timed('rules'):
+        risk_scores, factor_masks = calculate_risk_scores({
+            name: [features[name] for features in feature_rows] for name in RISK_FEATURES
+        })
+    return risk_scores, factor_masks, 'rule_based'
+
+
 def predict_with_sagemaker(features: Dict[str, Any]) -> Tuple[Optional[float], List]:
     """
     Use Amazon SageMaker endpoint for ML-based risk prediction.
@@ -54,31 +493,39 @@ def predict_with_sagemaker(features: Dict[str, Any]) -> Tuple[Optional[float], L
         - amount: Order value in INR
         - product_return_rate: Product category return rate
         - is_festival_season: Festival season indicator (0 or 1)
+        - customer_age_days, avg_order_value, return_frequency_30d (optional)
+        - flags, interactions and risk components derived by
+          feature_pipeline (same spec as train.py)
+        
+    While SAGEMAKER_BREAKER is open the endpoint is not called and the
+    caller falls back at once. With SAGEMAKER_BATCHER set the row joins
+    the next micro-batch instead of being sent on its own.
     """
+    started = None
     try:
         if not SAGEMAKER_ENDPOINT:
             return None, []
+        # Built before the call: a row that cannot be serialized is the
+        # request's fault and must not count against the endpoint
+        row = _to_csv_row(features)
+        if SAGEMAKER_BATCHER is not None:
+            return _predict_with_sagemaker_batcher(row)
+        if not circuit_allows(SAGEMAKER_BREAKER):
+            return None, None
         
-        # Prepare features for SageMaker (XGBoost CSV format)
-        feature_vector = [
-            features['customer_return_rate'],
-            features['total_orders'],
-            features['is_cod'],
-            features['amount'],
-            features['product_return_rate'],
-            features['is_festival_season']
-        ]
-        
-        # Call SageMaker endpoint
-        response = sagemaker_runtime.invoke_endpoint(
-            EndpointName=SAGEMAKER_ENDPOINT,
-            ContentType='text/csv',
-            Body=','.join(map(str, feature_vector))
-        )
-        
-        # Parse prediction - SageMaker returns a simple float value
-        result = response['Body'].read().decode().strip()
+        # Call SageMaker endpoint (XGBoost CSV format)
+        started = time.perf_counter()
+        with timed('sagemaker'):
+            response = sagemaker_runtime.invoke_endpoint(
+                EndpointName=SAGEMAKER_ENDPOINT,
+                ContentType='text/csv',
+                Body=row
+            )
+            
+            # Parse prediction - SageMaker returns a simple float value
+            result = response['Body'].read().decode().strip()
         risk_score = float(result)
+        circuit_record(SAGEMAKER_BREAKER, started)
         
         # Feature importance not available from basic XGBoost endpoint
         # Consider using SageMaker Clarify for SHAP values in production
@@ -88,140 +535,120 @@ def predict_with_sagemaker(features: Dict[str, Any]) -> Tuple[Optional[float], L
         
     except Exception as e:
         print(f"SageMaker prediction error: {str(e)}")
+        timed_out = note_timeout('sagemaker', e)
+        if started is not None:
+            circuit_record(SAGEMAKER_BREAKER, started, error=True, timed_out=timed_out)
         return None, None
 
 
-def calculate_risk_score(features: Dict[str, Any]) -> float:
+def _predict_with_sagemaker_batcher(row: str) -> Tuple[Optional[float], List]:
     """
-    Rule-based risk scoring algorithm (fallback when SageMaker unavailable).
+    Score one CSV row through SAGEMAKER_BATCHER, waiting at most for the time
+    the request deadline has left.
     
-    This algorithm uses weighted factors based on e-commerce domain expertise
-    and Indian market patterns.
+    The request holds the SAGEMAKER_BREAKER admission (a probe, when
+    half-open) while its row waits and gives it back once answered: the
+    batch call records its own outcome, once for all of its rows.
+    """
+    deadline = current_deadline()
+    budget_ms = deadline.remaining_ms() if deadline is not None else None
+    if budget_ms is not None and budget_ms < SAGEMAKER_MIN_BUDGET_MS:
+        deadline.degrade('sagemaker', 'budget')
+        return None, None
+    if not circuit_allows(SAGEMAKER_BREAKER):
+        return None, None
+    try:
+        with timed('sagemaker'):
+            future = SAGEMAKER_BATCHER.submit((row, deadline))
+            try:
+                risk_score, degradations = future.result(
+                    None if budget_ms is None else budget_ms / 1000
+                )
+            except FutureTimeoutError:
+                if deadline is not None:
+                    deadline.degrade('sagemaker', 'timeout')
+                return None, None
+    finally:
+        if SAGEMAKER_BREAKER is not None:
+            SAGEMAKER_BREAKER.discard()
+    if deadline is not None:
+        for degradation in degradations:
+            for _ in range(degradation['count']):
+                deadline.degrade(degradation['stage'], degradation['reason'])
+    return (risk_score, []) if risk_score is not None else (None, None)
+
+
+def predict_with_sagemaker_batch(feature_rows: List[Dict[str, Any]]) -> Optional[List[float]]:
+    """
+    Score many orders with a single multi-row SageMaker invocation.
     
     Args:
-        features: Dictionary containing customer and order features
+        feature_rows: List of feature dictionaries (same shape as predict_with_sagemaker)
         
     Returns:
-        Risk score between 0.0 and 1.0
-        
-    Risk Factors:
-        - Customer return rate (40% weight)
-        - Order history and value (30% weight)
-        - Payment method - COD risk (15% weight)
-        - Product category risk (10% weight)
-        - Festival season patterns (5% weight)
-    """
-    customer_return_rate = features['customer_return_rate']
-    total_orders = features['total_orders']
-    is_cod = features['is_cod']
-    amount = features['amount']
-    product_return_rate = features['product_return_rate']
-    is_festival_season = features['is_festival_season']
-    
-    # Base risk score
-    risk_score = 0.0
-    risk_factors = []
-    
-    # Customer behavior factors (40% weight)
-    if customer_return_rate > 0.5:
-        risk_score += 0.30
-        risk_factors.append({
-            'factor': 'very_high_customer_return_rate',
-            'value': customer_return_rate,
-            'weight': 0.30
-        })
-    elif customer_return_rate > 0.3:
-        risk_score += 0.15
-        risk_factors.append({
-            'factor': 'high_customer_return_rate',
-            'value': customer_return_rate,
-            'weight': 0.15
-        })
-    elif customer_return_rate > 0.15:
-        risk_score += 0.05
-        risk_factors.append({
-            'factor': 'moderate_customer_return_rate',
-            'value': customer_return_rate,
-            'weight': 0.05
-        })
-    
-    # New customer risk (10% weight)
-    if total_orders < 3:
-        risk_score += 0.10
-        risk_factors.append({
-            'factor': 'new_customer',
-            'value': total_orders,
-            'weight': 0.10
-        })
-    elif total_orders < 10:
-        risk_score += 0.05
-        risk_factors.append({
-            'factor': 'relatively_new_customer',
-            'value': total_orders,
-            'weight': 0.05
-        })
-    
-    # Payment method risk (15% weight)
-    if is_cod:
-        risk_score += 0.15
-        risk_factors.append({
-            'factor': 'cod_payment',
-            'value': 'COD',
-            'weight': 0.15
-        })
-    
-    # High value order risk (20% weight)
-    if amount > 50000:
-        risk_score += 0.20
-        risk_factors.append({
-            'factor': 'very_high_value_order',
-            'value': amount,
-            'weight': 0.20
-        })
-    elif amount > 20000:
-        risk_score += 0.10
-        risk_factors.append({
-            'factor': 'high_value_order',
-            'value': amount,
-            'weight': 0.10
-        })
-    elif amount > 10000:
-        risk_score += 0.05
-        risk_factors.append({
-            'factor': 'moderate_value_order',
-            'value': amount,
-            'weight': 0.05
-        })
-    
-    # Product return pattern (10% weight)
-    if product_return_rate > 0.4:
-        risk_score += 0.10
-        risk_factors.append({
-            'factor': 'high_product_return_rate',
-            'value': product_return_rate,
-            'weight': 0.10
-        })
-    elif product_return_rate > 0.2:
-        risk_score += 0.05
-        risk_factors.append({
-            'factor': 'moderate_product_return_rate',
-            'value': product_return_rate,
-            'weight': 0.05
-        })
-    
-    # Festival season adjustment (5% weight - reduces risk)
-    if is_festival_season:
-        risk_score -= 0.05
-        risk_factors.append({
-            'factor': 'festival_season',
-            'value': 'Yes',
-            'weight': -0.05
-        })
-    
-    # Normalize to 0-1 range
-    risk_score = max(0.0, min(1.0, risk_score))
+        List of risk scores in the same order as feature_rows,
+        or None if SageMaker is unavailable or returned a malformed payload
+        
+    Note:
+        Skipped while SAGEMAKER_BREAKER is open.
+    """
+    if not SAGEMAKER_ENDPOINT or not feature_rows:
+        return None
+    try:
+        rows = [_to_csv_row(features) for features in feature_rows]
+    except Exception as e:
+        # The request's fault, not the endpoint's: the breaker is not told
+        print(f"SageMaker batch row error: {str(e)}")
+        return None
+    return _invoke_sagemaker_rows(rows)
+
+
+def _invoke_sagemaker_rows(rows: List[str], admitted: bool = False) -> Optional[List[float]]:
+    """
+    One multi-row invoke_endpoint call for CSV rows (_to_csv_row).
     
-    return risk_score, risk_factors
+    Args:
+        rows: CSV rows, one per order
+        admitted: SAGEMAKER_BREAKER already let the call through (micro-batches)
+        
+    Returns:
+        One risk score per row, or None if the call failed
+        
+    Note:
+        The XGBoost container accepts one CSV row per line and answers with
+        one score per row, separated by newlines or commas depending on the
+        container version - both layouts are accepted here.
+    """
+    started = None
+    try:
+        if not admitted and not circuit_allows(SAGEMAKER_BREAKER):
+            return None
+        
+        started = time.perf_counter()
+        with timed('sagemaker'):
+            response = sagemaker_runtime.invoke_endpoint(
+                EndpointName=SAGEMAKER_ENDPOINT,
+                ContentType='text/csv',
+                Body='\n'.join(rows)
+            )
+            result = response['Body'].read().decode().strip()
+        risk_scores = [float(value) for value in result.replace('\n', ',').split(',') if value]
+        
+        if len(risk_scores) != len(rows):
+            print(f"SageMaker batch size mismatch: sent {len(rows)}, "
+                  f"got {len(risk_scores)}")
+            circuit_record(SAGEMAKER_BREAKER, started, error=True)
+            return None
+        
+        circuit_record(SAGEMAKER_BREAKER, started)
+        return risk_scores
+        
+    except Exception as e:
+        print(f"SageMaker batch prediction error: {str(e)}")
+        timed_out = note_timeout('sagemaker', e)
+        if started is not None:
+            circuit_record(SAGEMAKER_BREAKER, started, error=True, timed_out=timed_out)
+        return None
 
 
 def generate_bedrock_explanation(
@@ -245,61 +672,87 @@ def generate_bedrock_explanation(
         Uses Claude Sonnet 4 inference profile for consistent performance
         across regions. Explanation includes risk summary, key factors,
         and actionable recommendations.
+        The prompt (and token budget) follows the risk level's
+        EXPLANATION_ROUTING entry; tiers routed to "fallback" never call
+        Bedrock. "routing" reports the tier and prompt used.
+        Explanations are cached by factor/feature signature (explanation_cache);
+        the "cache" field reports hit/miss and the latency a hit saved.
+        When the request deadline has less left than the tier's median
+        Bedrock call (_bedrock_budget_ms), or while BEDROCK_BREAKER is open,
+        the rule-based explanation is returned without calling Bedrock.
     """
+    tier = classify_risk(risk_score)[0]
+    template = EXPLANATION_ROUTER.template_for(tier)
+    if template is None:
+        EXPLANATION_ROUTER.record(tier)
+        return dict(generate_fallback_explanation(risk_score, risk_factors, features),
+                    routing={'tier': tier, 'prompt': 'fallback'})
+    routing = {'tier': tier, 'prompt': template.name}
+    timer = current_timer()
+    if timer is not None:
+        timer.properties['explanation_tier'] = tier
+    
+    started = None
     try:
-        # Prepare context for Bedrock
-        prompt = f"""You are an AI assistant for an e-commerce return abuse detection system. 
-Generate a clear, professional explanation for the following return risk assessment.
-
-Risk Score: {risk_score:.2f} (0 = No Risk, 1 = High Risk)
-
-Risk Factors Detected:
-{json.dumps(risk_factors, indent=2)}
-
-Order Details:
-- Customer Return Rate: {features['customer_return_rate']*100:.1f}%
-- Total Orders: {features['total_orders']}
-- Payment Method: {'COD' if features['is_cod'] else 'Prepaid'}
-- Order Amount: ₹{features['amount']:,.0f}
-- Product Return Rate: {features['product_return_rate']*100:.1f}%
-- Festival Season: {'Yes' if features['is_festival_season'] else 'No'}
-
-Generate:
-1. A brief summary (1-2 sentences) explaining the risk level
-2. Top 3-5 key factors contributing to this risk score
-3. A recommended action for the operations team
-
-Keep the language professional, clear, and actionable. Focus on business impact."""
-
+        # Repeat factor/feature signatures are served from the explanation cache
+        cache_key = None
+        if EXPLANATION_CACHE is not None:
+            cache_key = explanation_signature(risk_score, risk_factors, features, template.name)
+            with timed('explanation_cache'):
+                cached, cache_info = EXPLANATION_CACHE.get(cache_key)
+            if cached is not None:
+                EXPLANATION_ROUTER.record(tier, cache_hit=True)
+                return dict(cached, risk_factors=risk_factors, cache=cache_info, routing=routing)
+        
+        if (not within_budget('bedrock', _bedrock_budget_ms(tier))
+                or not circuit_allows(BEDROCK_BREAKER)):
+            EXPLANATION_ROUTER.record(tier)
+            return dict(generate_fallback_explanation(risk_score, risk_factors, features),
+                        routing=routing)
+        
+        started = time.perf_counter()
+        
         # Call Bedrock API using cross-region inference profile
         # Using Claude Sonnet 4 (latest and most capable)
-        response = bedrock_runtime.invoke_model(
-            modelId='us.anthropic.claude-sonnet-4-20250514-v1:0',
-            body=json.dumps({
-                'anthropic_version': 'bedrock-2023-05-31',
-                'max_tokens': 500,
-                'messages': [{
-                    'role': 'user',
-                    'content': prompt
-                }],
-                'temperature': 0.3
-            })
-        )
-        
-        # Parse response
-        response_body = json.loads(response['body'].read())
+        with timed('bedrock'):
+            response = bedrock_runtime.invoke_model(
+                modelId=BEDROCK_MODEL_ID,
+                body=template.request_body(risk_score, risk_factors, features)
+            )
+            
+            # Parse response
+            response_body = json.loads(response['body'].read())
         explanation_text = response_body['content'][0]['text']
+        generation_ms = (time.perf_counter() - started) * 1000
+        circuit_record(BEDROCK_BREAKER, started, slow_call_ms=_bedrock_slow_call_ms(tier))
+        EXPLANATION_ROUTER.record(tier, generation_ms, response_body.get('usage'))
         
-        return {
+        explanation = {
             'generated_by': 'bedrock_claude_3_sonnet',
-            'explanation_text': explanation_text,
-            'risk_factors': risk_factors
+            'explanation_text': explanation_text
         }
+        if cache_key is not None:
+            with timed('explanation_cache'):
+                EXPLANATION_CACHE.put(cache_key, explanation, generation_ms)
+            return dict(explanation, risk_factors=risk_factors, cache={'status': 'miss'},
+                        routing=routing)
+        
+        return dict(explanation, risk_factors=risk_factors, routing=routing)
         
     except Exception as e:
         # Fallback to rule-based explanation if Bedrock fails
         print(f"Bedrock error: {str(e)}")
-        return generate_fallback_explanation(risk_score, risk_factors, features)
+        timed_out = note_timeout('bedrock', e)
+        if started is not None:
+            circuit_record(BEDROCK_BREAKER, started, error=True,
+                           slow_call_ms=_bedrock_slow_call_ms(tier), timed_out=timed_out)
+        # A timed-out call took at least this long; counting it keeps the
+        # tier's median from only seeing the calls fast enough to finish
+        EXPLANATION_ROUTER.record(
+            tier, (time.perf_counter() - started) * 1000 if timed_out else None, error=True
+        )
+        return dict(generate_fallback_explanation(risk_score, risk_factors, features),
+                    routing=routing)
 
 
 def generate_fallback_explanation(
@@ -321,26 +774,9 @@ def generate_fallback_explanation(
     Note:
         Provides business-friendly explanations for each risk factor
         with India-specific context (COD, festival seasons, etc.)
+        Explanation templates live in the rule table (risk_scoring.RULE_TABLE).
     """
-    reasons = []
-    
-    for factor in risk_factors:
-        if factor['factor'] == 'very_high_customer_return_rate':
-            reasons.append(f"Very high return rate: {factor['value']*100:.0f}% of orders returned")
-        elif factor['factor'] == 'high_customer_return_rate':
-            reasons.append(f"High return rate: {factor['value']*100:.0f}% of orders returned")
-        elif factor['factor'] == 'new_customer':
-            reasons.append(f"New customer with only {factor['value']} previous orders")
-        elif factor['factor'] == 'cod_payment':
-            reasons.append("Cash on Delivery payment method (higher risk)")
-        elif factor['factor'] == 'very_high_value_order':
-            reasons.append(f"Very high value order: ₹{factor['value']:,.0f}")
-        elif factor['factor'] == 'high_value_order':
-            reasons.append(f"High value order: ₹{factor['value']:,.0f}")
-        elif factor['factor'] == 'high_product_return_rate':
-            reasons.append(f"Product has high return rate: {factor['value']*100:.0f}%")
-        elif factor['factor'] == 'festival_season':
-            reasons.append("Festival season - normal shopping behavior expected")
+    reasons = explain_risk_factors(risk_factors)
     
     if not reasons:
         reasons = ["Normal return pattern with no significant risk indicators"]
@@ -352,42 +788,792 @@ def generate_fallback_explanation(
     }
 
 
-def store_prediction_dynamodb(prediction_data: Dict[str, Any]) -> None:
+def stream_bedrock_explanation(
+    risk_score: float,
+    risk_factors: List[Dict],
+    features: Dict[str, Any]
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming counterpart of generate_bedrock_explanation.
+    
+    Yields:
+        {"type": "explanation_delta", "text"} events while Bedrock generates,
+        then one {"type": "explanation", "status", "explanation"} event:
+        "rule_based" (tier routed to the fallback explanation), "cached"
+        (explanation cache hit, no deltas), "complete", or "fallback" with
+        a "reason" when the stream failed or stalled past
+        EXPLANATION_STREAM_FIRST_CHUNK_MS / EXPLANATION_STREAM_STALL_MS, or
+        "circuit_open" while BEDROCK_BREAKER is open
+        
+    Note:
+        Partial text already sent is superseded by the fallback event.
+        Only complete Bedrock explanations are written to the cache.
+        The stream is bounded by its own first-chunk/stall limits, not by
+        the request deadline, so it uses the default Bedrock client.
+    """
+    tier = classify_risk(risk_score)[0]
+    template = EXPLANATION_ROUTER.template_for(tier)
+    if template is None:
+        EXPLANATION_ROUTER.record(tier)
+        yield {
+            'type': 'explanation',
+            'status': 'rule_based',
+            'explanation': dict(generate_fallback_explanation(risk_score, risk_factors, features),
+                                routing={'tier': tier, 'prompt': 'fallback'})
+        }
+        return
+    routing = {'tier': tier, 'prompt': template.name}
+    timer = current_timer()
+    if timer is not None:
+        timer.properties['explanation_tier'] = tier
+    
+    cache_key = None
+    if EXPLANATION_CACHE is not None:
+        cache_key = explanation_signature(risk_score, risk_factors, features, template.name)
+        with timed('explanation_cache'):
+            cached, cache_info = EXPLANATION_CACHE.get(cache_key)
+        if cached is not None:
+            EXPLANATION_ROUTER.record(tier, cache_hit=True)
+            yield {
+                'type': 'explanation',
+                'status': 'cached',
+                'explanation': dict(cached, risk_factors=risk_factors, cache=cache_info,
+                                    routing=routing)
+            }
+            return
+    
+    if not circuit_allows(BEDROCK_BREAKER):
+        EXPLANATION_ROUTER.record(tier)
+        yield {
+            'type': 'explanation',
+            'status': 'fallback',
+            'reason': 'circuit_open',
+            'explanation': dict(generate_fallback_explanation(risk_score, risk_factors, features),
+                                routing=routing)
+        }
+        return
+    
+    started = time.perf_counter()
+    parts = []
+    usage: Dict[str, int] = {}
+    bedrock_stream = without_deadline(bedrock_runtime)
+    # The breaker judges a stream by its first chunk: a normal generation
+    # runs for seconds, and one past the first-chunk limit is a stall error
+    recorded = False
+    try:
+        with timed('bedrock'):
+            deltas = iter_with_deadline(
+                lambda: bedrock_stream.invoke_model_with_response_stream(
+                    modelId=BEDROCK_MODEL_ID,
+                    body=template.request_body(risk_score, risk_factors, features)
+                ),
+                lambda response: bedrock_text_deltas(response, usage),
+                EXPLANATION_STREAM_FIRST_CHUNK_MS / 1000,
+                EXPLANATION_STREAM_STALL_MS / 1000
+            )
+            for text in deltas:
+                if not parts:
+                    if timer is not None:
+                        timer.properties['first_chunk_ms'] = round(timer.elapsed_ms(), 3)
+                    circuit_record(BEDROCK_BREAKER, started,
+                                   slow_call_ms=EXPLANATION_STREAM_FIRST_CHUNK_MS)
+                    recorded = True
+                parts.append(text)
+                yield {'type': 'explanation_delta', 'text': text}
+    except GeneratorExit:
+        # Consumer gone (closing deltas closes the stream); nothing learnt about Bedrock
+        if not recorded and BEDROCK_BREAKER is not None:
+            BEDROCK_BREAKER.discard()
+        raise
+    except Exception as e:
+        reason = 'stall' if isinstance(e, StreamStalled) else 'error'
+        print(f"Bedrock stream {reason}: {str(e)}")
+        if not recorded:
+            circuit_record(BEDROCK_BREAKER, started, error=True)
+        EXPLANATION_ROUTER.record(tier, error=True)
+        yield {
+            'type': 'explanation',
+            'status': 'fallback',
+            'reason': reason,
+            'explanation': dict(generate_fallback_explanation(risk_score, risk_factors, features),
+                                routing=routing)
+        }
+        return
+    
+    generation_ms = (time.perf_counter() - started) * 1000
+    if not recorded:
+        circuit_record(BEDROCK_BREAKER, started, slow_call_ms=EXPLANATION_STREAM_FIRST_CHUNK_MS)
+    EXPLANATION_ROUTER.record(tier, generation_ms, usage)
+    explanation = {
+        'generated_by': 'bedrock_claude_3_sonnet',
+        'explanation_text': ''.join(parts)
+    }
+    if cache_key is not None:
+        with timed('explanation_cache'):
+            EXPLANATION_CACHE.put(cache_key, explanation, generation_ms)
+        explanation = dict(explanation, cache={'status': 'miss'})
+    yield {
+        'type': 'explanation',
+        'status': 'complete',
+        'explanation': dict(explanation, risk_factors=risk_factors, routing=routing)
+    }
+
+
+def new_prediction_id(order_id: str) -> str:
+    """
+    Prediction ID used as the audit table key and in /explanations/{id}.
+    
+    Random, not time-based: two requests for the same order must never
+    share (and overwrite) one audit row.
+    """
+    return f"{order_id}_{uuid.uuid4().hex}"
+
+
+def _build_audit_item(prediction_data: Dict[str, Any],
+                      request_hash: Optional[str] = None,
+                      features: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Build the DynamoDB audit record for one prediction response.
+    
+    With a request_hash the full response is stored too, so repeats of the
+    request can be answered from this row (see idempotency.py). The risk
+    features are kept so explanations can be regenerated offline
+    (explanation_backfill.py).
+    """
+    now = datetime.now()
+    item = {
+        'prediction_id': prediction_data.get('prediction_id')
+        or new_prediction_id(prediction_data['order_id']),
+        'order_id': prediction_data['order_id'],
+        'timestamp': now.isoformat(),
+        'risk_score': str(prediction_data['risk_score']),
+        'risk_level': prediction_data['risk_level'],
+        'recommended_action': prediction_data['recommended_action'],
+        'explanation': json.dumps(prediction_data['explanation']),
+        'model_version': prediction_data['model_version'],
+        'ttl': int(now.timestamp()) + (90 * 24 * 60 * 60)  # 90 days retention
+    }
+    if 'explanation_status' in prediction_data:
+        item['explanation_status'] = prediction_data['explanation_status']
+    if features is not None:
+        item['features'] = json.dumps({name: features[name] for name in RISK_FEATURES})
+    if request_hash:
+        item['request_hash'] = request_hash
+        item['response'] = json.dumps(prediction_data)
+    return item
+
+
+def store_prediction_dynamodb(prediction_data: Dict[str, Any],
+                              request_hash: Optional[str] = None,
+                              features: Optional[Dict[str, Any]] = None,
+                              sync: bool = False) -> bool:
     """
     Store prediction in DynamoDB for audit trail and analytics.
     
     Args:
         prediction_data: Complete prediction result including risk score,
                         factors, and metadata
+        request_hash: Idempotency fingerprint of the request, if any
+        features: Risk features the prediction was made from
+        sync: Write now even in buffered mode (the row is read or updated
+              right after this request)
+        
+    Returns:
+        False if the item was dropped (see audit_writer.py)
                         
     Note:
         - Enables compliance and audit requirements
         - Supports model performance monitoring
         - TTL set to 90 days for automatic cleanup
         - No PII data stored (order IDs only)
+        - AUDIT_WRITE_MODE=buffered hands the item to the write-behind
+          buffer; sync writes it before the response unless less than
+          AUDIT_SYNC_MIN_BUDGET_MS of the request deadline is left
     """
     try:
-        table = dynamodb.Table(PREDICTIONS_TABLE)
+        item = _build_audit_item(prediction_data, request_hash, features)
+        with timed('store'):
+            if sync and item.get('explanation_status') == 'pending':
+                # A job's row: never replace an explanation already written back
+                return AUDIT_WRITER.put_if(
+                    item,
+                    'attribute_not_exists(explanation_status) OR explanation_status <> :ready',
+                    {':ready': 'ready'}
+                )
+            if sync:
+                return AUDIT_WRITER.write_now([item])
+            defer = (AUDIT_WRITER.mode == 'sync'
+                     and not within_budget('audit', AUDIT_SYNC_MIN_BUDGET_MS))
+            return AUDIT_WRITER.write([item], defer=defer)
+    except Exception as e:
+        print(f"DynamoDB error: {str(e)}")
+        return False
+
+
+def store_predictions_dynamodb(predictions: List[Dict[str, Any]],
+                               features: Optional[List[Dict[str, Any]]] = None) -> bool:
+    """
+    Store a batch of predictions using DynamoDB batch writes.
+    
+    Args:
+        predictions: Prediction results (same shape as store_prediction_dynamodb)
+        features: Risk features of each prediction, in the same order
         
-        item = {
-            'prediction_id': f"{prediction_data['order_id']}_{int(datetime.now().timestamp())}",
-            'order_id': prediction_data['order_id'],
-            'timestamp': datetime.now().isoformat(),
-            'risk_score': str(prediction_data['risk_score']),
-            'risk_level': prediction_data['risk_level'],
-            'recommended_action': prediction_data['recommended_action'],
-            'explanation': json.dumps(prediction_data['explanation']),
-            'model_version': prediction_data['model_version'],
-            'ttl': int(datetime.now().timestamp()) + (90 * 24 * 60 * 60)  # 90 days retention
-        }
+    Returns:
+        True if every item was written (or buffered), False otherwise
         
-        table.put_item(Item=item)
+    Note:
+        Items go through AUDIT_WRITER: 25-item BatchWriteItem calls with
+        unprocessed items resubmitted, on the flush thread in buffered mode.
+    """
+    if not predictions:
         return True
+    try:
+        items = [
+            _build_audit_item(prediction_data, features=features[position] if features else None)
+            for position, prediction_data in enumerate(predictions)
+        ]
+        with timed('store'):
+            defer = (AUDIT_WRITER.mode == 'sync'
+                     and not within_budget('audit', AUDIT_SYNC_MIN_BUDGET_MS))
+            return AUDIT_WRITER.write(items, defer=defer)
     except Exception as e:
-        print(f"DynamoDB error: {str(e)}")
+        print(f"DynamoDB batch error: {str(e)}")
         return False
 
 
+def update_prediction_explanation(
+    prediction_id: str,
+    explanation: Dict[str, Any],
+    explanation_status: str
+) -> bool:
+    """
+    Write an explanation back to an existing audit record.
+    
+    Args:
+        prediction_id: Audit table key returned to the caller
+        explanation: Explanation payload (same shape as the sync response)
+        explanation_status: "ready" | "failed"
+    """
+    try:
+        table = dynamodb.Table(PREDICTIONS_TABLE)
+        table.update_item(
+            Key={'prediction_id': prediction_id},
+            UpdateExpression='SET explanation = :explanation, explanation_status = :status',
+            ExpressionAttributeValues={
+                ':explanation': json.dumps(explanation),
+                ':status': explanation_status
+            }
+        )
+        return True
+    except Exception as e:
+        print(f"DynamoDB explanation update error: {str(e)}")
+        return False
+
+
+def process_explanation_job(job: Dict[str, Any]) -> None:
+    """
+    Worker side of async explanation mode: generate and store the explanation.
+    
+    Args:
+        job: {"prediction_id", "risk_score", "risk_factors", "features"}
+    """
+    explanation = generate_bedrock_explanation(
+        job['risk_score'], job['risk_factors'], job['features']
+    )
+    if not update_prediction_explanation(job['prediction_id'], explanation, 'ready'):
+        raise RuntimeError(f"Could not store explanation for {job['prediction_id']}")
+
+
+_explanation_queue = None
+
+
+def get_explanation_queue():
+    """SQS queue when EXPLANATION_QUEUE_URL is set, otherwise the local stand-in."""
+    global _explanation_queue
+    if _explanation_queue is None:
+        if EXPLANATION_QUEUE_URL:
+            sqs = aws_client('sqs', region='ap-south-1')
+            _explanation_queue = SqsExplanationQueue(sqs, EXPLANATION_QUEUE_URL)
+        else:
+            _explanation_queue = LocalExplanationQueue(process_explanation_job)
+    return _explanation_queue
+
+
+def handle_explanation_jobs(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Process an SQS batch of explanation jobs.
+    
+    Returns:
+        Partial batch response so only failed messages are retried
+    """
+    failures = []
+    for record in event['Records']:
+        try:
+            process_explanation_job(json.loads(record['body']))
+        except Exception as e:
+            print(f"Explanation job error: {str(e)}")
+            failures.append({'itemIdentifier': record['messageId']})
+    return {'batchItemFailures': failures}
+
+
+def get_explanation(prediction_id: str) -> Dict[str, Any]:
+    """
+    Serve GET /explanations/{prediction_id}.
+    
+    Returns:
+        API Gateway response with explanation_status ("pending" | "ready" |
+        "failed") and the current explanation, or 404 if unknown
+    """
+    table = dynamodb.Table(PREDICTIONS_TABLE)
+    item = table.get_item(Key={'prediction_id': prediction_id}).get('Item')
+    if not item:
+        return _api_response(404, {
+            'error': 'NOT_FOUND',
+            'message': f"Unknown prediction_id: {prediction_id}"
+        })
+    return _api_response(200, {
+        'prediction_id': prediction_id,
+        'order_id': item.get('order_id'),
+        'explanation_status': item.get('explanation_status', 'ready'),
+        'explanation': json.loads(item['explanation']) if item.get('explanation') else None
+    })
+
+
+def _explanation_route(event: Dict[str, Any]) -> Optional[str]:
+    """Return the prediction_id for GET /explanations/{prediction_id}, else None."""
+    if event.get('httpMethod') != 'GET':
+        return None
+    prediction_id = (event.get('pathParameters') or {}).get('prediction_id')
+    if prediction_id:
+        return prediction_id
+    path = event.get('path') or ''
+    if '/explanations/' in path:
+        return path.rsplit('/explanations/', 1)[1].strip('/') or None
+    return None
+
+
+def resolve_request_features(
+    body: Dict[str, Any]
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Fill in missing order, customer and product features from the feature store.
+    
+    Args:
+        body: Request payload for one order (order_id, customer_id,
+              product_id and any features the caller already has)
+        
+    Live counters from the order/return stream are then applied on top of
+    the snapshot values (again only for fields the caller did not send).
+    
+    Returns:
+        Tuple of (payload with snapshot/live values for fields the caller
+        did not send, lookup info or None when neither source applies)
+    """
+    merged, info = body, None
+    if FEATURE_STORE is not None:
+        merged, info = FEATURE_STORE.resolve(body)
+    if STREAM_AGGREGATES is not None:
+        merged, live = STREAM_AGGREGATES.overlay(merged, body)
+        if live is not None:
+            info = dict(info or {}, live=live)
+    return merged, info
+
+
+def extract_features(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract model features from a request body (single order or batch row).
+    
+    Args:
+        body: Parsed request payload for one order
+        
+    Returns:
+        Feature dictionary used by the model backends and the rule-based
+        model (OPTIONAL_FEATURES are included only when supplied)
+    """
+    is_cod = (
+        body.get('payment_method') == 'COD' or body.get('is_cod') == True or body.get('is_cod') == 1
+    )
+    is_festival_season = (
+        body.get('is_festival_season') == True or body.get('is_festival_season') == 1
+    )
+    features = {
+        'customer_return_rate': body.get('customer_return_rate', 0.0),
+        'total_orders': body.get('total_orders', 0),
+        'is_cod': 1 if is_cod else 0,
+        'amount': body.get('amount', 0),
+        'product_return_rate': body.get('product_return_rate', 0.0),
+        'is_festival_season': 1 if is_festival_season else 0
+    }
+    for name in OPTIONAL_FEATURES:
+        if body.get(name) is not None:
+            features[name] = body[name]
+    return features
+
+
+def validate_features(features: Dict[str, Any]) -> None:
+    """
+    Check that every model feature is numeric.
+    
+    Raises:
+        ValueError: If a feature cannot be used for scoring
+    """
+    for name in RISK_FEATURES + OPTIONAL_FEATURES:
+        if name in OPTIONAL_FEATURES and name not in features:
+            continue
+        value = features[name]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Invalid value for '{name}': {value!r}")
+
+
+def classify_risk(risk_score: float) -> Tuple[str, str]:
+    """
+    Map a risk score to (risk_level, recommended_action).
+    
+    Thresholds:
+        - low (< 0.3): instant_refund
+        - medium (< 0.7): otp_verification
+        - high: quality_check_required
+    """
+    if risk_score < 0.3:
+        return 'low', 'instant_refund'
+    elif risk_score < 0.7:
+        return 'medium', 'otp_verification'
+    return 'high', 'quality_check_required'
+
+
+def build_prediction(
+    order_id: str,
+    risk_score: float,
+    explanation: Dict[str, Any],
+    model_type: str
+) -> Dict[str, Any]:
+    """Assemble the prediction payload returned to callers and stored for audit."""
+    risk_level, action = classify_risk(risk_score)
+    prediction = {
+        'order_id': order_id,
+        'risk_score': round(risk_score, 3),
+        'risk_level': risk_level,
+        'recommended_action': action,
+        'explanation': explanation,
+        'confidence': round(abs(risk_score - 0.5) * 2, 3),
+        'model_version': MODEL_VERSION,
+        'model_type': model_type,
+        'timestamp': datetime.now().isoformat()
+    }
+    if model_type == 'rule_based':
+        prediction['rules_version'] = active_rules().version
+    return prediction
+
+
+def _api_response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Wrap a payload in an API Gateway proxy response with CORS headers."""
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+    if status_code == 200:
+        headers['Access-Control-Allow-Headers'] = 'Content-Type'
+        headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+    timer = current_timer()
+    if timer is not None:
+        timer.properties['status_code'] = status_code
+        if timer.debug:
+            body = dict(body, debug_timings={
+                'spans': timer.tree(),
+                'rolling': STAGE_LATENCY.percentiles(),
+                'audit': AUDIT_WRITER.stats(),
+                'clients': {name: client.stats() for name, client in AWS_CLIENTS.items()},
+                'circuits': {breaker.name: breaker.stats() for breaker in CIRCUIT_BREAKERS}
+            })
+            if SAGEMAKER_BATCHER is not None:
+                body['debug_timings']['micro_batch'] = SAGEMAKER_BATCHER.stats()
+    with timed('serialize'):
+        payload = json.dumps(body)
+    return {
+        'statusCode': status_code,
+        'headers': headers,
+        'body': payload
+    }
+
+
+def score_batch(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Score a batch of orders with one SageMaker call.
+    
+    Args:
+        body: Request payload with an "orders" list (each entry uses the
+              single-order request shape) and optional "use_bedrock"
+        
+    Returns:
+        Batch response with one result per order, in request order.
+        Each result carries "status": "ok" | "error"; failed rows include
+        an "error" message instead of a prediction.
+        
+    Note:
+        - All valid rows go to the first available backend in one call
+          (one multi-line CSV invocation for SageMaker)
+        - If no model is available the rule-based model scores all rows in
+          one columnar pass (calculate_risk_scores)
+        - Bedrock explanations are opt-in for batches ("use_bedrock": true)
+          since they cost one LLM call per row
+        - Audit records are written with DynamoDB batch writes
+        - Each row's missing features are looked up in the feature store
+    """
+    orders = body['orders']
+    if not isinstance(orders, list):
+        raise ValueError("'orders' must be a list")
+    if len(orders) > MAX_BATCH_SIZE:
+        raise ValueError(f"Batch too large: {len(orders)} orders (max {MAX_BATCH_SIZE})")
+    
+    results: List[Optional[Dict[str, Any]]] = [None] * len(orders)
+    valid_rows = []  # (index, order_id, features)
+    
+    for index, order in enumerate(orders):
+        try:
+            if not isinstance(order, dict):
+                raise ValueError("Order must be a JSON object")
+            with timed('features'):
+                order, _ = resolve_request_features(order)
+                features = extract_features(order)
+                validate_features(features)
+            valid_rows.append((index, order.get('order_id', 'unknown'), features))
+        except Exception as e:
+            order_id = order.get('order_id', 'unknown') if isinstance(order, dict) else 'unknown'
+            results[index] = {
+                'order_id': order_id,
+                'status': 'error',
+                'error': str(e)
+            }
+    
+    # One model call for the whole batch, rule-based fallback otherwise
+    with timed('predict'):
+        risk_scores, factor_masks, model_type = predict_risk_batch(
+            [features for _, _, features in valid_rows]
+        )
+    
+    use_bedrock = body.get('use_bedrock', False)
+    predictions = []
+    prediction_features = []
+    
+    for position, (index, order_id, features) in enumerate(valid_rows):
+        try:
+            risk_score = float(risk_scores[position])
+            if factor_masks is not None:
+                risk_factors = decode_risk_factors(int(factor_masks[position]), features)
+            else:
+                risk_factors = []
+            
+            with timed('explanation'):
+                if use_bedrock:
+                    explanation = generate_bedrock_explanation(risk_score, risk_factors, features)
+                else:
+                    explanation = generate_fallback_explanation(risk_score, risk_factors, features)
+            
+            prediction = build_prediction(order_id, risk_score, explanation, model_type)
+            predictions.append(prediction)
+            prediction_features.append(features)
+            results[index] = dict(prediction, status='ok')
+        except Exception as e:
+            results[index] = {'order_id': order_id, 'status': 'error', 'error': str(e)}
+    
+    store_predictions_dynamodb(predictions, prediction_features)
+    
+    batch_response = {
+        'results': results,
+        'count': len(results),
+        'succeeded': len(predictions),
+        'failed': len(results) - len(predictions),
+        'model_type': model_type,
+        'model_version': MODEL_VERSION,
+        'timestamp': datetime.now().isoformat()
+    }
+    if use_bedrock:
+        if EXPLANATION_CACHE is not None:
+            batch_response['explanation_cache'] = EXPLANATION_CACHE.stats()
+        batch_response['explanation_routing'] = EXPLANATION_ROUTER.stats()
+    if FEATURE_STORE is not None:
+        batch_response['feature_snapshot'] = FEATURE_STORE.version
+    _report_degradations(batch_response)
+    return batch_response
+
+
+def stream_prediction_events(body: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Score one order and stream its Bedrock explanation (explanation_mode "stream").
+    
+    Args:
+        body: Parsed single-order request
+        
+    Yields:
+        {"type": "score", ...} - the prediction (with "prediction_id",
+        without "explanation") as soon as the model has answered - then the
+        events of stream_bedrock_explanation, or with "use_bedrock": false
+        a single "rule_based" explanation event. A repeated request replays
+        the stored prediction and its explanation with status "replay".
+        
+    Note:
+        The audit row is written once the explanation is final. Errors
+        raised before the score event propagate to the caller.
+    """
+    timer = current_timer()
+    with timed('features'):
+        body, feature_lookup = resolve_request_features(body)
+        features = extract_features(body)
+        validate_features(features)
+    use_bedrock = body.get('use_bedrock', True)
+    
+    request_hash = None
+    if IDEMPOTENCY_CACHE is not None and body.get('order_id'):
+        with timed('idempotency'):
+            request_hash = request_fingerprint(features, {
+                'use_bedrock': use_bedrock,
+                'explanation_mode': 'stream',
+                'model_version': MODEL_VERSION
+            })
+            replay = IDEMPOTENCY_CACHE.get(body['order_id'], request_hash)
+        if replay is not None:
+            if timer is not None:
+                timer.properties['idempotency'] = 'replay'
+            score = {key: value for key, value in replay.items() if key != 'explanation'}
+            yield dict(score, type='score')
+            yield {'type': 'explanation', 'status': 'replay', 'explanation': replay['explanation']}
+            return
+    
+    with timed('predict'):
+        risk_score, risk_factors, model_type = predict_risk(features)
+    order_id = body.get('order_id', 'unknown')
+    prediction = build_prediction(order_id, risk_score, None, model_type)
+    del prediction['explanation']
+    prediction['prediction_id'] = new_prediction_id(order_id)
+    if feature_lookup is not None:
+        prediction['feature_lookup'] = feature_lookup
+    if timer is not None:
+        timer.properties['model_type'] = model_type
+        timer.properties['score_ms'] = round(timer.elapsed_ms(), 3)
+    # Degraded scores are not replayed to repeats
+    if _report_degradations(prediction):
+        request_hash = None
+    yield dict(prediction, type='score')
+    
+    explanation = None
+    with timed('explanation'):
+        if use_bedrock:
+            events = stream_bedrock_explanation(risk_score, risk_factors, features)
+        else:
+            # Same as the sync path: the caller opted out of Bedrock
+            events = iter([{
+                'type': 'explanation',
+                'status': 'rule_based',
+                'explanation': generate_fallback_explanation(risk_score, risk_factors, features)
+            }])
+        for event in events:
+            if event['type'] == 'explanation':
+                explanation = event['explanation']
+            yield event
+    if timer is not None:
+        timer.properties['explanation'] = explanation.get('generated_by')
+    
+    response_body = dict(prediction, explanation=explanation)
+    store_prediction_dynamodb(response_body, request_hash, features)
+    if request_hash is not None:
+        IDEMPOTENCY_CACHE.put(order_id, request_hash, response_body)
+
+
+def _request_budget_ms(context: Any) -> float:
+    """REQUEST_BUDGET_MS, capped by the time Lambda has left for the invocation."""
+    budget_ms = float(REQUEST_BUDGET_MS)
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        budget_ms = min(budget_ms, float(context.get_remaining_time_in_millis()))
+    return budget_ms
+
+
+def _flush_audit(context: Any, deadline: Optional[Deadline] = None) -> None:
+    """
+    Write out the buffered audit rows before the invocation returns, waiting
+    at most AUDIT_INVOCATION_FLUSH_MS, the time Lambda has left and, for
+    scoring requests, what is left of the request deadline. Rows still
+    unwritten stay buffered for the next invocation.
+    """
+    timeout_ms = float(AUDIT_INVOCATION_FLUSH_MS)
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        timeout_ms = min(timeout_ms, float(context.get_remaining_time_in_millis()))
+    if deadline is not None:
+        timeout_ms = min(timeout_ms, deadline.remaining_ms())
+    with timed('audit_flush'):
+        drained = AUDIT_WRITER.flush(max(timeout_ms, 0.0) / 1000)
+    if not drained:
+        print(f"Audit flush incomplete after {max(timeout_ms, 0.0):.0f} ms: "
+              f"{AUDIT_WRITER.depth()} rows buffered, more may be in flight")
+
+
+def _report_degradations(response_body: Dict[str, Any]) -> bool:
+    """
+    Add the request deadline's degradations to a response as "degraded".
+    
+    Returns:
+        True if any stage was skipped or timed out (such responses are not
+        stored for idempotent replay)
+    """
+    deadline = current_deadline()
+    if deadline is None or not deadline.degraded:
+        return False
+    degradations = deadline.degradations
+    response_body['degraded'] = degradations
+    timer = current_timer()
+    if timer is not None:
+        timer.properties['degraded'] = [
+            f"{entry['stage']}:{entry['reason']}" for entry in degradations
+        ]
+    return True
+
+
+def _finish_invocation(timer: RequestTimer, timer_token: Token,
+                       deadline: Optional[Deadline] = None) -> None:
+    """Stop the invocation timer, update rolling percentiles and print the EMF line."""
+    stop_timer(timer, timer_token)
+    stage_totals = timer.stage_totals()
+    STAGE_LATENCY.record(stage_totals)
+    if METRICS_ENABLED:
+        metrics = dict(AUDIT_WRITER.metrics()) if AUDIT_WRITER.mode == 'buffered' else {}
+        for breaker in CIRCUIT_BREAKERS:
+            metrics.update(breaker.metrics())
+        if deadline is not None and deadline.degraded:
+            metrics['degraded_stages'] = (
+                sum(entry['count'] for entry in deadline.degradations), 'Count'
+            )
+        print(emf_line(timer, METRICS_NAMESPACE, stage_totals, metrics or None))
+
+
+def stream_prediction(body: Dict[str, Any]) -> Iterator[str]:
+    """
+    NDJSON lines of stream_prediction_events for hosts that can stream
+    (stream_server.py, Lambda Web Adapter); timed as its own invocation.
+    
+    Errors before the score event propagate; later errors end the stream
+    with an {"type": "error"} line.
+    """
+    timer, timer_token = start_timer()
+    timer.dimensions['Route'] = 'predict_stream'
+    deadline, deadline_token = (start_deadline(REQUEST_BUDGET_MS, BUDGET_RESERVE_MS)
+                                if REQUEST_BUDGET_MS > 0 else (None, None))
+    try:
+        started = False
+        try:
+            for event in stream_prediction_events(body):
+                started = True
+                yield ndjson_line(event)
+        except Exception as e:
+            if not started:
+                raise
+            print(f"Explanation stream error: {str(e)}")
+            yield ndjson_line({'type': 'error', 'error': str(e)})
+    finally:
+        _finish_invocation(timer, timer_token, deadline)
+        if deadline_token is not None:
+            stop_deadline(deadline_token)
+
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     AWS Lambda handler for return abuse risk prediction API.
@@ -402,12 +1588,70 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     Request Body:
         {
             "order_id": "string",
+            "order_date": "YYYY-MM-DD" (optional, velocity window date; default today),
+            "customer_id": "string" (optional, for feature lookup),
+            "product_id": "string" (optional, for feature lookup),
             "customer_return_rate": float (0.0-1.0),
             "total_orders": int,
             "payment_method": "COD" | "Prepaid",
             "amount": float (INR),
             "product_return_rate": float (0.0-1.0),
-            "is_festival_season": 0 | 1
+            "is_festival_season": 0 | 1,
+            "use_bedrock": bool (default true),
+            "explanation_mode": "sync" | "async" | "stream" (default "sync"),
+            "debug_timings": bool (default false)
+        }
+        
+    With FEATURE_SNAPSHOT_PATH set, fields the caller omits are looked up
+    by order_id / customer_id / product_id in the feature snapshot;
+    caller-supplied values always win. Orders and returns consumed from the
+    Kinesis event stream update those values immediately.
+        
+    A repeat of the same order_id with the same resolved features and
+    options within IDEMPOTENCY_WINDOW_SECONDS returns the original response
+    (same prediction_id and timestamp) without scoring it again.
+        
+    Async explanation mode returns the rule-based explanation at once plus
+    "prediction_id", "explanation_status": "pending" and "explanation_url";
+    GET /explanations/{prediction_id} serves the Bedrock explanation once
+    the worker has written it back.
+        
+    Explanations follow EXPLANATION_ROUTING by risk level (default: low
+    gets the rule-based text, medium a compact prompt, high the full one);
+    async requests whose tier skips Bedrock get the final rule-based
+    explanation and no job.
+        
+    A sync request whose tier's median Bedrock call (BEDROCK_MIN_BUDGET_MS
+    until known) does not fit the time its deadline has left is answered
+    in async mode instead, with "explanation_deferred": true. With the
+    defaults (500 ms budget, 2000 ms prior) that is every sync Bedrock
+    request until the worker's calls show a tier median that fits. Like any
+    async request it writes its audit row and sends the SQS job before
+    answering. Deferral is routing, not degradation: the answer is replayed
+    to repeats.
+        
+    Stream explanation mode answers with NDJSON events (application/x-ndjson):
+    the score first, then Bedrock text deltas, then the final explanation
+    (rule-based if the stream stalls); see explanation_stream.py.
+    Through API Gateway the events arrive in one body; stream_server.py
+    sends each as it is produced.
+        
+    Scoring requests run under a REQUEST_BUDGET_MS deadline
+    (request_deadline.py): AWS calls get timeouts that fit the time left,
+    and stages that no longer fit are skipped or degraded (rules instead of
+    SageMaker, rule-based instead of Bedrock explanation, audit row
+    deferred); the response lists them in "degraded". While a SageMaker or
+    Bedrock circuit breaker is open, that dependency is skipped the same way
+    ("circuit_open") without waiting for it to fail.
+        
+    Every invocation prints one CloudWatch EMF line with per-stage
+    latencies (request_timing.py); "debug_timings": true also returns this
+    request's span tree and the container's rolling p50/p95/p99 per stage.
+        
+    Batch Request Body:
+        {
+            "orders": [<single-order request>, ...],
+            "use_bedrock": bool (default false)
         }
         
     Response:
@@ -421,94 +1665,215 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 "explanation_text": string,
                 "top_factors": [string]
             },
-            "model_type": "sagemaker_ml" | "rule_based",
+            "model_type": "local_ml" | "sagemaker_ml" | "rule_based",
             "model_version": string,
+            "rules_version": string (rule_based only),
+            "feature_lookup": {snapshot, found, filled, live} (feature store / stream only),
+            "explanation_cache": {hits, misses, hit_rate, saved_latency_ms, ...} (Bedrock only),
+            "explanation_routing": {tier: {prompt, requests, bedrock_calls, input_tokens,
+                output_tokens, bedrock_latency_ms, ...}} (Bedrock only),
+            "idempotency": {status: "replay", tier, original_timestamp} (repeats only),
+            "explanation_deferred": true (sync Bedrock requests answered in async mode),
+            "degraded": [{stage, reason: "budget" | "timeout" | "circuit_open", count}]
+                (degraded requests only),
+            "debug_timings": {spans, rolling: {stage: {count, p50, p95, p99}}, audit,
+                clients: {name: {built, build_ms, variants}},
+                circuits: {name: {state, window_calls, error_rate, slow_rate, ...}},
+                micro_batch: {batches, rows_per_batch, row_limit, window_ms, ...}}
+                (debug_timings requests only),
             "timestamp": ISO datetime
         }
+        
+    Batch Response:
+        {
+            "results": [<response> + {"status": "ok"} | {"order_id", "status": "error", "error"}],
+            "count": int, "succeeded": int, "failed": int,
+            "model_type": string, "model_version": string, "timestamp": ISO datetime
+        }
+        
+    Error Response (400 for malformed JSON or non-numeric features, 500 otherwise):
+        {"error": string, "message": string}
     """
+    # Span tree for this invocation; emitted as one EMF metrics line at the end
+    timer, timer_token = start_timer()
+    timer.dimensions['Route'] = 'predict'
+    if context is not None and getattr(context, 'aws_request_id', None):
+        timer.properties['request_id'] = context.aws_request_id
+    deadline, deadline_token = None, None
+    # RULES_FILE is checked here, not per scored order
+    reload_rules_if_changed()
     try:
+        # Worker invocation: SQS event source for async explanations
+        if is_sqs_event(event):
+            timer.dimensions['Route'] = 'explanation_jobs'
+            return handle_explanation_jobs(event)
+        
+        # Consumer invocation: Kinesis order/return events
+        if is_kinesis_event(event):
+            timer.dimensions['Route'] = 'order_events'
+            return handle_stream_batch(event, STREAM_AGGREGATES)
+        
+        prediction_id = _explanation_route(event)
+        if prediction_id:
+            timer.dimensions['Route'] = 'get_explanation'
+            return get_explanation(prediction_id)
+        
+        # Scoring routes run under the request deadline from here on
+        if REQUEST_BUDGET_MS > 0:
+            deadline, deadline_token = start_deadline(_request_budget_ms(context),
+                                                      BUDGET_RESERVE_MS)
+        
         # Parse input
-        if 'body' in event:
-            body = json.loads(event['body'])
-        else:
-            body = event
-        
-        # Extract features
-        features = {
-            'customer_return_rate': body.get('customer_return_rate', 0.0),
-            'total_orders': body.get('total_orders', 0),
-            'is_cod': 1 if (body.get('payment_method') == 'COD' or body.get('is_cod') == True or body.get('is_cod') == 1) else 0,
-            'amount': body.get('amount', 0),
-            'product_return_rate': body.get('product_return_rate', 0.0),
-            'is_festival_season': 1 if (body.get('is_festival_season') == True or body.get('is_festival_season') == 1) else 0
-        }
+        with timed('parse'):
+            if 'body' in event:
+                body = json.loads(event['body'])
+            else:
+                body = event
+        timer.debug = DEBUG_TIMINGS_ENABLED and body.get('debug_timings') is True
         
-        # Try SageMaker first, fallback to rule-based
-        risk_score, feature_importance = predict_with_sagemaker(features)
+        if 'orders' in body:
+            timer.dimensions['Route'] = 'batch'
+            return _api_response(200, score_batch(body))
         
-        if risk_score is not None:
-            # SageMaker prediction successful
-            model_type = 'sagemaker_ml'
-            risk_factors = feature_importance if feature_importance else []
-        else:
-            # Fallback to rule-based model
-            model_type = 'rule_based'
-            risk_score, risk_factors = calculate_risk_score(features)
+        # Streaming explanation mode; API Gateway buffers the events into one body
+        if body.get('explanation_mode') == 'stream':
+            timer.dimensions['Route'] = 'predict_stream'
+            timer.properties['status_code'] = 200
+            events = ''.join(ndjson_line(event) for event in stream_prediction_events(body))
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': NDJSON_CONTENT_TYPE,
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': events
+            }
         
-        # Generate explanation using Bedrock (with fallback)
+        # Look up stored features by ID (caller values win), then extract
+        with timed('features'):
+            body, feature_lookup = resolve_request_features(body)
+            features = extract_features(body)
+            validate_features(features)
         use_bedrock = body.get('use_bedrock', True)
-        if use_bedrock:
-            explanation = generate_bedrock_explanation(risk_score, risk_factors, features)
-        else:
-            explanation = generate_fallback_explanation(risk_score, risk_factors, features)
-        
-        # Determine action based on risk level
-        if risk_score < 0.3:
-            risk_level = 'low'
-            action = 'instant_refund'
-        elif risk_score < 0.7:
-            risk_level = 'medium'
-            action = 'otp_verification'
-        else:
-            risk_level = 'high'
-            action = 'quality_check_required'
+        async_explanation = use_bedrock and body.get('explanation_mode') == 'async'
+        
+        # Repeat of a recent identical request: replay the stored result
+        # without scoring, Bedrock or another audit row
+        request_hash = None
+        if IDEMPOTENCY_CACHE is not None and body.get('order_id'):
+            with timed('idempotency'):
+                request_hash = request_fingerprint(features, {
+                    'use_bedrock': use_bedrock,
+                    'explanation_mode': 'async' if async_explanation else 'sync',
+                    'model_version': MODEL_VERSION
+                })
+                replay = IDEMPOTENCY_CACHE.get(body['order_id'], request_hash)
+            if replay is not None:
+                timer.properties['idempotency'] = 'replay'
+                return _api_response(200, replay)
+        
+        # Model backends in MODEL_BACKENDS order, fallback to rule-based
+        with timed('predict'):
+            risk_score, risk_factors, model_type = predict_risk(features)
+        timer.properties['model_type'] = model_type
+        
+        # Tiers routed to the rule-based explanation have nothing to wait for
+        risk_level = classify_risk(risk_score)[0]
+        if async_explanation and EXPLANATION_ROUTER.template_for(risk_level) is None:
+            async_explanation = False
+        # An async job needs its row written first; out of time, answer with
+        # the final rule-based explanation instead
+        out_of_time = async_explanation and not within_budget('async_explanation',
+                                                              AUDIT_SYNC_MIN_BUDGET_MS)
+        if out_of_time:
+            async_explanation = False
+        explain_with_bedrock = use_bedrock and not async_explanation and not out_of_time
+        # A sync Bedrock call the deadline cannot finish is not started: the
+        # request is routed to the async worker (rule-based text until then),
+        # or, without time left to write its row, the rule-based text stays
+        explanation_deferred = False
+        if (explain_with_bedrock and deadline is not None
+                and EXPLANATION_ROUTER.template_for(risk_level) is not None
+                and not deadline.allows(_bedrock_budget_ms(risk_level))):
+            explain_with_bedrock = False
+            if deadline.allows(AUDIT_SYNC_MIN_BUDGET_MS):
+                async_explanation = explanation_deferred = True
+                EXPLANATION_ROUTER.defer(risk_level)
+                timer.properties['explanation_deferred'] = True
+            else:
+                deadline.degrade('bedrock', 'budget')
+        
+        # Generate explanation using Bedrock (with fallback); async mode
+        # answers with the rule-based text and lets a worker attach Bedrock's
+        with timed('explanation'):
+            if explain_with_bedrock:
+                explanation = generate_bedrock_explanation(risk_score, risk_factors, features)
+            else:
+                explanation = generate_fallback_explanation(risk_score, risk_factors, features)
+        timer.properties['explanation'] = explanation.get('generated_by')
         
         # Build response
-        response_body = {
-            'order_id': body.get('order_id', 'unknown'),
-            'risk_score': round(risk_score, 3),
-            'risk_level': risk_level,
-            'recommended_action': action,
-            'explanation': explanation,
-            'confidence': round(abs(risk_score - 0.5) * 2, 3),
-            'model_version': 'v1.2-hybrid',
-            'model_type': model_type,
-            'timestamp': datetime.now().isoformat()
-        }
+        order_id = body.get('order_id', 'unknown')
+        response_body = build_prediction(order_id, risk_score, explanation, model_type)
+        if feature_lookup is not None:
+            response_body['feature_lookup'] = feature_lookup
+        if async_explanation:
+            response_body['prediction_id'] = new_prediction_id(order_id)
+            response_body['explanation_status'] = 'pending'
+            if explanation_deferred:
+                response_body['explanation_deferred'] = True
         
-        # Store prediction in DynamoDB
-        store_prediction_dynamodb(response_body)
+        # Degraded answers are not replayed to repeats
+        if deadline is not None and deadline.degraded:
+            request_hash = None
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS'
-            },
-            'body': json.dumps(response_body)
-        }
+        # Store prediction in DynamoDB; the explanation worker updates async
+        # rows, so those must exist before the job is queued
+        store_prediction_dynamodb(response_body, request_hash, features, sync=async_explanation)
+        
+        if async_explanation:
+            with timed('enqueue'):
+                queued = get_explanation_queue().enqueue({
+                    'prediction_id': response_body['prediction_id'],
+                    'risk_score': risk_score,
+                    'risk_factors': risk_factors,
+                    'features': features
+                })
+            if queued:
+                response_body['explanation_url'] = (
+                    f"/explanations/{response_body['prediction_id']}"
+                )
+            else:
+                response_body['explanation_status'] = 'failed'
+                update_prediction_explanation(response_body['prediction_id'], explanation, 'failed')
+        
+        degraded = _report_degradations(response_body)
+        if request_hash is not None and not degraded:
+            IDEMPOTENCY_CACHE.put(body['order_id'], request_hash, response_body)
+        if explain_with_bedrock:
+            if EXPLANATION_CACHE is not None:
+                response_body['explanation_cache'] = EXPLANATION_CACHE.stats()
+            response_body['explanation_routing'] = EXPLANATION_ROUTER.stats()
+        
+        return _api_response(200, response_body)
+        
+    except ValueError as e:
+        # Malformed JSON, batch shape or non-numeric features
+        return _api_response(400, {
+            'error': str(e),
+            'message': 'Invalid request'
+        })
         
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'error': str(e),
-                'message': 'Internal server error'
-            })
-        }
+        return _api_response(500, {
+            'error': str(e),
+            'message': 'Internal server error'
+        })
+    
+    finally:
+        # Sync mode too: rows of requests out of time were deferred to the buffer
+        if AUDIT_INVOCATION_FLUSH:
+            _flush_audit(context, deadline)
+        _finish_invocation(timer, timer_token, deadline)
+        if deadline_token is not None:
+            stop_deadline(deadline_token)
@@ -0,0 +1,63 @@
+"""
+Deferred imports for optional heavy dependencies.
+
+NumPy takes ~50 ms to import, and a Lambda scoring single orders never
+touches it. It is only needed for batch scoring, vectorized tree models
+and the feature snapshot index. Modules that use NumPy optionally bind
+
+    np = lazy_import('numpy')
+
+instead of importing it in a try/except ImportError. The result is falsy
+when the package is not installed, so the existing "no NumPy" fallbacks
+become `if not np:`. The import itself runs on first attribute access
+(np.asarray, np.float64, ...), so the first request that needs it pays
+the cost, not every cold start.
+"""
+
+import importlib
+import importlib.util
+import threading
+from typing import Any, Optional
+
+
+class LazyModule:
+    """Module stand-in that imports the real module on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[Any] = None
+        self._lock = threading.Lock()
+        try:
+            self._available = importlib.util.find_spec(name) is not None
+        except ValueError:
+            self._available = False
+
+    def __bool__(self) -> bool:
+        """True if the module can be imported (without importing it)."""
+        return self._available
+
+    def load(self) -> Any:
+        """The real module, imported on the first call."""
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+                module = self._module
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self.load(), attribute)
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self.loaded else ('deferred' if self._available else 'missing')
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Deferred `import name`; falsy if the module is not installed."""
+    return LazyModule(name)
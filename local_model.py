@@ -0,0 +1,165 @@
+"""
+In-process XGBoost inference for the Return Abuse Detection System.
+
+Loads the booster trained by sagemaker-training/train.py once per container
+and scores requests without the network hop to the SageMaker endpoint.
+
+Artifacts (a directory is searched in this order):
+    - model_trees.json: flat-array export of the booster
+      (sagemaker-training/export_trees.py); scored by tree_model.py with
+      the standard library only
+    - model.json: native XGBoost booster (written by train.py's save_model);
+      needs only xgboost + numpy at runtime
+    - model.joblib: pickled XGBClassifier; additionally needs scikit-learn
+
+Request features go through feature_pipeline.transform_row, the same
+spec train.py trains on, and are matched to the model's feature names
+(from the artifact or model_metadata.json next to it). Inputs the request
+does not supply are passed as missing values, which XGBoost sends down
+each split's default branch.
+
+xgboost and numpy are imported on first load, so containers that never
+enable the local backend do not pay for them.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from feature_pipeline import FEATURE_NAMES, transform_row
+
+MISSING = float('nan')
+
+
+class LocalModel:
+    """Lazily loaded, container-cached XGBoost model."""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: model.json / model.joblib file, or a directory containing one
+        """
+        self.path = path
+        self.feature_names: List[str] = []
+        # Pipeline column for each model feature (None: same order as FEATURE_NAMES)
+        self._positions: Optional[List[int]] = None
+        self.load_ms: Optional[float] = None
+        self.load_error: Optional[str] = None
+        self._trees = None
+        self._booster = None
+        self._classifier = None
+        self._lock = threading.Lock()
+
+    def _resolve_path(self) -> str:
+        if not os.path.isdir(self.path):
+            return self.path
+        for name in ('model_trees.json', 'model.json', 'model.joblib'):
+            candidate = os.path.join(self.path, name)
+            if os.path.exists(candidate):
+                return candidate
+        raise FileNotFoundError(
+            f"No model_trees.json, model.json or model.joblib in {self.path}"
+        )
+
+    def _read_metadata_features(self, model_path: str) -> List[str]:
+        metadata_path = os.path.join(os.path.dirname(model_path), 'model_metadata.json')
+        if not os.path.exists(metadata_path):
+            return []
+        with open(metadata_path) as f:
+            return list(json.load(f).get('features') or [])
+
+    def _ready(self) -> bool:
+        return (self._trees is not None or self._booster is not None
+                or self._classifier is not None)
+
+    def load(self) -> bool:
+        """
+        Load the model if it is not loaded yet.
+
+        Returns:
+            True if the model is ready; False if loading failed
+            (the error is kept in load_error and not retried)
+        """
+        if self._ready():
+            return True
+        if self.load_error is not None:
+            return False
+
+        with self._lock:
+            if self._ready():
+                return True
+            started = time.perf_counter()
+            try:
+                model_path = self._resolve_path()
+                if model_path.endswith('trees.json'):
+                    from tree_model import TreeModel
+                    self._trees = TreeModel.load(model_path)
+                    self.feature_names = self._trees.feature_names
+                elif model_path.endswith('.joblib'):
+                    import joblib
+                    self._classifier = joblib.load(model_path)
+                    names = getattr(self._classifier, 'feature_names_in_', None)
+                    self.feature_names = list(names) if names is not None else []
+                else:
+                    import xgboost as xgb
+                    booster = xgb.Booster()
+                    booster.load_model(model_path)
+                    self.feature_names = list(booster.feature_names or [])
+                    self._booster = booster
+                if not self.feature_names:
+                    self.feature_names = self._read_metadata_features(model_path)
+                if not self.feature_names:
+                    raise ValueError("Model artifact does not record its feature names")
+                if self.feature_names != FEATURE_NAMES:
+                    self._positions = [
+                        FEATURE_NAMES.index(name) if name in FEATURE_NAMES else -1
+                        for name in self.feature_names
+                    ]
+                self.load_ms = (time.perf_counter() - started) * 1000
+                print(f"Loaded local model {model_path} in {self.load_ms:.1f} ms")
+                return True
+            except Exception as e:
+                self.load_error = str(e)
+                print(f"Local model load error: {str(e)}")
+                return False
+
+    def _vectors(self, feature_rows: List[Dict[str, Any]]) -> List[List[float]]:
+        vectors = [transform_row(row) for row in feature_rows]
+        if self._positions is None:
+            return vectors
+        return [
+            [vector[i] if i >= 0 else MISSING for i in self._positions] for vector in vectors
+        ]
+
+    def predict(self, feature_rows: List[Dict[str, Any]]) -> Optional[List[float]]:
+        """
+        Score feature rows in process.
+
+        Args:
+            feature_rows: Request feature dictionaries (raw pipeline inputs)
+
+        Returns:
+            Fraud probability per row, or None if the model is unavailable
+        """
+        if not self.load():
+            return None
+        try:
+            vectors = self._vectors(feature_rows)
+            if self._trees is not None:
+                return self._trees.predict_vectors(vectors)
+            import numpy as np
+            matrix = np.array(vectors, dtype=np.float32)
+            if self._booster is not None:
+                import xgboost as xgb
+                dmatrix = xgb.DMatrix(matrix, feature_names=self.feature_names)
+                scores = self._booster.predict(dmatrix)
+            else:
+                import pandas as pd
+                frame = pd.DataFrame(matrix, columns=self.feature_names)
+                scores = self._classifier.predict_proba(frame)[:, 1]
+            return [float(score) for score in scores]
+        except Exception as e:
+            print(f"Local model prediction error: {str(e)}")
+            return None
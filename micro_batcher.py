@@ -0,0 +1,227 @@
+"""
+Dynamic micro-batching of concurrent single-row model calls.
+
+A SageMaker XGBoost endpoint spends most of an invocation on per-request
+overhead (TLS, routing, container dispatch, CSV parsing), not on the
+trees for a 6-value row. When one process serves many requests at once
+(stream_server.py, server mode), rows that arrive within a few
+milliseconds of each other can share one multi-row invoke_endpoint call.
+
+MicroBatcher collects submitted items into batches and hands each batch
+to a handler (lambda_function sends them as one multi-row invoke_endpoint
+call) on one of `workers` threads, then resolves each caller's Future with its
+row's result:
+
+    - a batch is sent once it holds row_limit rows, or once its first row
+      has waited the batch window, whichever comes first
+    - only one worker collects at a time; the others are busy with
+      endpoint calls or queue up as the next collector, so at most
+      `workers` calls are in flight
+    - a handler exception fails every Future in its batch
+
+Adaptive sizing (adaptive=True):
+
+    - row_limit: call latency is fitted as fixed + per_row * rows over the
+      last 64 batches. The limit is the largest batch whose latency stays
+      within max(target_call_ms, 2 x fixed), i.e. batching may at most
+      double a call's latency, or use up target_call_ms.
+    - window: with requests arriving further apart than max_wait_ms (light
+      load) a batch waits only min_wait_ms; otherwise long enough for
+      row_limit rows at the observed arrival rate, within
+      [min_wait_ms, max_wait_ms].
+
+With adaptive=False batches wait max_wait_ms or max_rows rows.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Batches kept for the latency fit
+FIT_WINDOW = 64
+
+# Weight of the newest inter-arrival gap in the arrival rate estimate
+ARRIVAL_EWMA_ALPHA = 0.1
+
+
+class MicroBatcher:
+    """Groups concurrent submissions into batched handler calls."""
+
+    def __init__(self, handler: Callable[[List[Any]], List[Any]], max_rows: int = 64,
+                 min_wait_ms: float = 2.0, max_wait_ms: float = 5.0,
+                 target_call_ms: float = 50.0, workers: int = 4, adaptive: bool = True,
+                 name: str = 'micro-batch'):
+        """
+        Args:
+            handler: Called with a list of items; returns one result per item,
+                     in order
+            max_rows: Largest batch
+            min_wait_ms: Shortest batch window
+            max_wait_ms: Longest batch window
+            target_call_ms: Call latency a batch may grow to (adaptive)
+            workers: Handler calls in flight at most
+            adaptive: Size batches and windows from observed latency and load
+            name: Thread name prefix
+        """
+        self.handler = handler
+        self.max_rows = max_rows
+        self.min_wait_ms = min_wait_ms
+        self.max_wait_ms = max_wait_ms
+        self.target_call_ms = target_call_ms
+        self.workers = workers
+        self.adaptive = adaptive
+        self.name = name
+        self.row_limit = max_rows
+        # (enqueued_at, item, future), oldest first
+        self._queue: Deque[Tuple[float, Any, Future]] = deque()
+        self._condition = threading.Condition()
+        self._collect_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        self._last_arrival: Optional[float] = None
+        self._gap_ms: Optional[float] = None
+        # (rows, call_ms) of recent batches
+        self._calls: Deque[Tuple[int, float]] = deque(maxlen=FIT_WINDOW)
+        self._fit: Optional[Tuple[float, float]] = None
+        self.submitted = 0
+        self.batches = 0
+        self.rows = 0
+        self.failed_batches = 0
+
+    def _ensure_workers(self) -> None:
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        for index in range(len(self._threads), self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item; the Future resolves to its handler result."""
+        future: Future = Future()
+        now = time.monotonic()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError(f"{self.name} is closed")
+            if len(self._threads) < self.workers:
+                self._ensure_workers()
+            if self._last_arrival is not None:
+                gap_ms = (now - self._last_arrival) * 1000
+                self._gap_ms = gap_ms if self._gap_ms is None else (
+                    ARRIVAL_EWMA_ALPHA * gap_ms + (1 - ARRIVAL_EWMA_ALPHA) * self._gap_ms
+                )
+            self._last_arrival = now
+            self._queue.append((now, item, future))
+            self.submitted += 1
+            self._condition.notify()
+        return future
+
+    def window_ms(self) -> float:
+        """How long the current batch's first row may wait for company."""
+        if not self.adaptive:
+            return self.max_wait_ms
+        gap_ms = self._gap_ms
+        if gap_ms is None or gap_ms >= self.max_wait_ms:
+            return self.min_wait_ms
+        return min(self.max_wait_ms, max(self.min_wait_ms, gap_ms * (self.row_limit - 1)))
+
+    def _collect(self) -> Optional[List[Tuple[float, Any, Future]]]:
+        """Next batch (blocking), or None once closed and drained."""
+        with self._collect_lock, self._condition:
+            while not self._queue:
+                if self._closed:
+                    return None
+                self._condition.wait()
+            limit = self.row_limit
+            send_at = self._queue[0][0] + self.window_ms() / 1000
+            while len(self._queue) < limit and not self._closed:
+                remaining = send_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(limit, len(self._queue)))]
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            futures = [future for _, _, future in batch]
+            started = time.perf_counter()
+            try:
+                results = self.handler([item for _, item, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"{self.name} handler returned {len(results)} results "
+                                     f"for {len(batch)} items")
+            except Exception as e:
+                with self._condition:
+                    self.failed_batches += 1
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            self._observe(len(batch), (time.perf_counter() - started) * 1000)
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def _observe(self, rows: int, call_ms: float) -> None:
+        """Count a batch and refit row_limit to the call latencies."""
+        with self._condition:
+            self.batches += 1
+            self.rows += rows
+            self._calls.append((rows, call_ms))
+            if not self.adaptive:
+                return
+            self._fit = self._fit_latency()
+            if self._fit is None:
+                return
+            fixed_ms, per_row_ms = self._fit
+            if per_row_ms <= 0:
+                self.row_limit = self.max_rows
+                return
+            budget_ms = max(self.target_call_ms, 2 * fixed_ms)
+            self.row_limit = max(1, min(self.max_rows, int((budget_ms - fixed_ms) / per_row_ms)))
+
+    def _fit_latency(self) -> Optional[Tuple[float, float]]:
+        """Least-squares (fixed_ms, per_row_ms) over recent batches; None without spread."""
+        count = len(self._calls)
+        mean_rows = sum(rows for rows, _ in self._calls) / count
+        mean_ms = sum(ms for _, ms in self._calls) / count
+        spread = sum((rows - mean_rows) ** 2 for rows, _ in self._calls)
+        if spread == 0:
+            return None
+        per_row_ms = sum((rows - mean_rows) * (ms - mean_ms) for rows, ms in self._calls) / spread
+        return max(0.0, mean_ms - per_row_ms * mean_rows), per_row_ms
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        Send what is queued and stop the workers.
+
+        Returns:
+            True if every worker finished within the timeout
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in self._threads)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batches, rows per batch, current limit/window and the latency fit."""
+        with self._condition:
+            stats: Dict[str, Any] = {
+                'submitted': self.submitted,
+                'batches': self.batches,
+                'rows': self.rows,
+                'rows_per_batch': round(self.rows / self.batches, 2) if self.batches else 0.0,
+                'failed_batches': self.failed_batches,
+                'queued': len(self._queue),
+                'row_limit': self.row_limit,
+                'window_ms': round(self.window_ms(), 3)
+            }
+            if self._fit is not None:
+                stats['fixed_ms'] = round(self._fit[0], 3)
+                stats['per_row_ms'] = round(self._fit[1], 4)
+        return stats
@@ -0,0 +1,164 @@
+"""
+Per-request latency budget for the Return Abuse Detection System.
+
+A scoring request has REQUEST_BUDGET_MS (500 ms by default) from the
+moment the handler starts. Without a deadline a slow invoke_endpoint is
+followed by a full Bedrock call and a DynamoDB write anyway, and botocore's
+default 60 s timeouts let one request hang until the Lambda times out.
+
+The handler starts a Deadline for each scoring request. Stages find it
+through a context variable, like request_timing's timer, so nothing is
+threaded through helper signatures. Before a remote call a stage asks
+whether enough of the budget is left:
+
+    - SageMaker: skipped (next backend, usually the rules) when less than
+      its minimum is left
+    - Bedrock: the async explanation path (or the rule-based explanation)
+      when less than the tier's median Bedrock call is left
+    - sync audit write: handed to the write-behind buffer instead
+      (deferred); async explanations, which need the row written first,
+      fall back to the rule-based explanation
+
+Remote calls made under a deadline use clients whose botocore connect/read
+timeouts and retry count fit the remaining budget (aws_clients.BudgetedClient,
+via client_timeouts()). Timeouts are snapped to a fixed ladder of tiers, so
+a container builds a handful of client variants, not one per request. A
+retry is only allowed when two attempts plus the worst retry backoff
+still fit.
+
+Each degradation is recorded as {"stage", "reason": "budget" | "timeout",
+"count"} and returned in the response's "degraded" field (lambda_function
+also records "circuit_open" for calls an open circuit breaker skipped). Code running
+outside a request (flush thread, explanation worker, Kinesis consumer)
+sees no deadline and keeps the default clients.
+"""
+
+import time
+from contextvars import ContextVar, Token
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# Connect/read timeout ladder (ms) for clients used under a deadline
+TIMEOUT_TIERS_MS = (25, 50, 100, 200, 400, 800, 1600, 3200, 6400)
+
+# botocore exceptions raised when a connect/read timeout expires
+TIMEOUT_ERRORS = ('ConnectTimeoutError', 'ReadTimeoutError')
+
+# Longest botocore "standard" mode backoff before a first retry (throttling)
+RETRY_BACKOFF_MS = 1000
+
+_CURRENT_DEADLINE: ContextVar[Optional['Deadline']] = ContextVar('request_deadline',
+                                                                default=None)
+
+
+class ClientTimeouts(NamedTuple):
+    """botocore settings of one client variant."""
+    timeout_ms: int
+    attempts: int
+
+
+class Deadline:
+    """Remaining budget of one request and the degradations it caused."""
+
+    def __init__(self, budget_ms: float, reserve_ms: float = 0.0,
+                 tiers_ms: Sequence[int] = TIMEOUT_TIERS_MS,
+                 retry_backoff_ms: float = RETRY_BACKOFF_MS):
+        """
+        Args:
+            budget_ms: Time the request may take, from now
+            reserve_ms: Part of the budget kept back for the work after the
+                        last remote call (rules, response, serialization)
+            tiers_ms: Timeout ladder for client_timeouts()
+            retry_backoff_ms: Worst-case wait before a retry
+        """
+        self.budget_ms = budget_ms
+        self.reserve_ms = reserve_ms
+        self.tiers_ms = tiers_ms if tiers_ms is TIMEOUT_TIERS_MS else sorted(tiers_ms)
+        self.retry_backoff_ms = retry_backoff_ms
+        self._started_ns = time.perf_counter_ns()
+        self._degradations: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter_ns() - self._started_ns) / 1e6
+
+    def remaining_ms(self) -> float:
+        """Budget left, less the reserve (may be negative)."""
+        return self.budget_ms - self.reserve_ms - self.elapsed_ms()
+
+    def allows(self, stage_ms: float) -> bool:
+        """True if a stage that needs stage_ms still fits."""
+        return self.remaining_ms() >= stage_ms
+
+    def client_timeouts(self, max_attempts: int = 1) -> ClientTimeouts:
+        """
+        Largest timeout tier (and attempt count) that fits the remaining budget.
+
+        Two or more attempts are only used when every attempt gets a tier of
+        its own plus the retry backoff. Below the smallest tier the smallest
+        one is used; callers skip the stage before that happens.
+        """
+        remaining = self.remaining_ms()
+        for attempts in range(max_attempts, 0, -1):
+            backoff = self.retry_backoff_ms * (attempts - 1)
+            fitting = [tier for tier in self.tiers_ms if tier * attempts + backoff <= remaining]
+            if fitting:
+                return ClientTimeouts(fitting[-1], attempts)
+        return ClientTimeouts(self.tiers_ms[0], 1)
+
+    def degrade(self, stage: str, reason: str) -> None:
+        """Record that a stage was skipped ("budget", ...) or ran out of time ("timeout")."""
+        entry = self._degradations.get((stage, reason))
+        if entry is None:
+            self._degradations[(stage, reason)] = {'stage': stage, 'reason': reason, 'count': 1}
+        else:
+            entry['count'] += 1
+
+    @property
+    def degraded(self) -> bool:
+        return bool(self._degradations)
+
+    @property
+    def degradations(self) -> List[Dict[str, Any]]:
+        return [dict(entry) for entry in self._degradations.values()]
+
+
+def start_deadline(budget_ms: float, reserve_ms: float = 0.0) -> Tuple[Deadline, Token]:
+    """Start a request's deadline in the current context; pass the token to stop_deadline."""
+    deadline = Deadline(budget_ms, reserve_ms)
+    return deadline, _CURRENT_DEADLINE.set(deadline)
+
+
+def stop_deadline(token: Token) -> None:
+    _CURRENT_DEADLINE.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """The deadline of the request being handled, or None outside one."""
+    return _CURRENT_DEADLINE.get()
+
+
+def within_budget(stage: str, stage_ms: float) -> bool:
+    """
+    False, with a "budget" degradation recorded, if the current request has
+    less than stage_ms left; True outside a deadline.
+    """
+    deadline = _CURRENT_DEADLINE.get()
+    if deadline is None or deadline.allows(stage_ms):
+        return True
+    deadline.degrade(stage, 'budget')
+    return False
+
+
+def note_timeout(stage: str, error: Exception) -> bool:
+    """
+    Record a "timeout" degradation if error is a botocore connect/read
+    timeout raised under a deadline.
+
+    Returns:
+        True if it was recorded
+    """
+    deadline = _CURRENT_DEADLINE.get()
+    # Matched by name so botocore is not imported just for the check
+    if deadline is None or type(error).__name__ not in TIMEOUT_ERRORS:
+        return False
+    deadline.degrade(stage, 'timeout')
+    return True
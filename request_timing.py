@@ -0,0 +1,258 @@
+"""
+Per-stage request timings for the Return Abuse Detection System.
+
+Every invocation carries a span tree recorded with the monotonic
+perf_counter clock: the handler opens one span per stage (parse,
+features, predict, explanation, store, ...) and the downstream helpers
+open nested spans for the remote calls they make (sagemaker, bedrock,
+explanation_cache, ...). Helpers find the current request's timer through
+a context variable, so nothing has to be threaded through their
+signatures, and timed() is a no-op when no request is being timed.
+
+Repeated stages under the same parent (one explanation per batch row)
+are merged into a single node with a count, which keeps the tree - and
+the log line carrying it - bounded for 500-row batches.
+
+At the end of an invocation:
+    - one CloudWatch Embedded Metric Format (EMF) line is printed: a JSON
+      log line that CloudWatch turns into per-stage latency metrics, and
+      that is just a structured log line when run locally
+    - per-stage durations are added to rolling in-process windows, whose
+      p50/p95/p99 are returned in the optional "debug_timings" response field
+"""
+
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar, Token
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+_CURRENT_TIMER: ContextVar[Optional['RequestTimer']] = ContextVar('request_timer', default=None)
+
+
+class Span:
+    """One node of the span tree (all runs of a stage under one parent)."""
+
+    __slots__ = ('name', 'timer', 'children', 'count', 'total_ns', 'first_ns', 'started_ns')
+
+    def __init__(self, name: str, timer: 'RequestTimer'):
+        self.name = name
+        self.timer = timer
+        self.children: Dict[str, 'Span'] = {}
+        self.count = 0
+        self.total_ns = 0
+        self.first_ns: Optional[int] = None
+        self.started_ns = 0
+
+    def __enter__(self) -> 'Span':
+        self.started_ns = time.perf_counter_ns()
+        if self.first_ns is None:
+            self.first_ns = self.started_ns
+        self.timer._stack.append(self)
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        self.total_ns += time.perf_counter_ns() - self.started_ns
+        self.count += 1
+        self.timer._stack.pop()
+        return False
+
+    def to_dict(self, origin_ns: int) -> Dict[str, Any]:
+        node: Dict[str, Any] = {
+            'name': self.name,
+            'start_us': ((self.first_ns or origin_ns) - origin_ns) // 1000,
+            'us': self.total_ns // 1000
+        }
+        if self.count > 1:
+            node['count'] = self.count
+        if self.children:
+            node['children'] = [child.to_dict(origin_ns) for child in self.children.values()]
+        return node
+
+
+class _NoSpan:
+    """Context manager used when no request is being timed."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class RequestTimer:
+    """Span tree of one invocation, rooted at the handler."""
+
+    def __init__(self, name: str = 'invocation'):
+        self.root = Span(name, self)
+        self.root.count = 1
+        self.root.first_ns = time.perf_counter_ns()
+        self._stack: List[Span] = [self.root]
+        self.finished = False
+        # Set by the handler: response wants debug_timings, EMF dimensions/properties
+        self.debug = False
+        self.dimensions: Dict[str, str] = {}
+        self.properties: Dict[str, Any] = {}
+
+    def span(self, name: str) -> Span:
+        """Span for `name` under the innermost open span (use as a context manager)."""
+        parent = self._stack[-1]
+        node = parent.children.get(name)
+        if node is None:
+            node = parent.children[name] = Span(name, self)
+        return node
+
+    def elapsed_ms(self) -> float:
+        """Time since the invocation started (total once finished)."""
+        if self.finished:
+            return self.root.total_ns / 1e6
+        return (time.perf_counter_ns() - self.root.first_ns) / 1e6
+
+    def finish(self) -> None:
+        if not self.finished:
+            self.root.total_ns = time.perf_counter_ns() - self.root.first_ns
+            self.finished = True
+
+    def tree(self) -> Dict[str, Any]:
+        """Span tree as nested dicts (start offsets and durations in whole microseconds)."""
+        root = self.root.to_dict(self.root.first_ns)
+        if not self.finished:
+            root['us'] = (time.perf_counter_ns() - self.root.first_ns) // 1000
+        return root
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Milliseconds per stage name (summed over repeats), plus "total"."""
+        totals = {'total': self.elapsed_ms()}
+        pending = list(self.root.children.values())
+        while pending:
+            node = pending.pop()
+            totals[node.name] = totals.get(node.name, 0.0) + node.total_ns / 1e6
+            pending.extend(node.children.values())
+        return totals
+
+
+def start_timer(name: str = 'invocation') -> Tuple[RequestTimer, Token]:
+    """Start timing a request in the current context; pass the token to stop_timer."""
+    timer = RequestTimer(name)
+    return timer, _CURRENT_TIMER.set(timer)
+
+
+def stop_timer(timer: RequestTimer, token: Token) -> None:
+    timer.finish()
+    _CURRENT_TIMER.reset(token)
+
+
+def current_timer() -> Optional[RequestTimer]:
+    return _CURRENT_TIMER.get()
+
+
+def timed(name: str):
+    """
+    Context manager timing a stage of the current request.
+
+    Example:
+        with timed('sagemaker'):
+            response = sagemaker_runtime.invoke_endpoint(...)
+    """
+    timer = _CURRENT_TIMER.get()
+    if timer is None:
+        return _NO_SPAN
+    return timer.span(name)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class RollingLatency:
+    """Last `window` durations per stage, with p50/p95/p99 on demand."""
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, totals: Dict[str, float]) -> None:
+        with self._lock:
+            for stage, ms in totals.items():
+                samples = self._samples.get(stage)
+                if samples is None:
+                    samples = self._samples[stage] = deque(maxlen=self.window)
+                samples.append(ms)
+
+    def stage_percentile(self, stage: str, pct: float) -> Tuple[int, Optional[float]]:
+        """(sample count, pct-th percentile) of one stage; (0, None) before its first sample."""
+        with self._lock:
+            values = sorted(self._samples.get(stage, ()))
+        return len(values), percentile(values, pct) if values else None
+
+    def percentiles(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            snapshot = {stage: sorted(samples) for stage, samples in self._samples.items()}
+        return {
+            stage: {
+                'count': len(values),
+                'p50': round(percentile(values, 50), 3),
+                'p95': round(percentile(values, 95), 3),
+                'p99': round(percentile(values, 99), 3)
+            }
+            for stage, values in snapshot.items()
+        }
+
+
+def emf_record(timer: RequestTimer, namespace: str,
+               totals: Optional[Dict[str, float]] = None,
+               metrics: Optional[Dict[str, Tuple[Any, str]]] = None) -> Dict[str, Any]:
+    """
+    CloudWatch Embedded Metric Format record for one finished invocation.
+
+    Each stage becomes a "<stage>_ms" metric (Milliseconds) under the
+    timer's dimensions; the span tree and properties ride along as log
+    fields for Logs Insights.
+
+    Args:
+        timer: Finished request timer
+        namespace: CloudWatch metrics namespace
+        totals: timer.stage_totals(), if the caller already computed them
+        metrics: Further metrics, {name: (value or list of values, unit)}
+    """
+    if totals is None:
+        totals = timer.stage_totals()
+    definitions = [{'Name': f"{stage}_ms", 'Unit': 'Milliseconds'} for stage in totals]
+    definitions.extend({'Name': name, 'Unit': unit} for name, (_, unit) in (metrics or {}).items())
+    record: Dict[str, Any] = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': namespace,
+                'Dimensions': [sorted(timer.dimensions)],
+                'Metrics': definitions
+            }]
+        }
+    }
+    record.update(timer.dimensions)
+    record.update(timer.properties)
+    for stage, ms in totals.items():
+        record[f"{stage}_ms"] = round(ms, 3)
+    for name, (value, _) in (metrics or {}).items():
+        record[name] = value
+    record['spans'] = timer.tree()
+    return record
+
+
+def emf_line(timer: RequestTimer, namespace: str,
+             totals: Optional[Dict[str, float]] = None,
+             metrics: Optional[Dict[str, Tuple[Any, str]]] = None) -> str:
+    """emf_record as one compact JSON log line."""
+    return json.dumps(emf_record(timer, namespace, totals, metrics), separators=(',', ':'))
@@ -0,0 +1,481 @@
+"""
+Rule-based risk scoring for the Return Abuse Detection System.
+
+Scores orders with the weighted rule model used as the SageMaker fallback.
+The rules are declared as a versioned data table (RULE_TABLE): one entry
+per feature with ascending breakpoints, the weight and factor name of each
+band, and an explanation template per factor. The table is compiled once
+at import into bisect lookups, so scoring a row is one binary search per
+feature and explaining a factor is one dict lookup.
+
+The columnar entry point (calculate_risk_scores) evaluates whole feature
+columns at once - vectorized with NumPy (searchsorted over the same
+breakpoints) when it is installed, otherwise row by row in pure Python -
+and encodes triggered rules as a bitmask per row. calculate_risk_score, what
+the Lambda handler calls per order, runs the same bisect lookups over one
+row and appends the triggered factors directly instead of building and
+decoding a bitmask, which keeps it as fast as the hand-written if/elif
+ladder the table replaced.
+
+Tuned rule tables can be hot-reloaded from a local JSON file named by the
+RULES_FILE environment variable; the file is re-checked at most every
+RULES_RELOAD_INTERVAL seconds and an invalid file leaves the current rules
+in place. calculate_risk_score does not check the file itself: the
+handler calls reload_rules_if_changed() once per invocation.
+
+NumPy is optional: the Lambda deployment package ships without it, while
+offline rescoring jobs get the vectorized path.
+"""
+
+import json
+import math
+import os
+import time
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from lazy_import import lazy_import
+
+# Imported on first use; falsy on a Lambda runtime without a NumPy layer
+np = lazy_import('numpy')
+
+
+# Feature columns consumed by the rule model (same order as the SageMaker CSV)
+RISK_FEATURES = [
+    'customer_return_rate',
+    'total_orders',
+    'is_cod',
+    'amount',
+    'product_return_rate',
+    'is_festival_season'
+]
+
+# Rule table. Triggers:
+#   above - band i applies when value > breakpoints[i] (highest matching band wins)
+#   below - band i applies when value < breakpoints[i] (lowest matching band wins)
+#   flag  - the single band applies when the value is truthy
+# Explanation templates may use {value} and {percent} (value * 100);
+# None means the factor scores but is not listed in fallback explanations.
+RULE_TABLE: Dict[str, Any] = {
+    'version': 'rules-v1',
+    'rules': [
+        {   # Customer behavior factors (40% weight)
+            'feature': 'customer_return_rate',
+            'trigger': 'above',
+            'breakpoints': [0.15, 0.3, 0.5],
+            'weights': [0.05, 0.15, 0.30],
+            'factors': [
+                'moderate_customer_return_rate',
+                'high_customer_return_rate',
+                'very_high_customer_return_rate'
+            ],
+            'explanations': [
+                None,
+                'High return rate: {percent:.0f}% of orders returned',
+                'Very high return rate: {percent:.0f}% of orders returned'
+            ]
+        },
+        {   # New customer risk (10% weight)
+            'feature': 'total_orders',
+            'trigger': 'below',
+            'breakpoints': [3, 10],
+            'weights': [0.10, 0.05],
+            'factors': ['new_customer', 'relatively_new_customer'],
+            'explanations': ['New customer with only {value} previous orders', None]
+        },
+        {   # Payment method risk (15% weight)
+            'feature': 'is_cod',
+            'trigger': 'flag',
+            'weights': [0.15],
+            'factors': ['cod_payment'],
+            'display_value': 'COD',
+            'explanations': ['Cash on Delivery payment method (higher risk)']
+        },
+        {   # High value order risk (20% weight)
+            'feature': 'amount',
+            'trigger': 'above',
+            'breakpoints': [10000, 20000, 50000],
+            'weights': [0.05, 0.10, 0.20],
+            'factors': ['moderate_value_order', 'high_value_order', 'very_high_value_order'],
+            'explanations': [
+                None,
+                'High value order: ₹{value:,.0f}',
+                'Very high value order: ₹{value:,.0f}'
+            ]
+        },
+        {   # Product return pattern (10% weight)
+            'feature': 'product_return_rate',
+            'trigger': 'above',
+            'breakpoints': [0.2, 0.4],
+            'weights': [0.05, 0.10],
+            'factors': ['moderate_product_return_rate', 'high_product_return_rate'],
+            'explanations': [None, 'Product has high return rate: {percent:.0f}%']
+        },
+        {   # Festival season adjustment (5% weight - reduces risk)
+            'feature': 'is_festival_season',
+            'trigger': 'flag',
+            'weights': [-0.05],
+            'factors': ['festival_season'],
+            'display_value': 'Yes',
+            'explanations': ['Festival season - normal shopping behavior expected']
+        }
+    ]
+}
+
+RULES_FILE = os.environ.get('RULES_FILE', '')
+RULES_RELOAD_INTERVAL = float(os.environ.get('RULES_RELOAD_INTERVAL', '30'))
+
+# Below this many rows the per-call NumPy overhead outweighs vectorization
+VECTORIZE_MIN_ROWS = 32
+
+_TRIGGERS = ('above', 'below', 'flag')
+
+
+class CompiledRule:
+    """
+    One feature rule compiled into lookup arrays.
+
+    The band index returned by index() selects from weights/bits; the
+    slot at none_index is the "no factor" band with weight 0.0 and bit 0.
+    """
+
+    __slots__ = ('feature', 'trigger', 'breakpoints', 'weights', 'bits', 'none_index')
+
+    def __init__(self, feature: str, trigger: str, breakpoints: List[float],
+                 weights: List[float], bits: List[int], none_index: int):
+        self.feature = feature
+        self.trigger = trigger
+        self.breakpoints = breakpoints
+        self.weights = weights
+        self.bits = bits
+        self.none_index = none_index
+
+    def search(self) -> Optional[Any]:
+        """Binary search used by index(); None for flag rules."""
+        if self.trigger == 'above':
+            return bisect_left
+        if self.trigger == 'below':
+            return bisect_right
+        return None
+
+    def index(self, value: Any) -> int:
+        """Band index for one value (one binary search)."""
+        search = self.search()
+        if search is None:
+            return 1 if value else 0
+        return search(self.breakpoints, value)
+
+    def index_array(self, values: Any) -> Any:
+        """Band indexes for a NumPy column (matches index() element-wise)."""
+        if self.trigger == 'flag':
+            return (values != 0).astype(np.intp)
+        side = 'left' if self.trigger == 'above' else 'right'
+        indexes = np.searchsorted(self.breakpoints, values, side=side)
+        # searchsorted orders NaN last; bisect treats it as matching no band
+        return np.where(np.isnan(values), self.none_index, indexes)
+
+
+class CompiledRules:
+    """
+    A rule table compiled for scoring, factor decoding and explanation.
+
+    Attributes:
+        version: Rule table version (reported with rule-based predictions)
+        rules: CompiledRule per feature, in table order (= accumulation order)
+        factors: (name, feature, weight, display_value, template) per mask bit
+    """
+
+    def __init__(self, table: Dict[str, Any]):
+        self.version = str(table['version'])
+        self.rules: List[CompiledRule] = []
+        self.factors: List[Tuple[str, str, float, Optional[str], Optional[str]]] = []
+        self.templates: Dict[str, Optional[str]] = {}
+
+        for rule in table['rules']:
+            feature = rule['feature']
+            trigger = rule['trigger']
+            weights = [float(weight) for weight in rule['weights']]
+            factors = list(rule['factors'])
+            explanations = list(rule.get('explanations') or [None] * len(factors))
+            breakpoints = [] if trigger == 'flag' else list(rule['breakpoints'])
+
+            if feature not in RISK_FEATURES:
+                raise ValueError(f"Unknown feature {feature!r}")
+            if trigger not in _TRIGGERS:
+                raise ValueError(f"{feature}: unknown trigger {trigger!r}")
+            if trigger == 'flag' and len(factors) != 1:
+                raise ValueError(f"{feature}: flag rules have exactly one band")
+            if trigger != 'flag' and len(breakpoints) != len(factors):
+                raise ValueError(f"{feature}: breakpoints and factors differ in length")
+            if breakpoints != sorted(breakpoints):
+                raise ValueError(f"{feature}: breakpoints must be ascending")
+            if not len(weights) == len(factors) == len(explanations):
+                raise ValueError(f"{feature}: weights/factors/explanations differ in length")
+            if not all(math.isfinite(float(value)) for value in breakpoints + weights):
+                raise ValueError(f"{feature}: breakpoints and weights must be finite numbers")
+
+            bits = []
+            for name, weight, template in zip(factors, weights, explanations):
+                if name in self.templates:
+                    raise ValueError(f"Duplicate factor name {name!r}")
+                bits.append(1 << len(self.factors))
+                self.factors.append((name, feature, weight, rule.get('display_value'), template))
+                self.templates[name] = template
+
+            # Lay bands out in bisect index order with a zero "no factor" slot
+            if trigger == 'below':
+                band_weights, band_bits, none_index = weights + [0.0], bits + [0], len(weights)
+            else:
+                band_weights, band_bits, none_index = [0.0] + weights, [0] + bits, 0
+
+            self.rules.append(CompiledRule(
+                feature, trigger, breakpoints, band_weights, band_bits, none_index
+            ))
+
+        # Flattened per-rule tuples for the columnar row loop
+        self.features = [rule.feature for rule in self.rules]
+        self._plan = [
+            (rule.search(), rule.breakpoints, rule.weights, rule.bits) for rule in self.rules
+        ]
+        # Same lookups for single rows, with each band's (name, weight, display_value)
+        # resolved up front so no mask has to be decoded
+        self._row_plan = []
+        for rule, (search, breakpoints, weights, bits) in zip(self.rules, self._plan):
+            band_factors: List[Optional[Tuple[str, float, Optional[str]]]] = []
+            for bit in bits:
+                if bit:
+                    name, _, weight, display_value, _ = self.factors[bit.bit_length() - 1]
+                    band_factors.append((name, weight, display_value))
+                else:
+                    band_factors.append(None)
+            self._row_plan.append((rule.feature, search, breakpoints, band_factors))
+
+    def score_factors(self, features: Mapping[str, Any]) -> Tuple[float, List[Dict[str, Any]]]:
+        """Score a single row, returning (risk_score, risk_factors)."""
+        risk_score = 0.0
+        risk_factors = []
+        append = risk_factors.append
+        for feature, search, breakpoints, factors in self._row_plan:
+            value = features[feature]
+            factor = factors[search(breakpoints, value) if search else (1 if value else 0)]
+            # The "no factor" band weighs 0.0, so skipping it leaves the sum unchanged
+            if factor is not None:
+                name, weight, display_value = factor
+                risk_score += weight
+                append({
+                    'factor': name,
+                    'value': value if display_value is None else display_value,
+                    'weight': weight
+                })
+        # Normalize to 0-1 range
+        return max(0.0, min(1.0, risk_score)), risk_factors
+
+    def score_values(self, values: Sequence[Any]) -> Tuple[float, int]:
+        """Score one row given positionally in self.features order."""
+        risk_score = 0.0
+        mask = 0
+        for value, (search, breakpoints, weights, bits) in zip(values, self._plan):
+            band = search(breakpoints, value) if search else (1 if value else 0)
+            risk_score += weights[band]
+            mask |= bits[band]
+        # Normalize to 0-1 range
+        return max(0.0, min(1.0, risk_score)), mask
+
+    def score_row(self, features: Mapping[str, Any]) -> Tuple[float, int]:
+        """Score a single row, returning (risk_score, factor_mask)."""
+        return self.score_values([features[name] for name in self.features])
+
+    def score_columns_numpy(self, columns: Mapping[str, Sequence]) -> Tuple[Any, Any]:
+        """Vectorized equivalent of score_row over whole columns."""
+        risk_scores = None
+        masks = None
+        for rule in self.rules:
+            values = np.asarray(columns[rule.feature], dtype=np.float64)
+            bands = rule.index_array(values)
+            weights = np.take(np.asarray(rule.weights, dtype=np.float64), bands)
+            bits = np.take(np.asarray(rule.bits, dtype=np.int64), bands)
+            # Accumulate in table order so float results match score_row exactly
+            risk_scores = weights if risk_scores is None else risk_scores + weights
+            masks = bits if masks is None else masks | bits
+        return np.clip(risk_scores, 0.0, 1.0), masks
+
+    def decode(self, mask: int, features: Mapping[str, Any]) -> List[Dict[str, Any]]:
+        """Expand a factor bitmask into {'factor', 'value', 'weight'} dicts."""
+        risk_factors = []
+        while mask:
+            lowest = mask & -mask
+            mask ^= lowest
+            name, feature, weight, display_value, _ = self.factors[lowest.bit_length() - 1]
+            risk_factors.append({
+                'factor': name,
+                'value': display_value if display_value is not None else features[feature],
+                'weight': weight
+            })
+        return risk_factors
+
+    def explain(self, risk_factors: List[Dict[str, Any]]) -> List[str]:
+        """Render the explanation template of each factor that has one."""
+        reasons = []
+        for factor in risk_factors:
+            template = self.templates.get(factor['factor'])
+            if template is None:
+                continue
+            if '{' not in template:
+                reasons.append(template)
+                continue
+            value = factor['value']
+            percent = value * 100 if isinstance(value, (int, float)) else value
+            reasons.append(template.format(value=value, percent=percent))
+        return reasons
+
+
+_active_rules = CompiledRules(RULE_TABLE)
+_rules_file_mtime: Optional[float] = None
+_next_reload_check = 0.0
+
+
+def load_rule_table(path: str) -> CompiledRules:
+    """
+    Compile a rule table from a JSON file (same layout as RULE_TABLE).
+
+    Raises:
+        ValueError: If the table is malformed
+    """
+    with open(path) as f:
+        return CompiledRules(json.load(f))
+
+
+def reload_rules_if_changed(force: bool = False) -> bool:
+    """
+    Hot-reload RULES_FILE when its modification time changes.
+
+    Checks the file at most every RULES_RELOAD_INTERVAL seconds unless
+    force is set. A missing or invalid file keeps the current rules.
+
+    Returns:
+        True if a new rule table was activated
+    """
+    global _active_rules, _rules_file_mtime, _next_reload_check
+
+    if not RULES_FILE:
+        return False
+    now = time.monotonic()
+    if not force and now < _next_reload_check:
+        return False
+    _next_reload_check = now + RULES_RELOAD_INTERVAL
+
+    try:
+        mtime = os.stat(RULES_FILE).st_mtime
+        if mtime == _rules_file_mtime:
+            return False
+        _active_rules = load_rule_table(RULES_FILE)
+        _rules_file_mtime = mtime
+        print(f"Loaded rule table {_active_rules.version} from {RULES_FILE}")
+        return True
+    except Exception as e:
+        print(f"Rule table reload error ({RULES_FILE}): {str(e)}")
+        return False
+
+
+def get_rules() -> CompiledRules:
+    """Return the active compiled rule table, reloading RULES_FILE if it changed."""
+    reload_rules_if_changed()
+    return _active_rules
+
+
+def active_rules() -> CompiledRules:
+    """Return the active compiled rule table without checking RULES_FILE."""
+    return _active_rules
+
+
+def calculate_risk_scores(
+    columns: Mapping[str, Sequence],
+    use_numpy: Optional[bool] = None,
+    rules: Optional[CompiledRules] = None
+) -> Tuple[Sequence[float], Sequence[int]]:
+    """
+    Columnar rule-based risk scoring for bulk evaluation.
+
+    Args:
+        columns: Mapping (dict of lists/arrays or a pandas DataFrame) with
+                 one column per name in RISK_FEATURES
+        use_numpy: Force (True) or disable (False) the NumPy path;
+                   by default NumPy is used when installed and the batch
+                   has at least VECTORIZE_MIN_ROWS rows
+        rules: Compiled rule table to use (defaults to the active table)
+
+    Returns:
+        Tuple of (risk_scores, factor_masks), one entry per row.
+        NumPy arrays on the vectorized path, lists otherwise.
+        Decode a mask with decode_risk_factors using the same rule table.
+    """
+    rules = rules or get_rules()
+    row_count = len(columns['customer_return_rate'])
+    if use_numpy is None:
+        use_numpy = bool(np) and row_count >= VECTORIZE_MIN_ROWS
+    if use_numpy:
+        if not np:
+            raise ImportError("NumPy is required for vectorized risk scoring")
+        return rules.score_columns_numpy(columns)
+
+    risk_scores = []
+    masks = []
+    score_values = rules.score_values
+    for row in zip(*(columns[name] for name in rules.features)):
+        risk_score, mask = score_values(row)
+        risk_scores.append(risk_score)
+        masks.append(mask)
+    return risk_scores, masks
+
+
+def decode_risk_factors(
+    mask: int,
+    features: Mapping[str, Any],
+    rules: Optional[CompiledRules] = None
+) -> List[Dict[str, Any]]:
+    """
+    Expand a factor bitmask into the risk factor list returned by the API.
+
+    Args:
+        mask: Factor bitmask produced by calculate_risk_scores
+        features: Feature values of the same row (used for factor values)
+        rules: Rule table that produced the mask (defaults to the active table)
+
+    Returns:
+        List of {'factor', 'value', 'weight'} dicts in rule order
+    """
+    return (rules or _active_rules).decode(mask, features)
+
+
+def explain_risk_factors(risk_factors: List[Dict[str, Any]]) -> List[str]:
+    """
+    Business-friendly explanation lines for detected risk factors.
+
+    Factors without an explanation template (e.g. moderate bands) and
+    factor names unknown to the active rule table are skipped.
+    """
+    return _active_rules.explain(risk_factors)
+
+
+def calculate_risk_score(features: Dict[str, Any]) -> Tuple[float, List[Dict[str, Any]]]:
+    """
+    Rule-based risk scoring algorithm (fallback when SageMaker unavailable).
+
+    This algorithm uses weighted factors based on e-commerce domain expertise
+    and Indian market patterns (see RULE_TABLE).
+
+    Args:
+        features: Dictionary containing customer and order features
+
+    Returns:
+        Tuple of (risk_score between 0.0 and 1.0, risk_factors)
+
+    Risk Factors:
+        - Customer return rate (40% weight)
+        - Order history and value (30% weight)
+        - Payment method - COD risk (15% weight)
+        - Product category risk (10% weight)
+        - Festival season patterns (5% weight)
+    """
+    # Active table; RULES_FILE is checked per invocation
+    return _active_rules.score_factors(features)
@@ -26,6 +26,7 @@ print(f"Output path: {s3_output_path}")
 xgb_estimator = XGBoost(
     entry_point='train.py',
     source_dir='.',
+    dependencies=['../feature_pipeline.py', '../lazy_import.py'],
     role=role,
     instance_count=1,
     instance_type='ml.m5.xlarge',
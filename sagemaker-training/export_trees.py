@@ -0,0 +1,160 @@
+"""
+Export a trained XGBoost booster to the flat-array tree format
+
+Reads the native model.json written by train.py and flattens every tree
+into parallel node arrays (split feature, threshold, child indices,
+default direction, leaf value) that tree_model.py in the Lambda package
+walks with the standard library only - no xgboost, pandas or numpy needed
+at inference time.
+
+Usage:
+    python export_trees.py model/model.json model/model_trees.json
+"""
+
+import argparse
+import json
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+EXPORT_FORMAT = 'xgb-flat-v1'
+SUPPORTED_OBJECTIVES = ('binary:logistic', 'reg:logistic')
+
+
+def _parse_base_score(raw: str) -> float:
+    # XGBoost >= 2.0 writes base_score as a vector string, e.g. "[5.82E-2]"
+    return float(raw.strip('[]').split(',')[0])
+
+
+def _tree_depth(left: List[int], right: List[int]) -> int:
+    depth = 0
+    stack = [(0, 0)]
+    while stack:
+        node, level = stack.pop()
+        if left[node] == -1:
+            depth = max(depth, level)
+        else:
+            stack.append((left[node], level + 1))
+            stack.append((right[node], level + 1))
+    return depth
+
+
+def flatten_model(model_json: Dict[str, Any],
+                  feature_names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Flatten an XGBoost JSON model into one set of node arrays
+
+    Args:
+        model_json: Parsed model.json (Booster.save_model JSON format)
+        feature_names: Overrides the names stored in the model
+
+    Returns:
+        Exported model: node arrays, per-tree root offsets, base margin
+        and feature names
+    """
+    learner = model_json['learner']
+    objective = learner['objective']['name']
+    if objective not in SUPPORTED_OBJECTIVES:
+        raise ValueError(f"Unsupported objective: {objective}")
+    if int(learner['learner_model_param'].get('num_class', '0')) > 1:
+        raise ValueError("Multi-class models are not supported")
+
+    names = list(feature_names or learner.get('feature_names') or [])
+    if not names:
+        raise ValueError("Model does not record its feature names")
+
+    base_score = _parse_base_score(learner['learner_model_param']['base_score'])
+    base_margin = math.log(base_score / (1.0 - base_score))
+
+    feature: List[int] = []
+    threshold: List[float] = []
+    left: List[int] = []
+    right: List[int] = []
+    default_left: List[int] = []
+    value: List[float] = []
+    roots: List[int] = []
+    max_depth = 0
+
+    for tree in learner['gradient_booster']['model']['trees']:
+        if any(tree.get('split_type') or []):
+            raise ValueError("Categorical splits are not supported")
+        offset = len(feature)
+        roots.append(offset)
+        tree_left = tree['left_children']
+        tree_right = tree['right_children']
+        max_depth = max(max_depth, _tree_depth(tree_left, tree_right))
+        for node, condition in enumerate(tree['split_conditions']):
+            if tree_left[node] == -1:
+                # Leaves point at themselves so batch traversal can run a
+                # fixed number of steps; the leaf value is stored in
+                # split_conditions
+                feature.append(-1)
+                threshold.append(0.0)
+                left.append(offset + node)
+                right.append(offset + node)
+                default_left.append(1)
+                value.append(float(condition))
+            else:
+                feature.append(int(tree['split_indices'][node]))
+                threshold.append(float(condition))
+                left.append(offset + tree_left[node])
+                right.append(offset + tree_right[node])
+                default_left.append(int(tree['default_left'][node]))
+                value.append(0.0)
+
+    return {
+        'format': EXPORT_FORMAT,
+        'objective': objective,
+        'feature_names': names,
+        'base_margin': base_margin,
+        'max_depth': max_depth,
+        'roots': roots,
+        'feature': feature,
+        'threshold': threshold,
+        'left': left,
+        'right': right,
+        'default_left': default_left,
+        'value': value
+    }
+
+
+def export_trees(model_path: str, output_path: str,
+                 feature_names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Export model.json to the flat-array format used by tree_model.py
+
+    Args:
+        model_path: Native XGBoost model.json
+        output_path: Destination (conventionally model_trees.json)
+        feature_names: Overrides the names stored in the model
+
+    Returns:
+        Export summary (trees, nodes, max depth, file size)
+    """
+    with open(model_path) as f:
+        exported = flatten_model(json.load(f), feature_names)
+
+    with open(output_path, 'w') as f:
+        json.dump(exported, f, separators=(',', ':'))
+
+    summary = {
+        'trees': len(exported['roots']),
+        'nodes': len(exported['feature']),
+        'max_depth': exported['max_depth'],
+        'bytes': os.path.getsize(output_path)
+    }
+    print(f"Exported {summary['trees']} trees ({summary['nodes']} nodes, "
+          f"depth {summary['max_depth']}) to {output_path} ({summary['bytes']} bytes)")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('model_path', help='model.json written by train.py')
+    parser.add_argument('output_path', help='e.g. model/model_trees.json')
+    args = parser.parse_args()
+    export_trees(args.model_path, args.output_path)
+
+
+if __name__ == '__main__':
+    main()
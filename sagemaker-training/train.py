@@ -6,6 +6,7 @@ Uses XGBoost for binary classification with SHAP explainability
 import argparse
 import json
 import os
+import sys
 import pandas as pd
 import numpy as np
 import xgboost as xgb
@@ -20,6 +21,13 @@ import shap
 import joblib
 from typing import Tuple, Dict
 
+from export_trees import export_trees
+
+# feature_pipeline.py lives at the repository root (shipped with the Lambda);
+# SageMaker copies it next to this script via the estimator's dependencies
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from feature_pipeline import INPUT_FEATURES, transform_frame  # noqa: E402
+
 
 def load_data(data_path: str) -> Tuple[pd.DataFrame, pd.Series]:
     """
@@ -40,20 +48,9 @@ def load_data(data_path: str) -> Tuple[pd.DataFrame, pd.Series]:
     print(f"Loaded {len(df)} records")
     print(f"Columns: {df.columns.tolist()}")
     
-    # Define features
-    feature_columns = [
-        'customer_return_rate',
-        'total_orders',
-        'is_cod',
-        'amount',
-        'product_return_rate',
-        'is_festival_season',
-        'customer_age_days',
-        'avg_order_value',
-        'return_frequency_30d',
-        'high_value_order_flag',
-        'new_customer_flag'
-    ]
+    # Raw inputs of the shared feature pipeline (flags are derived from them
+    # by engineer_features, exactly as the online scorer does)
+    feature_columns = INPUT_FEATURES
     
     # Prepare features and target
     X = df[feature_columns]
@@ -69,30 +66,16 @@ def engineer_features(X: pd.DataFrame) -> pd.DataFrame:
     """
     Create additional engineered features
     
+    Uses the vectorized path of feature_pipeline, the same spec the Lambda
+    applies to each request, so training and serving columns cannot drift.
+    
     Args:
         X: Input feature DataFrame
         
     Returns:
-        Enhanced feature DataFrame
+        Enhanced feature DataFrame (FEATURE_NAMES columns, in model order)
     """
-    X = X.copy()
-    
-    # Interaction features
-    X['return_rate_x_cod'] = X['customer_return_rate'] * X['is_cod']
-    X['amount_x_return_rate'] = X['amount'] * X['customer_return_rate']
-    X['festival_x_cod'] = X['is_festival_season'] * X['is_cod']
-    
-    # Risk score components
-    X['customer_risk_score'] = (
-        X['customer_return_rate'] * 0.4 +
-        X['new_customer_flag'] * 0.1
-    )
-    
-    X['order_risk_score'] = (
-        X['is_cod'] * 0.15 +
-        X['high_value_order_flag'] * 0.2 +
-        X['product_return_rate'] * 0.1
-    )
+    X = transform_frame(X)
     
     return X
 
@@ -262,6 +245,19 @@ def save_model(model: xgb.XGBClassifier, output_path: str) -> None:
     model_path = os.path.join(output_path, 'model.joblib')
     joblib.dump(model, model_path)
     
+    # Native booster for in-process Lambda inference (xgboost + numpy only).
+    # Trimmed to the early-stopping iteration so it matches predict_proba.
+    booster = model.get_booster()
+    booster = booster[: int(model.best_iteration) + 1]
+    booster.save_model(os.path.join(output_path, 'model.json'))
+    
+    # Flat-array trees for the dependency-free Lambda scorer (tree_model.py)
+    export_trees(
+        os.path.join(output_path, 'model.json'),
+        os.path.join(output_path, 'model_trees.json'),
+        feature_names=list(model.feature_names_in_) if hasattr(model, 'feature_names_in_') else None
+    )
+    
     # Save model metadata
     metadata = {
         'model_type': 'XGBoost',
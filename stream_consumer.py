@@ -0,0 +1,722 @@
+"""
+Order/return event stream consumer for the Return Abuse Detection System.
+
+Orders and returns arrive on a Kinesis data stream as JSON events in the
+layout of sample-data/orders.csv and returns.csv. The consumer folds each
+event into running per-customer and per-product counters, in O(1) per
+event (a couple of dict updates):
+
+    - customer: orders, returns, total order value
+    - product: orders, returns
+    - customer velocity window (velocity_features.py): returns in the last
+      1/7/30 days, order value EWMA, median days_to_return
+
+Scoring overlays these live counters on the feature snapshot, so an order
+or return is reflected in customer_return_rate, total_orders,
+customer_return_count, avg_order_value and product_return_rate on the
+next request instead of at the next snapshot build; the velocity window
+supplies return_frequency_30d and ages customer_age_days. Caller-supplied
+values still win.
+
+Events dated on or before the snapshot's as_of date are already counted
+in the snapshot and are skipped. Kinesis delivers at least once; records
+at or below the last sequence number applied for their shard are skipped
+too, and a batch stops at its first bad record so the retry resumes
+exactly there.
+
+Tiers:
+    - In-process counters (the consumer and the scoring path share them
+      in long-lived server processes and local runs)
+    - Optional DynamoDB table shared by all containers
+      (STREAM_AGGREGATES_TABLE): each batch flushes one atomic ADD per
+      touched customer/product (several in flight) and stores each touched
+      customer's serialized velocity window; scoring reads the table
+      through a short-lived, size-bounded local cache, within the request
+      deadline and behind a circuit breaker
+
+The in-process checkpoints are lost when a failed batch is retried on
+another container, so each shared-tier update also stores the last
+sequence number applied per shard and is conditional on it: records the
+item already holds are dropped from the deltas (and from the velocity
+window loaded from the table) instead of being added twice. This assumes
+one batch in flight per shard (ParallelizationFactor 1).
+
+FileEventStream is a file-backed stand-in for the Kinesis stream (one JSON
+line per record) used by local runs, tests and the throughput benchmark.
+
+Write the sample orders and returns as a replayable stream:
+    python stream_consumer.py sample-data order_events.jsonl
+"""
+
+import argparse
+import base64
+import csv
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from circuit_breaker import CircuitBreaker, circuit_allows, circuit_record
+from request_deadline import note_timeout, within_budget
+from request_timing import timed
+from velocity_features import WINDOW_DAYS, VelocityStore, VelocityWindow, day_number
+
+StreamEvent = Dict[str, Any]
+
+# Pseudo-orders behind a product's snapshot return rate: the snapshot has
+# no per-product order counts, so live events move the rate as if the
+# snapshot rate had been observed over this many orders
+PRODUCT_PRIOR_ORDERS = 50
+
+LOCAL_SHARD_ID = 'shardId-000000000000'
+
+# Shared-tier attribute holding the last sequence number applied per shard
+SEQUENCE_PREFIX = 'seq:'
+
+# (shard_id, entity key) -> [(sequence number, deltas)] in sequence order
+PendingDeltas = Dict[Tuple[Optional[str], str], List[Tuple[Optional[int], List[float]]]]
+
+
+def event_type(event: StreamEvent) -> str:
+    """'order' or 'return' (explicit event_type, else inferred from return_id)."""
+    kind = event.get('event_type')
+    if kind:
+        return kind
+    return 'return' if 'return_id' in event else 'order'
+
+
+def event_date(event: StreamEvent) -> Optional[str]:
+    return event.get('return_date') if event_type(event) == 'return' else event.get('order_date')
+
+
+def _sequence_value(sequence: int) -> str:
+    """
+    Stored form of a sequence number: Kinesis uses up to 56 digits, beyond
+    DynamoDB's 38-digit numbers, so it is kept as a zero-padded string
+    (which compares in numeric order).
+    """
+    return f"{sequence:064d}"
+
+
+def _decode_window(value: Any) -> Optional[VelocityWindow]:
+    """VelocityWindow from a DynamoDB binary attribute (boto3 Binary or bytes)."""
+    if not value:
+        return None
+    return VelocityWindow.from_bytes(bytes(getattr(value, 'value', value)))
+
+
+class StreamAggregates:
+    """Incremental per-customer and per-product counters fed by order/return events."""
+
+    def __init__(self, shared_table: Any = None, as_of: Optional[str] = None,
+                 order_lookup: Optional[Callable[[str], Optional[str]]] = None,
+                 order_index_size: int = 100000, read_ttl_seconds: float = 1.0,
+                 flush_concurrency: int = 16, velocity_idle_days: int = 90,
+                 read_cache_size: int = 10000, read_min_budget_ms: float = 10.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        """
+        Args:
+            shared_table: boto3 DynamoDB Table for the shared tier, or None
+            as_of: Snapshot date (ISO format); older events are skipped
+            order_lookup: order_id -> product_id for returns of orders not
+                seen on the stream (e.g. the feature store's order table)
+            order_index_size: Recent order_id -> product_id entries kept to
+                attribute returns to products
+            read_ttl_seconds: How long scoring reuses a shared-tier read
+            flush_concurrency: Shared-tier updates in flight per flush
+            velocity_idle_days: Customer velocity windows idle this long expire
+            read_cache_size: Shared-tier reads kept for reuse (least
+                recently used dropped first)
+            read_min_budget_ms: Least time left in the request deadline for
+                a shared-tier read; with less the cached value (or nothing)
+                is used
+            breaker: Circuit breaker for the shared-tier reads, or None
+        """
+        self.shared_table = shared_table
+        self.as_of = as_of
+        self._as_of_day = day_number(as_of) if as_of else None
+        self.order_lookup = order_lookup
+        self.order_index_size = order_index_size
+        self.read_ttl_seconds = read_ttl_seconds
+        self.read_cache_size = read_cache_size
+        self.read_min_budget_ms = read_min_budget_ms
+        self.breaker = breaker
+        self.flush_concurrency = flush_concurrency
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # customer_id -> [orders, returns, order_value]; product_id -> [orders, returns]
+        self._customers: Dict[str, List[float]] = {}
+        self._products: Dict[str, List[float]] = {}
+        self._order_products: 'OrderedDict[str, str]' = OrderedDict()
+        self._pending: PendingDeltas = {}
+        self._checkpoints: Dict[str, int] = {}
+        # customer_id -> {shard_id: last sequence number} of a window loaded
+        # from the shared tier, until this consumer's records pass it
+        self._window_sequences: Dict[str, Dict[str, int]] = {}
+        self._reads: 'OrderedDict[str, Tuple[float, Optional[Tuple[List[float], Any]]]]' = \
+            OrderedDict()
+        self._reads_lock = threading.Lock()
+        self.velocity = VelocityStore(
+            idle_days=velocity_idle_days,
+            loader=self._load_window if shared_table is not None else None
+        )
+        self._lock = threading.Lock()
+        self.applied = 0
+        self.skipped_stale = 0
+        self.skipped_duplicate = 0
+        self.skipped_shared = 0
+        self.flushed_updates = 0
+
+    def _remember_order(self, order_id: str, product_id: str) -> None:
+        self._order_products[order_id] = product_id
+        if len(self._order_products) > self.order_index_size:
+            self._order_products.popitem(last=False)
+
+    def _product_for_return(self, event: StreamEvent) -> Optional[str]:
+        product_id = event.get('product_id')
+        if product_id:
+            return product_id
+        product_id = self._order_products.get(event.get('order_id'))
+        if product_id is None and self.order_lookup is not None:
+            product_id = self.order_lookup(event.get('order_id'))
+        return product_id
+
+    @staticmethod
+    def _add(counters: Dict[str, List[float]], key: str, deltas: Tuple[float, ...]) -> None:
+        current = counters.get(key)
+        if current is None:
+            counters[key] = list(deltas)
+        else:
+            for index, delta in enumerate(deltas):
+                current[index] += delta
+
+    def _add_pending(self, key: str, shard_id: Optional[str], sequence: Optional[int],
+                     deltas: Tuple[float, ...]) -> None:
+        entries = self._pending.setdefault((shard_id, key), [])
+        if entries and entries[-1][0] == sequence:
+            for index, delta in enumerate(deltas):
+                entries[-1][1][index] += delta
+        else:
+            entries.append((sequence, list(deltas)))
+
+    def _in_shared_window(self, customer_id: str, day: int, shard_id: Optional[str],
+                          sequence: Optional[int]) -> bool:
+        """True if the customer's window in the shared tier already holds this record."""
+        if self.shared_table is None or sequence is None:
+            return False
+        self.velocity.load(customer_id, day)
+        persisted = self._window_sequences.get(customer_id)
+        if not persisted or shard_id not in persisted:
+            return False
+        if sequence <= persisted[shard_id]:
+            return True
+        # This shard's later records are all new to the window
+        del persisted[shard_id]
+        if not persisted:
+            del self._window_sequences[customer_id]
+        return False
+
+    def apply(self, event: StreamEvent, shard_id: Optional[str] = None,
+              sequence: Optional[int] = None) -> bool:
+        """
+        Fold one order or return event into the counters.
+
+        Args:
+            event: Order or return event
+            shard_id, sequence: Where the event came from (apply_record);
+                shared-tier updates are made conditional on them
+
+        Returns:
+            True if applied, False if skipped (already in the snapshot)
+        """
+        kind = event_type(event)
+        if kind not in ('order', 'return'):
+            raise ValueError(f"Unknown event_type: {kind}")
+        customer_id = event['customer_id']
+        dated = event_date(event)
+        day = day_number(dated) if dated else None
+        with self._lock:
+            if self._as_of_day is not None and day is not None and day <= self._as_of_day:
+                self.skipped_stale += 1
+                return False
+            if (day is not None
+                    and not self._in_shared_window(customer_id, day, shard_id, sequence)):
+                if kind == 'order':
+                    self.velocity.record_order(customer_id, day, float(event.get('amount') or 0))
+                else:
+                    days_to_return = event.get('days_to_return')
+                    self.velocity.record_return(
+                        customer_id, day,
+                        int(days_to_return) if days_to_return not in (None, '') else None
+                    )
+            if kind == 'order':
+                product_id = event.get('product_id')
+                customer_deltas = (1, 0, float(event.get('amount') or 0))
+                product_deltas = (1, 0)
+                if product_id:
+                    self._remember_order(event['order_id'], product_id)
+            else:
+                product_id = self._product_for_return(event)
+                customer_deltas = (0, 1, 0.0)
+                product_deltas = (0, 1)
+            self._add(self._customers, customer_id, customer_deltas)
+            if product_id:
+                self._add(self._products, product_id, product_deltas)
+            if self.shared_table is not None:
+                self._add_pending(f"customer#{customer_id}", shard_id, sequence, customer_deltas)
+                if product_id:
+                    self._add_pending(f"product#{product_id}", shard_id, sequence,
+                                      product_deltas)
+            self.applied += 1
+        return True
+
+    def apply_record(self, shard_id: str, sequence_number: str, event: StreamEvent) -> bool:
+        """apply() with per-shard replay protection for at-least-once delivery."""
+        sequence = int(sequence_number)
+        with self._lock:
+            if sequence <= self._checkpoints.get(shard_id, -1):
+                self.skipped_duplicate += 1
+                return False
+        applied = self.apply(event, shard_id, sequence)
+        with self._lock:
+            self._checkpoints[shard_id] = max(sequence, self._checkpoints.get(shard_id, -1))
+        return applied
+
+    def _update_shared(self, shard_id: Optional[str], key: str,
+                       entries: List[Tuple[Optional[int], List[float]]]) -> Optional[int]:
+        """
+        One ADD of the entries' summed deltas, conditional on the shard's
+        stored sequence number being below the first entry's.
+
+        Returns:
+            None if applied, else the sequence number the item already holds
+        """
+        deltas = [sum(column) for column in zip(*(deltas for _, deltas in entries))]
+        names = ('orders', 'returns', 'order_value')[:len(deltas)]
+        expression = 'ADD ' + ', '.join(f"{name} :{name}" for name in names)
+        values: Dict[str, Any] = {
+            f":{name}": Decimal(str(round(delta, 2))) for name, delta in zip(names, deltas)
+        }
+        assignments = []
+        if key.startswith('customer#'):
+            velocity = self.velocity.serialize(key[len('customer#'):])
+            if velocity is not None:
+                assignments.append('velocity = :velocity')
+                values[':velocity'] = velocity
+        conditions: Dict[str, Any] = {}
+        if shard_id is not None:
+            assignments.append('#seq = :seq')
+            values[':seq'] = _sequence_value(entries[-1][0])
+            values[':first'] = _sequence_value(entries[0][0])
+            conditions = {
+                'ConditionExpression': 'attribute_not_exists(#seq) OR #seq < :first',
+                'ExpressionAttributeNames': {'#seq': SEQUENCE_PREFIX + shard_id}
+            }
+        if assignments:
+            expression += ' SET ' + ', '.join(assignments)
+        try:
+            self.shared_table.update_item(
+                Key={'entity_key': key},
+                UpdateExpression=expression,
+                ExpressionAttributeValues=values,
+                **conditions
+            )
+            return None
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            if not conditions or code != 'ConditionalCheckFailedException':
+                raise
+        item = self.shared_table.get_item(
+            Key={'entity_key': key},
+            ProjectionExpression='#seq',
+            ExpressionAttributeNames=conditions['ExpressionAttributeNames'],
+            ConsistentRead=True
+        ).get('Item') or {}
+        return int(item.get(SEQUENCE_PREFIX + shard_id, -1))
+
+    def _write_shared(
+        self, item: Tuple[Tuple[Optional[str], str], List[Tuple[Optional[int], List[float]]]]
+    ) -> Optional[Exception]:
+        """
+        Write one key's pending deltas. Records the item already holds (a
+        batch retried on another container) are dropped and the rest is
+        written again.
+        """
+        (shard_id, key), entries = item
+        try:
+            while entries:
+                applied = self._update_shared(shard_id, key, entries)
+                if applied is None:
+                    return None
+                kept = [entry for entry in entries if entry[0] > applied]
+                with self._lock:
+                    self.skipped_shared += len(entries) - len(kept)
+                entries = kept
+            return None
+        except Exception as e:
+            return e
+
+    def flush(self) -> int:
+        """
+        Write pending counter deltas to the shared tier (one ADD per key,
+        flush_concurrency updates in flight).
+
+        Returns:
+            Number of items updated
+
+        Raises:
+            The first update error, after putting every unwritten delta back
+            into the pending set
+        """
+        if self.shared_table is None:
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        items = list(pending.items())
+        if len(items) > 1 and self.flush_concurrency > 1:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.flush_concurrency,
+                                                    thread_name_prefix='stream-flush')
+            errors = list(self._executor.map(self._write_shared, items))
+        else:
+            errors = [self._write_shared(item) for item in items]
+
+        failed = [item for item, error in zip(items, errors) if error is not None]
+        with self._lock:
+            self.flushed_updates += len(items) - len(failed)
+            for (shard_id, key), entries in failed:
+                for sequence, deltas in entries:
+                    self._add_pending(key, shard_id, sequence, tuple(deltas))
+        if failed:
+            raise next(error for error in errors if error is not None)
+        return len(items)
+
+    def _load_window(self, customer_id: str) -> Optional[VelocityWindow]:
+        """Persisted velocity window for a customer first seen by this consumer."""
+        item = self.shared_table.get_item(Key={'entity_key': f"customer#{customer_id}"}).get('Item')
+        if not item:
+            return None
+        sequences = {
+            name[len(SEQUENCE_PREFIX):]: int(value)
+            for name, value in item.items() if name.startswith(SEQUENCE_PREFIX)
+        }
+        if sequences:
+            self._window_sequences[customer_id] = sequences
+        return _decode_window(item.get('velocity'))
+
+    def _read_shared(self, key: str) -> Optional[Tuple[List[float], Any]]:
+        """
+        Counters and velocity window of a key from the shared tier. Past the
+        cache TTL the item is read again, unless the request deadline or the
+        breaker rule the read out; then the stale value (if any) is used.
+        """
+        now = time.monotonic()
+        with self._reads_lock:
+            cached = self._reads.get(key)
+            if cached is not None:
+                self._reads.move_to_end(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        if (not within_budget('stream_aggregates', self.read_min_budget_ms)
+                or not circuit_allows(self.breaker)):
+            return cached[1] if cached else None
+        started = time.perf_counter()
+        try:
+            with timed('stream_aggregates'):
+                item = self.shared_table.get_item(Key={'entity_key': key}).get('Item')
+        except Exception as e:
+            print(f"Stream aggregates read error: {str(e)}")
+            circuit_record(self.breaker, started, error=True,
+                           timed_out=note_timeout('stream_aggregates', e))
+            return cached[1] if cached else None
+        circuit_record(self.breaker, started)
+        entry = None
+        if item:
+            counters = [float(item.get('orders', 0)), float(item.get('returns', 0))]
+            window = None
+            if key.startswith('customer#'):
+                counters.append(float(item.get('order_value', 0)))
+                window = _decode_window(item.get('velocity'))
+            entry = (counters, window)
+        with self._reads_lock:
+            self._reads[key] = (now + self.read_ttl_seconds, entry)
+            self._reads.move_to_end(key)
+            while len(self._reads) > self.read_cache_size:
+                self._reads.popitem(last=False)
+        return entry
+
+    def customer_counters(self, customer_id: Optional[str]) -> Optional[List[float]]:
+        """[orders, returns, order_value] seen on the stream, or None."""
+        if not customer_id:
+            return None
+        if self.shared_table is not None:
+            entry = self._read_shared(f"customer#{customer_id}")
+            return entry[0] if entry else None
+        with self._lock:
+            counters = self._customers.get(customer_id)
+            return list(counters) if counters else None
+
+    def product_counters(self, product_id: Optional[str]) -> Optional[List[float]]:
+        """[orders, returns] seen on the stream, or None."""
+        if not product_id:
+            return None
+        if self.shared_table is not None:
+            entry = self._read_shared(f"product#{product_id}")
+            return entry[0] if entry else None
+        with self._lock:
+            counters = self._products.get(product_id)
+            return list(counters) if counters else None
+
+    def velocity_window(self, customer_id: Optional[str]) -> Optional[VelocityWindow]:
+        """The customer's velocity window (from the shared tier when configured)."""
+        if not customer_id:
+            return None
+        if self.shared_table is not None:
+            entry = self._read_shared(f"customer#{customer_id}")
+            return entry[1] if entry else None
+        return self.velocity.get(customer_id)
+
+    def overlay(self, merged: Dict[str, Any], body: Dict[str, Any],
+                today: Any = None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        Update snapshot-derived features with the live counters.
+
+        return_frequency_30d is the snapshot's count (until the snapshot date
+        leaves the 30-day window) plus the window's returns after the
+        snapshot date, so a window persisted across snapshot rebuilds is
+        never counted twice.
+
+        Args:
+            merged: Payload after the feature-store lookup (snapshot values
+                are the baseline; zero when there is no snapshot)
+            body: Original request payload; fields it sets are left alone
+            today: Scoring date (default: the order_date sent, else UTC today)
+
+        Returns:
+            Tuple of (payload, live info {customer, product, updated} or
+            None when the stream has nothing for this customer/product)
+        """
+        updates: Dict[str, Any] = {}
+        customer = self.customer_counters(merged.get('customer_id'))
+        if customer:
+            orders, returns, order_value = customer
+            base_orders = float(merged.get('total_orders') or 0)
+            base_rate = float(merged.get('customer_return_rate') or 0)
+            total_orders = base_orders + orders
+            updates['total_orders'] = int(total_orders)
+            updates['customer_return_count'] = int(
+                (merged.get('customer_return_count') or 0) + returns
+            )
+            if total_orders:
+                updates['customer_return_rate'] = round(
+                    min(1.0, (base_rate * base_orders + returns) / total_orders), 4
+                )
+            base_value = merged.get('avg_order_value')
+            if base_value is not None and total_orders:
+                updates['avg_order_value'] = round(
+                    (float(base_value) * base_orders + order_value) / total_orders, 2
+                )
+            elif orders:
+                updates['avg_order_value'] = round(order_value / orders, 2)
+
+        product = self.product_counters(merged.get('product_id'))
+        if product:
+            orders, returns = product
+            base_rate = float(merged.get('product_return_rate') or 0)
+            updates['product_return_rate'] = round(min(1.0, (
+                base_rate * PRODUCT_PRIOR_ORDERS + returns
+            ) / (PRODUCT_PRIOR_ORDERS + orders)), 4)
+
+        velocity = None
+        window = self.velocity_window(merged.get('customer_id'))
+        if window is not None:
+            today = day_number(today or body.get('order_date') or datetime.utcnow().date())
+            velocity = window.features(today)
+            as_of_day = self._as_of_day
+            snapshot_30d = merged.get('return_frequency_30d')
+            if as_of_day is None or snapshot_30d is None:
+                updates['return_frequency_30d'] = velocity['returns_30d']
+            else:
+                in_window = today - as_of_day < WINDOW_DAYS
+                updates['return_frequency_30d'] = (
+                    (int(snapshot_30d) if in_window else 0) +
+                    window.returns_in(WINDOW_DAYS, today, after=as_of_day)
+                )
+            if merged.get('customer_age_days') is not None and as_of_day is not None:
+                updates['customer_age_days'] = (
+                    int(merged['customer_age_days']) + max(0, today - as_of_day)
+                )
+            else:
+                updates['customer_age_days'] = velocity['first_seen_days']
+
+        if not customer and not product and velocity is None:
+            return merged, None
+        updated = sorted(name for name in updates if body.get(name) is None)
+        result = dict(merged)
+        for name in updated:
+            result[name] = updates[name]
+        live = {
+            'customer': {'orders': int(customer[0]), 'returns': int(customer[1])}
+            if customer else None,
+            'product': {'orders': int(product[0]), 'returns': int(product[1])}
+            if product else None,
+            'velocity': velocity,
+            'updated': updated
+        }
+        return result, live
+
+    def stats(self) -> Dict[str, Any]:
+        """Container-level counters for logs and benchmarks."""
+        with self._lock:
+            return {
+                'applied': self.applied,
+                'skipped_stale': self.skipped_stale,
+                'skipped_duplicate': self.skipped_duplicate,
+                'skipped_shared': self.skipped_shared,
+                'customers': len(self._customers),
+                'products': len(self._products),
+                'velocity_windows': len(self.velocity),
+                'velocity_expired': self.velocity.expired,
+                'flushed_updates': self.flushed_updates
+            }
+
+
+def decode_record(record: Dict[str, Any]) -> Tuple[str, str, StreamEvent]:
+    """(shard_id, sequence_number, event) from a Kinesis event source record."""
+    shard_id = record.get('eventID', LOCAL_SHARD_ID).split(':')[0]
+    kinesis = record['kinesis']
+    event = json.loads(base64.b64decode(kinesis['data']))
+    return shard_id, kinesis['sequenceNumber'], event
+
+
+def handle_stream_batch(event: Dict[str, Any], aggregates: StreamAggregates) -> Dict[str, Any]:
+    """
+    Apply a Kinesis batch of order/return events.
+
+    Processing stops at the first record that fails; it and everything
+    after it are reported so the retry resumes from that record without
+    re-applying the ones before it.
+
+    Returns:
+        Partial batch response (itemIdentifier = sequence number)
+    """
+    records = event['Records']
+    failed_at = len(records)
+    for index, record in enumerate(records):
+        try:
+            aggregates.apply_record(*decode_record(record))
+        except Exception as e:
+            print(f"Stream record error: {str(e)}")
+            failed_at = index
+            break
+    try:
+        aggregates.flush()
+    except Exception as e:
+        # Unwritten deltas stay pending; the retry skips the already-applied
+        # records as duplicates and flushes them again
+        print(f"Stream aggregates flush error: {str(e)}")
+        failed_at = 0
+    if failed_at == len(records):
+        return {'batchItemFailures': []}
+    return {'batchItemFailures': [
+        {'itemIdentifier': records[failed_at]['kinesis']['sequenceNumber']}
+    ]}
+
+
+def is_kinesis_event(event: Dict[str, Any]) -> bool:
+    """True if the Lambda event was delivered by a Kinesis event source mapping."""
+    records = event.get('Records')
+    return bool(records) and records[0].get('eventSource') == 'aws:kinesis'
+
+
+def events_from_csv(data_dir: str) -> List[StreamEvent]:
+    """Orders and returns from the sample-data CSVs as events in date order."""
+    events = []
+    with open(os.path.join(data_dir, 'orders.csv'), newline='') as f:
+        for row in csv.DictReader(f):
+            row['amount'] = float(row['amount'])
+            row['is_festival_season'] = int(row['is_festival_season'])
+            events.append(dict(row, event_type='order'))
+    with open(os.path.join(data_dir, 'returns.csv'), newline='') as f:
+        for row in csv.DictReader(f):
+            row['refund_amount'] = float(row['refund_amount'])
+            row['days_to_return'] = int(row['days_to_return'])
+            events.append(dict(row, event_type='return'))
+    # Orders sort before returns on the same day
+    events.sort(key=lambda item: (event_date(item), item['event_type'] != 'order'))
+    return events
+
+
+class FileEventStream:
+    """
+    File-backed stand-in for a single-shard Kinesis stream.
+
+    Each line is one record: {"seq": int, "key": partition key, "data": event}.
+    Batches are delivered in the Lambda Kinesis event shape, so the same
+    handler runs against this file and the real stream.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._next_sequence = 0
+        if os.path.exists(path):
+            with open(path) as f:
+                self._next_sequence = sum(1 for _ in f)
+
+    def put_records(self, events: List[StreamEvent], partition_key: str = 'customer_id') -> int:
+        """Append events; returns the sequence number of the last one written."""
+        with open(self.path, 'a') as f:
+            for item in events:
+                f.write(json.dumps({
+                    'seq': self._next_sequence,
+                    'key': str(item.get(partition_key, '')),
+                    'data': item
+                }, separators=(',', ':')) + '\n')
+                self._next_sequence += 1
+        return self._next_sequence - 1
+
+    def read_batches(self, batch_size: int = 100,
+                     start_sequence: int = 0) -> Iterator[Dict[str, Any]]:
+        """Yield Lambda Kinesis events of up to batch_size records, from start_sequence on."""
+        records = []
+        with open(self.path) as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry['seq'] < start_sequence:
+                    continue
+                sequence = str(entry['seq'])
+                records.append({
+                    'eventSource': 'aws:kinesis',
+                    'eventID': f"{LOCAL_SHARD_ID}:{sequence}",
+                    'kinesis': {
+                        'partitionKey': entry['key'],
+                        'sequenceNumber': sequence,
+                        'data': base64.b64encode(
+                            json.dumps(entry['data'], separators=(',', ':')).encode()
+                        ).decode()
+                    }
+                })
+                if len(records) == batch_size:
+                    yield {'Records': records}
+                    records = []
+        if records:
+            yield {'Records': records}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write sample orders/returns as a local stream')
+    parser.add_argument('data_dir', help='Directory with orders.csv and returns.csv')
+    parser.add_argument('stream_path', help='JSON-lines stream file to append to')
+    args = parser.parse_args()
+
+    events = events_from_csv(args.data_dir)
+    last = FileEventStream(args.stream_path).put_records(events)
+    print(f"Wrote {len(events)} events to {args.stream_path} (last sequence {last})")
+
+
+if __name__ == '__main__':
+    main()
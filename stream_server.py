@@ -0,0 +1,176 @@
+"""
+Local HTTP server for streaming explanations.
+
+Stand-in for Lambda response streaming: POST /risk-score/stream (or any
+POST with "explanation_mode": "stream") writes the NDJSON events of
+lambda_function.stream_prediction as HTTP chunks as soon as they are
+produced - the score first, then Bedrock text, then the final
+explanation. Other requests go through lambda_handler unchanged, so
+index.html can point both its endpoints here.
+
+The same process can serve a Lambda function URL in RESPONSE_STREAM mode
+through Lambda Web Adapter; behind API Gateway (REST) responses are
+buffered and stream mode returns all events in one body.
+
+Usage:
+    python stream_server.py [--port 8080] [--stubs] [--bedrock-latency-ms 800]
+        [--bedrock-chunk-ms 40] [--micro-batch] [--batch-max-rows 64]
+        [--batch-max-wait-ms 5] [--batch-fixed]
+
+--stubs swaps the AWS clients for the in-process stand-ins from
+benchmarks/aws_stubs.py (no AWS account needed). --micro-batch (or
+MICRO_BATCH_ENABLED=true) lets the single-order SageMaker calls of
+concurrent requests share multi-row invocations (micro_batcher.py);
+--batch-fixed turns off the adaptive batch size and window.
+"""
+
+import argparse
+import json
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+import lambda_function
+from explanation_stream import NDJSON_CONTENT_TYPE
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS'
+}
+
+
+class StreamingHandler(BaseHTTPRequestHandler):
+    """Chunked NDJSON for stream mode, lambda_handler for everything else."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_OPTIONS(self) -> None:
+        self.send_response(204)
+        for name, value in CORS_HEADERS.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        self._send_lambda_response(lambda_function.lambda_handler(
+            {'httpMethod': 'GET', 'path': self.path}, None
+        ))
+
+    def do_POST(self) -> None:
+        raw = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        try:
+            body = json.loads(raw or b'{}')
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and 'orders' not in body and (
+                self.path.rstrip('/').endswith('/stream')
+                or body.get('explanation_mode') == 'stream'):
+            self._stream(dict(body, explanation_mode='stream'))
+            return
+        self._send_lambda_response(lambda_function.lambda_handler(
+            {'httpMethod': 'POST', 'path': self.path, 'body': raw.decode('utf-8')}, None
+        ))
+
+    def _stream(self, body: Dict[str, Any]) -> None:
+        lines = lambda_function.stream_prediction(body)
+        try:
+            # Errors before the score event still get a normal JSON error response
+            try:
+                first = next(lines)
+            except ValueError as e:
+                self._send_json(400, {'error': str(e), 'message': 'Invalid request'})
+                return
+            except Exception as e:
+                self._send_json(500, {'error': str(e), 'message': 'Internal server error'})
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', NDJSON_CONTENT_TYPE)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.send_header('Cache-Control', 'no-cache')
+            for name, value in CORS_HEADERS.items():
+                self.send_header(name, value)
+            self.end_headers()
+            try:
+                self._write_chunk(first)
+                for line in lines:
+                    self._write_chunk(line)
+                self.wfile.write(b'0\r\n\r\n')
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+        finally:
+            # Close on this thread so the invocation timer is reset in its own context
+            lines.close()
+
+    def _write_chunk(self, line: str) -> None:
+        data = line.encode('utf-8')
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def _send_lambda_response(self, response: Dict[str, Any]) -> None:
+        payload = response.get('body', '').encode('utf-8')
+        self.send_response(response.get('statusCode', 200))
+        for name, value in (response.get('headers') or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_json(self, status_code: int, body: Dict[str, Any]) -> None:
+        self._send_lambda_response({
+            'statusCode': status_code,
+            'headers': dict(CORS_HEADERS, **{'Content-Type': 'application/json'}),
+            'body': json.dumps(body)
+        })
+
+    def log_message(self, format: str, *args) -> None:
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--stubs', action='store_true', help='use in-process AWS stand-ins')
+    parser.add_argument('--sagemaker-latency-ms', type=float, default=20.0)
+    parser.add_argument('--bedrock-latency-ms', type=float, default=800.0,
+                        help='stub time to first explanation chunk')
+    parser.add_argument('--bedrock-chunk-ms', type=float, default=40.0)
+    parser.add_argument('--dynamodb-latency-ms', type=float, default=5.0)
+    parser.add_argument('--micro-batch', action='store_true',
+                        help='batch concurrent SageMaker calls')
+    parser.add_argument('--batch-max-rows', type=int, default=lambda_function.MICRO_BATCH_MAX_ROWS)
+    parser.add_argument('--batch-max-wait-ms', type=float,
+                        default=lambda_function.MICRO_BATCH_MAX_WAIT_MS)
+    parser.add_argument('--batch-fixed', action='store_true',
+                        help='fixed batch window and size instead of adaptive')
+    args = parser.parse_args()
+
+    if args.stubs:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+        from aws_stubs import install_stubs
+        stubs = install_stubs(lambda_function, args.sagemaker_latency_ms,
+                              args.bedrock_latency_ms, args.dynamodb_latency_ms)
+        stubs.bedrock.chunk_ms = args.bedrock_chunk_ms
+    if args.micro_batch:
+        lambda_function.SAGEMAKER_BATCHER = lambda_function.new_sagemaker_batcher(
+            max_rows=args.batch_max_rows,
+            max_wait_ms=args.batch_max_wait_ms,
+            adaptive=not args.batch_fixed
+        )
+
+    server = ThreadingHTTPServer((args.host, args.port), StreamingHandler)
+    print(f"Serving on http://{args.host}:{args.port} (POST /risk-score/stream for NDJSON)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+    finally:
+        if lambda_function.SAGEMAKER_BATCHER is not None:
+            lambda_function.SAGEMAKER_BATCHER.close(timeout=1.0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Dependency-free gradient-boosted tree scorer for the Return Abuse Detection System.
+
+Scores the flat-array model written by sagemaker-training/export_trees.py
+(model_trees.json): every tree of the XGBoost booster flattened into
+parallel node arrays - split feature index, float32 threshold, left/right
+child, default direction for missing values and leaf value. Scoring a row
+walks each tree from its root to a leaf, sums the leaf values onto the
+base margin and applies the logistic link, which reproduces
+XGBClassifier.predict_proba[:, 1].
+
+Feature values and thresholds are rounded to float32 before comparing, as
+XGBoost does, so split decisions match the booster exactly; missing
+features (NaN) follow each split's default branch.
+
+The row path needs only the standard library. Batches of
+VECTORIZE_MIN_ROWS or more use NumPy when it is installed, advancing all
+rows through all trees one level per step.
+"""
+
+import json
+import math
+from array import array
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+from lazy_import import lazy_import
+
+# Imported on first use; falsy on a Lambda runtime without a NumPy layer
+np = lazy_import('numpy')
+
+EXPORT_FORMAT = 'xgb-flat-v1'
+
+# Batch size at which the NumPy traversal beats walking rows one by one
+VECTORIZE_MIN_ROWS = 16
+
+MISSING = float('nan')
+
+
+def _to_float32(values: Sequence[float]) -> List[float]:
+    return list(array('f', values))
+
+
+def _sigmoid(margin: float) -> float:
+    if margin < -700.0:
+        return 0.0
+    return 1.0 / (1.0 + math.exp(-margin))
+
+
+class TreeModel:
+    """Flat-array tree ensemble with a standard-library row scorer."""
+
+    def __init__(self, exported: Dict[str, Any]):
+        """
+        Args:
+            exported: Parsed model_trees.json (see export_trees.flatten_model)
+        """
+        if exported.get('format') != EXPORT_FORMAT:
+            raise ValueError(f"Unsupported tree model format: {exported.get('format')}")
+
+        self.feature_names: List[str] = list(exported['feature_names'])
+        self.base_margin = float(exported['base_margin'])
+        self.max_depth = int(exported['max_depth'])
+        self.roots: List[int] = list(exported['roots'])
+        self.feature: List[int] = list(exported['feature'])
+        self.threshold = _to_float32(exported['threshold'])
+        self.left: List[int] = list(exported['left'])
+        self.right: List[int] = list(exported['right'])
+        self.value: List[float] = [float(v) for v in exported['value']]
+        # Child taken when the split feature is missing
+        self.missing: List[int] = [
+            left if default_left else right
+            for left, right, default_left in zip(self.left, self.right, exported['default_left'])
+        ]
+        self._arrays: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def load(cls, path: str) -> 'TreeModel':
+        with open(path) as f:
+            return cls(json.load(f))
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def _row_values(self, features: Mapping[str, Any]) -> List[float]:
+        return _to_float32([
+            MISSING if features.get(name) is None else float(features[name])
+            for name in self.feature_names
+        ])
+
+    def margin_values(self, values: Sequence[float]) -> float:
+        """
+        Raw margin for one row of float32-rounded values in feature_names order.
+        """
+        feature = self.feature
+        threshold = self.threshold
+        left = self.left
+        right = self.right
+        missing = self.missing
+        value = self.value
+
+        margin = self.base_margin
+        for node in self.roots:
+            split = feature[node]
+            while split >= 0:
+                x = values[split]
+                if x < threshold[node]:
+                    node = left[node]
+                elif x != x:
+                    node = missing[node]
+                else:
+                    node = right[node]
+                split = feature[node]
+            margin += value[node]
+        return margin
+
+    def predict_row(self, features: Mapping[str, Any]) -> float:
+        """Probability of the positive class for one feature dictionary."""
+        return _sigmoid(self.margin_values(self._row_values(features)))
+
+    def _numpy_arrays(self) -> Dict[str, Any]:
+        if self._arrays is None:
+            feature = np.asarray(self.feature, dtype=np.int32)
+            self._arrays = {
+                'roots': np.asarray(self.roots, dtype=np.int32),
+                # Leaves read column 0; their self-loop children ignore the result
+                'feature': np.maximum(feature, 0),
+                'threshold': np.asarray(self.threshold, dtype=np.float32),
+                'left': np.asarray(self.left, dtype=np.int32),
+                'right': np.asarray(self.right, dtype=np.int32),
+                'missing': np.asarray(self.missing, dtype=np.int32),
+                'value': np.asarray(self.value, dtype=np.float64)
+            }
+        return self._arrays
+
+    def predict_matrix_numpy(self, matrix: Any) -> Any:
+        """
+        Vectorized probabilities for a (rows, features) array in feature_names order.
+        """
+        arrays = self._numpy_arrays()
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        flat = matrix.ravel()
+        # Offset of each row's first feature in the flattened matrix
+        row_offsets = (np.arange(matrix.shape[0], dtype=np.int64) * matrix.shape[1])[:, None]
+        nodes = np.repeat(arrays['roots'][None, :], matrix.shape[0], axis=0)
+        for _ in range(self.max_depth):
+            x = flat.take(row_offsets + arrays['feature'].take(nodes))
+            next_nodes = arrays['right'].take(nodes)
+            go_left = x < arrays['threshold'].take(nodes)
+            next_nodes[go_left] = arrays['left'].take(nodes[go_left])
+            is_missing = np.isnan(x)
+            if is_missing.any():
+                next_nodes[is_missing] = arrays['missing'].take(nodes[is_missing])
+            nodes = next_nodes
+        margin = self.base_margin + arrays['value'].take(nodes).sum(axis=1)
+        return 1.0 / (1.0 + np.exp(-margin))
+
+    def predict_vectors(self, vectors: List[Sequence[float]],
+                        use_numpy: Optional[bool] = None) -> List[float]:
+        """
+        Score feature vectors already in feature_names order (NaN = missing).
+
+        Args:
+            vectors: One sequence of feature values per row
+            use_numpy: Force (True) or disable (False) the NumPy batch path;
+                default uses it for batches of VECTORIZE_MIN_ROWS or more
+
+        Returns:
+            Probability of the positive class per row
+        """
+        if use_numpy is None:
+            use_numpy = bool(np) and len(vectors) >= VECTORIZE_MIN_ROWS
+        if use_numpy:
+            if not np:
+                raise RuntimeError("NumPy is not installed")
+            matrix = np.array(vectors, dtype=np.float32)
+            return [float(score) for score in self.predict_matrix_numpy(matrix)]
+        return [_sigmoid(self.margin_values(_to_float32(vector))) for vector in vectors]
+
+    def predict(self, feature_rows: List[Mapping[str, Any]],
+                use_numpy: Optional[bool] = None) -> List[float]:
+        """
+        Score feature dictionaries keyed by feature name (absent = missing).
+
+        Args:
+            feature_rows: Feature dictionaries keyed by model feature name
+            use_numpy: See predict_vectors
+
+        Returns:
+            Probability of the positive class per row
+        """
+        vectors = [
+            [MISSING if row.get(name) is None else float(row[name])
+             for name in self.feature_names]
+            for row in feature_rows
+        ]
+        return self.predict_vectors(vectors, use_numpy)
@@ -5,9 +5,29 @@
 
 echo "🚀 Updating Lambda function with hybrid model architecture..."
 
+# Benchmark gate: CPU-bound scoring cases vs benchmarks/baseline.json, and the
+# cold start budgets of bench_startup.py
+# (SKIP_BENCHMARKS=1 to deploy anyway)
+if [ "${SKIP_BENCHMARKS:-0}" != "1" ]; then
+    echo "⏱️  Checking scoring benchmarks against the saved baseline..."
+    if ! python3 benchmarks/bench_suite.py --cases cpu --check; then
+        echo "❌ Benchmark regression - fix it, refresh the baseline, or set SKIP_BENCHMARKS=1"
+        exit 1
+    fi
+    echo "⏱️  Checking cold import and first invocation against the startup budgets..."
+    if ! python3 benchmarks/bench_startup.py --no-eager --repeat 5; then
+        echo "❌ Cold start over budget - defer the new import/client, or set SKIP_BENCHMARKS=1"
+        exit 1
+    fi
+fi
+
 # Create deployment package
 echo "📦 Creating deployment package..."
-zip -r lambda-deployment.zip lambda_function.py
+zip -r lambda-deployment.zip lambda_function.py risk_scoring.py explanation_cache.py explanation_queue.py \
+  local_model.py tree_model.py feature_store.py feature_pipeline.py stream_consumer.py \
+  velocity_features.py idempotency.py request_timing.py explanation_stream.py \
+  explanation_routing.py audit_writer.py aws_clients.py lazy_import.py request_deadline.py \
+  circuit_breaker.py micro_batcher.py
 
 # Update Lambda function
 echo "⬆️  Uploading to AWS Lambda..."
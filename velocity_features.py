@@ -0,0 +1,241 @@
+"""
+Sliding-window velocity features per customer.
+
+train.py's return_frequency_30d (and customer_age_days) only existed in
+the offline snapshot, and a recount over a customer's order/return
+history gets slower as the history grows. Each customer here has a fixed
+size window updated in O(1) per event:
+
+    - returns per day in a 30-slot ring of day buckets, giving returns in
+      the last 1, 7 and 30 days (a sum over at most 30 slots)
+    - EWMA of order value (EWMA_ALPHA per order)
+    - histogram of days_to_return (one bin per day, the last bin holds
+      everything from DAYS_TO_RETURN_BINS - 1 days on), giving the median
+    - first/last event day, for customer age and idle expiry
+
+Memory per key is bounded (two small uint16 arrays plus a few ints), and
+a window serializes to a fixed VELOCITY_RECORD_SIZE-byte record, so the
+shared DynamoDB tier stores one small binary attribute per customer and
+scoring decodes it instead of scanning history. Windows untouched for
+idle_days are expired.
+"""
+
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, Optional
+
+WINDOW_DAYS = 30
+DAYS_TO_RETURN_BINS = 31
+EWMA_ALPHA = 0.2
+COUNTER_MAX = 0xFFFF
+
+VELOCITY_FORMAT_VERSION = 1
+# version, head_day, first_day, last_day, orders, order_value_ewma
+VELOCITY_HEADER = struct.Struct('<BIIIIf')
+VELOCITY_RECORD_SIZE = VELOCITY_HEADER.size + 2 * (WINDOW_DAYS + DAYS_TO_RETURN_BINS)
+
+
+def day_number(value: Any) -> int:
+    """Proleptic ordinal of an ISO date/datetime string or date."""
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+class VelocityWindow:
+    """Bucketed ring counters for one customer."""
+
+    __slots__ = ('head_day', 'first_day', 'last_day', 'orders', 'order_value_ewma',
+                 'returns', 'days_to_return')
+
+    def __init__(self, day: int):
+        self.head_day = day
+        self.first_day = day
+        self.last_day = day
+        self.orders = 0
+        self.order_value_ewma = 0.0
+        self.returns = array('H', bytes(2 * WINDOW_DAYS))
+        self.days_to_return = array('H', bytes(2 * DAYS_TO_RETURN_BINS))
+
+    def _advance(self, day: int) -> None:
+        """Move the ring head forward to `day`, clearing the buckets passed over."""
+        gap = day - self.head_day
+        if gap <= 0:
+            return
+        if gap >= WINDOW_DAYS:
+            for index in range(WINDOW_DAYS):
+                self.returns[index] = 0
+        else:
+            for passed in range(self.head_day + 1, day + 1):
+                self.returns[passed % WINDOW_DAYS] = 0
+        self.head_day = day
+
+    def _touch(self, day: int) -> None:
+        self.first_day = min(self.first_day, day)
+        self.last_day = max(self.last_day, day)
+        self._advance(day)
+
+    def add_order(self, day: int, amount: float) -> None:
+        self._touch(day)
+        if self.orders:
+            self.order_value_ewma += EWMA_ALPHA * (amount - self.order_value_ewma)
+        else:
+            self.order_value_ewma = float(amount)
+        self.orders += 1
+
+    def add_return(self, day: int, days_to_return: Optional[int]) -> None:
+        self._touch(day)
+        # Late events older than the ring still count towards the median
+        if day > self.head_day - WINDOW_DAYS:
+            slot = day % WINDOW_DAYS
+            self.returns[slot] = min(COUNTER_MAX, self.returns[slot] + 1)
+        if days_to_return is not None:
+            index = min(max(int(days_to_return), 0), DAYS_TO_RETURN_BINS - 1)
+            if self.days_to_return[index] == COUNTER_MAX:
+                # Halve every bin; the median is unchanged up to rounding
+                for other in range(DAYS_TO_RETURN_BINS):
+                    self.days_to_return[other] //= 2
+            self.days_to_return[index] += 1
+
+    def returns_in(self, days: int, today: int, after: Optional[int] = None) -> int:
+        """Returns in the `days` days ending on `today` (inclusive), only after `after`."""
+        newest = min(today, self.head_day)
+        oldest = max(today - days + 1, self.head_day - WINDOW_DAYS + 1)
+        if after is not None:
+            oldest = max(oldest, after + 1)
+        return sum(self.returns[day % WINDOW_DAYS] for day in range(oldest, newest + 1))
+
+    def median_days_to_return(self) -> Optional[float]:
+        total = sum(self.days_to_return)
+        if not total:
+            return None
+        middle = (total + 1) // 2
+        seen = 0
+        for index, count in enumerate(self.days_to_return):
+            seen += count
+            if seen >= middle:
+                return float(index)
+        return None
+
+    def features(self, today: int) -> Dict[str, Any]:
+        return {
+            'returns_1d': self.returns_in(1, today),
+            'returns_7d': self.returns_in(7, today),
+            'returns_30d': self.returns_in(WINDOW_DAYS, today),
+            'order_value_ewma': round(self.order_value_ewma, 2) if self.orders else None,
+            'median_days_to_return': self.median_days_to_return(),
+            'first_seen_days': max(0, today - self.first_day)
+        }
+
+    def to_bytes(self) -> bytes:
+        """Fixed-size little-endian record (VELOCITY_RECORD_SIZE bytes)."""
+        header = VELOCITY_HEADER.pack(VELOCITY_FORMAT_VERSION, self.head_day, self.first_day,
+                                      self.last_day, self.orders, self.order_value_ewma)
+        returns, days_to_return = array('H', self.returns), array('H', self.days_to_return)
+        if struct.pack('=H', 1) != struct.pack('<H', 1):
+            returns.byteswap()
+            days_to_return.byteswap()
+        return header + returns.tobytes() + days_to_return.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'VelocityWindow':
+        if len(data) != VELOCITY_RECORD_SIZE:
+            raise ValueError(f"Velocity record must be {VELOCITY_RECORD_SIZE} bytes")
+        version, head_day, first_day, last_day, orders, ewma = VELOCITY_HEADER.unpack_from(data)
+        if version != VELOCITY_FORMAT_VERSION:
+            raise ValueError(f"Unsupported velocity record version: {version}")
+        window = cls(head_day)
+        window.first_day = first_day
+        window.last_day = last_day
+        window.orders = orders
+        window.order_value_ewma = ewma
+        offset = VELOCITY_HEADER.size
+        window.returns = array('H', data[offset:offset + 2 * WINDOW_DAYS])
+        window.days_to_return = array('H', data[offset + 2 * WINDOW_DAYS:])
+        if struct.pack('=H', 1) != struct.pack('<H', 1):
+            window.returns.byteswap()
+            window.days_to_return.byteswap()
+        return window
+
+
+class VelocityStore:
+    """
+    Velocity windows for all active customers.
+
+    Windows are kept in last-activity order, so expiring idle keys pops
+    from the front and costs O(1) per expired key.
+    """
+
+    def __init__(self, idle_days: int = 90,
+                 loader: Optional[Callable[[str], Optional[VelocityWindow]]] = None):
+        """
+        Args:
+            idle_days: Windows with no event for this many days (relative
+                to the newest event seen) are dropped
+            loader: customer_id -> persisted window, consulted before a
+                customer's first event in this process (shared tier)
+        """
+        self.idle_days = idle_days
+        self.loader = loader
+        self._windows: 'OrderedDict[str, VelocityWindow]' = OrderedDict()
+        self._lock = threading.RLock()
+        self.newest_day: Optional[int] = None
+        self.expired = 0
+
+    def _window(self, customer_id: str, day: int) -> VelocityWindow:
+        window = self._windows.get(customer_id)
+        if window is None and self.loader is not None:
+            window = self.loader(customer_id)
+        if window is None:
+            window = VelocityWindow(day)
+        self._windows[customer_id] = window
+        self._windows.move_to_end(customer_id)
+        return window
+
+    def _seen(self, day: int) -> None:
+        if self.newest_day is None or day > self.newest_day:
+            self.newest_day = day
+            self.expire(day)
+
+    def record_order(self, customer_id: str, day: int, amount: float) -> None:
+        with self._lock:
+            self._seen(day)
+            self._window(customer_id, day).add_order(day, amount)
+
+    def record_return(self, customer_id: str, day: int, days_to_return: Optional[int]) -> None:
+        with self._lock:
+            self._seen(day)
+            self._window(customer_id, day).add_return(day, days_to_return)
+
+    def expire(self, today: int) -> int:
+        """Drop windows idle for more than idle_days; returns how many were dropped."""
+        dropped = 0
+        with self._lock:
+            while self._windows:
+                customer_id, window = next(iter(self._windows.items()))
+                if window.last_day >= today - self.idle_days:
+                    break
+                del self._windows[customer_id]
+                dropped += 1
+            self.expired += dropped
+        return dropped
+
+    def get(self, customer_id: str) -> Optional[VelocityWindow]:
+        with self._lock:
+            return self._windows.get(customer_id)
+
+    def load(self, customer_id: str, day: int) -> VelocityWindow:
+        """The customer's window: held, persisted (loader) or new from day on."""
+        with self._lock:
+            return self._window(customer_id, day)
+
+    def serialize(self, customer_id: str) -> Optional[bytes]:
+        with self._lock:
+            window = self._windows.get(customer_id)
+            return window.to_bytes() if window is not None else None
+
+    def __len__(self) -> int:
+        return len(self._windows)